@@ -0,0 +1,250 @@
+import csv
+import datetime
+import tempfile
+from decimal import Decimal
+
+import xlsxwriter
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import FileResponse, StreamingHttpResponse
+
+# Rows fetched per round trip while a report is written out
+EXPORT_CHUNK_SIZE = 2000
+
+# Behind pgbouncer, the direct connection that still has server-side cursors (config/databases.py)
+EXPORT_DATABASE = 'exports' if 'exports' in settings.DATABASES else DEFAULT_DB_ALIAS
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class ExportReport:
+    """
+    A report as a header plus a lazy stream of rows, so it can be written to
+    XLSX or CSV without ever holding the whole result set in memory.
+
+    `rows` yields tuples in `headers` order, `total_columns` are the column
+    indexes summed into the TOTAL row while the rows stream past, and
+    `highlight` (row -> bool) marks rows to shade in the workbook.
+    """
+
+    def __init__(self, title, headers, rows, file_name, total_columns=(), highlight=None, sheet_name=None):
+        self.title = title
+        self.sheet_name = sheet_name or title
+        self.headers = headers
+        self.rows = rows
+        self.file_name = file_name
+        self.total_columns = tuple(total_columns)
+        self.highlight = highlight
+        self.totals = {column: Decimal('0') for column in self.total_columns}
+
+    def __iter__(self):
+        for row in self.rows:
+            for column in self.total_columns:
+                self.totals[column] += row[column] or 0
+            yield row
+
+    def total_row(self):
+        row = [None] * len(self.headers)
+        row[0] = 'TOTAL'
+        for column, value in self.totals.items():
+            row[column] = value
+        return row
+
+
+def _report_title(title, start_date, end_date):
+    return f"{title} - {start_date} to {end_date}" if start_date and end_date else title
+
+
+def _report(title, headers, rows, file_name, start_date, end_date, **kwargs):
+    return ExportReport(_report_title(title, start_date, end_date), headers, rows, file_name, sheet_name=title, **kwargs)
+
+
+def sales_report(queryset, group_by='seller', start_date=None, end_date=None):
+    """Report over one of the get_sales_analytics_by_* querysets"""
+    title_mapping = {
+        'seller': 'Sales by Seller',
+        'product': 'Sales by Product',
+        'route': 'Sales by Route'
+    }
+    key_mapping = {
+        'seller': ('seller_id', 'seller__store_name', 'Seller'),
+        'product': ('product_id', 'product__name', 'Product'),
+        'route': ('route_id', 'route__name', 'Route'),
+    }
+    id_key, name_key, label = key_mapping.get(group_by, key_mapping['seller'])
+    headers = [f'{label} ID', f'{label} Name', 'Total Quantity', 'Total Value', 'Order Count']
+
+    rows = (
+        (item[id_key], item[name_key], item['total_quantity'], item['total_value'], item['order_count'])
+        for item in queryset.using(EXPORT_DATABASE).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return _report(
+        title_mapping.get(group_by, 'Sales Report'),
+        headers,
+        rows,
+        f"sales_by_{group_by}_{start_date}_to_{end_date}",
+        start_date,
+        end_date,
+        total_columns=(2, 3, 4),
+    )
+
+
+def detailed_sales_report(queryset, start_date=None, end_date=None):
+    """Report with one row per order item; reads plain values, no model instances"""
+    headers = ['Order Number', 'Seller Name', 'Order Date', 'Product Name', 'Product Code',
+               'Quantity', 'Unit Price', 'Total Price']
+
+    values = queryset.using(EXPORT_DATABASE).values_list(
+        'order__order_number',
+        'order__seller__store_name',
+        'order__delivery_date',
+        'product__name',
+        'product__code',
+        'quantity',
+        'unit_price',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    rows = (
+        (order_number, store_name, delivery_date, product_name, product_code,
+         quantity, unit_price, (quantity * unit_price).quantize(Decimal('0.01')))
+        for order_number, store_name, delivery_date, product_name, product_code, quantity, unit_price in values
+    )
+    return _report(
+        'Detailed Sales Report',
+        headers,
+        rows,
+        f"detailed_sales_{start_date}_to_{end_date}",
+        start_date,
+        end_date,
+        total_columns=(5, 7),
+    )
+
+
+def seller_balance_report(queryset, start_date=None, end_date=None):
+    """Report over the annotated get_seller_balance_report queryset"""
+    headers = ['Seller ID', 'Store Name', 'Owner Name', 'Opening Balance', 'Total Sales',
+               'Total Payments', 'Current Balance', 'Last Payment Date', 'Last Order Date']
+
+    rows = (
+        (seller.id, seller.store_name, seller.full_name, seller.opening_balance, seller.total_sales,
+         seller.total_payments, seller.current_balance, seller.last_payment_date, seller.last_order_date)
+        for seller in queryset.using(EXPORT_DATABASE).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return _report(
+        'Seller Balance Report',
+        headers,
+        rows,
+        f"seller_balance_{start_date}_to_{end_date}",
+        start_date,
+        end_date,
+        total_columns=(3, 4, 5, 6),
+        # Highlight negative balances
+        highlight=lambda row: row[6] is not None and row[6] < 0,
+    )
+
+
+def _write_xlsx_row(worksheet, row_num, row, cell_format, date_format, widths):
+    for col_num, value in enumerate(row):
+        if value is None:
+            worksheet.write_blank(row_num, col_num, None, cell_format)
+            continue
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            worksheet.write_datetime(row_num, col_num, value, date_format)
+            text = value.isoformat()
+        elif isinstance(value, Decimal):
+            worksheet.write_number(row_num, col_num, float(value), cell_format)
+            text = str(value)
+        else:
+            worksheet.write(row_num, col_num, value, cell_format)
+            text = str(value)
+        widths[col_num] = max(widths[col_num], len(text))
+
+
+def write_xlsx(report, output):
+    """
+    Write the report to a file object with xlsxwriter in constant_memory
+    mode: each row is flushed to disk as soon as the next one starts, so
+    memory use does not grow with the number of rows.
+    """
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet(report.sheet_name[:31])
+
+    title_format = workbook.add_format({'bold': True, 'font_size': 14, 'align': 'center'})
+    header_format = workbook.add_format({'bold': True, 'bg_color': '#DDDDDD', 'align': 'center'})
+    highlight_format = workbook.add_format({'bg_color': '#FFCCCC'})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+    highlight_date_format = workbook.add_format({'num_format': 'yyyy-mm-dd', 'bg_color': '#FFCCCC'})
+    total_format = workbook.add_format({'bold': True})
+
+    widths = [len(header) for header in report.headers]
+
+    # Add report header
+    worksheet.merge_range(0, 0, 0, len(report.headers) - 1, report.title, title_format)
+
+    # Add column headers
+    for col_num, header in enumerate(report.headers):
+        worksheet.write(2, col_num, header, header_format)
+
+    # Add data rows
+    row_num = 2
+    for row_num, row in enumerate(report, 3):
+        if report.highlight and report.highlight(row):
+            _write_xlsx_row(worksheet, row_num, row, highlight_format, highlight_date_format, widths)
+        else:
+            _write_xlsx_row(worksheet, row_num, row, None, date_format, widths)
+
+    # Add totals row
+    _write_xlsx_row(worksheet, row_num + 2, report.total_row(), total_format, date_format, widths)
+
+    # Column widths are tracked while writing, the rows are no longer in memory
+    for col_num, width in enumerate(widths):
+        worksheet.set_column(col_num, col_num, width + 2)
+
+    workbook.close()
+
+
+def xlsx_response(report):
+    """
+    Build the workbook in a temporary file and stream it back in chunks.
+    The temporary file is removed when the response is closed.
+    """
+    output = tempfile.TemporaryFile()
+    try:
+        write_xlsx(report, output)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f"{report.file_name}.xlsx",
+        content_type=XLSX_CONTENT_TYPE,
+    )
+
+
+class _Echo:
+    """File-like object whose write() just hands the line back to csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def csv_rows(report):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(report.headers)
+    for row in report:
+        yield writer.writerow([_csv_value(value) for value in row])
+    yield writer.writerow(report.total_row())
+
+
+def csv_response(report):
+    """Stream the report as CSV, one line per row as the queryset is iterated"""
+    response = StreamingHttpResponse(csv_rows(report), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{report.file_name}.csv"'
+    return response
@@ -31,6 +31,13 @@ class RouteSalesAnalyticsSerializer(serializers.Serializer):
     total_value = serializers.DecimalField(max_digits=15, decimal_places=2)
     order_count = serializers.IntegerField()
 
+class SalesTrendSerializer(serializers.Serializer):
+    """Serializer for sales totals per day, week, month or year."""
+    period = serializers.DateField()
+    total_quantity = serializers.DecimalField(max_digits=15, decimal_places=3)
+    total_value = serializers.DecimalField(max_digits=15, decimal_places=2)
+    order_count = serializers.IntegerField()
+
 class SellerBalanceSerializer(serializers.Serializer):
     """Serializer for seller balance report."""
     id = serializers.IntegerField()
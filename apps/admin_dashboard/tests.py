@@ -0,0 +1,63 @@
+import csv
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from django.test import TestCase
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+
+from apps.core.testing import create_route, create_sellers, create_user
+from apps.delivery.models import DeliveryOrder
+
+
+class SellerBalanceExportTests(TestCase):
+    """The seller balance report streams out as XLSX and CSV with a TOTAL row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('exporter')
+        route = create_route('Hill')
+        cls.seller, cls.other = create_sellers(route, 2)
+        for day, total, collected in ((date(2026, 9, 28), '50.00', '0.00'), (date(2026, 10, 2), '80.00', '30.00')):
+            DeliveryOrder.objects.create(
+                route=route, seller=cls.seller, delivery_date=day,
+                total_price=Decimal(total), amount_collected=Decimal(collected),
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.params = {'start_date': '2026-10-01', 'end_date': '2026-10-31'}
+
+    def test_csv_export(self):
+        response = self.client.get('/export/seller-balance/csv/', self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('seller_balance_2026-10-01_to_2026-10-31.csv', response['Content-Disposition'])
+
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:3], ['Seller ID', 'Store Name', 'Owner Name'])
+        by_seller = {row[0]: row for row in rows[1:-1]}
+        self.assertEqual(
+            [Decimal(value) for value in by_seller[str(self.seller.pk)][3:7]],
+            [Decimal('50.00'), Decimal('80.00'), Decimal('30.00'), Decimal('100.00')],
+        )
+        self.assertEqual(rows[-1][0], 'TOTAL')
+        self.assertEqual(Decimal(rows[-1][6]), Decimal('100.00'))
+
+    def test_xlsx_export(self):
+        response = self.client.get('/export/seller-balance/', self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('seller_balance_2026-10-01_to_2026-10-31.xlsx', response['Content-Disposition'])
+
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0][0], 'Seller Balance Report - 2026-10-01 to 2026-10-31')
+        self.assertEqual(rows[2][0], 'Seller ID')
+        self.assertEqual(len(rows), 3 + 2 + 2)
+        self.assertEqual(rows[-1][0], 'TOTAL')
+        self.assertEqual(rows[-1][6], 100)
+
+    def test_exports_are_for_admins(self):
+        self.client.force_authenticate(create_user('driver', role='DELIVERY'))
+        self.assertEqual(self.client.get('/export/seller-balance/csv/', self.params).status_code, 403)
@@ -19,4 +19,9 @@
     path('export/sales/', views.export_sales_excel, name='export_sales_excel'),
     path('export/detailed-sales/', views.export_detailed_sales_excel, name='export_detailed_sales_excel'),
     path('export/seller-balance/', views.export_seller_balance_excel, name='export_seller_balance_excel'),
+
+    # CSV exports
+    path('export/sales/csv/', views.export_sales_csv, name='export_sales_csv'),
+    path('export/detailed-sales/csv/', views.export_detailed_sales_csv, name='export_detailed_sales_csv'),
+    path('export/seller-balance/csv/', views.export_seller_balance_csv, name='export_seller_balance_csv'),
 ]
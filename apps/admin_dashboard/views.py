@@ -1,5 +1,4 @@
 from django.shortcuts import render
-from django.http import HttpResponse
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.utils.decorators import method_decorator
@@ -19,11 +18,14 @@
 from apps.sales.models import SalesOrder, OrderItem
 from apps.delivery.models import DeliveryOrder
 from apps.products.models import Product
+from apps.products.lookups import product_list
+from apps.seller.lookups import route_list
 
 from .serializers import (
     SalesAnalyticsSerializer,
     ProductSalesAnalyticsSerializer,
     RouteSalesAnalyticsSerializer,
+    SalesTrendSerializer,
     SellerBalanceSerializer,
     SalesOrderExportSerializer,
     OrderItemExportSerializer,
@@ -34,10 +36,15 @@
     get_sales_analytics_by_seller,
     get_sales_analytics_by_product,
     get_sales_analytics_by_route,
+    get_sales_trend,
     get_seller_balance_report,
-    generate_excel_for_sales,
-    generate_excel_for_seller_balance,
-    generate_excel_for_detailed_sales
+)
+from .exports import (
+    sales_report,
+    detailed_sales_report,
+    seller_balance_report,
+    xlsx_response,
+    csv_response,
 )
 
 # Dashboard Home View
@@ -84,8 +91,8 @@ def get_context_data(self, **kwargs):
 
         # Add filter options to context
         context['sellers'] = Seller.objects.all().order_by('store_name')
-        context['routes'] = Route.objects.all().order_by('name')
-        context['products'] = Product.objects.filter(is_active=True).order_by('name')
+        context['routes'] = route_list()
+        context['products'] = product_list()
 
         # Default time periods
         today = datetime.now().date()
@@ -148,9 +155,13 @@ def get(self, request):
             chart_data['datasets'][0]['data'].append(float(item['total_value']))
             chart_data['datasets'][1]['data'].append(float(item['total_quantity']))
 
+        # Totals per day / week / month / year, from the daily rollups
+        trend = SalesTrendSerializer(get_sales_trend(start_date, end_date, time_filter), many=True)
+
         return Response({
             'chart_data': chart_data,
-            'table_data': serializer.data
+            'table_data': serializer.data,
+            'trend': trend.data,
         })
 
 # Seller Balance Report Views
@@ -191,10 +202,10 @@ def get(self, request):
 
         return Response(serializer.data)
 
-# Excel Export Views
-@api_view(['GET'])
-@permission_classes([IsAdminUser])
-def export_sales_excel(request):
+# Excel / CSV Export Views
+# Reports are streamed: rows are read with .iterator() and written as they
+# arrive, so a year of detailed sales does not have to fit in memory.
+def build_sales_report(request):
     # Get filter parameters
     start_date = request.query_params.get('start_date')
     end_date = request.query_params.get('end_date')
@@ -204,36 +215,22 @@ def export_sales_excel(request):
     # Get analytics data based on grouping
     if group_by == 'product':
         analytics_data = get_sales_analytics_by_product(start_date, end_date, time_filter)
-        file_name = f"sales_by_product_{start_date}_to_{end_date}.xlsx"
     elif group_by == 'route':
         analytics_data = get_sales_analytics_by_route(start_date, end_date, time_filter)
-        file_name = f"sales_by_route_{start_date}_to_{end_date}.xlsx"
     else:  # default: group by seller
+        group_by = 'seller'
         analytics_data = get_sales_analytics_by_seller(start_date, end_date, time_filter)
-        file_name = f"sales_by_seller_{start_date}_to_{end_date}.xlsx"
 
-    # Generate Excel file
-    excel_file = generate_excel_for_sales(analytics_data, group_by, start_date, end_date)
+    return sales_report(analytics_data, group_by, start_date, end_date)
 
-    # Create response
-    response = HttpResponse(
-        excel_file.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
-
-    return response
-
-@api_view(['GET'])
-@permission_classes([IsAdminUser])
-def export_detailed_sales_excel(request):
+def build_detailed_sales_report(request):
     # Get filter parameters
     start_date = request.query_params.get('start_date')
     end_date = request.query_params.get('end_date')
     seller_id = request.query_params.get('seller_id')
 
     # Build queryset
-    queryset = OrderItem.objects.select_related('order', 'order__seller', 'product')
+    queryset = OrderItem.objects.all()
 
     if start_date:
         queryset = queryset.filter(order__delivery_date__gte=start_date)
@@ -242,22 +239,9 @@ def export_detailed_sales_excel(request):
     if seller_id:
         queryset = queryset.filter(order__seller_id=seller_id)
 
-    # Generate Excel file
-    excel_file = generate_excel_for_detailed_sales(queryset, start_date, end_date)
-
-    # Create response
-    file_name = f"detailed_sales_{start_date}_to_{end_date}.xlsx"
-    response = HttpResponse(
-        excel_file.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    return detailed_sales_report(queryset, start_date, end_date)
 
-    return response
-
-@api_view(['GET'])
-@permission_classes([IsAdminUser])
-def export_seller_balance_excel(request):
+def build_seller_balance_report(request):
     # Get filter parameters
     start_date = request.query_params.get('start_date')
     end_date = request.query_params.get('end_date')
@@ -266,15 +250,34 @@ def export_seller_balance_excel(request):
     # Get seller balance data
     balance_data = get_seller_balance_report(seller_id, start_date, end_date)
 
-    # Generate Excel file
-    excel_file = generate_excel_for_seller_balance(balance_data, start_date, end_date)
+    return seller_balance_report(balance_data, start_date, end_date)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_sales_excel(request):
+    return xlsx_response(build_sales_report(request))
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_sales_csv(request):
+    return csv_response(build_sales_report(request))
 
-    # Create response
-    file_name = f"seller_balance_{start_date}_to_{end_date}.xlsx"
-    response = HttpResponse(
-        excel_file.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_detailed_sales_excel(request):
+    return xlsx_response(build_detailed_sales_report(request))
 
-    return response
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_detailed_sales_csv(request):
+    return csv_response(build_detailed_sales_report(request))
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_seller_balance_excel(request):
+    return xlsx_response(build_seller_balance_report(request))
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_seller_balance_csv(request):
+    return csv_response(build_seller_balance_report(request))
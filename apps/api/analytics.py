@@ -0,0 +1,315 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.paginator import EmptyPage, Paginator
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.delivery.models import DailySalesRollup, DeliveryOrder, SellerLedger
+from apps.seller.models import Seller
+
+# Analytics endpoints page over groups (products, sellers, routes), not rows
+ANALYTICS_PAGE_SIZE = 100
+ANALYTICS_MAX_PAGE_SIZE = 1000
+
+ZERO = Decimal('0')
+
+
+def _sum(field):
+    """Decimal-exact SUM that is 0 instead of NULL for empty groups"""
+    return Coalesce(Sum(field), Value(ZERO))
+
+
+def period_trunc(period, field):
+    """Truncation used for a breakdown period ('month', 'year', anything else is weekly)"""
+    if period == 'year':
+        return TruncYear(field)
+    return TruncMonth(field) if period == 'month' else TruncWeek(field)
+
+
+def period_start(value, period):
+    """Python counterpart of period_trunc for a date"""
+    if period == 'year':
+        return value.replace(month=1, day=1)
+    if period == 'month':
+        return value.replace(day=1)
+    return value - timedelta(days=value.weekday())
+
+
+def period_label(value, period):
+    if period == 'year':
+        return value.strftime('%Y')
+    return value.strftime('%Y-%m') if period == 'month' else value.strftime('%Y-%W')
+
+
+def parse_date_bounds(params):
+    """
+    (start_date, end_date) from the start_date / end_date query parameters.
+    Either may be missing; raises ValueError for a malformed date.
+    """
+    bounds = []
+    for name in ('start_date', 'end_date'):
+        value = params.get(name)
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValueError(f'Invalid {name}. Use YYYY-MM-DD.')
+        bounds.append(parsed)
+    return tuple(bounds)
+
+
+def _date_filter(field, start_date, end_date):
+    date_filter = Q()
+    if start_date:
+        date_filter &= Q(**{f'{field}__gte': start_date})
+    if end_date:
+        date_filter &= Q(**{f'{field}__lte': end_date})
+    return date_filter
+
+
+def _positive_int(value, default):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+class GroupPage:
+    """One page of aggregated groups plus the numbers a client needs to page on"""
+
+    def __init__(self, queryset, page=1, page_size=ANALYTICS_PAGE_SIZE):
+        self.page_size = min(_positive_int(page_size, ANALYTICS_PAGE_SIZE), ANALYTICS_MAX_PAGE_SIZE)
+        self.number = _positive_int(page, 1)
+        paginator = Paginator(queryset, self.page_size)
+        self.count = paginator.count
+        self.num_pages = paginator.num_pages
+        try:
+            self.groups = list(paginator.page(self.number).object_list)
+        except EmptyPage:
+            self.groups = []
+
+    def meta(self):
+        return {
+            'count': self.count,
+            'page': self.number,
+            'page_size': self.page_size,
+            'total_pages': self.num_pages,
+        }
+
+
+def _breakdown(queryset, group_field, group_ids, period, date_field, **metrics):
+    """{group_id: {period_label: {metric: value}}} for the groups on the page"""
+    rows = queryset.filter(**{f'{group_field}__in': group_ids}).annotate(
+        period=period_trunc(period, date_field)
+    ).values(group_field, 'period').annotate(**metrics).order_by('period')
+
+    breakdown = {group_id: {} for group_id in group_ids}
+    for row in rows:
+        breakdown[row[group_field]][period_label(row['period'], period)] = {
+            metric: row[metric] for metric in metrics
+        }
+    return breakdown
+
+
+def _delivered_rollups(start_date, end_date):
+    """Daily rollup rows that carry delivery order items (see apps/delivery/rollups.py)"""
+    return DailySalesRollup.objects.filter(
+        _date_filter('date', start_date, end_date), delivered_items__gt=0
+    )
+
+
+def product_movement(period='week', start_date=None, end_date=None, page=1, page_size=ANALYTICS_PAGE_SIZE):
+    """Delivered quantity and value per product, with a per-period breakdown"""
+    rollups = _delivered_rollups(start_date, end_date)
+    totals = rollups.values('product_id').annotate(
+        product_name=F('product__name'),
+        total_quantity=_sum('delivered_quantity'),
+        total_value=_sum('delivered_value'),
+    ).order_by('-total_value', 'product_id')
+
+    groups = GroupPage(totals, page, page_size)
+    breakdown = _breakdown(
+        rollups, 'product_id', [group['product_id'] for group in groups.groups], period, 'date',
+        quantity=_sum('delivered_quantity'),
+        value=_sum('delivered_value'),
+    )
+
+    products = []
+    for group in groups.groups:
+        periods = breakdown[group['product_id']]
+        products.append({
+            'product_id': group['product_id'],
+            'product_name': group['product_name'],
+            'total_quantity': group['total_quantity'],
+            'total_value': group['total_value'],
+            'movement_breakdown': {
+                'quantity': {label: stats['quantity'] for label, stats in periods.items()},
+                'value': {label: stats['value'] for label, stats in periods.items()},
+            },
+        })
+    return products, groups.meta()
+
+
+def top_sellers(period='week', start_date=None, end_date=None, page=1, page_size=ANALYTICS_PAGE_SIZE):
+    """Sellers by delivered quantity, with a per-period breakdown"""
+    rollups = _delivered_rollups(start_date, end_date)
+    totals = rollups.values('seller_id').annotate(
+        seller_name=F('seller__store_name'),
+        total_quantity=_sum('delivered_quantity'),
+        total_value=_sum('delivered_value'),
+    ).order_by('-total_quantity', 'seller_id')
+
+    groups = GroupPage(totals, page, page_size)
+    breakdown = _breakdown(
+        rollups, 'seller_id', [group['seller_id'] for group in groups.groups], period, 'date',
+        quantity=_sum('delivered_quantity'),
+        value=_sum('delivered_value'),
+    )
+
+    sellers = []
+    for group in groups.groups:
+        periods = breakdown[group['seller_id']]
+        sellers.append({
+            'seller_id': group['seller_id'],
+            'seller_name': group['seller_name'],
+            'total_quantity': group['total_quantity'],
+            'total_value': group['total_value'],
+            'delivery_breakdown': {
+                'quantity': {label: stats['quantity'] for label, stats in periods.items()},
+                'value': {label: stats['value'] for label, stats in periods.items()},
+            },
+        })
+    return sellers, groups.meta()
+
+
+def _route_metrics():
+    # Orders are joined to their items for the quantity, so the counts must be distinct
+    return {
+        'total_deliveries': Count('id', distinct=True),
+        'on_time_deliveries': Count(
+            'id', distinct=True, filter=Q(actual_delivery_date=F('delivery_date'))
+        ),
+        'total_delivered_quantity': _sum('items__delivered_quantity'),
+    }
+
+
+def route_performance(period='week', start_date=None, end_date=None, page=1, page_size=ANALYTICS_PAGE_SIZE):
+    """Deliveries, on-time deliveries and delivered quantity per route"""
+    orders = DeliveryOrder.objects.filter(_date_filter('delivery_date', start_date, end_date))
+    totals = orders.values('route_id').annotate(
+        route_name=F('route__name'),
+        **_route_metrics()
+    ).order_by('-total_deliveries', 'route_id')
+
+    groups = GroupPage(totals, page, page_size)
+    breakdown = _breakdown(
+        orders, 'route_id', [group['route_id'] for group in groups.groups], period,
+        'delivery_date',
+        **_route_metrics()
+    )
+
+    routes = []
+    for group in groups.groups:
+        total_deliveries = group['total_deliveries']
+        on_time_percent = (
+            Decimal(group['on_time_deliveries'] * 100) / total_deliveries
+        ).quantize(Decimal('0.01')) if total_deliveries else Decimal('0.00')
+        routes.append({
+            'route_id': group['route_id'],
+            'route_name': group['route_name'],
+            'total_deliveries': total_deliveries,
+            'on_time_deliveries': group['on_time_deliveries'],
+            'on_time_percent': on_time_percent,
+            'total_delivered_quantity': group['total_delivered_quantity'],
+            'performance_breakdown': breakdown[group['route_id']],
+        })
+    return routes, groups.meta()
+
+
+# Age buckets in days overdue: (label, youngest, oldest or None)
+AGING_BUCKETS = (
+    ('0-7', 0, 7),
+    ('8-30', 8, 30),
+    ('31-60', 31, 60),
+    ('60+', 61, None),
+)
+
+
+def _age_bucket(age):
+    for label, youngest, oldest in AGING_BUCKETS:
+        if age >= youngest and (oldest is None or age <= oldest):
+            return label
+
+
+def balance_aging(period='buckets', as_of=None, seller_id=None, route_id=None,
+                  page=1, page_size=ANALYTICS_PAGE_SIZE):
+    """
+    Overdue balances per seller: the sum of its SellerLedger entries dated
+    before as_of, when positive. Collections pay off the oldest debt first,
+    so what is still owed is made of the most recent days that added to the
+    balance; period='buckets' splits it by the age of those days, 'week'
+    and 'month' by the period they fall in.
+    """
+    as_of = as_of or timezone.localdate()
+    entries = SellerLedger.objects.filter(entry_date__lt=as_of)
+    if seller_id:
+        entries = entries.filter(seller_id=seller_id)
+    if route_id:
+        entries = entries.filter(seller__route_id=route_id)
+
+    totals = entries.values('seller_id').annotate(
+        overdue_balance=_sum('amount')
+    ).filter(overdue_balance__gt=0).order_by('-overdue_balance', 'seller_id')
+
+    # One row per seller is small enough to page in memory, which saves
+    # the paginator's COUNT a second pass over the ledger
+    groups = GroupPage(list(totals), page, page_size)
+    page_ids = [group['seller_id'] for group in groups.groups]
+    names = dict(Seller.objects.filter(pk__in=page_ids).values_list('id', 'store_name'))
+
+    # What each day charged the page's sellers (sales, opening balances),
+    # newest first
+    days = defaultdict(list)
+    rows = entries.filter(seller_id__in=page_ids).exclude(entry_type='collection').values_list(
+        'seller_id', 'entry_date'
+    ).annotate(
+        net=Sum('amount')
+    ).filter(net__gt=0).order_by('seller_id', '-entry_date')
+    for seller, entry_date, net in rows:
+        days[seller].append((entry_date, net))
+
+    sellers = []
+    for group in groups.groups:
+        if period == 'buckets':
+            breakdown = {label: ZERO for label, _, _ in AGING_BUCKETS}
+        else:
+            breakdown = {}
+        owed = group['overdue_balance']
+        for entry_date, net in days[group['seller_id']]:
+            if owed <= 0:
+                break
+            part = min(net, owed)
+            owed -= part
+            if period == 'buckets':
+                label = _age_bucket((as_of - entry_date).days)
+            else:
+                label = period_label(period_start(entry_date, period), period)
+            breakdown[label] = breakdown.get(label, ZERO) + part
+        if period != 'buckets':
+            breakdown = dict(sorted(breakdown.items()))
+        sellers.append({
+            'seller_id': group['seller_id'],
+            'seller_name': names.get(group['seller_id'], str(group['seller_id'])),
+            'total_balance': group['overdue_balance'],
+            'overdue_breakdown': breakdown,
+        })
+    return sellers, groups.meta()
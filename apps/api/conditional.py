@@ -0,0 +1,96 @@
+"""
+Conditional GET for the read endpoints the mobile app polls.
+
+A response's validators come from the data it is rendered from, not from
+the rendered bytes: for the filtered queryset and each source it depends
+on, the row count and the latest updated_at, one aggregate query apiece.
+The ETag hashes those together with the request path, Last-Modified is the
+latest updated_at of them all. A request whose If-None-Match (or
+If-Modified-Since) still matches gets a 304 before anything is serialized.
+
+A source is either a lookup path from the queryset's model ('items',
+'route') or a model whose whole table the response depends on, such as
+Product for product names or PricePlan for general prices. Counts catch
+deletions, which leave no updated_at behind.
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def _version(queryset, path=''):
+    prefix = f'{path}__' if path else ''
+    row = queryset.order_by().aggregate(count=Count(f'{prefix}pk'), latest=Max(f'{prefix}updated_at'))
+    return row['count'], row['latest']
+
+
+def queryset_versions(queryset, sources=()):
+    """[(row count, latest updated_at)] of the queryset and each of its sources"""
+    # By primary key, so search filters' DISTINCT and joins do not skew the counts
+    rows = queryset.model._default_manager.filter(pk__in=queryset.order_by().values('pk'))
+    versions = [_version(rows)]
+    for source in sources:
+        if isinstance(source, str):
+            versions.append(_version(rows, source))
+        else:
+            versions.append(_version(source._default_manager.all()))
+    return versions
+
+
+def conditional_response(request, versions, respond):
+    """
+    A 304 / 412 when the request's preconditions say the client is up to
+    date, otherwise respond(); either way with ETag and Last-Modified set.
+    """
+    digest = hashlib.sha256(repr((request.get_full_path(), versions)).encode()).hexdigest()[:32]
+    # Weak: equal data, not necessarily byte-identical renderings
+    etag = f'W/"{digest}"'
+    latest = [version for _, version in versions if version is not None]
+    last_modified = int(max(latest).timestamp()) if latest else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = respond()
+        if not 200 <= response.status_code < 300:
+            return response
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified validators and 304 responses for a viewset's list
+    and retrieve actions. conditional_sources lists what the serializer
+    reads besides the queryset's own rows.
+    """
+    conditional_sources = ()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return conditional_response(
+            request,
+            queryset_versions(queryset, self.conditional_sources),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            versions = queryset_versions(
+                queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]}), self.conditional_sources
+            )
+        except (TypeError, ValueError, ValidationError):
+            # A malformed id: let get_object() answer with its 404
+            return super().retrieve(request, *args, **kwargs)
+        return conditional_response(
+            request,
+            versions,
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
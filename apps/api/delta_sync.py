@@ -0,0 +1,114 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.products.models import PricePlan, Product
+from apps.products.pricing import effective_prices_prefetch
+from apps.seller.models import Route, Seller
+
+from .models import SyncTombstone
+from .serializers import (
+    PricePlanSerializer,
+    ProductSerializer,
+    RouteSerializer,
+    SellerSerializer,
+)
+
+# Rows changed this long before the cursor are sent again, so a write that
+# committed while the previous pull was running is not missed. Devices
+# upsert by id, so the repeats are harmless.
+PULL_OVERLAP = timedelta(seconds=5)
+
+# Tombstones are kept this long; a cursor older than that gets a full pull
+TOMBSTONE_RETENTION = getattr(settings, 'SYNC_TOMBSTONE_RETENTION', timedelta(days=30))
+
+
+def parse_cursor(value):
+    """Cursor handed out by a previous pull (an ISO timestamp), or None"""
+    if not value:
+        return None
+    try:
+        cursor = parse_datetime(str(value).replace(' ', '+'))
+    except ValueError:
+        return None
+    if cursor is not None and timezone.is_naive(cursor):
+        cursor = timezone.make_aware(cursor)
+    return cursor
+
+
+def _deleted_ids(resource, since):
+    return list(
+        SyncTombstone.objects.filter(resource=resource, deleted_at__gt=since)
+        .values_list('object_id', flat=True).distinct()
+    )
+
+
+def collect_changes(cursor, context=None):
+    """
+    Master data changed since the cursor, as
+    {resource: {'changed': [...], 'deleted': [ids]}} plus the next cursor.
+    Without a usable cursor everything is returned and 'full' is True.
+    """
+    now = timezone.now()
+    full = cursor is None or cursor < now - TOMBSTONE_RETENTION
+    since = None if full else cursor - PULL_OVERLAP
+    SyncTombstone.objects.filter(deleted_at__lt=now - TOMBSTONE_RETENTION).delete()
+
+    routes = Route.objects.order_by('id')
+    products = Product.objects.select_related('category').order_by('id')
+    plans = PricePlan.objects.select_related('seller').prefetch_related('product_prices__product').order_by('id')
+    sellers = Seller.objects.select_related('route').prefetch_related(
+        'price_plans__product_prices__product',
+        'price_plans__seller',
+        effective_prices_prefetch(),
+    ).order_by('id')
+
+    deleted = {resource: [] for resource in ('routes', 'products', 'price_plans', 'sellers')}
+
+    if not full:
+        routes = routes.filter(updated_at__gt=since)
+        products = products.filter(updated_at__gt=since)
+        plans = plans.filter(
+            Q(updated_at__gt=since) | Q(product_prices__updated_at__gt=since)
+        ).distinct()
+
+        # A seller's effective prices move with its own plans and with the general plan
+        changed_plans = list(plans.values_list('seller_id', 'is_general'))
+        if not any(is_general for _, is_general in changed_plans):
+            plan_sellers = {seller_id for seller_id, _ in changed_plans if seller_id}
+            sellers = sellers.filter(Q(updated_at__gt=since) | Q(id__in=plan_sellers))
+
+        for resource in deleted:
+            deleted[resource] = _deleted_ids(resource, since)
+
+    # Deactivated products disappear from the app the same way deleted ones do
+    changed_products = []
+    for product in products:
+        if product.is_active:
+            changed_products.append(product)
+        elif not full:
+            deleted['products'].append(product.pk)
+
+    return {
+        'cursor': now.isoformat(),
+        'full': full,
+        'routes': {
+            'changed': RouteSerializer(routes, many=True, context=context).data,
+            'deleted': deleted['routes'],
+        },
+        'products': {
+            'changed': ProductSerializer(changed_products, many=True, context=context).data,
+            'deleted': deleted['products'],
+        },
+        'price_plans': {
+            'changed': PricePlanSerializer(plans, many=True, context=context).data,
+            'deleted': deleted['price_plans'],
+        },
+        'sellers': {
+            'changed': SellerSerializer(sellers, many=True, context=context).data,
+            'deleted': deleted['sellers'],
+        },
+    }
@@ -84,8 +84,8 @@ class Meta:
 
 class BrokenOrderFilter(django_filters.FilterSet):
     route = django_filters.NumberFilter(field_name='route__id')
-    start_date = django_filters.DateFilter(field_name='broken_date', lookup_expr='gte')
-    end_date = django_filters.DateFilter(field_name='broken_date', lookup_expr='lte')
+    start_date = django_filters.DateFilter(field_name='report_date', lookup_expr='gte')
+    end_date = django_filters.DateFilter(field_name='report_date', lookup_expr='lte')
     status = django_filters.CharFilter(field_name='status')
     sync_status = django_filters.CharFilter(field_name='sync_status')
     
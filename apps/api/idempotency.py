@@ -0,0 +1,58 @@
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import SyncRequest
+
+logger = logging.getLogger(__name__)
+
+# How long a completed sync is replayed for; after that the same payload is
+# processed again (e.g. a device re-uploading the same day on purpose)
+SYNC_REPLAY_TTL = getattr(settings, 'SYNC_REPLAY_TTL', timedelta(hours=24))
+
+
+def sync_key_for(request):
+    """
+    Key identifying one logical upload: the Idempotency-Key header, then a
+    'sync_key' field in the payload, then a SHA-256 of the canonical payload
+    """
+    key = request.headers.get('Idempotency-Key')
+    if not key and isinstance(request.data, dict):
+        key = request.data.get('sync_key')
+    if key:
+        key = str(key).strip()
+        # Long client keys are hashed so they fit the column
+        return key if len(key) <= 64 else hashlib.sha256(key.encode()).hexdigest()
+
+    payload = json.dumps(request.data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_replay(user, sync_key):
+    """Stored (response, status_code) for a completed sync, or None"""
+    stored = SyncRequest.objects.filter(
+        user=user,
+        sync_key=sync_key,
+        created_at__gte=timezone.now() - SYNC_REPLAY_TTL,
+    ).values_list('response', 'status_code').first()
+    return stored
+
+
+def store_replay(user, sync_key, response, status_code):
+    """Remember the response of a completed sync; expired keys are pruned first"""
+    SyncRequest.objects.filter(
+        user=user, created_at__lt=timezone.now() - SYNC_REPLAY_TTL
+    ).delete()
+    try:
+        with transaction.atomic():
+            SyncRequest.objects.create(
+                user=user, sync_key=sync_key, response=response, status_code=status_code
+            )
+    except IntegrityError:
+        # A concurrent retry of the same upload finished first
+        logger.info('Sync %s already stored, keeping the first response', sync_key)
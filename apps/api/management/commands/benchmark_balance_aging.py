@@ -0,0 +1,92 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.api.analytics import balance_aging
+from apps.delivery.models import SellerLedger
+from apps.seller.models import Route, Seller
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the balance aging report on a synthetic seller ledger. '
+        'Everything is created inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sellers', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=730)
+        parser.add_argument(
+            '--every', type=int, default=7,
+            help='Days between two orders of the same seller',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['sellers'], options['days'], max(1, options['every']))
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write('Benchmark data rolled back')
+
+    def timed(self, label, func):
+        # Building the data overflows the query log, which would hide these queries
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f'{label}: {elapsed * 1000:.0f} ms, {len(queries)} queries')
+        return result
+
+    def run(self, seller_count, days, every):
+        today = date.today()
+        route = Route.objects.create(name='Bench route', code='BENCH-R')
+        sellers = Seller.objects.bulk_create([
+            Seller(
+                first_name='Bench', last_name=str(i), mobileno=f'B{i:010d}',
+                store_name=f'Bench store {i}', store_address='Benchmark street', route=route,
+            )
+            for i in range(seller_count)
+        ])
+
+        self.stdout.write(f'Building ledgers for {seller_count} sellers over {days} days, one order every {every} days')
+        # A sale and a smaller collection per order, oldest first, written
+        # directly: the order and rollup signals are not what this measures
+        batch = []
+        count = 0
+        for index, seller in enumerate(sellers):
+            balance = Decimal('0.00')
+            for offset in range(days - index % every, 0, -every):
+                count += 1
+                entry_date = today - timedelta(days=offset)
+                for entry_type, amount in (('sale', Decimal('50.00')), ('collection', Decimal('-40.00'))):
+                    balance += amount
+                    batch.append(SellerLedger(
+                        seller=seller, reference=f'BENCH-{count}', entry_type=entry_type,
+                        entry_date=entry_date, amount=amount, balance_after=balance,
+                    ))
+            if len(batch) >= 20000:
+                SellerLedger.objects.bulk_create(batch, batch_size=2000)
+                batch = []
+        SellerLedger.objects.bulk_create(batch, batch_size=2000)
+        self.stdout.write(f'  {count} orders, {count * 2} ledger entries')
+
+        # The first pass also warms the page cache
+        for period in ('buckets', 'week', 'month', 'buckets'):
+            sellers_page, pagination = self.timed(
+                f'Aging by {period}, first page', lambda: balance_aging(period, today)
+            )
+            self.stdout.write(f"  {pagination['count']} sellers, {len(sellers_page)} on the page")
+        self.timed(
+            'Aging by buckets for one seller',
+            lambda: balance_aging('buckets', today, seller_id=sellers[0].pk),
+        )
@@ -0,0 +1,120 @@
+import multiprocessing
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+
+from apps.api.write_queue import sync_write_turn
+from apps.delivery.models import DeliverySync
+
+DEVICE_PREFIX = 'bench-sync-'
+
+
+def _writer(index, syncs, hold, results):
+    """Sync-shaped write transactions: insert, hold the transaction open, update"""
+    connections.close_all()
+    latencies, locked = [], 0
+    for number in range(syncs):
+        started = time.perf_counter()
+        try:
+            with sync_write_turn(), transaction.atomic():
+                job = DeliverySync.objects.create(
+                    device_id=f'{DEVICE_PREFIX}{index}', sync_type='combined',
+                    local_id=f'{index}-{number}', data={'payload': {}}, status='processing',
+                )
+                # Validation and the per-record work of a real upload
+                time.sleep(hold)
+                DeliverySync.objects.filter(pk=job.pk).update(status='completed')
+        except OperationalError:
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    results.put(('write', latencies, locked))
+
+
+def _reader(stop, results):
+    """The polling reads the phones make while others upload"""
+    connections.close_all()
+    latencies, locked = [], 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            DeliverySync.objects.filter(device_id__startswith=DEVICE_PREFIX, status='completed').count()
+        except OperationalError:
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.01)
+    results.put(('read', latencies, locked))
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent sync-shaped writes and reads from several processes against the configured '
+        'SQLite database and report throughput, lock errors and latency. Compare a run with '
+        'DATABASE_SQLITE_TUNED=true against one without. Rows created are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--syncs', type=int, default=25, help='Write transactions per writer')
+        parser.add_argument(
+            '--hold', type=float, default=0.05,
+            help='Seconds each write transaction stays open',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark measures SQLite locking; DATABASE_PROFILE is not sqlite')
+
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        self.stdout.write(
+            f"journal_mode={journal_mode}, "
+            f"transaction_mode={connection.settings_dict['OPTIONS'].get('transaction_mode', 'DEFERRED')}, "
+            f"write lock={'on' if settings.SYNC_WRITE_LOCK else 'off'}"
+        )
+
+        # Children must open their own database connections
+        connections.close_all()
+        results, stop = multiprocessing.Queue(), multiprocessing.Event()
+        writers = [
+            multiprocessing.Process(target=_writer, args=(index, options['syncs'], options['hold'], results))
+            for index in range(options['writers'])
+        ]
+        readers = [multiprocessing.Process(target=_reader, args=(stop, results)) for _ in range(options['readers'])]
+
+        started = time.perf_counter()
+        for process in readers + writers:
+            process.start()
+        outcomes = [results.get() for _ in writers]
+        elapsed = time.perf_counter() - started
+        stop.set()
+        outcomes += [results.get() for _ in readers]
+        for process in readers + writers:
+            process.join()
+
+        try:
+            for kind in ('write', 'read'):
+                latencies = [latency for outcome in outcomes if outcome[0] == kind for latency in outcome[1]]
+                locked = sum(outcome[2] for outcome in outcomes if outcome[0] == kind)
+                self.stdout.write(
+                    f'{kind}s: {len(latencies)} ok, {locked} "database is locked", '
+                    f'p50 {statistics.median(latencies or [0]) * 1000:.0f} ms, '
+                    f'p95 {_percentile(latencies, 0.95) * 1000:.0f} ms, '
+                    f'max {max(latencies or [0]) * 1000:.0f} ms'
+                )
+            committed = sum(len(outcome[1]) for outcome in outcomes if outcome[0] == 'write')
+            self.stdout.write(f'{committed / elapsed:.1f} syncs/s over {elapsed:.1f} s')
+        finally:
+            DeliverySync.objects.filter(device_id__startswith=DEVICE_PREFIX).delete()
@@ -0,0 +1,147 @@
+import logging
+import os
+import time
+import uuid
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.api.views import SyncView
+from apps.authentication.models import CustomUser
+from apps.core.log import DebugSampleFilter
+from apps.products.models import Category, Product
+from apps.seller.models import Route, Seller
+
+# (label, level of the "apps" logger, debug sample rate)
+MODES = (
+    ('INFO (default)', logging.INFO, None),
+    ('DEBUG, sampled', logging.DEBUG, None),
+    ('DEBUG, every record', logging.DEBUG, 1.0),
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _Counter(logging.Filter):
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def filter(self, record):
+        self.count += 1
+        return True
+
+
+class Command(BaseCommand):
+    help = (
+        'Time a sync of many delivery orders at each logging level, with the log written to '
+        '/dev/null through the configured handler. DEBUG with every record kept is what the '
+        'print() tracing used to cost. Everything is created inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--products', type=int, default=4)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['orders'], options['products'])
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write('Benchmark data rolled back')
+
+    def run(self, order_count, product_count):
+        user = CustomUser.objects.create_user(
+            username=f'bench-{uuid.uuid4().hex[:8]}', password=uuid.uuid4().hex, email='bench@example.com',
+            mobile_number='0000000000', first_name='Bench', last_name='Mark', role='DELIVERY',
+        )
+        route = Route.objects.create(name='Bench route', code=f'BR-{uuid.uuid4().hex[:6]}')
+        category = Category.objects.create(name='Bench', code=f'BC-{uuid.uuid4().hex[:6]}')
+        products = [
+            Product.objects.create(name=f'Bench {i}', code=f'BP-{uuid.uuid4().hex[:6]}', category=category, unit_size=1)
+            for i in range(product_count)
+        ]
+        sellers = Seller.objects.bulk_create([
+            Seller(
+                first_name='Bench', last_name=str(i), mobileno=f'B{i:010d}',
+                store_name=f'Bench store {i}', store_address='Benchmark street', route=route,
+            )
+            for i in range(order_count)
+        ])
+
+        apps_logger = logging.getLogger('apps')
+        handlers = apps_logger.handlers
+        samplers = [f for handler in handlers for f in handler.filters if isinstance(f, DebugSampleFilter)]
+        saved = (apps_logger.level, [h.stream for h in handlers], [f.rate for f in samplers])
+        counter = _Counter()
+        factory = APIRequestFactory()
+
+        with open(os.devnull, 'w') as devnull:
+            for handler in handlers:
+                handler.setStream(devnull)
+                handler.addFilter(counter)
+            try:
+                self.stdout.write(f'{order_count} orders x {product_count} products through /apiapp/sync/')
+                for label, level, rate in MODES:
+                    apps_logger.setLevel(level)
+                    for sampler, saved_rate in zip(samplers, saved[2]):
+                        sampler.rate = saved_rate if rate is None else rate
+                    payload = self.payload(route, sellers, products)
+                    try:
+                        # Each mode starts from the same empty day
+                        with transaction.atomic():
+                            # The upload, then the app retrying it, which finds every order again
+                            for upload in ('first upload', 're-upload'):
+                                counter.count = 0
+                                request = factory.post(
+                                    '/apiapp/sync/', payload, format='json', HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex
+                                )
+                                force_authenticate(request, user)
+                                started = time.perf_counter()
+                                response = SyncView.as_view()(request)
+                                elapsed = time.perf_counter() - started
+                                self.stdout.write(
+                                    f'  {label:<20} {upload:<12} {elapsed * 1000:7.0f} ms, '
+                                    f'{order_count / elapsed:6.0f} orders/s, {counter.count} records written, '
+                                    f'status {response.status_code}'
+                                )
+                            raise _Rollback()
+                    except _Rollback:
+                        pass
+            finally:
+                apps_logger.setLevel(saved[0])
+                for handler, stream in zip(handlers, saved[1]):
+                    handler.setStream(stream)
+                    handler.removeFilter(counter)
+                for sampler, rate in zip(samplers, saved[2]):
+                    sampler.rate = rate
+
+    def payload(self, route, sellers, products):
+        return {'delivery_orders': [
+            {
+                'local_id': f'bench-{uuid.uuid4().hex}',
+                'route': route.pk,
+                'seller': seller.pk,
+                'delivery_date': date.today().isoformat(),
+                'delivery_time': '07:30:00',
+                'amount_collected': '10.00',
+                'payment_method': 'cash',
+                'status': 'draft',
+                'items': [
+                    {
+                        'product': product.pk,
+                        'ordered_quantity': '2.000',
+                        'extra_quantity': '0.000',
+                        'delivered_quantity': '2.000',
+                        'unit_price': '5.00',
+                    }
+                    for product in products
+                ],
+            }
+            for seller in sellers
+        ]}
@@ -0,0 +1,55 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.api.sync_jobs import worker_loop
+
+
+class Command(BaseCommand):
+    help = 'Process queued sync uploads (DeliverySync jobs) with a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Number of worker processes (use 1 on SQLite, it allows a single writer)',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help='Seconds to wait before polling again when the queue is empty',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain the queue in this process and exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = worker_loop(once=True)
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} sync jobs'))
+            return
+
+        workers = max(1, options['workers'])
+        self.stdout.write(f'Starting {workers} sync worker(s)')
+
+        # Children must open their own database connections
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=worker_loop,
+                kwargs={'poll_interval': options['poll_interval']},
+                name=f'sync-worker-{index}',
+                daemon=True,
+            )
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping sync workers')
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_synctombstone'),
+        ('seller', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteBundle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delivery_date', models.DateField()),
+                ('etag', models.CharField(help_text='Quoted hash of the uncompressed document', max_length=66)),
+                ('payload', models.BinaryField(help_text='gzip-compressed JSON document')),
+                ('size', models.PositiveIntegerField(help_text='Uncompressed size in bytes')),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bundles', to='seller.route')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('route', 'delivery_date'), name='unique_route_bundle_route_date')],
+            },
+        ),
+    ]
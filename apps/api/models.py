@@ -1,8 +1,15 @@
 from django.db import models
 # from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from apps.authentication.models import CustomUser as User
+from apps.delivery.ledger import entries_appended
+from apps.delivery.models import DeliveryOrder, DeliveryOrderItem, LoadingOrder, LoadingOrderItem
+from apps.delivery.signals import item_order
+from apps.products.models import Category, PricePlan, Product, ProductPrice
+from apps.products.pricing import in_bulk_price_write, prices_replaced
+from apps.seller.models import Route, Seller
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -22,3 +29,176 @@ def save_user_profile(sender, instance, **kwargs):
     if not hasattr(instance, 'profile'):
         UserProfile.objects.create(user=instance)
     instance.profile.save()
+
+
+class SyncRequest(models.Model):
+    """
+    Response of a completed /sync/ upload, keyed by the client's sync key
+    (Idempotency-Key header or 'sync_key' in the payload) or, failing that,
+    a hash of the payload. A retried upload is answered from this row
+    instead of being processed again.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_requests')
+    sync_key = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(default=200)
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'sync_key'],
+                name='unique_user_sync_key'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.sync_key}"
+
+
+class SyncTombstone(models.Model):
+    """
+    Record of a deleted master-data row, so /sync/pull/ can tell devices to
+    drop it. Rows older than the pull retention window are pruned.
+    """
+    resource = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} {self.object_id} deleted at {self.deleted_at}"
+
+
+class RouteBundle(models.Model):
+    """
+    Everything a driver needs offline for one route and delivery date
+    (loading orders, delivery orders, sellers, products, prices, opening
+    balances) as one gzip-compressed JSON document, built by
+    apps/api/route_bundle.py and served as-is by RouteBundleView.
+    """
+    route = models.ForeignKey('seller.Route', on_delete=models.CASCADE, related_name='bundles')
+    delivery_date = models.DateField()
+    etag = models.CharField(max_length=66, help_text='Quoted hash of the uncompressed document')
+    payload = models.BinaryField(help_text='gzip-compressed JSON document')
+    size = models.PositiveIntegerField(help_text='Uncompressed size in bytes')
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['route', 'delivery_date'],
+                name='unique_route_bundle_route_date'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.route_id} - {self.delivery_date} ({self.etag})"
+
+
+# Master data the delta pull endpoint tracks
+TOMBSTONE_RESOURCES = {
+    Seller: 'sellers',
+    Product: 'products',
+    Route: 'routes',
+    PricePlan: 'price_plans',
+}
+
+
+# Connected per model: a post_delete receiver for every sender would stop
+# Django from fast-deleting the rows of any model in bulk
+@receiver(post_delete, sender=Seller)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Route)
+@receiver(post_delete, sender=PricePlan)
+def record_master_data_tombstone(sender, instance, **kwargs):
+    SyncTombstone.objects.create(resource=TOMBSTONE_RESOURCES[sender], object_id=instance.pk)
+
+
+@receiver(post_delete, sender=ProductPrice)
+def touch_plan_of_deleted_price(sender, instance, **kwargs):
+    if in_bulk_price_write():
+        return
+    # A removed price changes its plan; bump the plan so the next pull resends it
+    PricePlan.objects.filter(pk=instance.price_plan_id).update(updated_at=timezone.now())
+
+
+# Changes to these make every upcoming offline route bundle stale (apps/api/route_bundle.py)
+@receiver(post_save, sender=Seller)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=PricePlan)
+@receiver(post_save, sender=ProductPrice)
+@receiver(post_delete, sender=Seller)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=PricePlan)
+@receiver(post_delete, sender=ProductPrice)
+@receiver(prices_replaced, sender=PricePlan)
+def invalidate_route_bundles_for_master_data(sender, **kwargs):
+    from .route_bundle import invalidate_upcoming_route_bundles
+
+    # A bulk price write invalidates once for the whole plan
+    if sender is ProductPrice and in_bulk_price_write():
+        return
+    invalidate_upcoming_route_bundles()
+
+
+@receiver(post_save, sender=LoadingOrder)
+@receiver(post_delete, sender=LoadingOrder)
+def invalidate_route_bundle_for_loading_order(sender, instance, **kwargs):
+    from .route_bundle import invalidate_route_bundles, schedule_route_bundle_build
+
+    if kwargs.get('created'):
+        # Drivers download the bundle right after loading; have it ready
+        schedule_route_bundle_build(instance.route_id, instance.loading_date)
+    else:
+        invalidate_route_bundles([(instance.loading_date, instance.route_id)])
+
+
+@receiver(post_save, sender=DeliveryOrder)
+@receiver(post_delete, sender=DeliveryOrder)
+def invalidate_route_bundle_for_delivery_order(sender, instance, **kwargs):
+    from .route_bundle import invalidate_route_bundles
+
+    # A delivery order moved to another day or route leaves its old bundle stale too
+    previous = getattr(instance, '_previous_rollup_slice', None)
+    invalidate_route_bundles([(instance.delivery_date, instance.route_id), previous or (None, None)])
+
+
+# Item model -> foreign key to the order whose bundle it is part of
+BUNDLE_ORDER_ITEMS = {
+    LoadingOrderItem: 'loading_order',
+    DeliveryOrderItem: 'delivery_order',
+}
+
+
+@receiver(post_save, sender=LoadingOrderItem)
+@receiver(post_save, sender=DeliveryOrderItem)
+@receiver(post_delete, sender=LoadingOrderItem)
+@receiver(post_delete, sender=DeliveryOrderItem)
+def invalidate_route_bundle_for_item(sender, instance, **kwargs):
+    from .route_bundle import invalidate_route_bundles
+
+    order = item_order(instance, BUNDLE_ORDER_ITEMS[sender])
+    if isinstance(order, LoadingOrder):
+        invalidate_route_bundles([(order.loading_date, order.route_id)])
+    elif order:
+        invalidate_route_bundles([(order.delivery_date, order.route_id)])
+
+
+@receiver(entries_appended)
+def invalidate_route_bundles_for_ledger(sender, entries, **kwargs):
+    """Bundles dated after an entry carry opening balances that no longer include it"""
+    from .route_bundle import invalidate_later_route_bundles
+
+    earliest = {}
+    for entry in entries:
+        if entry.seller_id not in earliest or entry.entry_date < earliest[entry.seller_id]:
+            earliest[entry.seller_id] = entry.entry_date
+    routes = Seller.objects.filter(pk__in=earliest).values_list('pk', 'route_id')
+    invalidate_later_route_bundles([(earliest[seller_id], route_id) for seller_id, route_id in routes])
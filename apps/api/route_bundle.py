@@ -0,0 +1,159 @@
+"""
+Offline route bundles: one precomputed document per (route, delivery date)
+holding what a driver otherwise fetches from the loading order, delivery
+order, seller, product and price endpoints before a run.
+
+A bundle is built when the route's loading order is created and otherwise
+on the first request for it. Changes to the orders of that route and day
+drop it, changes to master data (sellers, products, prices) drop every
+bundle from today on, and a ledger entry for a seller drops the bundles
+of the seller's route dated after it, whose opening balances include it.
+The next request builds them again. Invalidations and
+builds requested inside a transaction run once, after it commits.
+"""
+import gzip
+import hashlib
+import threading
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.renderers import JSONRenderer
+
+from apps.delivery.ledger import opening_balances
+from apps.delivery.models import DeliveryOrder, DeliveryOrderItem, LoadingOrder
+from apps.products.catalog import active_products
+from apps.products.pricing import effective_prices_prefetch
+from apps.seller.models import Route, Seller
+
+from .models import RouteBundle
+from .serializers import (
+    DeliveryOrderSerializer,
+    LoadingOrderSerializer,
+    ProductSerializer,
+    RouteSerializer,
+    SellerSerializer,
+)
+
+# (date, route_id) slices to drop / build, and whether every upcoming bundle is stale
+_pending_bundles = threading.local()
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        return parse_date(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def bundle_document(route, delivery_date):
+    """The bundle's contents as plain data"""
+    loading_orders = LoadingOrder.objects.filter(
+        route=route, loading_date=delivery_date
+    ).select_related('route').prefetch_related('items__product').order_by('id')
+    delivery_orders = DeliveryOrder.objects.filter(
+        route=route, delivery_date=delivery_date
+    ).select_related('seller', 'route').prefetch_related(
+        Prefetch('items', queryset=DeliveryOrderItem.objects.select_related('product'))
+    ).order_by('id')
+    sellers = Seller.objects.filter(route=route).select_related('route').prefetch_related(
+        'price_plans__product_prices__product',
+        'price_plans__seller',
+        effective_prices_prefetch(),
+    ).order_by('store_name')
+    balances = opening_balances([seller.pk for seller in sellers], delivery_date)
+
+    return {
+        'route': RouteSerializer(route).data,
+        'delivery_date': delivery_date.isoformat(),
+        'generated_at': timezone.now(),
+        'loading_orders': LoadingOrderSerializer(loading_orders, many=True).data,
+        # Only the products each seller takes; the app fills in the rest from 'products'
+        'delivery_orders': DeliveryOrderSerializer(delivery_orders, many=True).data,
+        'sellers': SellerSerializer(sellers, many=True).data,
+        'products': ProductSerializer(active_products(), many=True).data,
+        'opening_balances': {str(seller_id): str(balance) for seller_id, balance in balances.items()},
+    }
+
+
+def build_route_bundle(route, delivery_date):
+    """Build and store the bundle of a route and date, replacing any previous one"""
+    if not isinstance(route, Route):
+        route = Route.objects.get(pk=route)
+    delivery_date = _as_date(delivery_date)
+    body = JSONRenderer().render(bundle_document(route, delivery_date))
+    values = {
+        'etag': f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        'payload': gzip.compress(body),
+        'size': len(body),
+    }
+    try:
+        with transaction.atomic():
+            bundle, _ = RouteBundle.objects.update_or_create(
+                route=route, delivery_date=delivery_date, defaults=values
+            )
+    except IntegrityError:
+        # Built concurrently by another request; theirs is as fresh as ours
+        bundle = RouteBundle.objects.get(route=route, delivery_date=delivery_date)
+    return bundle
+
+
+def get_route_bundle(route, delivery_date):
+    """The stored bundle, built first when there is none"""
+    bundle = RouteBundle.objects.filter(route=route, delivery_date=delivery_date).first()
+    return bundle or build_route_bundle(route, delivery_date)
+
+
+def _pending(name):
+    if not hasattr(_pending_bundles, name):
+        setattr(_pending_bundles, name, set())
+    return getattr(_pending_bundles, name)
+
+
+def _run_pending():
+    stale, later, build = _pending('stale'), _pending('later'), _pending('build')
+    upcoming = getattr(_pending_bundles, 'upcoming', False)
+    _pending_bundles.stale, _pending_bundles.later, _pending_bundles.build = set(), set(), set()
+    _pending_bundles.upcoming = False
+    if upcoming:
+        RouteBundle.objects.filter(delivery_date__gte=timezone.localdate()).delete()
+    for day, route_id in stale:
+        RouteBundle.objects.filter(route_id=route_id, delivery_date=day).delete()
+    for day, route_id in later:
+        RouteBundle.objects.filter(route_id=route_id, delivery_date__gt=day).delete()
+    for day, route_id in build:
+        build_route_bundle(route_id, day)
+
+
+def invalidate_route_bundles(slices):
+    """Drop the bundles of these (date, route_id) slices once the current transaction commits"""
+    slices = {(_as_date(day), route_id) for day, route_id in slices if day and route_id}
+    if not slices:
+        return
+    _pending('stale').update(slices)
+    # Later callbacks find the pending sets already drained and do nothing
+    transaction.on_commit(_run_pending)
+
+
+def invalidate_later_route_bundles(slices):
+    """Drop the bundles of each (date, route_id)'s route dated after that date once the transaction commits"""
+    slices = {(_as_date(day), route_id) for day, route_id in slices if day and route_id}
+    if not slices:
+        return
+    _pending('later').update(slices)
+    transaction.on_commit(_run_pending)
+
+
+def invalidate_upcoming_route_bundles():
+    """Drop every bundle dated today or later once the current transaction commits"""
+    _pending_bundles.upcoming = True
+    transaction.on_commit(_run_pending)
+
+
+def schedule_route_bundle_build(route_id, delivery_date):
+    """Build a bundle after the current transaction commits, e.g. for a new loading order"""
+    _pending('build').add((_as_date(delivery_date), route_id))
+    transaction.on_commit(_run_pending)
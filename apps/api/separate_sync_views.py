@@ -31,10 +31,15 @@
     DeliveryExpenseSerializer,
     CashDenominationSerializer
 )
+from .sync_jobs import wants_async, accept_sync_job
+from .write_queue import serialize_sync_writes
 
 import json
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 
 class BaseSyncView(APIView):
     """Base class for all sync views with common functionality"""
@@ -78,8 +83,12 @@ def extract_data(self, request):
 class DeliveryOrderSyncView(BaseSyncView):
     """API endpoint for syncing delivery orders only"""
 
+    @serialize_sync_writes
     @transaction.atomic
     def post(self, request):
+        if wants_async(request):
+            return accept_sync_job(request, 'delivery_orders')
+
         try:
             user = request.user
             data = self.extract_data(request)
@@ -88,7 +97,7 @@ def post(self, request):
                 # If data is not a list, wrap it in a list
                 data = [data]
             
-            print(f"Processing {len(data)} delivery orders")
+            logger.info('Processing %s delivery orders', len(data))
             
             results = []
             for order_data in data:
@@ -107,7 +116,7 @@ def post(self, request):
                 if 'payment_method' in order_data:
                     valid_payment_methods = ['cash', 'online']
                     if order_data['payment_method'] not in valid_payment_methods:
-                        print(f"Invalid payment_method: {order_data['payment_method']}, setting to 'cash'")
+                        logger.warning("Invalid payment_method %r, setting it to 'cash'", order_data['payment_method'])
                         order_data['payment_method'] = 'cash'
                 
                 # Try to find existing order
@@ -117,15 +126,15 @@ def post(self, request):
                 if 'id' in order_data and order_data['id']:
                     try:
                         existing_order = DeliveryOrder.objects.get(id=order_data['id'])
-                        print(f"Found existing delivery order by ID: {existing_order.id}")
+                        logger.debug('Found existing delivery order %s by id', existing_order.id)
                     except DeliveryOrder.DoesNotExist:
-                        print(f"No existing order found with ID: {order_data['id']}")
+                        logger.debug('No delivery order with id %s', order_data['id'])
                 
                 # If not found by ID, try to find by local_id
                 if not existing_order and 'local_id' in order_data and order_data['local_id']:
                     existing_order = DeliveryOrder.objects.filter(local_id=order_data['local_id']).first()
                     if existing_order:
-                        print(f"Found existing delivery order by local_id: {existing_order.id}")
+                        logger.debug('Found existing delivery order %s by local_id', existing_order.id)
                 
                 # If not found by local_id, try to find by unique constraint fields
                 if not existing_order and 'route' in order_data and 'seller' in order_data and 'delivery_date' in order_data:
@@ -136,11 +145,11 @@ def post(self, request):
                             delivery_date=order_data['delivery_date']
                         ).first()
                         if existing_order:
-                            print(f"Found existing delivery order by constraint fields: {existing_order.id}")
+                            logger.debug('Found existing delivery order %s by route, seller and date', existing_order.id)
                             # Add the ID to the order data for future reference
                             order_data['id'] = existing_order.id
-                    except Exception as e:
-                        print(f"Error finding existing delivery order: {e}")
+                    except Exception:
+                        logger.warning('Could not look up the existing delivery order', exc_info=True)
                 
                 if existing_order:
                     # Update existing order
@@ -186,8 +195,7 @@ def post(self, request):
             })
         
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception('Delivery order sync failed')
             return Response({
                 'status': 'error',
                 'message': str(e)
@@ -198,8 +206,12 @@ def post(self, request):
 class BrokenOrderSyncView(BaseSyncView):
     """API endpoint for syncing broken orders only"""
 
+    @serialize_sync_writes
     @transaction.atomic
     def post(self, request):
+        if wants_async(request):
+            return accept_sync_job(request, 'broken_orders')
+
         try:
             user = request.user
             data = self.extract_data(request)
@@ -208,24 +220,24 @@ def post(self, request):
                 # If data is not a list, wrap it in a list
                 data = [data]
             
-            print(f"Processing {len(data)} broken orders")
+            logger.info('Processing %s broken orders', len(data))
             
             results = []
             for order_data in data:
                 # Handle route_id vs route field
                 if 'route_id' in order_data and 'route' not in order_data:
                     order_data['route'] = order_data['route_id']
-                    print(f"Mapped route_id {order_data['route_id']} to route field")
+                    logger.debug('Mapped route_id %s to route', order_data['route_id'])
                 
                 # Map date field if needed
                 if 'date' in order_data and 'report_date' not in order_data:
                     order_data['report_date'] = order_data['date']
-                    print(f"Mapped date {order_data['date']} to report_date field")
+                    logger.debug('Mapped date %s to report_date', order_data['date'])
                 
                 # Set report_time if not provided
                 if 'report_time' not in order_data:
                     order_data['report_time'] = datetime.now().strftime('%H:%M:%S')
-                    print(f"Set default report_time: {order_data['report_time']}")
+                    logger.debug('Set default report_time %s', order_data['report_time'])
                 
                 # Process items to ensure product is a primary key
                 if 'items' in order_data:
@@ -238,7 +250,7 @@ def post(self, request):
                         if 'product_id' in item and 'product' not in item:
                             # Map product_id to product
                             processed_item['product'] = item['product_id']
-                            print(f"Mapped product_id {item['product_id']} to product field")
+                            logger.debug('Mapped product_id %s to product', item['product_id'])
                         elif 'product' in item:
                             processed_item['product'] = item['product']
                         else:
@@ -260,7 +272,7 @@ def post(self, request):
                 if 'local_id' in order_data and order_data['local_id']:
                     existing_order = BrokenOrder.objects.filter(local_id=order_data['local_id']).first()
                     if existing_order:
-                        print(f"Found existing broken order by local_id: {existing_order.id}")
+                        logger.debug('Found existing broken order %s by local_id', existing_order.id)
                 
                 if existing_order:
                     # Update existing order
@@ -306,8 +318,7 @@ def post(self, request):
             })
         
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception('Broken order sync failed')
             return Response({
                 'status': 'error',
                 'message': str(e)
@@ -318,8 +329,12 @@ def post(self, request):
 class ReturnOrderSyncView(BaseSyncView):
     """API endpoint for syncing return orders only"""
 
+    @serialize_sync_writes
     @transaction.atomic
     def post(self, request):
+        if wants_async(request):
+            return accept_sync_job(request, 'return_orders')
+
         try:
             user = request.user
             data = self.extract_data(request)
@@ -328,7 +343,7 @@ def post(self, request):
                 # If data is not a list, wrap it in a list
                 data = [data]
             
-            print(f"Processing {len(data)} return orders")
+            logger.info('Processing %s return orders', len(data))
             
             results = []
             for order_data in data:
@@ -347,7 +362,7 @@ def post(self, request):
                 if 'local_id' in order_data and order_data['local_id']:
                     existing_order = ReturnedOrder.objects.filter(local_id=order_data['local_id']).first()
                     if existing_order:
-                        print(f"Found existing return order by local_id: {existing_order.id}")
+                        logger.debug('Found existing return order %s by local_id', existing_order.id)
                 
                 if existing_order:
                     # Update existing order
@@ -393,8 +408,7 @@ def post(self, request):
             })
         
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception('Return order sync failed')
             return Response({
                 'status': 'error',
                 'message': str(e)
@@ -405,8 +419,12 @@ def post(self, request):
 class PublicSaleSyncView(BaseSyncView):
     """API endpoint for syncing public sales only"""
 
+    @serialize_sync_writes
     @transaction.atomic
     def post(self, request):
+        if wants_async(request):
+            return accept_sync_job(request, 'public_sales')
+
         try:
             user = request.user
             data = self.extract_data(request)
@@ -415,7 +433,7 @@ def post(self, request):
                 # If data is not a list, wrap it in a list
                 data = [data]
             
-            print(f"Processing {len(data)} public sales")
+            logger.info('Processing %s public sales', len(data))
             
             results = []
             for sale_data in data:
@@ -427,7 +445,7 @@ def post(self, request):
                 if 'payment_method' in sale_data:
                     valid_payment_methods = ['cash', 'online']
                     if sale_data['payment_method'] not in valid_payment_methods:
-                        print(f"Invalid payment_method: {sale_data['payment_method']}, setting to 'cash'")
+                        logger.warning("Invalid payment_method %r, setting it to 'cash'", sale_data['payment_method'])
                         sale_data['payment_method'] = 'cash'
                 
                 # Try to find existing sale by local_id
@@ -435,7 +453,7 @@ def post(self, request):
                 if 'local_id' in sale_data and sale_data['local_id']:
                     existing_sale = PublicSale.objects.filter(local_id=sale_data['local_id']).first()
                     if existing_sale:
-                        print(f"Found existing public sale by local_id: {existing_sale.id}")
+                        logger.debug('Found existing public sale %s by local_id', existing_sale.id)
                 
                 if existing_sale:
                     # Update existing sale
@@ -481,8 +499,7 @@ def post(self, request):
             })
         
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception('Public sale sync failed')
             return Response({
                 'status': 'error',
                 'message': str(e)
@@ -493,8 +510,12 @@ def post(self, request):
 class DeliveryExpenseSyncView(BaseSyncView):
     """API endpoint for syncing delivery expenses only"""
 
+    @serialize_sync_writes
     @transaction.atomic
     def post(self, request):
+        if wants_async(request):
+            return accept_sync_job(request, 'expenses')
+
         try:
             user = request.user
             data = self.extract_data(request)
@@ -503,7 +524,7 @@ def post(self, request):
                 # If data is not a list, wrap it in a list
                 data = [data]
             
-            print(f"Processing {len(data)} delivery expenses")
+            logger.info('Processing %s delivery expenses', len(data))
             
             results = []
             for expense_data in data:
@@ -519,11 +540,11 @@ def post(self, request):
                     }
                     
                     original_type = expense_data['expense_type'].lower() if expense_data['expense_type'] else ''
-                    print(f'Original expense_type: {original_type}')
+                    logger.debug('Original expense_type %s', original_type)
                     
                     if original_type in expense_type_mapping:
                         expense_data['expense_type'] = expense_type_mapping[original_type]
-                        print(f'Mapped expense_type to: {expense_data["expense_type"]}')
+                        logger.debug('Mapped expense_type to %s', expense_data['expense_type'])
                 
                 # Set created_by if not provided
                 if 'created_by' not in expense_data:
@@ -534,7 +555,7 @@ def post(self, request):
                 if 'local_id' in expense_data and expense_data['local_id']:
                     existing_expense = DeliveryExpense.objects.filter(local_id=expense_data['local_id']).first()
                     if existing_expense:
-                        print(f"Found existing delivery expense by local_id: {existing_expense.id}")
+                        logger.debug('Found existing delivery expense %s by local_id', existing_expense.id)
                 
                 if existing_expense:
                     # Update existing expense
@@ -580,8 +601,7 @@ def post(self, request):
             })
         
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception('Delivery expense sync failed')
             return Response({
                 'status': 'error',
                 'message': str(e)
@@ -592,8 +612,12 @@ def post(self, request):
 class CashDenominationSyncView(BaseSyncView):
     """API endpoint for syncing cash denominations only"""
 
+    @serialize_sync_writes
     @transaction.atomic
     def post(self, request):
+        if wants_async(request):
+            return accept_sync_job(request, 'denominations')
+
         try:
             user = request.user
             data = self.extract_data(request)
@@ -602,7 +626,7 @@ def post(self, request):
                 # If data is not a list, wrap it in a list
                 data = [data]
             
-            print(f"Processing {len(data)} cash denominations")
+            logger.info('Processing %s cash denominations', len(data))
             
             results = []
             for denomination_data in data:
@@ -611,7 +635,7 @@ def post(self, request):
                 if 'local_id' in denomination_data and denomination_data['local_id']:
                     existing_denomination = CashDenomination.objects.filter(local_id=denomination_data['local_id']).first()
                     if existing_denomination:
-                        print(f"Found existing cash denomination by local_id: {existing_denomination.id}")
+                        logger.debug('Found existing cash denomination %s by local_id', existing_denomination.id)
                 
                 if existing_denomination:
                     # Update existing denomination
@@ -657,8 +681,7 @@ def post(self, request):
             })
         
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception('Cash denomination sync failed')
             return Response({
                 'status': 'error',
                 'message': str(e)
@@ -3,6 +3,7 @@
 from apps.authentication.models import CustomUser as User
 from apps.seller.models import Seller, Route
 from apps.products.models import Product, PricePlan, ProductPrice, Category
+from apps.core.cache import cached
 from apps.sales.models import SalesOrder, OrderItem as SalesOrderItem
 from datetime import datetime
 from apps.delivery.models import (
@@ -27,6 +28,27 @@
     DeliveryLocation
     # Payment
 )
+from apps.delivery.totals import flush_scheduled_totals
+
+class SyncPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that first looks the pk up in objects the sync
+    pipeline prefetched (serializer context['prefetched'][Model][pk]), so
+    validating a batch does not cost one query per foreign key value.
+    Falls back to the normal queryset lookup on a miss.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.queryset.model)
+        if prefetched is not None and not isinstance(data, bool):
+            try:
+                instance = prefetched.get(int(data))
+            except (TypeError, ValueError):
+                instance = None
+            if instance is not None:
+                return instance
+        return super().to_internal_value(data)
+
 # Authentication Serializers
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True)
@@ -97,6 +119,12 @@ class Meta:
         model = PricePlan
         fields = ('id', 'name', 'valid_from', 'valid_to', 'is_general', 'seller', 'seller_name', 'is_active', 'product_prices')
 
+def _serialize_general_plan():
+    general_plan = PricePlan.objects.filter(
+        is_general=True, is_active=True
+    ).prefetch_related('product_prices__product').first()
+    return PricePlanSerializer(general_plan).data if general_plan else None
+
 class SellerSerializer(serializers.ModelSerializer):
     price_plans = PricePlanSerializer(many=True, read_only=True)
     route_name = serializers.ReadOnlyField(source='route.name')
@@ -107,45 +135,30 @@ class Meta:
         model = Seller
         fields = ('id', 'store_name', 'first_name','last_name','mobileno', 'lat','lan', 'store_address', 'route', 'route_name', 'price_plans', 'general_price_plan', 'effective_prices')
 
+    def _general_plan_data(self):
+        # Shared across requests (apps/core/cache.py), read once per response
+        root = self.root
+        if not hasattr(root, '_general_plan_data'):
+            root._general_plan_data = cached(('price_plans', 'products'), 'general:data', _serialize_general_plan)
+        return root._general_plan_data
+
     def get_general_price_plan(self, obj):
         # Only include general price plan if seller has no specific price plans
-        if not obj.price_plans.exists():
-            general_plan = PricePlan.objects.filter(is_general=True, is_active=True).first()
-            if general_plan:
-                return PricePlanSerializer(general_plan).data
+        if not obj.price_plans.all():
+            return self._general_plan_data()
         return None
 
     def get_effective_prices(self, obj):
-        # Create a dictionary to store the effective prices
-        effective_prices = {}
-
-        # First, try to get seller-specific prices
-        seller_plans = obj.price_plans.filter(is_active=True).order_by('-valid_from')
-        if seller_plans.exists():
-            # Use the most recent seller-specific plan
-            seller_plan = seller_plans.first()
-            for price in seller_plan.product_prices.all():
-                effective_prices[price.product_id] = {
-                    'product_id': price.product_id,
-                    'product_name': price.product.name,
-                    'price': float(price.price),
-                    'source': 'seller_specific'
-                }
-
-        # For any products without seller-specific prices, use general prices
-        general_plan = PricePlan.objects.filter(is_general=True, is_active=True).first()
-        if general_plan:
-            for price in general_plan.product_prices.all():
-                if price.product_id not in effective_prices:
-                    effective_prices[price.product_id] = {
-                        'product_id': price.product_id,
-                        'product_name': price.product.name,
-                        'price': float(price.price),
-                        'source': 'general'
-                    }
-
-        # Convert dictionary to list
-        return list(effective_prices.values())
+        # Materialized in EffectiveSellerPrice (apps/products/pricing.py)
+        return [
+            {
+                'product_id': effective.product_id,
+                'product_name': effective.product.name,
+                'price': float(effective.price),
+                'source': effective.source
+            }
+            for effective in obj.effective_prices.all()
+        ]
 
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.ReadOnlyField(source='category.name')
@@ -248,29 +261,15 @@ class Meta:
 
     def get_unit_price(self, obj):
         """Get the unit price from the general price plan"""
-        from apps.products.models import PricePlan, ProductPrice
+        from apps.products.pricing import get_price_resolver
         from decimal import Decimal
 
         # Get the loading date from the loading order
         loading_date = obj.loading_order.loading_date
 
-        # Find the active general price plan for this date
-        general_price_plan = PricePlan.objects.filter(
-            is_general=True,
-            is_active=True,
-            valid_from__lte=loading_date,
-            valid_to__gte=loading_date
-        ).first()
-
-        if general_price_plan:
-            # Get the price for this product from the general price plan
-            product_price = ProductPrice.objects.filter(
-                price_plan=general_price_plan,
-                product=obj.product
-            ).first()
-
-            if product_price:
-                return str(product_price.price)
+        price = get_price_resolver().get_general_price(obj.product_id, loading_date)
+        if price is not None:
+            return str(price)
 
         # Default to 0 if no price found
         return str(Decimal('0.00'))
@@ -284,9 +283,21 @@ class Meta:
         fields = ('id', 'order_number', 'route', 'route_name', 'loading_date', 'status', 'items', 'crates_loaded', 'loading_time')
 
 # Delivery Operation Serializers
+class DeliveryOrderItemListSerializer(serializers.ListSerializer):
+    """
+    With context['full_catalog'], a delivery order's items are read through
+    DeliveryOrder.catalog_items(): one row per active product, the ones the
+    seller did not take built on the fly with id None.
+    """
+
+    def get_attribute(self, instance):
+        if self.context.get('full_catalog') and isinstance(instance, DeliveryOrder):
+            return instance.catalog_items()
+        return super().get_attribute(instance)
+
 class DeliveryOrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    product = SyncPrimaryKeyRelatedField(queryset=Product.objects.all())
     ordered_quantity = serializers.DecimalField(max_digits=10, decimal_places=2)
     extra_quantity = serializers.DecimalField(max_digits=10, decimal_places=2)
     delivered_quantity = serializers.DecimalField(max_digits=10, decimal_places=2)
@@ -296,6 +307,7 @@ class DeliveryOrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = DeliveryOrderItem
         fields = ('id', 'product', 'product_name', 'ordered_quantity', 'extra_quantity', 'delivered_quantity', 'unit_price', 'total_price')
+        list_serializer_class = DeliveryOrderItemListSerializer
 
 class DeliveryOrderSerializer(serializers.ModelSerializer):
     items = DeliveryOrderItemSerializer(many=True, required=False)
@@ -349,7 +361,10 @@ def create(self, validated_data):
         delivery_order = DeliveryOrder.objects.create(**validated_data)
 
         for item_data in items_data:
-            DeliveryOrderItem.objects.create(delivery_order=delivery_order, **item_data)
+            item = DeliveryOrderItem(delivery_order=delivery_order, **item_data)
+            # Products the seller did not take come from catalog_items(), not stored rows
+            if not item.is_blank:
+                item.save()
 
         return delivery_order
 
@@ -377,7 +392,7 @@ def update(self, instance, validated_data):
                         for attr, value in item_data.items():
                             setattr(existing_item, attr, value)
                         existing_item.save()
-                    else:
+                    elif not DeliveryOrderItem(**item_data).is_blank:
                         # Create new item
                         DeliveryOrderItem.objects.create(delivery_order=instance, **item_data)
                 else:
@@ -388,7 +403,7 @@ def update(self, instance, validated_data):
 
 class ReturnedOrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    product = SyncPrimaryKeyRelatedField(queryset=Product.objects.all())
 
     class Meta:
         model = ReturnedOrderItem
@@ -397,7 +412,7 @@ class Meta:
 class ReturnedOrderSerializer(serializers.ModelSerializer):
     items = ReturnedOrderItemSerializer(many=True)
     route_name = serializers.ReadOnlyField(source='route.name')
-    route = serializers.PrimaryKeyRelatedField(queryset=Route.objects.all())
+    route = SyncPrimaryKeyRelatedField(queryset=Route.objects.all())
 
     class Meta:
         model = ReturnedOrder
@@ -414,7 +429,7 @@ def create(self, validated_data):
 
 class BrokenOrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    product = SyncPrimaryKeyRelatedField(queryset=Product.objects.all())
     # Make reason optional for mobile app sync
     # reason = serializers.CharField(required=False, allow_blank=True, default='')
     # Rename broken_quantity to quantity if needed
@@ -427,10 +442,10 @@ class Meta:
 class BrokenOrderSerializer(serializers.ModelSerializer):
     items = BrokenOrderItemSerializer(many=True)
     route_name = serializers.ReadOnlyField(source='route.name')
-    route = serializers.PrimaryKeyRelatedField(queryset=Route.objects.all())
+    route = SyncPrimaryKeyRelatedField(queryset=Route.objects.all())
     # Use report_date instead of broken_date to match the model
     # Also make loading_order optional for mobile app sync
-    loading_order = serializers.PrimaryKeyRelatedField(queryset=LoadingOrder.objects.all(), required=False, allow_null=True)
+    loading_order = SyncPrimaryKeyRelatedField(queryset=LoadingOrder.objects.all(), required=False, allow_null=True)
     # Add status field with default value
     status = serializers.CharField(default='pending', required=False)
     # Add sync_status field with default value
@@ -457,11 +472,9 @@ def validate(self, data):
         if 'report_time' not in data or data['report_time'] is None:
             data['report_time'] = datetime.now().time()
 
-        # If order_number is not provided, generate one
-        if 'order_number' not in data or not data['order_number']:
-            today = datetime.now().strftime('%Y%m%d')
-            count = BrokenOrder.objects.filter(order_number__contains=f"BO-{today}").count() + 1
-            data['order_number'] = f"BO-{today}-{count:04d}"
+        # If order_number is not provided, BrokenOrder.save() allocates one
+        if not data.get('order_number'):
+            data.pop('order_number', None)
 
         return data
 
@@ -476,7 +489,7 @@ def create(self, validated_data):
 
 class PublicSaleItemSerializer(serializers.ModelSerializer):
     product_name = serializers.ReadOnlyField(source='product.name')
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    product = SyncPrimaryKeyRelatedField(queryset=Product.objects.all())
 
     class Meta:
         model = PublicSaleItem
@@ -485,7 +498,7 @@ class Meta:
 class PublicSaleSerializer(serializers.ModelSerializer):
     items = PublicSaleItemSerializer(many=True)
     route_name = serializers.ReadOnlyField(source='route.name')
-    route = serializers.PrimaryKeyRelatedField(queryset=Route.objects.all())
+    route = SyncPrimaryKeyRelatedField(queryset=Route.objects.all())
 
     class Meta:
         model = PublicSale
@@ -498,6 +511,9 @@ def create(self, validated_data):
         for item_data in items_data:
             PublicSaleItem.objects.create(public_sale=public_sale, **item_data)
 
+        # The response shows the totals, so recalculate them before the commit
+        flush_scheduled_totals()
+        public_sale.refresh_from_db(fields=['total_price', 'balance_amount'])
         return public_sale
 
     def update(self, instance, validated_data):
@@ -513,11 +529,15 @@ def update(self, instance, validated_data):
             # Create new items
             for item_data in items_data:
                 PublicSaleItem.objects.create(public_sale=instance, **item_data)
+            flush_scheduled_totals()
+            instance.refresh_from_db(fields=['total_price', 'balance_amount'])
         return instance
 
 class DeliveryExpenseSerializer(serializers.ModelSerializer):
     delivery_team_name = serializers.ReadOnlyField(source='delivery_team.name')
-    delivery_team = serializers.PrimaryKeyRelatedField(queryset=DeliveryTeam.objects.all())
+    delivery_team = SyncPrimaryKeyRelatedField(queryset=DeliveryTeam.objects.all())
+    route = SyncPrimaryKeyRelatedField(queryset=Route.objects.all(), required=False, allow_null=True)
+    created_by = SyncPrimaryKeyRelatedField(queryset=User.objects.all())
 
     class Meta:
         model = DeliveryExpense
@@ -529,8 +549,8 @@ def create(self, validated_data):
         return expense
 
 class CashDenominationSerializer(serializers.ModelSerializer):
-    delivery_order = serializers.PrimaryKeyRelatedField(queryset=DeliveryOrder.objects.all(), required=False, allow_null=True)
-    route = serializers.PrimaryKeyRelatedField(queryset=Route.objects.all(), required=False, allow_null=True)
+    delivery_order = SyncPrimaryKeyRelatedField(queryset=DeliveryOrder.objects.all(), required=False, allow_null=True)
+    route = SyncPrimaryKeyRelatedField(queryset=Route.objects.all(), required=False, allow_null=True)
     delivery_date = serializers.DateField(required=False, allow_null=True)
 
     class Meta:
@@ -584,21 +604,97 @@ class OrderStatusHeatmapSerializer(serializers.Serializer):
     statuses = serializers.ListField(child=serializers.CharField())
     heatmap = serializers.ListField(child=serializers.DictField())
 
+def ExactDecimalField(**kwargs):
+    """Decimal rendered exactly as aggregated, without rounding to fixed places"""
+    return serializers.DecimalField(max_digits=None, decimal_places=None, **kwargs)
+
+class AnalyticsPageSerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    page = serializers.IntegerField()
+    page_size = serializers.IntegerField()
+    total_pages = serializers.IntegerField()
+
+class SellerAgingSerializer(serializers.Serializer):
+    seller_id = serializers.IntegerField()
+    seller_name = serializers.CharField()
+    total_balance = ExactDecimalField()
+    overdue_breakdown = serializers.DictField(child=ExactDecimalField())
+
 class BalanceAgingReportSerializer(serializers.Serializer):
     period = serializers.CharField()
-    sellers = serializers.ListField(child=serializers.DictField())
+    as_of = serializers.DateField()
+    pagination = AnalyticsPageSerializer()
+    sellers = SellerAgingSerializer(many=True)
+
+class QuantityValueBreakdownSerializer(serializers.Serializer):
+    quantity = serializers.DictField(child=ExactDecimalField())
+    value = serializers.DictField(child=ExactDecimalField())
+
+class ProductMovementSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    product_name = serializers.CharField()
+    total_quantity = ExactDecimalField()
+    total_value = ExactDecimalField()
+    movement_breakdown = QuantityValueBreakdownSerializer()
 
 class ProductMovementChartSerializer(serializers.Serializer):
     period = serializers.CharField()
-    products = serializers.ListField(child=serializers.DictField())
+    start_date = serializers.DateField(allow_null=True)
+    end_date = serializers.DateField(allow_null=True)
+    pagination = AnalyticsPageSerializer()
+    products = ProductMovementSerializer(many=True)
+
+class ProductReconciliationSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    product_code = serializers.CharField()
+    product_name = serializers.CharField()
+    loaded = ExactDecimalField()
+    delivered = ExactDecimalField()
+    broken = ExactDecimalField()
+    returned = ExactDecimalField()
+    public_sold = ExactDecimalField()
+    remaining = ExactDecimalField()
+
+class LoadingOrderReconciliationSerializer(serializers.Serializer):
+    loading_order = serializers.IntegerField()
+    route = serializers.IntegerField()
+    loading_date = serializers.DateField()
+    products = ProductReconciliationSerializer(many=True)
+
+class TopSellerSerializer(serializers.Serializer):
+    seller_id = serializers.IntegerField()
+    seller_name = serializers.CharField()
+    total_quantity = ExactDecimalField()
+    total_value = ExactDecimalField()
+    delivery_breakdown = QuantityValueBreakdownSerializer()
 
 class TopSellersSerializer(serializers.Serializer):
     period = serializers.CharField()
-    sellers = serializers.ListField(child=serializers.DictField())
+    start_date = serializers.DateField(allow_null=True)
+    end_date = serializers.DateField(allow_null=True)
+    pagination = AnalyticsPageSerializer()
+    sellers = TopSellerSerializer(many=True)
+
+class RoutePeriodPerformanceSerializer(serializers.Serializer):
+    total_deliveries = serializers.IntegerField()
+    on_time_deliveries = serializers.IntegerField()
+    total_delivered_quantity = ExactDecimalField()
+
+class RoutePerformanceEntrySerializer(serializers.Serializer):
+    route_id = serializers.IntegerField()
+    route_name = serializers.CharField()
+    total_deliveries = serializers.IntegerField()
+    on_time_deliveries = serializers.IntegerField()
+    on_time_percent = ExactDecimalField()
+    total_delivered_quantity = ExactDecimalField()
+    performance_breakdown = serializers.DictField(child=RoutePeriodPerformanceSerializer())
 
 class RoutePerformanceSerializer(serializers.Serializer):
     period = serializers.CharField()
-    routes = serializers.ListField(child=serializers.DictField())
+    start_date = serializers.DateField(allow_null=True)
+    end_date = serializers.DateField(allow_null=True)
+    pagination = AnalyticsPageSerializer()
+    routes = RoutePerformanceEntrySerializer(many=True)
 
 class SyncStatusSerializer(serializers.Serializer):
     last_sync = serializers.DateTimeField()
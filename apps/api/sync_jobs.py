@@ -0,0 +1,175 @@
+import logging
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from django.db import IntegrityError, OperationalError, close_old_connections, transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.delivery.models import DeliverySync
+
+from .idempotency import sync_key_for
+
+logger = logging.getLogger(__name__)
+
+# sync_type -> view that processes the upload (imported lazily, the views import this module)
+SYNC_JOB_VIEWS = {
+    'combined': 'apps.api.views.SyncView',
+    'delivery_orders': 'apps.api.separate_sync_views.DeliveryOrderSyncView',
+    'broken_orders': 'apps.api.separate_sync_views.BrokenOrderSyncView',
+    'return_orders': 'apps.api.separate_sync_views.ReturnOrderSyncView',
+    'public_sales': 'apps.api.separate_sync_views.PublicSaleSyncView',
+    'expenses': 'apps.api.separate_sync_views.DeliveryExpenseSyncView',
+    'denominations': 'apps.api.separate_sync_views.CashDenominationSyncView',
+}
+
+# A job still 'processing' after this long belongs to a worker that died
+STALE_JOB_TIMEOUT = timedelta(minutes=10)
+
+
+class QueuedRequest:
+    """
+    The parts of a DRF request the sync views read (user, data, headers,
+    query_params), rebuilt from a queued DeliverySync row
+    """
+
+    def __init__(self, user, data, sync_key=None):
+        self.user = user
+        self.data = data
+        self.headers = {'Idempotency-Key': sync_key} if sync_key else {}
+        self.query_params = {}
+
+
+def wants_async(request):
+    """True if the client asked for accept-then-process (?async=1 or Prefer: respond-async)"""
+    if str(request.query_params.get('async', '')).lower() in ('1', 'true', 'yes'):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+
+def _active_job(user, sync_type, sync_key):
+    return DeliverySync.objects.filter(
+        created_by=user, sync_type=sync_type, sync_key=sync_key, status__in=['pending', 'processing']
+    ).first()
+
+
+def accept_sync_job(request, sync_type):
+    """
+    Queue the upload and answer 202 with the job id and where to poll for
+    it. The job is keyed like the replay store (sync_key_for), so a retry
+    sent while the first job is still queued or running gets that job back.
+    """
+    sync_key = sync_key_for(request)
+    job = _active_job(request.user, sync_type, sync_key)
+    if job is None:
+        try:
+            with transaction.atomic():
+                job = DeliverySync.objects.create(
+                    device_id=request.headers.get('X-Device-Id') or f'user-{request.user.pk}',
+                    sync_type=sync_type,
+                    local_id=sync_key[:50],
+                    # The key travels with the job so the replay store still applies
+                    sync_key=sync_key,
+                    data={'payload': request.data},
+                    status='pending',
+                    created_by=request.user,
+                )
+            logger.info('Queued %s sync job %s', sync_type, job.pk)
+        except IntegrityError:
+            # A concurrent retry queued it first (unique_active_sync_job)
+            job = _active_job(request.user, sync_type, sync_key)
+            if job is None:
+                raise
+    else:
+        logger.info('Sync %s is already queued as job %s', sync_key, job.pk)
+    return Response({
+        'status': 'accepted',
+        'job_id': job.pk,
+        'status_url': reverse('sync-job-status', args=[job.pk]),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest pending job to 'processing' and return it.
+
+    The claim is a conditional UPDATE, so several worker processes can poll
+    the same table (SQLite included, which has no SELECT ... SKIP LOCKED);
+    whoever updates the row first owns the job.
+    """
+    now = timezone.now()
+    # Give jobs of crashed workers back to the queue
+    DeliverySync.objects.filter(
+        sync_type__in=SYNC_JOB_VIEWS,
+        status='processing',
+        last_sync_attempt__lt=now - STALE_JOB_TIMEOUT,
+    ).update(status='pending')
+
+    while True:
+        job_id = DeliverySync.objects.filter(
+            sync_type__in=SYNC_JOB_VIEWS, status='pending'
+        ).order_by('id').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        claimed = DeliverySync.objects.filter(id=job_id, status='pending').update(
+            status='processing', last_sync_attempt=timezone.now()
+        )
+        if claimed:
+            return DeliverySync.objects.select_related('created_by').get(id=job_id)
+
+
+def run_job(job):
+    """Process one claimed job through its sync view and store the outcome on it"""
+    module_name, class_name = SYNC_JOB_VIEWS[job.sync_type].rsplit('.', 1)
+    view_class = getattr(import_module(module_name), class_name)
+    # Jobs queued before DeliverySync.sync_key existed kept the key in data
+    request = QueuedRequest(job.created_by, job.data.get('payload'), job.sync_key or job.data.get('sync_key'))
+
+    try:
+        response = view_class().post(request)
+        job.response = response.data
+        if response.status_code < 400:
+            job.status = 'completed'
+            job.error_message = None
+        else:
+            job.status = 'failed'
+            job.error_message = str(response.data.get('message', response.data))
+    except Exception as e:
+        logger.exception('Sync job %s (%s) raised', job.pk, job.sync_type)
+        job.status = 'failed'
+        job.error_message = str(e)
+
+    job.save(update_fields=['status', 'response', 'error_message', 'updated_at'])
+    logger.info('Sync job %s (%s) %s', job.pk, job.sync_type, job.status)
+    return job
+
+
+def run_pending_jobs(limit=None):
+    """Drain the queue in this process; returns the number of jobs processed"""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def worker_loop(poll_interval=2.0, once=False):
+    """Body of one worker process: claim, run, sleep when the queue is empty"""
+    while True:
+        close_old_connections()
+        try:
+            processed = run_pending_jobs()
+        except OperationalError as e:
+            # SQLite answers concurrent writers with 'database is locked'; try again
+            logger.warning('Sync worker database error, retrying: %s', e)
+            processed = 0
+        if once:
+            return processed
+        if not processed:
+            time.sleep(poll_interval)
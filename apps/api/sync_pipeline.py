@@ -0,0 +1,774 @@
+import logging
+import uuid
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.authentication.models import CustomUser
+from apps.products.models import Product
+from apps.sales.models import SalesOrder
+from apps.sales.sequences import allocate_order_numbers
+from apps.seller.models import Route, Seller
+from apps.delivery.models import (
+    DeliveryOrder,
+    DeliveryOrderItem,
+    ReturnedOrder,
+    ReturnedOrderItem,
+    BrokenOrder,
+    BrokenOrderItem,
+    PublicSale,
+    PublicSaleItem,
+    DeliveryExpense,
+    CashDenomination,
+    DeliveryTeam,
+    LoadingOrder,
+)
+from apps.delivery.ledger import post_delivery_orders
+from apps.delivery.reconciliation import invalidate_reconciliations, loading_orders_of
+from apps.delivery.rollups import order_slice, schedule_rollup_refresh
+
+from .models import UserProfile
+from .route_bundle import invalidate_route_bundles
+from .serializers import (
+    ReturnedOrderSerializer,
+    BrokenOrderSerializer,
+    PublicSaleSerializer,
+    DeliveryExpenseSerializer,
+    CashDenominationSerializer,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _as_pk(value):
+    """Primary key out of an int, numeric string or model instance; None otherwise"""
+    if value is None or isinstance(value, bool):
+        return None
+    if hasattr(value, 'pk'):
+        return value.pk
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        try:
+            return parse_date(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _concrete_field(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except Exception:
+        return None
+    return field if getattr(field, 'concrete', False) else None
+
+
+class SyncPipeline:
+    """
+    Set-based writer behind the combined /apiapp/sync/ endpoint.
+
+    The payload is handled in four stages so the number of queries grows with
+    the number of models touched, not with the number of orders and items:
+
+    1. parse    - collect every id, local_id and foreign key the payload references
+    2. prefetch - load those rows with one IN query per model
+    3. diff     - match payload records against existing rows in memory
+    4. write    - bulk_create / bulk_update per model
+
+    If a bulk write fails (e.g. a unique constraint), that batch is retried
+    record by record so one bad row does not drop the rest of the upload.
+    Per-record outcomes are collected in self.results, in the same
+    {id, local_id, status, message[, errors]} shape the separate sync views use.
+    """
+
+    DECIMAL_ITEM_FIELDS = ('ordered_quantity', 'extra_quantity', 'delivered_quantity', 'unit_price', 'total_price')
+    DELIVERY_ORDER_ITEM_UPDATE_FIELDS = [
+        'ordered_quantity', 'extra_quantity', 'delivered_quantity', 'unit_price', 'total_price',
+        'sync_status', 'local_id', 'last_sync_attempt', 'updated_at',
+    ]
+    # Keys the existing-order update never touches, to keep the unique constraint stable
+    DELIVERY_ORDER_KEY_FIELDS = ('id', 'route', 'seller', 'delivery_date', 'items')
+
+    def __init__(self, data, user, route=None, delivery_date=None):
+        self.data = data
+        self.user = user
+        self.route_id = _as_pk(route)
+        self.delivery_date = _as_date(delivery_date) if delivery_date else None
+        self.now = timezone.now()
+        self.results = defaultdict(list)
+        self.referenced = defaultdict(set)
+        self.prefetched = {}
+        self._delivery_teams = {}
+
+    # ------------------------------------------------------------------
+    # Entry point
+    # ------------------------------------------------------------------
+    def run(self):
+        self.parse()
+        self.prefetch()
+
+        if self.delivery_orders:
+            self.sync_delivery_orders()
+
+        if 'return_orders' in self.data:
+            self.sync_return_orders()
+        if 'broken_orders' in self.data:
+            self.sync_broken_orders()
+        if 'public_sales' in self.data:
+            self.sync_public_sales()
+        if 'expenses' in self.data:
+            self.sync_expenses()
+        if 'denominations' in self.data:
+            self.sync_denominations()
+
+        UserProfile.objects.filter(user=self.user).update(last_sync=self.now)
+        return self.results
+
+    # ------------------------------------------------------------------
+    # Stage 1: parse
+    # ------------------------------------------------------------------
+    def _section(self, name):
+        records = self.data.get(name) or []
+        return [record for record in records if isinstance(record, dict)]
+
+    def _reference(self, model, value):
+        pk = _as_pk(value)
+        if pk is not None:
+            self.referenced[model].add(pk)
+
+    def parse(self):
+        self.delivery_orders = self._section('delivery_orders')
+        self._reference(Route, self.route_id)
+
+        for order in self.delivery_orders:
+            self._reference(Route, order.get('route'))
+            self._reference(Seller, order.get('seller'))
+            self._reference(SalesOrder, order.get('sales_order'))
+            self._reference(LoadingOrder, order.get('loading_order'))
+            for item in order.get('items') or []:
+                self._reference(Product, item.get('product'))
+
+        for name in ('return_orders', 'broken_orders', 'public_sales'):
+            for record in self._section(name):
+                self._reference(Route, record.get('route', record.get('route_id')))
+                self._reference(LoadingOrder, record.get('loading_order'))
+                for item in record.get('items') or []:
+                    self._reference(Product, item.get('product', item.get('product_id')))
+
+        for record in self._section('expenses'):
+            self._reference(Route, record.get('route'))
+            self._reference(DeliveryTeam, record.get('delivery_team'))
+
+        for record in self._section('denominations'):
+            self._reference(Route, record.get('route'))
+            self._reference(DeliveryOrder, record.get('delivery_order'))
+
+    # ------------------------------------------------------------------
+    # Stage 2: prefetch
+    # ------------------------------------------------------------------
+    def prefetch(self):
+        for model, pks in self.referenced.items():
+            self.prefetched[model] = model.objects.in_bulk(pks)
+        self.prefetched[CustomUser] = {self.user.pk: self.user}
+
+        self.existing_orders_by_id = {}
+        self.existing_orders_by_local_id = {}
+        self.existing_orders_by_key = {}
+        self.taken_order_numbers = set()
+        self.existing_items = defaultdict(dict)
+
+        if not self.delivery_orders:
+            return
+
+        ids, local_ids, order_numbers = set(), set(), set()
+        routes, sellers, dates = set(), set(), set()
+        for order in self.delivery_orders:
+            pk = _as_pk(order.get('id'))
+            if pk is not None:
+                ids.add(pk)
+            if order.get('local_id'):
+                local_ids.add(order['local_id'])
+            if order.get('order_number'):
+                order_numbers.add(order['order_number'])
+            key = self._order_key(order)
+            if key:
+                routes.add(key[0])
+                sellers.add(key[1])
+                dates.add(key[2])
+
+        query = Q(id__in=ids) | Q(local_id__in=local_ids) | Q(order_number__in=order_numbers)
+        if dates:
+            query |= Q(route_id__in=routes, seller_id__in=sellers, delivery_date__in=dates)
+
+        for order in DeliveryOrder.objects.filter(query).order_by('id'):
+            self.existing_orders_by_id[order.pk] = order
+            if order.local_id:
+                self.existing_orders_by_local_id.setdefault(order.local_id, order)
+            self.existing_orders_by_key[(order.route_id, order.seller_id, order.delivery_date)] = order
+            self.taken_order_numbers.add(order.order_number)
+
+        if self.existing_orders_by_id:
+            for item in DeliveryOrderItem.objects.filter(delivery_order_id__in=self.existing_orders_by_id):
+                self.existing_items[item.delivery_order_id][item.product_id] = item
+
+    def _order_key(self, order):
+        route_id = _as_pk(order.get('route'))
+        seller_id = _as_pk(order.get('seller'))
+        delivery_date = _as_date(order.get('delivery_date'))
+        if route_id is None or seller_id is None or delivery_date is None:
+            return None
+        return (route_id, seller_id, delivery_date)
+
+    def _lookup(self, model, value):
+        return self.prefetched.get(model, {}).get(_as_pk(value))
+
+    @property
+    def serializer_context(self):
+        return {'prefetched': self.prefetched}
+
+    # ------------------------------------------------------------------
+    # Stage 3 + 4: delivery orders and their items
+    # ------------------------------------------------------------------
+    def _match_delivery_order(self, order_data):
+        pk = _as_pk(order_data.get('id'))
+        if pk is not None and pk in self.existing_orders_by_id:
+            return self.existing_orders_by_id[pk]
+        if order_data.get('local_id') and order_data['local_id'] in self.existing_orders_by_local_id:
+            return self.existing_orders_by_local_id[order_data['local_id']]
+        key = self._order_key(order_data)
+        if key and key in self.existing_orders_by_key:
+            existing_order = self.existing_orders_by_key[key]
+            # Add the ID to the order data for future reference
+            order_data['id'] = existing_order.pk
+            return existing_order
+        return None
+
+    def _set_order_field(self, order, key, value):
+        """Set one payload value on a DeliveryOrder; returns the field name or None if skipped"""
+        field = _concrete_field(DeliveryOrder, key)
+        if field is None:
+            return None
+        if field.is_relation:
+            if value is None:
+                setattr(order, field.name, None)
+                return field.name
+            related = self._lookup(field.related_model, value)
+            if related is None:
+                logger.warning('%s with id %s does not exist', field.related_model.__name__, value)
+                return None
+            setattr(order, field.name, related)
+            return field.name
+        setattr(order, field.attname, field.to_python(value))
+        return field.name
+
+    def _set_item_fields(self, item, item_data):
+        for key, value in item_data.items():
+            if key in ('id', 'product', 'delivery_order'):
+                continue
+            field = _concrete_field(DeliveryOrderItem, key)
+            if field is None or field.is_relation:
+                continue
+            if key in self.DECIMAL_ITEM_FIELDS:
+                try:
+                    value = Decimal(str(value)) if value not in (None, '') else Decimal('0.00')
+                except InvalidOperation:
+                    logger.warning('Invalid decimal value for %s: %r', key, value)
+                    value = Decimal('0.00')
+            setattr(item, field.attname, value)
+        item.updated_at = self.now
+        item.apply_pricing()
+
+    def _diff_delivery_order_items(self, order, items_data, existing_items, new_items, changed_items):
+        for item_data in items_data or []:
+            if 'product' not in item_data:
+                continue
+            product_id = _as_pk(item_data['product'])
+            item = existing_items.get(product_id)
+            if item is not None:
+                if item.pk:
+                    changed_items[item.pk] = item
+                self._set_item_fields(item, item_data)
+                continue
+
+            product = self._lookup(Product, product_id)
+            if product is None:
+                logger.warning('Product with id %s does not exist', product_id)
+                continue
+            item = DeliveryOrderItem(delivery_order=order, product=product)
+            self._set_item_fields(item, item_data)
+            # The app sends the full catalog sheet; untouched products are not stored
+            if item.is_blank:
+                continue
+            existing_items[product_id] = item
+            new_items.append(item)
+
+    def sync_delivery_orders(self):
+        logger.info('Processing %s delivery orders', len(self.delivery_orders))
+        updated_orders = {}
+        update_fields = {'sync_status', 'updated_by', 'updated_at'}
+        new_orders = []
+        new_items = []
+        changed_items = {}
+        entries = []
+
+        for order_data in self.delivery_orders:
+            existing_order = self._match_delivery_order(order_data)
+            try:
+                if existing_order is not None:
+                    for key, value in order_data.items():
+                        if key in self.DELIVERY_ORDER_KEY_FIELDS:
+                            continue
+                        name = self._set_order_field(existing_order, key, value)
+                        if name:
+                            update_fields.add(name)
+                    existing_order.sync_status = 'synced'
+                    existing_order.updated_by = self.user
+                    existing_order.updated_at = self.now
+                    updated_orders[existing_order.pk] = existing_order
+                    self._diff_delivery_order_items(
+                        existing_order,
+                        order_data.get('items'),
+                        self.existing_items[existing_order.pk],
+                        new_items,
+                        changed_items,
+                    )
+                    entries.append((order_data, existing_order, 'updated'))
+                else:
+                    new_order = DeliveryOrder(sync_status='synced', created_by=self.user, updated_by=self.user)
+                    for key, value in order_data.items():
+                        if key in ('id', 'items'):
+                            continue
+                        self._set_order_field(new_order, key, value)
+                    if not (new_order.route_id and new_order.seller_id and new_order.delivery_date):
+                        raise ValueError('route, seller and delivery_date are required')
+                    if new_order.order_number in self.taken_order_numbers:
+                        logger.info('Order number %s already in use, allocating a new one', new_order.order_number)
+                        new_order.order_number = ''
+                    if new_order.order_number:
+                        self.taken_order_numbers.add(new_order.order_number)
+                    items = {}
+                    self._diff_delivery_order_items(new_order, order_data.get('items'), items, new_items, changed_items)
+                    new_orders.append(new_order)
+                    entries.append((order_data, new_order, 'created'))
+            except (ValidationError, ValueError, TypeError) as e:
+                logger.warning('Could not prepare delivery order: %s', e)
+                self.results['delivery_orders'].append({
+                    'local_id': order_data.get('local_id'),
+                    'status': 'error',
+                    'message': str(e),
+                })
+
+        try:
+            with transaction.atomic():
+                unnumbered = [order for order in new_orders if not order.order_number]
+                for order, number in zip(unnumbered, allocate_order_numbers('DO', len(unnumbered), model=DeliveryOrder)):
+                    order.order_number = number
+                DeliveryOrder.objects.bulk_create(new_orders)
+                if updated_orders:
+                    DeliveryOrder.objects.bulk_update(list(updated_orders.values()), sorted(update_fields))
+                DeliveryOrderItem.objects.bulk_create(new_items)
+                if changed_items:
+                    DeliveryOrderItem.objects.bulk_update(
+                        list(changed_items.values()), self.DELIVERY_ORDER_ITEM_UPDATE_FIELDS
+                    )
+                # bulk writes skip the rollup and ledger signals
+                schedule_rollup_refresh(order_slice(order) for _, order, _ in entries)
+                invalidate_route_bundles(order_slice(order) for _, order, _ in entries)
+                invalidate_reconciliations(loading_orders_of(order for _, order, _ in entries))
+                post_delivery_orders([order for _, order, _ in entries])
+            failed = set()
+        except DatabaseError as e:
+            logger.warning('Bulk delivery order sync failed, retrying order by order: %s', e)
+            failed = self._write_delivery_orders_individually(entries, new_items, changed_items)
+
+        for order_data, order, action in entries:
+            if id(order) in failed:
+                continue
+            self.results['delivery_orders'].append({
+                'id': order.pk,
+                'local_id': order.local_id,
+                'status': action,
+                'message': f'Delivery order {action} successfully',
+            })
+
+    def _write_delivery_orders_individually(self, entries, new_items, changed_items):
+        failed = set()
+        items_by_order = defaultdict(list)
+        for item in new_items:
+            item.pk = None
+            item._state.adding = True
+            items_by_order[id(item.delivery_order)].append(item)
+        for item in changed_items.values():
+            items_by_order[id(item.delivery_order)].append(item)
+
+        for order_data, order, action in entries:
+            if action == 'created':
+                order.pk = None
+                order._state.adding = True
+                # Drop the number allocated for the failed batch, keep one the app sent
+                if order.order_number != order_data.get('order_number'):
+                    order.order_number = ''
+            try:
+                with transaction.atomic():
+                    order.save()
+                    for item in items_by_order[id(order)]:
+                        item.delivery_order = order
+                        item.save()
+            except Exception as e:
+                logger.warning('Could not %s delivery order', 'create' if action == 'created' else 'update', exc_info=True)
+                failed.add(id(order))
+                self.results['delivery_orders'].append({
+                    'local_id': order_data.get('local_id'),
+                    'status': 'error',
+                    'message': str(e),
+                })
+        return failed
+
+    # ------------------------------------------------------------------
+    # Stage 3 + 4: child sections (returns, broken, public sales, expenses, denominations)
+    # ------------------------------------------------------------------
+    def _delete_for_route_and_date(self, model, date_field):
+        if self.route_id and self.delivery_date:
+            model.objects.filter(route_id=self.route_id, **{date_field: self.delivery_date}).delete()
+
+    def _existing_by_local_id(self, model, local_ids):
+        local_ids = {str(local_id) for local_id in local_ids if local_id}
+        existing = {}
+        if local_ids:
+            for instance in model.objects.filter(local_id__in=local_ids).order_by('-pk'):
+                existing[instance.local_id] = instance
+        return existing
+
+    def _sync_section(self, section, label, serializer_class, records, existing, build, save_kwargs):
+        """
+        Validate every record once (foreign keys resolve from the prefetched
+        maps), update the rare rows that already exist through the serializer,
+        and bulk insert the rest via build(validated_data) -> (parent, children).
+        """
+        pending = []
+        for record, existing_instance in zip(records, existing):
+            if existing_instance is not None:
+                serializer = serializer_class(
+                    existing_instance, data=record, partial=True, context=self.serializer_context
+                )
+                if serializer.is_valid():
+                    instance = serializer.save(**save_kwargs)
+                    self.results[section].append({
+                        'id': instance.pk,
+                        'local_id': getattr(instance, 'local_id', None),
+                        'status': 'updated',
+                        'message': f'{label} updated successfully',
+                    })
+                else:
+                    logger.warning('Validation errors updating %s: %s', label.lower(), serializer.errors)
+                    self._error(section, record, serializer.errors)
+                continue
+
+            serializer = serializer_class(data=record, context=self.serializer_context)
+            if serializer.is_valid():
+                parent, children = build(dict(serializer.validated_data))
+                pending.append((record, parent, children))
+            else:
+                logger.warning('Validation errors creating %s: %s', label.lower(), serializer.errors)
+                self._error(section, record, serializer.errors)
+
+        if pending:
+            self._bulk_insert(section, label, pending)
+
+    def _bulk_insert(self, section, label, pending):
+        model = type(pending[0][1])
+        try:
+            with transaction.atomic():
+                self._number(model, [parent for _, parent, _ in pending])
+                model.objects.bulk_create([parent for _, parent, _ in pending])
+                children = [child for _, _, group in pending for child in group]
+                if children:
+                    type(children[0]).objects.bulk_create(children)
+                if model in (BrokenOrder, ReturnedOrder):
+                    # bulk writes skip the rollup signals
+                    schedule_rollup_refresh(order_slice(parent) for _, parent, _ in pending)
+                if model in (BrokenOrder, ReturnedOrder, PublicSale):
+                    invalidate_reconciliations(loading_orders_of(parent for _, parent, _ in pending))
+            created = pending
+        except DatabaseError as e:
+            logger.warning('Bulk insert of %s failed, retrying one by one: %s', section, e)
+            created = []
+            for record, parent, group in pending:
+                parent.pk = None
+                parent._state.adding = True
+                for child in group:
+                    child.pk = None
+                    child._state.adding = True
+                try:
+                    with transaction.atomic():
+                        self._number(model, [parent])
+                        parent.save()
+                        for child in group:
+                            # Re-point the child at the parent's new pk
+                            for field in child._meta.concrete_fields:
+                                if field.is_relation and field.related_model is model:
+                                    setattr(child, field.name, parent)
+                            child.save()
+                    created.append((record, parent, group))
+                except Exception as error:
+                    logger.warning('Could not create %s', label.lower(), exc_info=True)
+                    self._error(section, record, str(error))
+
+        for record, parent, _ in created:
+            self.results[section].append({
+                'id': parent.pk,
+                'local_id': getattr(parent, 'local_id', None),
+                'status': 'created',
+                'message': f'{label} created successfully',
+            })
+
+    def _number(self, model, instances):
+        prefixes = {ReturnedOrder: 'RO', BrokenOrder: 'BO'}
+        if model in prefixes:
+            unnumbered = [instance for instance in instances if not instance.order_number]
+            numbers = allocate_order_numbers(prefixes[model], len(unnumbered), model=model)
+            for instance, number in zip(unnumbered, numbers):
+                instance.order_number = number
+
+    def _error(self, section, record, errors):
+        self.results[section].append({
+            'local_id': record.get('local_id'),
+            'status': 'error',
+            'message': 'Validation error',
+            'errors': errors,
+        })
+
+    def sync_return_orders(self):
+        self._delete_for_route_and_date(ReturnedOrder, 'return_date')
+        records = self._section('return_orders')
+        existing_map = self._existing_by_local_id(ReturnedOrder, (r.get('local_id') for r in records))
+        existing = [existing_map.get(str(r['local_id'])) if r.get('local_id') else None for r in records]
+
+        def build(validated_data):
+            items = validated_data.pop('items', [])
+            validated_data['sync_status'] = 'synced'
+            order = ReturnedOrder(created_by=self.user, updated_by=self.user, **validated_data)
+            return order, [ReturnedOrderItem(returned_order=order, **item) for item in items]
+
+        self._sync_section(
+            'return_orders', 'Returned order', ReturnedOrderSerializer, records, existing, build,
+            {'sync_status': 'synced', 'updated_by': self.user},
+        )
+
+    def _normalize_broken_order(self, order_data):
+        if 'route_id' in order_data and 'route' not in order_data:
+            order_data['route'] = order_data['route_id']
+        if 'date' in order_data and 'report_date' not in order_data:
+            order_data['report_date'] = order_data['date']
+        if 'report_time' not in order_data:
+            order_data['report_time'] = datetime.now().strftime('%H:%M:%S')
+
+        processed_items = []
+        for item in order_data.get('items') or []:
+            processed_item = {}
+            if 'product_id' in item and 'product' not in item:
+                processed_item['product'] = item['product_id']
+            elif 'product' in item:
+                processed_item['product'] = item['product']
+            else:
+                logger.warning('No product or product_id in item %s', item)
+                for key, value in item.items():
+                    if 'product' in key.lower() and isinstance(value, (int, str)):
+                        processed_item['product'] = value
+                        break
+            if 'quantity' in item:
+                processed_item['quantity'] = item['quantity']
+            if 'product_name' in item:
+                processed_item['product_name'] = item['product_name']
+            processed_items.append(processed_item)
+        order_data['items'] = processed_items
+        return order_data
+
+    def sync_broken_orders(self):
+        self._delete_for_route_and_date(BrokenOrder, 'report_date')
+        records = [self._normalize_broken_order(record) for record in self._section('broken_orders')]
+
+        # The mobile app sends its own id, which is stored as local_id
+        def local_key(record):
+            return str(record['id']) if record.get('id') else record.get('local_id')
+
+        existing_map = self._existing_by_local_id(BrokenOrder, (local_key(r) for r in records))
+        existing = []
+        for record in records:
+            existing_order = existing_map.get(str(local_key(record))) if local_key(record) else None
+            if existing_order is None and record.get('id'):
+                record['local_id'] = str(record['id'])
+            if existing_order is None:
+                # Always let BrokenOrder numbering allocate order_number for new records
+                record.pop('order_number', None)
+            existing.append(existing_order)
+
+        def build(validated_data):
+            items = validated_data.pop('items', [])
+            validated_data.pop('order_number', None)
+            validated_data['sync_status'] = 'synced'
+            order = BrokenOrder(created_by=self.user, updated_by=self.user, **validated_data)
+            return order, [BrokenOrderItem(broken_order=order, **item) for item in items]
+
+        self._sync_section(
+            'broken_orders', 'Broken order', BrokenOrderSerializer, records, existing, build,
+            {'sync_status': 'synced', 'updated_by': self.user},
+        )
+
+    def sync_public_sales(self):
+        self._delete_for_route_and_date(PublicSale, 'sale_date')
+        records = self._section('public_sales')
+        existing_map = self._existing_by_local_id(PublicSale, (r.get('local_id') for r in records))
+        existing = [existing_map.get(str(r['local_id'])) if r.get('local_id') else None for r in records]
+
+        def build(validated_data):
+            items = validated_data.pop('items', [])
+            validated_data['sync_status'] = 'synced'
+            sale = PublicSale(created_by=self.user, updated_by=self.user, **validated_data)
+            children = []
+            for item in items:
+                child = PublicSaleItem(public_sale=sale, **item)
+                # Same arithmetic as PublicSaleItem.save() / PublicSale.save()
+                child.total_price = child.quantity * child.unit_price
+                children.append(child)
+            if children:
+                sale.total_price = sum(child.total_price for child in children)
+            sale.sale_number = f"PS-{uuid.uuid4().hex[:8].upper()}"
+            sale.balance_amount = sale.total_price - sale.amount_collected
+            return sale, children
+
+        self._sync_section(
+            'public_sales', 'Public sale', PublicSaleSerializer, records, existing, build,
+            {'sync_status': 'synced', 'updated_by': self.user},
+        )
+
+    def _remember_team(self, key, loading_order_filter, fallback=None):
+        """Resolve a delivery team once per key and keep it for serializer validation"""
+        if key not in self._delivery_teams:
+            team = None
+            loading_order = LoadingOrder.objects.filter(
+                **loading_order_filter
+            ).select_related('purchase_order__delivery_team').first()
+            if loading_order and loading_order.purchase_order and loading_order.purchase_order.delivery_team:
+                team = loading_order.purchase_order.delivery_team
+            elif fallback is not None:
+                team = fallback()
+            if team is not None:
+                self.prefetched.setdefault(DeliveryTeam, {})[team.pk] = team
+            self._delivery_teams[key] = team.pk if team else None
+        return self._delivery_teams[key]
+
+    def _delivery_team_for(self, route_id, expense_date):
+        """Delivery team for a route on a day, resolved once per (route, date)"""
+        return self._remember_team(
+            (route_id, expense_date),
+            {'route_id': route_id, 'loading_date': expense_date},
+            # Fallback: any delivery team assigned to this route, then the first team
+            lambda: DeliveryTeam.objects.filter(route_id=route_id).first() or DeliveryTeam.objects.first(),
+        )
+
+    def _delivery_team_from_loading_order(self):
+        """Delivery team of the loading order referenced at the top of the payload"""
+        loading_order = self.data.get('loading_order')
+        if isinstance(loading_order, dict):
+            loading_order = loading_order.get('order_number')
+        pk = _as_pk(loading_order)
+        if pk is None:
+            return None
+        return self._remember_team(('loading_order', pk), {'id': pk})
+
+    def _map_expense(self, expense_data):
+        route_id = _as_pk(expense_data.get('route')) or self.route_id
+        expense_date = expense_data.get('expense_date')
+        if isinstance(expense_date, date):
+            expense_date = expense_date.isoformat()
+        elif not expense_date and self.delivery_date:
+            expense_date = self.delivery_date.isoformat()
+
+        expense_type = (expense_data.get('expense_type') or '').lower()
+        if expense_type in ['vehicle', 'maintenance', 'repairs', 'repair']:
+            expense_type = 'vehicle'
+        elif expense_type not in ['fuel', 'food']:
+            expense_type = 'other'
+
+        if route_id:
+            delivery_team = self._delivery_team_for(route_id, expense_date)
+        else:
+            delivery_team = self._delivery_team_from_loading_order()
+
+        return {
+            'delivery_team': delivery_team,
+            'expense_date': expense_date,
+            'route': route_id,
+            'expense_type': expense_type,
+            'amount': expense_data.get('amount', None),
+            'notes': expense_data.get('description', None),
+            'local_id': expense_data.get('local_id', None),
+            'sync_status': 'synced',
+            'created_by': self.user.pk,
+        }
+
+    def sync_expenses(self):
+        self._delete_for_route_and_date(DeliveryExpense, 'expense_date')
+        records = []
+        for expense_data in self._section('expenses'):
+            mapped = self._map_expense(expense_data)
+            if not mapped['delivery_team']:
+                logger.warning('Skipping expense without a delivery team: %s', expense_data)
+                self._error('expenses', mapped, 'No delivery team found for route')
+                continue
+            records.append(mapped)
+        existing_map = self._existing_by_local_id(DeliveryExpense, (r.get('local_id') for r in records))
+        existing = [existing_map.get(str(r['local_id'])) if r.get('local_id') else None for r in records]
+
+        def build(validated_data):
+            validated_data['sync_status'] = 'synced'
+            return DeliveryExpense(**validated_data), []
+
+        self._sync_section(
+            'expenses', 'Expense', DeliveryExpenseSerializer, records, existing, build,
+            {'sync_status': 'synced'},
+        )
+
+    def sync_denominations(self):
+        self._delete_for_route_and_date(CashDenomination, 'delivery_date')
+        records = self._section('denominations')
+        for denomination_data in records:
+            route_id = _as_pk(denomination_data.get('route'))
+            denomination_data['route'] = route_id if route_id is not None else self.route_id
+            if isinstance(denomination_data.get('delivery_date'), date):
+                denomination_data['delivery_date'] = denomination_data['delivery_date'].isoformat()
+            elif 'delivery_date' not in denomination_data and self.delivery_date:
+                denomination_data['delivery_date'] = self.delivery_date.isoformat()
+            if hasattr(denomination_data.get('delivery_order'), 'pk'):
+                denomination_data['delivery_order'] = denomination_data['delivery_order'].pk
+        existing_map = self._existing_by_local_id(CashDenomination, (r.get('local_id') for r in records))
+        existing = [existing_map.get(str(r['local_id'])) if r.get('local_id') else None for r in records]
+
+        def build(validated_data):
+            validated_data['sync_status'] = 'synced'
+            denomination = CashDenomination(**validated_data)
+            # Same arithmetic as CashDenomination.save()
+            denomination.total_amount = denomination.denomination * denomination.count
+            return denomination, []
+
+        self._sync_section(
+            'denominations', 'Denomination', CashDenominationSerializer, records, existing, build,
+            {'sync_status': 'synced'},
+        )
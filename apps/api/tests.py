@@ -0,0 +1,696 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+import pandas as pd
+
+from django.db import connection
+from django.db.models.deletion import Collector
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.core.testing import (
+    clear_caches, create_delivery_team, create_general_plan, create_products, create_route, create_sellers,
+    create_user,
+)
+from apps.delivery.ledger import current_balance, post_delivery_orders
+from apps.delivery.models import (
+    BrokenOrder, BrokenOrderItem, CashDenomination, DeliveryExpense, DeliveryOrder, DeliveryOrderItem,
+    DeliverySync, LoadingOrder, LoadingOrderItem, PublicSale, PublicSaleItem, PurchaseOrder, ReturnedOrder,
+    ReturnedOrderItem,
+)
+from apps.products.models import PricePlan, Product, ProductPrice
+from apps.sales.models import OrderItem, SalesOrder
+from apps.seller.models import Route, Seller
+from apps.products.utils import process_price_plan_excel
+from .models import RouteBundle, SyncRequest
+from .route_bundle import build_route_bundle, get_route_bundle
+from .serializers import DeliveryOrderSerializer, ProductSerializer, SellerSerializer
+from .sync_jobs import run_pending_jobs
+from .write_queue import sync_write_turn
+
+
+class SyncEndpointTests(TestCase):
+    """The combined /apiapp/sync/ endpoint: query budget, replays and queued uploads"""
+
+    # Upper bound for a payload touching every section the tests send; the
+    # point is that it holds for 1 order or 1000, not the exact number
+    QUERY_BUDGET = 40
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('driver', role='DELIVERY')
+        cls.route = create_route('North')
+        cls.products = create_products([f'Product {i}' for i in range(8)])
+        cls.sellers = create_sellers(cls.route, 12)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.delivery_date = date(2026, 10, 18)
+
+    def build_payload(self, sellers, products):
+        return {
+            'delivery_orders': [
+                {
+                    'local_id': f'do-{seller.pk}',
+                    'route': self.route.pk,
+                    'seller': seller.pk,
+                    'delivery_date': self.delivery_date.isoformat(),
+                    'delivery_time': '2026-10-18 07:30:00',
+                    'amount_collected': '10.00',
+                    'payment_method': 'cash',
+                    'status': 'draft',
+                    'items': [
+                        {
+                            'product': product.pk,
+                            'ordered_quantity': '2.000',
+                            'extra_quantity': '0.000',
+                            'delivered_quantity': '2.000',
+                            'unit_price': '5.00',
+                        }
+                        for product in products
+                    ],
+                }
+                for seller in sellers
+            ],
+            'denominations': [
+                {'denomination': 100, 'count': 3, 'total_amount': '300.00', 'local_id': 'den-100'},
+                {'denomination': 50, 'count': 1, 'total_amount': '50.00', 'local_id': 'den-50'},
+            ],
+        }
+
+    def sync(self, payload, sync_key=None):
+        # A fresh key per call, so identical payloads are not answered from the replay store
+        headers = {'Idempotency-Key': sync_key or uuid.uuid4().hex}
+        # Run the rollup refresh scheduled for commit, outside the counted queries
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/apiapp/sync/', payload, format='json', headers=headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_payload(self):
+        # The first sync of the day also creates the order number counter row
+        self.sync(self.build_payload(self.sellers[:1], self.products[:1]))
+        DeliveryOrder.objects.all().delete()
+
+        small = self.sync(self.build_payload(self.sellers[:1], self.products[:1]))
+        DeliveryOrder.objects.all().delete()
+
+        large = self.sync(self.build_payload(self.sellers, self.products))
+
+        self.assertEqual(DeliveryOrder.objects.count(), len(self.sellers))
+        self.assertEqual(DeliveryOrderItem.objects.count(), len(self.sellers) * len(self.products))
+        self.assertLessEqual(large, self.QUERY_BUDGET)
+        # 8x the orders and 96x the items; only bulk_create's batching for
+        # SQLite's bound-parameter limit may add a statement
+        self.assertLessEqual(large, small + 2)
+
+    def test_resync_updates_in_place(self):
+        payload = self.build_payload(self.sellers, self.products)
+        created = self.sync(payload)
+
+        for order in payload['delivery_orders']:
+            for item in order['items']:
+                item['delivered_quantity'] = '1.000'
+        updated = self.sync(payload)
+
+        self.assertLessEqual(updated, self.QUERY_BUDGET)
+        self.assertLessEqual(updated, created + 2)
+        self.assertEqual(DeliveryOrder.objects.count(), len(self.sellers))
+        self.assertEqual(CashDenomination.objects.count(), 2)
+        item = DeliveryOrderItem.objects.filter(delivery_order__seller=self.sellers[0]).first()
+        self.assertEqual(item.delivered_quantity, Decimal('1.000'))
+        self.assertEqual(item.total_price, Decimal('5.00'))
+
+    def test_retried_sync_is_replayed(self):
+        payload = self.build_payload(self.sellers, self.products)
+        self.sync(payload, sync_key='upload-1')
+        DeliveryOrderItem.objects.update(delivered_quantity=Decimal('9.000'))
+
+        replayed = self.sync(payload, sync_key='upload-1')
+
+        self.assertLessEqual(replayed, 3)
+        self.assertFalse(DeliveryOrderItem.objects.exclude(delivered_quantity=Decimal('9.000')).exists())
+
+    def test_async_sync_is_queued_and_processed_by_worker(self):
+        payload = self.build_payload(self.sellers[:2], self.products[:2])
+        response = self.client.post('/apiapp/sync/?async=1', payload, format='json')
+
+        self.assertEqual(response.status_code, 202, response.content)
+        job = DeliverySync.objects.get(pk=response.data['job_id'])
+        self.assertEqual(job.status, 'pending')
+        self.assertFalse(DeliveryOrder.objects.exists())
+
+        self.assertEqual(run_pending_jobs(), 1)
+
+        status = self.client.get(response.data['status_url']).data
+        self.assertEqual(status['status'], 'completed')
+        self.assertEqual(status['result']['status'], 'success')
+        self.assertEqual(DeliveryOrder.objects.count(), 2)
+        self.assertEqual(run_pending_jobs(), 0)
+
+    def test_retried_async_sync_gets_the_queued_job(self):
+        payload = self.build_payload(self.sellers[:1], self.products[:1])
+        # No Idempotency-Key: the job is keyed by the payload, like the replay store
+        first = self.client.post('/apiapp/sync/?async=1', payload, format='json')
+        retry = self.client.post('/apiapp/sync/?async=1', payload, format='json')
+
+        self.assertEqual(retry.status_code, 202)
+        self.assertEqual(retry.data['job_id'], first.data['job_id'])
+        job = DeliverySync.objects.get()
+        self.assertEqual(len(job.sync_key), 64)
+
+        self.assertEqual(run_pending_jobs(), 1)
+        replay = self.client.post('/apiapp/sync/?async=1', payload, format='json')
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay['Idempotent-Replay'], 'true')
+        self.assertEqual(DeliverySync.objects.count(), 1)
+
+    def test_replays_and_async_submits_do_not_wait_for_the_write_lock(self):
+        payload = self.build_payload(self.sellers[:1], self.products[:1])
+        with (
+            mock.patch('apps.api.views.sync_write_turn', wraps=sync_write_turn) as combined,
+            mock.patch('apps.api.write_queue.sync_write_turn', wraps=sync_write_turn) as separate,
+        ):
+            self.sync(payload, sync_key='upload-1')
+            self.sync(payload, sync_key='upload-1')
+            self.client.post('/apiapp/sync/?async=1', payload, format='json')
+            self.client.post('/apiapp/sync/delivery-orders/?async=1', payload['delivery_orders'], format='json')
+
+        # Only the one sync that ran took its turn
+        self.assertEqual(combined.call_count, 1)
+        self.assertEqual(separate.call_count, 0)
+        self.assertEqual(DeliverySync.objects.filter(status='pending').count(), 2)
+
+    def test_pull_returns_only_changes_since_cursor(self):
+        full = self.client.get('/apiapp/sync/pull/').data
+        self.assertTrue(full['full'])
+        self.assertEqual(len(full['sellers']['changed']), len(self.sellers))
+
+        # Pretend the catalog was last touched well before the cursor
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Seller.objects.update(updated_at=an_hour_ago)
+        Product.objects.update(updated_at=an_hour_ago)
+        Route.objects.update(updated_at=an_hour_ago)
+
+        seller = self.sellers[0]
+        seller.store_name = 'Renamed'
+        seller.save()
+        removed = self.products[-1]
+        removed_pk = removed.pk
+        removed.delete()
+
+        delta = self.client.get('/apiapp/sync/pull/', {'cursor': full['cursor']}).data
+        self.assertFalse(delta['full'])
+        self.assertEqual([row['id'] for row in delta['sellers']['changed']], [seller.pk])
+        self.assertEqual(delta['products']['changed'], [])
+        self.assertEqual(delta['products']['deleted'], [removed_pk])
+        self.assertEqual(delta['routes']['changed'], [])
+
+    def test_analytics_aggregate_in_the_database(self):
+        self.sync(self.build_payload(self.sellers[:2], self.products[:2]))
+        params = {'period': 'month', 'start_date': '2026-10-01', 'end_date': '2026-10-31'}
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/apiapp/admin/route-performance/', params)
+        self.sync(self.build_payload(self.sellers, self.products))
+        with CaptureQueriesContext(connection) as large:
+            routes = self.client.get('/apiapp/admin/route-performance/', params).data
+        # count, one page of groups and their breakdown, whatever the row count
+        self.assertEqual(len(large), len(small))
+
+        route = routes['routes'][0]
+        self.assertEqual(route['total_deliveries'], len(self.sellers))
+        self.assertEqual(Decimal(route['total_delivered_quantity']), Decimal('2.000') * len(self.sellers) * len(self.products))
+        self.assertEqual(list(route['performance_breakdown']), ['2026-10'])
+
+        products = self.client.get('/apiapp/admin/product-movement/', dict(params, page_size=3)).data
+        self.assertEqual(products['pagination']['count'], len(self.products))
+        self.assertEqual(len(products['products']), 3)
+        self.assertEqual(Decimal(products['products'][0]['total_value']), Decimal('10.00') * len(self.sellers))
+
+        sellers = self.client.get('/apiapp/admin/top-sellers/', {'start_date': '2026-11-01'}).data
+        self.assertEqual(sellers['sellers'], [])
+
+        response = self.client.get('/apiapp/admin/top-sellers/', {'start_date': '18-10-2026'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BalanceAgingTests(TestCase):
+    """Overdue balances per seller, bucketed by age"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('admin')
+        cls.route = create_route('East')
+        cls.seller, = create_sellers(cls.route, 1)
+
+    def create_orders(self, seller, days):
+        """Orders chained like the app saves them: each opens with the previous total balance"""
+        today = timezone.now().date()
+        balance = Decimal('0.00')
+        for days_ago, total, collected in days:
+            order = DeliveryOrder.objects.create(
+                route=self.route, seller=seller, delivery_date=today - timedelta(days=days_ago),
+                opening_balance=balance, total_price=Decimal(total), amount_collected=Decimal(collected),
+            )
+            order.refresh_from_db()
+            balance = order.total_balance
+
+    def test_balance_aging_reads_the_ledger(self):
+        # 50.00 is owed in the end: collections paid the oldest sales first,
+        # so it is the 10.00 of 3 days ago, the 20.00 of 20 days ago and what
+        # is left of the 30.00 of 45 days ago
+        self.create_orders(self.seller, [
+            (90, '40.00', '0.00'), (45, '30.00', '0.00'), (20, '20.00', '0.00'), (3, '10.00', '50.00'),
+            (0, '99.00', '0.00'),
+        ])
+        paid_up, = create_sellers(self.route, 1, name='Paid')
+        self.create_orders(paid_up, [(10, '15.00', '15.00')])
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        report = client.get('/apiapp/admin/balance-aging/', {'period': 'buckets', 'route_id': self.route.pk}).data
+        self.assertEqual(report['pagination']['count'], 1)
+        seller = report['sellers'][0]
+        self.assertEqual(Decimal(seller['total_balance']), Decimal('50.00'))
+        self.assertEqual(
+            {label: Decimal(value) for label, value in seller['overdue_breakdown'].items()},
+            {'0-7': Decimal('10.00'), '8-30': Decimal('20.00'), '31-60': Decimal('20.00'), '60+': Decimal('0.00')},
+        )
+
+        monthly = client.get('/apiapp/admin/balance-aging/', {'period': 'month'}).data['sellers'][0]
+        self.assertEqual(sum(Decimal(value) for value in monthly['overdue_breakdown'].values()), Decimal('50.00'))
+        self.assertEqual(client.get('/apiapp/admin/balance-aging/', {'period': 'day'}).status_code, 400)
+
+
+class DeliveryOrderItemBulkTests(TestCase):
+    """The bulk item endpoints write in batches and recompute order totals once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('clerk')
+        cls.route = create_route('West')
+        cls.seller, = create_sellers(cls.route, 1)
+        cls.products = create_products([f'Curd {i}' for i in range(30)], category='Curd')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.order = DeliveryOrder.objects.create(
+            route=self.route, seller=self.seller, delivery_date=date(2026, 10, 18),
+            amount_collected=Decimal('10.00'),
+        )
+
+    def items(self, products, delivered='2.00'):
+        return [
+            {
+                'delivery_order': self.order.pk, 'product': product.pk, 'ordered_quantity': '2.00',
+                'extra_quantity': '0.00', 'delivered_quantity': delivered, 'unit_price': '5.00', 'total_price': '0',
+            }
+            for product in products
+        ]
+
+    def send(self, method, action, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(
+                    f'/apiapp/orders/delivery-items/{action}/', payload, format='json'
+                )
+        return response, len(queries)
+
+    def test_bulk_create_and_update_batch_the_writes(self):
+        response, small = self.send('post', 'bulk_create', {'items': self.items(self.products[:2])})
+        self.assertEqual(response.status_code, 201, response.content)
+        DeliveryOrderItem.objects.all().delete()
+
+        response, large = self.send('post', 'bulk_create', {'items': self.items(self.products)})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(large, small)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('300.00'))
+        self.assertEqual(self.order.total_balance, Decimal('290.00'))
+        self.assertEqual(current_balance(self.seller), Decimal('290.00'))
+
+        updates = [
+            {'id': item['id'], 'delivered_quantity': '1.00'} for item in response.data['items'][:10]
+        ]
+        response, queries = self.send('put', 'bulk_update', {'items': updates})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertLessEqual(queries, large)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('250.00'))
+        self.assertEqual(DeliveryOrderItem.objects.filter(total_price=Decimal('5.00')).count(), 10)
+
+    def test_invalid_items_write_nothing(self):
+        items = self.items(self.products[:3])
+        items[1]['product'] = 999999
+        response, _ = self.send('post', 'bulk_create', {'items': items})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+
+        response, _ = self.send('put', 'bulk_update', {'items': [{'id': 999999, 'delivered_quantity': '1.00'}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DeliveryOrderItem.objects.exists())
+
+
+class RouteBundleTests(TestCase):
+    """One precomputed offline document per route and date"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('loader')
+        cls.route = create_route('Harbour')
+        cls.sellers = create_sellers(cls.route, 3)
+        cls.product, = create_products(['Paneer'], category='Paneer')
+        cls.delivery_date = date(2026, 10, 18)
+        cls.orders = [
+            DeliveryOrder.objects.create(
+                route=cls.route, seller=seller, delivery_date=cls.delivery_date,
+                total_price=Decimal('20.00'), opening_balance=Decimal('5.00'),
+            )
+            for seller in cls.sellers
+        ]
+        # Yesterday's unpaid delivery is today's opening balance
+        post_delivery_orders([DeliveryOrder.objects.create(
+            route=cls.route, seller=cls.sellers[0], delivery_date=cls.delivery_date - timedelta(days=1),
+            total_price=Decimal('5.00'),
+        )])
+        cls.team = create_delivery_team(cls.route, cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fetch(self, **headers):
+        return self.client.get(
+            '/apiapp/route-bundle/', {'route': self.route.pk, 'date': self.delivery_date.isoformat()}, headers=headers
+        )
+
+    def test_bundle_is_built_with_the_loading_order_and_revalidated(self):
+        purchase_order = PurchaseOrder.objects.create(
+            order_number='PO-H1', delivery_team=self.team, route=self.route, delivery_date=self.delivery_date,
+            created_by=self.user, updated_by=self.user,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            LoadingOrder.objects.create(
+                order_number='LO-H1', purchase_order=purchase_order, route=self.route,
+                loading_date=self.delivery_date, loading_time='05:30', created_by=self.user, updated_by=self.user,
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.fetch(**{'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        # Served from the stored document: the bundle row and the route
+        self.assertLessEqual(len(queries), 3)
+        document = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(document['loading_orders']), 1)
+        self.assertEqual(len(document['delivery_orders']), 3)
+        self.assertEqual(len(document['sellers']), 3)
+        self.assertEqual(Decimal(document['opening_balances'][str(self.sellers[0].pk)]), Decimal('5.00'))
+
+        etag = response['ETag']
+        self.assertEqual(self.fetch(**{'If-None-Match': etag}).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DeliveryOrderItem.objects.create(
+                delivery_order=self.orders[0], product=self.product, ordered_quantity=Decimal('1.00'),
+                delivered_quantity=Decimal('1.00'), unit_price=Decimal('9.00'), total_price=Decimal('9.00'),
+            )
+        response = self.fetch(**{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(json.loads(response.content)['delivery_orders'][0]['items'][0]['product'], self.product.pk)
+
+
+    def test_price_import_drops_upcoming_bundles(self):
+        today = timezone.localdate()
+        build_route_bundle(self.route, today)
+        plan = create_general_plan()
+        plan.excel_file.name = 'price_plans/general.xlsx'
+        sheet = pd.DataFrame({'product_code': [self.product.code], 'price': [12.5]})
+        with mock.patch('apps.products.utils.pd.read_excel', return_value=sheet):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(process_price_plan_excel(plan).imported, 1)
+        self.assertFalse(RouteBundle.objects.filter(delivery_date=today).exists())
+
+    def test_ledger_entries_drop_the_later_bundles_of_the_route(self):
+        earlier = self.delivery_date - timedelta(days=5)
+        for day in (earlier, self.delivery_date):
+            build_route_bundle(self.route, day)
+        # An order from two days before changes every later opening balance
+        with self.captureOnCommitCallbacks(execute=True):
+            DeliveryOrder.objects.create(
+                route=self.route, seller=self.sellers[1], delivery_date=self.delivery_date - timedelta(days=2),
+                total_price=Decimal('8.00'),
+            )
+        self.assertEqual(list(RouteBundle.objects.values_list('delivery_date', flat=True)), [earlier])
+        bundle = get_route_bundle(self.route, self.delivery_date)
+        document = json.loads(gzip.decompress(bundle.payload))
+        self.assertEqual(Decimal(document['opening_balances'][str(self.sellers[1].pk)]), Decimal('8.00'))
+
+class ConditionalGetTests(TestCase):
+    """ETag / Last-Modified validators on the endpoints the app polls"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('poller')
+        cls.route = create_route('Canal')
+        cls.seller, = create_sellers(cls.route, 1)
+        cls.products = create_products(['Ghee 0', 'Ghee 1'], category='Ghee')
+        cls.order = DeliveryOrder.objects.create(
+            route=cls.route, seller=cls.seller, delivery_date=date(2026, 10, 18),
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertNotModified(self, url, serializer, params=None, **headers):
+        with mock.patch.object(serializer, 'to_representation', side_effect=AssertionError('serialized')):
+            response = self.client.get(url, params, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        return response
+
+    def test_products_revalidate_until_the_catalog_changes(self):
+        response = self.client.get('/apiapp/products/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        self.assertNotModified('/apiapp/products/', ProductSerializer, **{'If-None-Match': etag})
+        self.assertNotModified(
+            f'/apiapp/products/{self.products[0].pk}/', ProductSerializer,
+            **{'If-None-Match': self.client.get(f'/apiapp/products/{self.products[0].pk}/')['ETag']},
+        )
+
+        self.products[1].name = 'Ghee 1 litre'
+        self.products[1].save()
+        response = self.client.get('/apiapp/products/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # A deletion leaves no newer updated_at behind, the count still changes
+        etag = response['ETag']
+        self.products[1].delete()
+        self.assertEqual(self.client.get('/apiapp/products/', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_sellers_depend_on_their_price_plans(self):
+        etag = self.client.get('/apiapp/sellers/')['ETag']
+        self.assertNotModified('/apiapp/sellers/', SellerSerializer, **{'If-None-Match': etag})
+
+        plan = PricePlan.objects.create(
+            name='Canal plan', valid_from=date(2026, 1, 1), valid_to=date(2026, 12, 31),
+            is_general=False, seller=self.seller,
+        )
+        ProductPrice.objects.create(price_plan=plan, product=self.products[0], price=Decimal('310.00'))
+        self.assertEqual(self.client.get('/apiapp/sellers/', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_delivery_report_revalidates_without_serializing(self):
+        params = {'route': self.route.pk, 'delivery_date': '2026-10-18'}
+        response = self.client.get('/apiapp/delivery-reports/', params)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotModified(
+                '/apiapp/delivery-reports/', DeliveryOrderSerializer, params, **{'If-None-Match': etag}
+            )
+        # One aggregate per queryset and source, whatever the number of rows
+        self.assertLessEqual(len(queries), 20)
+        self.assertNotModified(
+            '/apiapp/delivery-reports/', DeliveryOrderSerializer, params,
+            **{'If-Modified-Since': response['Last-Modified']},
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DeliveryOrderItem.objects.create(
+                delivery_order=self.order, product=self.products[0], ordered_quantity=Decimal('1.00'),
+                delivered_quantity=Decimal('1.00'), unit_price=Decimal('300.00'), total_price=Decimal('300.00'),
+            )
+        response = self.client.get('/apiapp/delivery-reports/', params, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['delivery_orders'][0]['items'][0]['product'], self.products[0].pk)
+
+
+class ReceiverScopeTests(SimpleTestCase):
+    """Receivers are connected per model, so models nobody listens to keep Django's bulk fast delete"""
+
+    def test_unwatched_models_are_fast_deleted(self):
+        for model in (CashDenomination, DeliveryExpense, SyncRequest):
+            with self.subTest(model=model.__name__):
+                self.assertTrue(Collector(using='default').can_fast_delete(model.objects.all()))
+
+
+class SyncWriteQueueTests(SimpleTestCase):
+    def test_sync_writes_take_turns_on_the_lock_file(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        events = []
+
+        def second_upload():
+            with sync_write_turn():
+                events.append('second')
+
+        with override_settings(SYNC_WRITE_LOCK=path):
+            with sync_write_turn():
+                # Re-entrant for the same thread, e.g. a queued job running a sync view
+                with sync_write_turn():
+                    pass
+                waiting = threading.Thread(target=second_upload)
+                waiting.start()
+                time.sleep(0.2)
+                events.append('first')
+            waiting.join(5)
+
+        self.assertEqual(events, ['first', 'second'])
+
+
+class QueryPlanTests(TestCase):
+    """List endpoints and the delivery report cost the same queries for one order as for many"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('planner')
+        cls.route = create_route('Plain')
+        cls.day = date(2026, 10, 18)
+        cls.products = create_products(['Paneer', 'Curd'], category='Paneer')
+        create_general_plan(cls.products)
+        cls.team = create_delivery_team(cls.route, cls.user)
+        cls.sellers = 0
+
+    def setUp(self):
+        # Rolling a test back sends no signals, so drop what it cached
+        clear_caches()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_orders(self, count):
+        """count more of everything the report and the order lists show, each with an item per product"""
+        for _ in range(count):
+            QueryPlanTests.sellers += 1
+            seller, = create_sellers(self.route, 1, name=f'Plain {self.sellers}')
+            # A route loads once a day, so the loading orders go back a day each
+            loading_date = self.day - timedelta(days=self.sellers - 1)
+            purchase_order = PurchaseOrder.objects.create(
+                delivery_team=self.team, route=self.route, delivery_date=loading_date,
+                created_by=self.user, updated_by=self.user,
+            )
+            loading_order = LoadingOrder.objects.create(
+                purchase_order=purchase_order, route=self.route, loading_date=loading_date,
+                loading_time='05:00', created_by=self.user, updated_by=self.user,
+            )
+            sales_order = SalesOrder.objects.create(
+                seller=seller, delivery_date=self.day, created_by=self.user, updated_by=self.user,
+            )
+            # The sales order opens the seller's delivery order for the day
+            delivery_order = DeliveryOrder.objects.get(sales_order=sales_order)
+            returned = ReturnedOrder.objects.create(
+                route=self.route, return_date=self.day, reason='Unsold', created_by=self.user, updated_by=self.user,
+            )
+            broken = BrokenOrder.objects.create(route=self.route, report_date=self.day)
+            sale = PublicSale.objects.create(
+                route=self.route, sale_date=self.day, sale_time='09:00', created_by=self.user, updated_by=self.user,
+            )
+            for product in self.products:
+                LoadingOrderItem.objects.create(loading_order=loading_order, product=product, loaded_quantity=5)
+                # Adds the item to the delivery order as well
+                OrderItem.objects.create(order=sales_order, product=product, quantity=2, unit_price=Decimal('10.00'))
+                ReturnedOrderItem.objects.create(returned_order=returned, product=product, quantity=1)
+                BrokenOrderItem.objects.create(broken_order=broken, product=product, quantity=1)
+                PublicSaleItem.objects.create(public_sale=sale, product=product, quantity=1, unit_price=Decimal('12.00'))
+            DeliveryExpense.objects.create(
+                delivery_team=self.team, route=self.route, expense_date=self.day, expense_type='fuel',
+                amount=Decimal('50.00'), created_by=self.user,
+            )
+            CashDenomination.objects.create(
+                delivery_order=delivery_order, route=self.route, delivery_date=self.day,
+                denomination=100, count=1, total_amount=Decimal('100.00'),
+            )
+
+    def assertQueriesDoNotGrow(self, url, params=None):
+        self.add_orders(1)
+        # Fills the catalog, route and price caches the endpoints share
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        # Still within one page of the paginated lists
+        self.add_orders(3)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(large), len(small), '\n'.join(query['sql'] for query in large.captured_queries)
+        )
+        return response
+
+    def test_delivery_orders(self):
+        response = self.assertQueriesDoNotGrow('/apiapp/orders/delivery/')
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual([item['product_name'] for item in response.data[0]['items']], ['Curd', 'Paneer'])
+
+    def test_sparse_delivery_orders(self):
+        self.assertQueriesDoNotGrow('/apiapp/orders/delivery/', {'catalog': 'sparse'})
+
+    def test_loading_orders(self):
+        response = self.assertQueriesDoNotGrow('/apiapp/orders/loading/')
+        self.assertEqual(response.data['results'][0]['items'][0]['unit_price'], '10.00')
+
+    def test_returned_orders(self):
+        self.assertQueriesDoNotGrow('/apiapp/orders/return/')
+
+    def test_broken_orders(self):
+        self.assertQueriesDoNotGrow('/apiapp/orders/broken/')
+
+    def test_public_sales(self):
+        self.assertQueriesDoNotGrow('/apiapp/orders/public_sale/')
+
+    def test_sales_orders(self):
+        self.assertQueriesDoNotGrow('/apiapp/orders/sales/')
+
+    def test_purchase_orders(self):
+        self.assertQueriesDoNotGrow('/apiapp/orders/purchase/')
+
+    def test_delivery_order_items(self):
+        self.assertQueriesDoNotGrow('/apiapp/orders/delivery-items/')
+
+    def test_delivery_report(self):
+        response = self.assertQueriesDoNotGrow(
+            '/apiapp/delivery-reports/', {'route': self.route.pk, 'delivery_date': '2026-10-18'}
+        )
+        self.assertEqual(len(response.data['delivery_orders']), 4)
+        self.assertEqual(response.data['delivery_expenses'][0]['delivery_team_name'], 'Team Plain')
@@ -62,6 +62,12 @@
     # Sync endpoints
     path('sync/', views.SyncView.as_view(), name='sync'),
     path('sync/status/', views.SyncStatusView.as_view(), name='sync-status'),
+    path('sync/jobs/<int:pk>/', views.SyncJobStatusView.as_view(), name='sync-job-status'),
+    path('sync/pull/', views.SyncPullView.as_view(), name='sync-pull'),
+    path('route-bundle/', views.RouteBundleView.as_view(), name='route-bundle'),
+
+    # Request metrics for Prometheus
+    path('metrics/', views.metrics, name='metrics'),
 
     # Individual sync endpoints
     path('sync/delivery-orders/', DeliveryOrderSyncView.as_view(), name='sync-delivery-orders'),
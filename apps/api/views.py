@@ -10,22 +10,34 @@
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.parsers import MultiPartParser, FormParser
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
 from django.db import models
 
 from django.contrib.auth import authenticate, login, logout
 from django.db import transaction
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags
 from datetime import datetime, date
 
 from decimal import Decimal
-import random
-from django.db import IntegrityError
+import gzip
+import logging
+from django.core.exceptions import ValidationError
 
+from apps.core.instrumentation import render_metrics
 from apps.seller.models import Seller, Route
 from apps.products.models import Product, PricePlan, ProductPrice, Category
+from apps.products.pricing import effective_prices_prefetch
 from apps.sales.models import SalesOrder
+from apps.delivery.rollups import order_slice, schedule_rollup_refresh
+from apps.delivery.reconciliation import invalidate_reconciliations, loading_order_reconciliation, loading_orders_of
+from apps.delivery.totals import recalculate_order_totals
 from apps.delivery.models import (
     PurchaseOrder,
     PurchaseOrderItem,
@@ -45,7 +57,8 @@
     Distributor,
     DeliveryTeamMember,
     DailyDeliveryTeam,
-    DeliveryLocation
+    DeliveryLocation,
+    DeliverySync
     # Payment
 )
 
@@ -83,6 +96,7 @@
     AdminSnapshotSerializer,
     OrderStatusHeatmapSerializer,
     BalanceAgingReportSerializer,
+    LoadingOrderReconciliationSerializer,
     ProductMovementChartSerializer,
     TopSellersSerializer,
     RoutePerformanceSerializer,
@@ -100,6 +114,14 @@
     PublicSaleFilter,
     # PaymentFilter
 )
+from .sync_pipeline import SyncPipeline
+from .idempotency import sync_key_for, get_replay, store_replay
+from .sync_jobs import wants_async, accept_sync_job
+from .write_queue import sync_write_turn
+from .delta_sync import parse_cursor, collect_changes
+from .route_bundle import get_route_bundle, invalidate_route_bundles
+from .conditional import ConditionalGetMixin, conditional_response, queryset_versions
+from . import analytics
 
 # Authentication Views
 from django.views.decorators.csrf import csrf_exempt
@@ -107,6 +129,9 @@
 from django.utils.decorators import method_decorator
 from apps.authentication.models import CustomUser, Role
 
+logger = logging.getLogger(__name__)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class LoginView(APIView):
     permission_classes = []
@@ -184,8 +209,12 @@ def post(self, request):
 #     ordering = ['name']
 #     pagination_class = None  # No pagination for master data
 
-class SellerViewSet(viewsets.ModelViewSet):
-    queryset = Seller.objects.all()
+class SellerViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Seller.objects.select_related('route').prefetch_related(
+        'price_plans__product_prices__product',
+        'price_plans__seller',
+        effective_prices_prefetch(),
+    )
     serializer_class = SellerSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -194,6 +223,8 @@ class SellerViewSet(viewsets.ModelViewSet):
     ordering_fields = ['store_name', 'route__name']
     ordering = ['store_name']
     pagination_class = PageNumberPagination
+    # Price plans bump their updated_at when their prices change; products for the names
+    conditional_sources = ('route', 'effective_prices', PricePlan, Product)
 
     def perform_create(self, serializer):
         instance = serializer.save(created_by=self.request.user, updated_by=self.request.user)
@@ -219,8 +250,8 @@ def perform_create(self, serializer):
     def perform_update(self, serializer):
         serializer.save(updated_by=self.request.user)
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.filter(is_active=True)
+class ProductViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.filter(is_active=True).select_related('category')
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -229,6 +260,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'code']
     ordering = ['name']
     pagination_class = None
+    conditional_sources = ('category',)
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -236,7 +268,7 @@ def perform_create(self, serializer):
     def perform_update(self, serializer):
         serializer.save(updated_by=self.request.user)
 
-class RouteViewSet(viewsets.ModelViewSet):
+class RouteViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
     permission_classes = [IsAuthenticated]
@@ -252,8 +284,8 @@ def perform_create(self, serializer):
     def perform_update(self, serializer):
         serializer.save(updated_by=self.request.user)
 
-class PricePlanViewSet(viewsets.ModelViewSet):
-    queryset = PricePlan.objects.all()
+class PricePlanViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = PricePlan.objects.select_related('seller').prefetch_related('product_prices__product')
     serializer_class = PricePlanSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -262,6 +294,7 @@ class PricePlanViewSet(viewsets.ModelViewSet):
     ordering = ['name']
     pagination_class = None
     parser_classes = (MultiPartParser, FormParser)  # Allow file uploads
+    conditional_sources = ('product_prices', 'seller', Product)
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -273,20 +306,28 @@ def create(self, request, *args, **kwargs):
 
         # Process the Excel file
         excel_file = request.FILES.get('excel_file')
+        import_report = None
         if excel_file:
             price_plan.excel_file = excel_file
             price_plan.save()
-            success = process_price_plan_excel(price_plan)
-            if not success:
+            import_report = process_price_plan_excel(price_plan)
+            if not import_report:
                 price_plan.delete()
                 return Response(
-                    {"success": False, "error": "Failed to process Excel file. Please check the format and try again."},
+                    {
+                        "success": False,
+                        "error": "Failed to process Excel file. Please check the format and try again.",
+                        "import_report": import_report.as_dict(),
+                    },
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
+        data = self.get_serializer(price_plan).data
+        if import_report is not None:
+            data['import_report'] = import_report.as_dict()
         headers = self.get_success_headers(serializer.data)
         return Response(
-            self.get_serializer(price_plan).data,
+            data,
             status=status.HTTP_201_CREATED,
             headers=headers
         )
@@ -295,7 +336,7 @@ def perform_update(self, serializer):
         serializer.save(updated_by=self.request.user)
 
 class ProductPriceViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = ProductPrice.objects.all()
+    queryset = ProductPrice.objects.select_related('product')
     serializer_class = ProductPriceSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -305,7 +346,7 @@ class ProductPriceViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None  # No pagination for master data
 
 class SalesOrderViewSet(viewsets.ModelViewSet):
-    queryset = SalesOrder.objects.all()
+    queryset = SalesOrder.objects.select_related('seller').prefetch_related('items__product')
     serializer_class = SalesOrderSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -331,7 +372,7 @@ def update(self, request, *args, **kwargs):
         return super().update(request, *args, **kwargs)
 
 class PurchaseOrderViewSet(viewsets.ModelViewSet):
-    queryset = PurchaseOrder.objects.all()
+    queryset = PurchaseOrder.objects.prefetch_related('items__product')
     serializer_class = PurchaseOrderSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -454,8 +495,9 @@ def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(purchase_order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class LoadingOrderViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = LoadingOrder.objects.all()
+class LoadingOrderViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    # Items with their product and parent loaded, so unit_price and product_name cost no queries
+    queryset = LoadingOrder.objects.select_related('route').prefetch_related('items__product')
     serializer_class = LoadingOrderSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -463,10 +505,24 @@ class LoadingOrderViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['order_number', 'route__name']
     ordering_fields = ['loading_date', 'route__name']
     ordering = ['-loading_date']
+    # Unit prices come from the general price plan
+    conditional_sources = ('route', 'items', Product, PricePlan)
+
+    @action(detail=True, methods=['get'])
+    def reconciliation(self, request, pk=None):
+        """Loaded, delivered, broken, returned, publicly sold and remaining quantity per product"""
+        loading_order = get_object_or_404(LoadingOrder.objects.only('route_id', 'loading_date'), pk=pk)
+        serializer = LoadingOrderReconciliationSerializer({
+            'loading_order': loading_order.pk,
+            'route': loading_order.route_id,
+            'loading_date': loading_order.loading_date,
+            'products': loading_order_reconciliation(loading_order),
+        })
+        return Response(serializer.data)
 
 # Delivery Operation Views
 class DeliveryOrderViewSet(viewsets.ModelViewSet):
-    queryset = DeliveryOrder.objects.all()
+    queryset = DeliveryOrder.objects.select_related('seller', 'route').prefetch_related('items__product')
     serializer_class = DeliveryOrderSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -476,6 +532,14 @@ class DeliveryOrderViewSet(viewsets.ModelViewSet):
     ordering = ['-delivery_date']
     pagination_class = None  # Disable pagination for this viewset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # Reads show the full catalog sheet the app works from (?catalog=sparse for stored rows only)
+        context['full_catalog'] = (
+            self.request.method == 'GET' and self.request.query_params.get('catalog') != 'sparse'
+        )
+        return context
+
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         # Set sync_status to 'pending' for offline-created records
@@ -485,7 +549,7 @@ def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
 class ReturnedOrderViewSet(viewsets.ModelViewSet):
-    queryset = ReturnedOrder.objects.all()
+    queryset = ReturnedOrder.objects.select_related('route').prefetch_related('items__product')
     serializer_class = ReturnedOrderSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -503,14 +567,14 @@ def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
 class BrokenOrderViewSet(viewsets.ModelViewSet):
-    queryset = BrokenOrder.objects.all()
+    queryset = BrokenOrder.objects.select_related('route').prefetch_related('items__product')
     serializer_class = BrokenOrderSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = BrokenOrderFilter
     search_fields = ['order_number', 'route__name']
-    ordering_fields = ['broken_date', 'route__name']
-    ordering = ['-broken_date']
+    ordering_fields = ['report_date', 'route__name']
+    ordering = ['-report_date']
 
     @transaction.atomic
     def create(self, request, *args, **kwargs):
@@ -521,7 +585,7 @@ def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
 class PublicSaleViewSet(viewsets.ModelViewSet):
-    queryset = PublicSale.objects.all()
+    queryset = PublicSale.objects.select_related('route').prefetch_related('items__product')
     serializer_class = PublicSaleSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -557,7 +621,7 @@ def create(self, request, *args, **kwargs):
 #         return super().create(request, *args, **kwargs)
 
 class DeliveryOrderItemViewSet(viewsets.ModelViewSet):
-    queryset = DeliveryOrderItem.objects.all()
+    queryset = DeliveryOrderItem.objects.select_related('product')
     serializer_class = DeliveryOrderItemSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -570,6 +634,14 @@ def get_queryset(self):
             queryset = queryset.filter(delivery_order_id=delivery_order_id)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # ?catalog=full: one row per active product, unsaved ones with id None
+        delivery_order_id = request.query_params.get('delivery_order')
+        if request.query_params.get('catalog') == 'full' and delivery_order_id:
+            delivery_order = get_object_or_404(DeliveryOrder, pk=delivery_order_id)
+            return Response(self.get_serializer(delivery_order.catalog_items(), many=True).data)
+        return super().list(request, *args, **kwargs)
+
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         # Set sync_status to 'pending' for offline-created records
@@ -595,6 +667,30 @@ def destroy(self, request, *args, **kwargs):
             )
         return super().destroy(request, *args, **kwargs)
 
+    # Written by bulk_update besides what the payload sets
+    BULK_UPDATE_FIELDS = {'unit_price', 'total_price', 'updated_at'}
+
+    def _bulk_serializer(self, items_data, instances=None, partial=False):
+        """Validate a list of items with their products looked up in one query"""
+        product_ids = {
+            item.get('product') for item in items_data
+            if isinstance(item, dict) and isinstance(item.get('product'), (int, str))
+        }
+        context = self.get_serializer_context()
+        context['prefetched'] = {Product: Product.objects.in_bulk(
+            [int(pk) for pk in product_ids if str(pk).isdigit()]
+        )}
+        return self.serializer_class(instances, data=items_data, many=True, partial=partial, context=context)
+
+    def _bulk_written(self, items):
+        """Recompute the totals of the orders these items belong to and refresh their rollups"""
+        orders = {item.delivery_order_id: item.delivery_order for item in items}
+        # bulk writes skip the item signals
+        schedule_rollup_refresh(order_slice(order) for order in orders.values())
+        invalidate_route_bundles(order_slice(order) for order in orders.values())
+        invalidate_reconciliations(loading_orders_of(orders.values()))
+        recalculate_order_totals(orders)
+
     @action(detail=False, methods=['post'])
     @transaction.atomic
     def bulk_create(self, request):
@@ -615,44 +711,36 @@ def bulk_create(self, request):
         delivery_order_id = list(delivery_order_ids)[0]
         try:
             delivery_order = DeliveryOrder.objects.get(id=delivery_order_id)
-        except DeliveryOrder.DoesNotExist:
+        except (DeliveryOrder.DoesNotExist, ValueError, TypeError):
             return Response(
                 {'detail': f'Delivery order with id {delivery_order_id} does not exist'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Process items
-        created_items = []
-        errors = []
-
-        for index, item_data in enumerate(items_data):
-            # Set sync_status to 'pending' for offline-created records
-            if request.data.get('is_offline', False):
-                item_data['sync_status'] = 'pending'
-
-            serializer = self.get_serializer(data=item_data)
-            if serializer.is_valid():
-                serializer.save()
-                created_items.append(serializer.data)
-            else:
-                errors.append({
-                    'index': index,
-                    'errors': serializer.errors
-                })
-
-        # If there were any errors, rollback and return the errors
-        if errors:
+        serializer = self._bulk_serializer(items_data)
+        if not serializer.is_valid():
             return Response({
                 'detail': 'Some items could not be created',
-                'errors': errors
+                'errors': [
+                    {'index': index, 'errors': errors}
+                    for index, errors in enumerate(serializer.errors) if errors
+                ]
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Recalculate delivery order totals
-        delivery_order.recalculate_totals()
+        items = []
+        for validated_data in serializer.validated_data:
+            item = DeliveryOrderItem(delivery_order=delivery_order, **validated_data)
+            # Set sync_status to 'pending' for offline-created records
+            if request.data.get('is_offline', False):
+                item.sync_status = 'pending'
+            item.apply_pricing()
+            items.append(item)
+        DeliveryOrderItem.objects.bulk_create(items)
+        self._bulk_written(items)
 
         return Response({
-            'detail': f'Successfully created {len(created_items)} items',
-            'items': created_items
+            'detail': f'Successfully created {len(items)} items',
+            'items': self.get_serializer(items, many=True).data
         }, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['put'])
@@ -671,55 +759,55 @@ def bulk_update(self, request):
                 'missing_ids_at_indices': missing_ids
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Process items
-        updated_items = []
-        errors = []
-        delivery_order_ids = set()
-
-        for index, item_data in enumerate(items_data):
-            try:
-                item = DeliveryOrderItem.objects.get(id=item_data['id'])
-                delivery_order_ids.add(item.delivery_order_id)
-
-                # Set sync_status to 'pending' for offline updates
-                if request.data.get('is_offline', False):
-                    item_data['sync_status'] = 'pending'
-
-                serializer = self.get_serializer(item, data=item_data, partial=True)
-                if serializer.is_valid():
-                    serializer.save()
-                    updated_items.append(serializer.data)
-                else:
-                    errors.append({
-                        'id': item_data['id'],
-                        'index': index,
-                        'errors': serializer.errors
-                    })
-            except DeliveryOrderItem.DoesNotExist:
-                errors.append({
-                    'id': item_data['id'],
-                    'index': index,
-                    'errors': {'detail': f'Item with id {item_data["id"]} does not exist'}
-                })
-
-        # If there were any errors, rollback and return the errors
+        existing = DeliveryOrderItem.objects.select_related('delivery_order', 'product').in_bulk(
+            [item['id'] for item in items_data if str(item['id']).isdigit()]
+        )
+        errors = [
+            {
+                'id': item_data['id'],
+                'index': index,
+                'errors': {'detail': f'Item with id {item_data["id"]} does not exist'}
+            }
+            for index, item_data in enumerate(items_data)
+            if not str(item_data['id']).isdigit() or int(item_data['id']) not in existing
+        ]
+        if not errors:
+            items = [existing[int(item_data['id'])] for item_data in items_data]
+            serializer = self._bulk_serializer(items_data, items, partial=True)
+            if not serializer.is_valid():
+                errors = [
+                    {'id': item_data['id'], 'index': index, 'errors': item_errors}
+                    for index, (item_data, item_errors) in enumerate(zip(items_data, serializer.errors))
+                    if item_errors
+                ]
+
+        # If there were any errors, nothing is written
         if errors:
             return Response({
                 'detail': 'Some items could not be updated',
                 'errors': errors
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Recalculate delivery order totals for all affected orders
-        for delivery_order_id in delivery_order_ids:
-            try:
-                delivery_order = DeliveryOrder.objects.get(id=delivery_order_id)
-                delivery_order.recalculate_totals()
-            except DeliveryOrder.DoesNotExist:
-                pass  # This shouldn't happen, but just in case
+        now = timezone.now()
+        update_fields = set(self.BULK_UPDATE_FIELDS)
+        # Set sync_status to 'pending' for offline updates
+        if request.data.get('is_offline', False):
+            update_fields.add('sync_status')
+        for item, validated_data in zip(items, serializer.validated_data):
+            for name, value in validated_data.items():
+                setattr(item, name, value)
+                update_fields.add(name)
+            if 'sync_status' in update_fields:
+                item.sync_status = 'pending'
+            item.updated_at = now
+            item.apply_pricing()
+        # An item listed twice is written once, with its last values
+        DeliveryOrderItem.objects.bulk_update(list({item.pk: item for item in items}.values()), sorted(update_fields))
+        self._bulk_written(items)
 
         return Response({
-            'detail': f'Successfully updated {len(updated_items)} items',
-            'items': updated_items
+            'detail': f'Successfully updated {len(items)} items',
+            'items': self.get_serializer(items, many=True).data
         })
 
 # Sync Views
@@ -766,7 +854,7 @@ def preprocess_data(self, data, user):
                 delivery_date = delivery_order.get('delivery_date')
                 route_id = delivery_order.get('route')
         except Exception as e:
-            print('No delivery orders provided in the request data.', e)
+            logger.debug('No delivery orders in the sync payload: %s', e)
         
         try:
             if 'loading_order' in processed_data:
@@ -781,7 +869,7 @@ def preprocess_data(self, data, user):
                     loading_order = LoadingOrderSerializer(loading_order).data
                     processed_data['loading_order'] = loading_order
         except Exception as e:
-            print('No loading order provided in the request data.', e)
+            logger.debug('No loading order in the sync payload: %s', e)
 
         # if 'delivery_orders' in processed_data:
 
@@ -835,7 +923,7 @@ def preprocess_data(self, data, user):
                 processed_data['route_id'] = route_id
                 processed_data['delivery_date'] = delivery_date
         except Exception as e:
-            print('No delivery orders provided in the request data.', e)
+            logger.debug('No delivery orders in the sync payload: %s', e)
 
         try:
             if 'loading_order' in processed_data:
@@ -850,14 +938,14 @@ def preprocess_data(self, data, user):
                     loading_order = LoadingOrderSerializer(loading_order).data
                     processed_data['loading_order'] = loading_order
         except Exception as e:
-            print('No loading order provided in the request data.', e)
+            logger.debug('No loading order in the sync payload: %s', e)
 
         try:
             route = Route.objects.get(id=route_id)
             processed_data['route'] = route
             processed_data['delivery_date'] = delivery_date
         except Exception as e:
-            print('No route provided in the request data.', e)
+            logger.debug('No route in the sync payload: %s', e)
 
         # Process delivery orders
         if 'delivery_orders' in processed_data:
@@ -871,7 +959,7 @@ def preprocess_data(self, data, user):
                     if key in unique_orders:
                         # This is a duplicate, mark it for removal
                         duplicate_indices.append(i)
-                        print(f"Found duplicate delivery order at index {i}: {key}")
+                        logger.info('Merging duplicate delivery order %s at index %s', key, i)
 
                         # Merge items if both orders have items
                         if 'items' in order and 'items' in unique_orders[key]:
@@ -883,7 +971,7 @@ def preprocess_data(self, data, user):
                                 if 'product' in item and item['product'] not in existing_product_ids:
                                     unique_orders[key]['items'].append(item)
                                     existing_product_ids.add(item['product'])
-                                    print(f"Added new product {item['product']} to merged order")
+                                    logger.debug('Added product %s to the merged order', item['product'])
                                 elif 'product' in item:
                                     # Update quantities for existing products
                                     for existing_item in unique_orders[key]['items']:
@@ -893,7 +981,7 @@ def preprocess_data(self, data, user):
                                                 existing_item['extra_quantity'] = max(existing_item['extra_quantity'], item['extra_quantity'])
                                             if 'ordered_quantity' in item and 'ordered_quantity' in existing_item:
                                                 existing_item['ordered_quantity'] = max(existing_item['ordered_quantity'], item['ordered_quantity'])
-                                            print(f"Updated quantities for product {item['product']} in merged order")
+                                            logger.debug('Updated quantities of product %s in the merged order', item['product'])
                                             break
                     else:
                         # This is a unique order
@@ -901,32 +989,35 @@ def preprocess_data(self, data, user):
 
             # Remove duplicates (in reverse order to avoid index shifting)
             for i in sorted(duplicate_indices, reverse=True):
-                print(f"Removing duplicate delivery order at index {i}")
+                logger.debug('Removing duplicate delivery order at index %s', i)
                 processed_data['delivery_orders'].pop(i)
 
-            # Now check for existing delivery orders in the database
-            for order in processed_data['delivery_orders']:
-                if 'route' in order and 'seller' in order and 'delivery_date' in order:
-                    try:
-                        # Check if this order already exists in the database
-                        existing_order = DeliveryOrder.objects.filter(
-                            route_id=order['route'],
-                            seller_id=order['seller'],
-                            delivery_date=order['delivery_date']
-                        ).first()
-
-                        if existing_order:
-                            print(f"Found existing delivery order in database: {existing_order.id}")
+            # Now check for existing delivery orders in the database, with one
+            # query for every (route, seller, delivery_date) in the upload
+            order_keys = [
+                order for order in processed_data['delivery_orders']
+                if 'route' in order and 'seller' in order and 'delivery_date' in order
+            ]
+            if order_keys:
+                try:
+                    existing_orders = {
+                        (route, seller, str(day)): order_id
+                        for order_id, route, seller, day in DeliveryOrder.objects.filter(
+                            route_id__in={order['route'] for order in order_keys},
+                            seller_id__in={order['seller'] for order in order_keys},
+                            delivery_date__in={order['delivery_date'] for order in order_keys},
+                        ).values_list('id', 'route_id', 'seller_id', 'delivery_date')
+                    }
+                    for order in order_keys:
+                        existing_id = existing_orders.get(
+                            (int(order['route']), int(order['seller']), str(order['delivery_date']))
+                        )
+                        if existing_id:
+                            logger.debug('Found existing delivery order %s', existing_id)
                             # Add the existing order ID to the data
-                            order['id'] = existing_order.id
-
-                            # If we have local_id in the data but not in the database, update it
-                            if 'local_id' in order and order['local_id'] and not existing_order.local_id:
-                                print(f"Updating local_id for existing order: {order['local_id']}")
-                                existing_order.local_id = order['local_id']
-                                existing_order.save(update_fields=['local_id'])
-                    except Exception as e:
-                        print(f"Error checking for existing delivery order: {e}")
+                            order['id'] = existing_id
+                except Exception:
+                    logger.warning('Could not look up existing delivery orders', exc_info=True)
 
             # Now process each order
             for order in processed_data['delivery_orders']:
@@ -954,16 +1045,17 @@ def preprocess_data(self, data, user):
                 
 
         if 'broken_orders' in processed_data:
+            loading_order = processed_data.get('loading_order')
             for order in processed_data['broken_orders']:
                 # Fix time formats
-                order['loading_order'] = loading_order.get('id')
+                order['loading_order'] = loading_order.get('id') if isinstance(loading_order, dict) else None
                 order['report_date'] = delivery_date
                 order['route'] = route_id
                 order['created_by'] = user.id
                 order['updated_by'] = user.id
 
-                for item in order['items']:
-                    item['product'] = item['product_id']
+                for item in order.get('items', []):
+                    item['product'] = item.get('product_id', item.get('product'))
 
         if 'return_orders' in processed_data:
             for order in processed_data['return_orders']:
@@ -977,10 +1069,17 @@ def preprocess_data(self, data, user):
 
         # Process expenses
         if 'expenses' in processed_data:
+            expense_delivery_team = None
+            if any('delivery_team' not in expense for expense in processed_data['expenses']):
+                loading_order = LoadingOrder.objects.filter(
+                    route_id=route_id, loading_date=delivery_date
+                ).select_related('purchase_order').first()
+                if loading_order and loading_order.purchase_order:
+                    expense_delivery_team = loading_order.purchase_order.delivery_team_id
             for expense in processed_data['expenses']:
                 # Always set route as PK and expense_date as ISO string
                 expense['route'] = int(route_id) if route_id else None
-                print('Route in expense: ', expense['route'])
+                logger.debug('Route in expense: %s', expense['route'])
                 if isinstance(delivery_date, date):
                     expense['expense_date'] = delivery_date.isoformat()
                 else:
@@ -993,12 +1092,11 @@ def preprocess_data(self, data, user):
                 if 'created_by' not in expense:
                     expense['created_by'] = user.id
                 if 'delivery_team' not in expense:
-                    loading_order = LoadingOrder.objects.filter(route_id=route_id, loading_date=delivery_date).first()
-                    expense['delivery_team'] = loading_order.purchase_order.delivery_team.id if loading_order else None
+                    expense['delivery_team'] = expense_delivery_team
 
         # Process denominations
         if 'denominations' in processed_data and isinstance(processed_data['denominations'], list):
-            print('Denominations:', processed_data['denominations'])
+            logger.debug('Denominations: %s', processed_data['denominations'])
             # If it's a list of lists, flatten it
             if processed_data['denominations'] and isinstance(processed_data['denominations'][0], list):
                 flattened = []
@@ -1008,11 +1106,11 @@ def preprocess_data(self, data, user):
                     else:
                         flattened.append(group)
                 processed_data['denominations'] = flattened
-                print('Flattened denominations:', processed_data['denominations'])
+                logger.debug('Flattened denominations: %s', processed_data['denominations'])
             for denomination in processed_data['denominations']:
                 # Always set route as PK and delivery_date as ISO string
                 denomination['route'] = int(route_id) if route_id else None
-                print('route in denomination: ', denomination['route'])
+                logger.debug('Route in denomination: %s', denomination['route'])
                 if isinstance(delivery_date, date):
                     denomination['delivery_date'] = delivery_date.isoformat()
                 else:
@@ -1034,19 +1132,44 @@ def preprocess_data(self, data, user):
         return processed_data
 
     def post(self, request):
+        # A retried upload gets the stored response instead of a second run
+        sync_key = sync_key_for(request)
+        replay = self.stored_response(request, sync_key)
+        if replay is not None:
+            return replay
+
+        if wants_async(request):
+            return accept_sync_job(request, 'combined')
+
+        # Only the run itself waits for its turn on the write lock
+        with sync_write_turn():
+            # An upload retried while the first attempt ran has queued behind it
+            replay = self.stored_response(request, sync_key)
+            if replay is not None:
+                return replay
+            return self.run_sync(request, sync_key)
+
+    def stored_response(self, request, sync_key):
+        replay = get_replay(request.user, sync_key)
+        if replay is None:
+            return None
+        logger.info('Replaying stored response for sync %s', sync_key)
+        response_data, status_code = replay
+        return Response(response_data, status=status_code, headers={'Idempotent-Replay': 'true'})
+
+    def run_sync(self, request, sync_key):
         try:
             user = request.user
             # Check if data is nested inside a 'data' key
             if 'data' in request.data:
                 data_to_process = request.data['data']
-                print('Found nested data structure, extracting data from "data" key')
+                logger.debug('Found nested data structure, extracting data from "data" key')
             else:
                 data_to_process = request.data
-                print('Using direct data structure')
+                logger.debug('Using direct data structure')
 
             # Pre-process the data to fix time formats and other issues before validation
             data_to_process = self.preprocess_data(data_to_process, user)
-            print('Preprocessed data:', data_to_process)
             route_id = None
             delivery_date = None
             if 'route' in data_to_process:
@@ -1058,833 +1181,23 @@ def post(self, request):
             if not delivery_date and 'delivery_orders' in data_to_process and data_to_process['delivery_orders']:
                 delivery_date = data_to_process['delivery_orders'][0].get('delivery_date')
 
-            # Instead of validating all data at once, we'll validate each section separately
-            # This way, if one section fails validation, we can still process the others
-            validated_data = {}
-
-            # Process delivery orders separately
-            if 'delivery_orders' in data_to_process:
-                print(f"Processing {len(data_to_process['delivery_orders'])} delivery orders")
-                valid_delivery_orders = []
-
-                for order_data in data_to_process['delivery_orders']:
-                    # Try to find existing order first
-                    existing_order = None
-
-                    # First, check if we have an ID in the order data (added during preprocessing)
-                    if 'id' in order_data:
-                        print(f"Searching for existing order by ID: {order_data['id']}")
-                        try:
-                            existing_order = DeliveryOrder.objects.get(id=order_data['id'])
-                            print(f"Found existing delivery order by ID: {existing_order.id}")
-                        except DeliveryOrder.DoesNotExist:
-                            print(f"No existing order found with ID: {order_data['id']}")
-
-                    # If not found by ID, try to find by local_id
-                    if not existing_order and 'local_id' in order_data and order_data['local_id']:
-                        print(f"Searching for existing order by local_id: {order_data['local_id']}")
-                        existing_order = DeliveryOrder.objects.filter(local_id=order_data['local_id']).first()
-                        if existing_order:
-                            print(f"Found existing delivery order by local_id: {existing_order.id}")
-
-                    # If not found by local_id, try to find by unique constraint fields
-                    if not existing_order and 'route' in order_data and 'seller' in order_data and 'delivery_date' in order_data:
-                        print(f"Searching for existing order by constraint fields:")
-                        print(f"  - route: {order_data['route']}")
-                        print(f"  - seller: {order_data['seller']}")
-                        print(f"  - delivery_date: {order_data['delivery_date']}")
-
-                        try:
-                            existing_order = DeliveryOrder.objects.filter(
-                                route_id=order_data['route'],
-                                seller_id=order_data['seller'],
-                                delivery_date=order_data['delivery_date']
-                            ).first()
-                            if existing_order:
-                                print(f"Found existing delivery order by constraint fields: {existing_order.id}")
-                                # Add the ID to the order data for future reference
-                                order_data['id'] = existing_order.id
-                        except Exception as e:
-                            print(f"Error finding existing delivery order: {e}")
-
-                    if existing_order:
-                        # Update existing order
-                        print(f"Updating existing delivery order: {existing_order.id}")
-
-                        # Check if there are any items in the order data
-                        if 'items' not in order_data or not order_data['items']:
-                            print("No items in order data, removing items field to avoid validation errors")
-                            # Remove items field to avoid validation errors
-                            order_data_copy = order_data.copy()
-                            if 'items' in order_data_copy:
-                                del order_data_copy['items']
-                        else:
-                            order_data_copy = order_data
-
-                        try:
-                            # Update the order directly using model instance
-                            for key, value in order_data_copy.items():
-                                # Skip id, route, seller, and delivery_date fields to maintain the unique constraint
-                                if key in ['id', 'route', 'seller', 'delivery_date']:
-                                    continue
-
-                                if key != 'items' and hasattr(existing_order, key):
-                                    # Handle foreign key fields
-                                    if key == 'sales_order' and isinstance(value, int):
-                                        try:
-                                            sales_order = SalesOrder.objects.get(id=value)
-                                            setattr(existing_order, key, sales_order)
-                                        except SalesOrder.DoesNotExist:
-                                            print(f"SalesOrder with id {value} does not exist")
-                                    else:
-                                        # For non-foreign key fields
-                                        setattr(existing_order, key, value)
-
-                            existing_order.sync_status = 'synced'
-                            existing_order.updated_by = user
-                            existing_order.save()
-
-                            # Process items separately
-                            if 'items' in order_data and order_data['items']:
-                                print(f"Processing {len(order_data['items'])} items for delivery order {existing_order.id}")
-
-                                # Get all existing items for this delivery order
-                                existing_items = {item.product_id: item for item in DeliveryOrderItem.objects.filter(delivery_order=existing_order)}
-                                print(f"Found {len(existing_items)} existing items in the database")
-
-                                for item_data in order_data['items']:
-                                    if 'product' in item_data:
-                                        product_id = item_data['product']
-
-                                        # Check if this product already exists in the delivery order
-                                        if product_id in existing_items:
-                                            # Update existing item
-                                            existing_item = existing_items[product_id]
-                                            print(f"Updating existing item for product {product_id}")
-
-                                            # Update fields - completely avoid any comparison or complex logic
-                                            # Just set the fields directly with minimal processing
-                                            for key, value in item_data.items():
-                                                if key != 'product' and hasattr(existing_item, key):
-                                                    try:
-                                                        # For quantity fields, convert to string with 2 decimal places
-                                                        if key in ['ordered_quantity', 'extra_quantity', 'delivered_quantity']:
-                                                            # Always convert to string to avoid type issues
-                                                            try:
-                                                                setattr(existing_item, key, Decimal(value or '0.00'))
-                                                            except (ValueError, TypeError):
-                                                                print(f"Invalid decimal value for {key}: {value}")
-                                                                setattr(existing_item, key, Decimal('0.00'))
-                                                        
-                                                        elif key == 'unit_price':
-                                                            try:
-                                                                setattr(existing_item, key, Decimal(value or '0.00'))
-                                                            except (ValueError, TypeError):
-                                                                print(f"Invalid decimal value for {key}: {value}")
-                                                                setattr(existing_item, key, Decimal('0.00'))
-                                                        elif key == 'total_price':
-                                                            try:
-                                                                setattr(existing_item, key, Decimal(value or '0.00'))
-                                                            except (ValueError, TypeError):
-                                                                print(f"Invalid decimal value for {key}: {value}")
-                                                                setattr(existing_item, key, Decimal('0.00'))
-                                                        else:
-                                                            # For non-quantity fields, set directly
-                                                            setattr(existing_item, key, value)
-                                                    except Exception as e:
-                                                        print(f"Error setting {key}: {e}, skipping")
-                                                        continue
-
-                                            existing_item.save()
-                                        else:
-                                            # Create new item
-                                            try:
-                                                # Get the product instance
-                                                product = Product.objects.get(id=product_id)
-                                                print(f"Creating new item for product {product_id}")
-
-                                                # Create new item with product instance
-                                                new_item = DeliveryOrderItem(
-                                                    delivery_order=existing_order,
-                                                    product=product
-                                                )
-
-                                                # Set other fields - use the same simplified approach as for updating
-                                                for key, value in item_data.items():
-                                                    if key != 'product' and hasattr(new_item, key):
-                                                        try:
-                                                            # For quantity fields, convert to string with 2 decimal places
-                                                            if key in ['ordered_quantity', 'extra_quantity', 'delivered_quantity']:
-                                                                # Always convert to string to avoid type issues
-                                                                try:
-                                                                    setattr(existing_item, key, Decimal(value or '0.00'))
-                                                                except (ValueError, TypeError):
-                                                                    print(f"Invalid decimal value for {key}: {value}")
-                                                                    setattr(existing_item, key, Decimal('0.00'))
-                                                            elif key == 'unit_price':
-                                                                try:
-                                                                    setattr(existing_item, key, Decimal(value or '0.00'))
-                                                                except (ValueError, TypeError):
-                                                                    print(f"Invalid decimal value for {key}: {value}")
-                                                                    setattr(existing_item, key, Decimal('0.00'))
-                                                            elif key == 'total_price':
-                                                                try:
-                                                                    setattr(existing_item, key, Decimal(value or '0.00'))
-                                                                except (ValueError, TypeError):
-                                                                    print(f"Invalid decimal value for {key}: {value}")
-                                                                    setattr(existing_item, key, Decimal('0.00'))
-                                                                else:
-                                                                    # For non-quantity fields, set directly
-                                                                    setattr(new_item, key, value)
-                                                        except Exception as e:
-                                                            print(f"Error setting {key}: {e}, skipping")
-                                                            continue
-
-                                                new_item.save()
-
-                                                # Add to existing items dict to avoid duplicates
-                                                existing_items[product_id] = new_item
-                                            except Product.DoesNotExist:
-                                                print(f"Product with id {product_id} does not exist")
-                                            except Exception as e:
-                                                print(f"Error creating delivery order item: {e}")
-
-                            # Add to valid orders
-                            valid_delivery_orders.append(existing_order)
-                            print(f"Successfully updated delivery order: {existing_order.id}")
-                        except Exception as e:
-                            print(f"Error updating delivery order: {e}")
-                    else:
-                        # Create new order
-                        print("Creating new delivery order")
-                        try:
-                            # Create the order directly using model
-                            new_order = DeliveryOrder(
-                                sync_status='synced',
-                                created_by=user,
-                                updated_by=user
-                            )
-
-                            # Set fields from order_data
-                            for key, value in order_data.items():
-                                if key != 'items' and hasattr(new_order, key):
-                                    # Handle foreign key fields
-                                    if key == 'route' and isinstance(value, int):
-                                        try:
-                                            route = Route.objects.get(id=value)
-                                            setattr(new_order, key, route)
-                                        except Route.DoesNotExist:
-                                            print(f"Route with id {value} does not exist")
-                                    elif key == 'seller' and isinstance(value, int):
-                                        try:
-                                            seller = Seller.objects.get(id=value)
-                                            setattr(new_order, key, seller)
-                                        except Seller.DoesNotExist:
-                                            print(f"Seller with id {value} does not exist")
-                                    elif key == 'sales_order' and isinstance(value, int):
-                                        try:
-                                            sales_order = SalesOrder.objects.get(id=value)
-                                            setattr(new_order, key, sales_order)
-                                        except SalesOrder.DoesNotExist:
-                                            print(f"SalesOrder with id {value} does not exist")
-                                    else:
-                                        # For non-foreign key fields
-                                        setattr(new_order, key, value)
-
-                            # Save the new order
-                            new_order.save()
-
-                            # Process items
-                            if 'items' in order_data and order_data['items']:
-                                print(f"Processing {len(order_data['items'])} items for new delivery order {new_order.id}")
-
-                                # Keep track of products we've already added
-                                added_products = set()
-
-                                for item_data in order_data['items']:
-                                    if 'product' in item_data:
-                                        product_id = item_data['product']
-
-                                        # Skip if we've already added this product
-                                        if product_id in added_products:
-                                            print(f"Skipping duplicate product {product_id}")
-                                            continue
-
-                                        try:
-                                            # Get the product instance
-                                            product = Product.objects.get(id=product_id)
-                                            print(f"Creating item for product {product_id}")
-
-                                            # Create new item with product instance
-                                            new_item = DeliveryOrderItem(
-                                                delivery_order=new_order,
-                                                product=product
-                                            )
-
-                                            # Set other fields - use the same simplified approach as for updating
-                                            for key, value in item_data.items():
-                                                if key != 'product' and hasattr(new_item, key):
-                                                    try:
-                                                        # For quantity fields, convert to string with 2 decimal places
-                                                        if key in ['ordered_quantity', 'extra_quantity', 'delivered_quantity']:
-                                                            # Always convert to string to avoid type issues
-                                                            if value is None or value == '':
-                                                                setattr(new_item, key, '0.00')
-                                                            else:
-                                                                # Simple string conversion
-                                                                setattr(new_item, key, str(value))
-                                                        else:
-                                                            # For non-quantity fields, set directly
-                                                            setattr(new_item, key, value)
-                                                    except Exception as e:
-                                                        print(f"Error setting {key}: {e}, skipping")
-                                                        continue
-
-                                            new_item.save()
-
-                                            # Mark this product as added
-                                            added_products.add(product_id)
-                                        except Product.DoesNotExist:
-                                            print(f"Product with id {product_id} does not exist")
-                                        except Exception as e:
-                                            print(f"Error creating delivery order item: {e}")
-
-                            # Add to valid orders
-                            valid_delivery_orders.append(new_order)
-                            print(f"Successfully created delivery order: {new_order.id}")
-                        except Exception as e:
-                            print(f"Error creating delivery order: {e}")
-
-            # Add valid delivery orders to validated data
-            validated_data['delivery_orders'] = valid_delivery_orders
+            # Each section is validated record by record, so one invalid record
+            # no longer drops the rest of its section
+            results = SyncPipeline(data_to_process, user, route=route_id, delivery_date=delivery_date).run()
+            for section, section_results in results.items():
+                errors = [result for result in section_results if result['status'] == 'error']
+                logger.info(
+                    'Synced %s: %s ok, %s errors', section, len(section_results) - len(errors), len(errors),
+                    extra={'section': section, 'ok': len(section_results) - len(errors), 'errors': len(errors)},
+                )
         except Exception as e:
-            print(f"Error during sync: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception('Sync failed')
             return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # For other sections, use the serializer as before
-        other_sections = ['return_orders', 'broken_orders', 'public_sales', 'expenses', 'denominations']
-        # print('Public sales: ', data_to_process.get('public_sales', []))
-        # print('Return orders: ', data_to_process.get('return_orders', []))
-        for section in other_sections:
-            if section in data_to_process:
-                section_serializer = None
-                if section == 'return_orders':
-                    returned_orders = ReturnedOrder.objects.filter(route=data_to_process['route'], return_date=data_to_process['delivery_date'])
-                    returned_orders.delete()                    
-                    section_serializer = ReturnedOrderSerializer(data=data_to_process[section], many=True)
-                elif section == 'broken_orders':
-                    broken_orders = BrokenOrder.objects.filter(route=data_to_process['route'], report_date=data_to_process['delivery_date'])
-                    broken_orders.delete()
-                    section_serializer = BrokenOrderSerializer(data=data_to_process[section], many=True)
-                elif section == 'public_sales':
-                    public_sales = PublicSale.objects.filter(route=data_to_process['route'], sale_date=data_to_process['delivery_date'])
-                    public_sales.delete()
-                    section_serializer = PublicSaleSerializer(data=data_to_process[section], many=True)
-                elif section == 'expenses':
-                    expenses = DeliveryExpense.objects.filter(route=data_to_process['route'], expense_date=data_to_process['delivery_date'])
-                    expenses.delete()
-                    section_serializer = DeliveryExpenseSerializer(data=data_to_process[section], many=True)
-                elif section == 'denominations':
-                    denominations = CashDenomination.objects.filter(route=data_to_process['route'], delivery_date=data_to_process['delivery_date'])
-                    denominations.delete()
-                    section_serializer = CashDenominationSerializer(data=data_to_process[section], many=True)
-
-                if section_serializer and section_serializer.is_valid():
-                    validated_data[section] = section_serializer.validated_data
-                else:
-                    print(f"Validation errors in {section}: {section_serializer.errors if section_serializer else 'No serializer'}")
-
-        # Create a dummy serializer for compatibility with the rest of the code
-        class DummySerializer:
-            def __init__(self, validated_data):
-                self.validated_data = validated_data
-
-        serializer = DummySerializer(validated_data)
-
-        # We've already processed delivery orders above, so we can skip this section
-        # Process other sections
-
-        # Process returned orders - check both 'returned_orders' and 'return_orders' keys
-        return_orders_key = 'returned_orders' if 'returned_orders' in serializer.validated_data else 'return_orders' if 'return_orders' in serializer.validated_data else None
-
-        if 'return_orders' in serializer.validated_data:
-            for order_data in serializer.validated_data[return_orders_key]:
-                # Ensure route is a primary key
-                if 'route' in order_data and not isinstance(order_data['route'], int):
-                    order_data['route'] = order_data['route'].id if hasattr(order_data['route'], 'id') else order_data['route']
-
-                # Process items to ensure product is a primary key
-                if 'items' in order_data:
-                    for item in order_data['items']:
-                        if 'product' in item and not isinstance(item['product'], int):
-                            item['product'] = item['product'].id if hasattr(item['product'], 'id') else item['product']
-
-                # Check if this returned order already exists by local_id
-                existing_order = None
-                if 'local_id' in order_data and order_data['local_id']:
-                    existing_order = ReturnedOrder.objects.filter(local_id=order_data['local_id']).first()
-                    if existing_order:
-                        print(f"Found existing returned order by local_id: {existing_order.id}")
-
-                if existing_order:
-                    # Update existing order
-                    returned_serializer = ReturnedOrderSerializer(existing_order, data=order_data, partial=True)
-                    if returned_serializer.is_valid():
-                        returned_serializer.save(sync_status='synced', updated_by=request.user)
-                        print(f"Successfully updated returned order: {existing_order.id}")
-                    else:
-                        print(f"Validation errors updating returned order: {returned_serializer.errors}")
-                        print(f"Data received: {order_data}")
-                        # Continue processing other orders instead of failing the whole request
-                        continue
-                else:
-                    # Create new order
-                    returned_serializer = ReturnedOrderSerializer(data=order_data)
-                    if returned_serializer.is_valid():
-                        returned_serializer.save(sync_status='synced', updated_by=request.user, created_by=request.user)
-                        print(f"Successfully created returned order")
-                    else:
-                        print(f"Validation errors creating returned order: {returned_serializer.errors}")
-                        print(f"Data received: {order_data}")
-                        # Continue processing other orders instead of failing the whole request
-                        continue
-        else:
-            print("Returned orders not provided in the request data.")
-
-        # Process broken orders
-        if 'broken_orders' in serializer.validated_data:
-            for order_data in serializer.validated_data['broken_orders']:
-                # Handle route_id vs route field
-                if 'route_id' in order_data and not 'route' in order_data:
-                    order_data['route'] = order_data['route_id']
-                    print(f"Mapped route_id {order_data['route_id']} to route field")
-
-                # Ensure route is a primary key
-                if 'route' in order_data and not isinstance(order_data['route'], int):
-                    try:
-                        order_data['route'] = int(order_data['route'])
-                        print(f"Converted route {order_data['route']} to integer")
-                    except (ValueError, TypeError):
-                        order_data['route'] = order_data['route'].id if hasattr(order_data['route'], 'id') else order_data['route']
-                        print(f"Used object id for route: {order_data['route']}")
-
-                # Map date field if needed
-                if 'date' in order_data and not 'report_date' in order_data:
-                    order_data['report_date'] = order_data['date']
-                    print(f"Mapped date {order_data['date']} to report_date field")
-
-                # Set report_time if not provided
-                if not 'report_time' in order_data:
-                    order_data['report_time'] = datetime.now().strftime('%H:%M:%S')
-                    print(f"Set default report_time: {order_data['report_time']}")
-
-                # Ensure route_id is mapped to route
-                if 'route_id' in order_data and not 'route' in order_data:
-                    order_data['route'] = order_data['route_id']
-                    print(f"Mapped route_id {order_data['route_id']} to route field")
-
-                # Process items to ensure product is a primary key
-                if 'items' in order_data:
-                    processed_items = []
-                    for item in order_data['items']:
-                        # Create a new item dictionary to avoid modifying the original
-                        processed_item = {}
-
-                        # Handle different field names in the payload
-                        if 'product_id' in item and not 'product' in item:
-                            # Map product_id to product
-                            processed_item['product'] = item['product_id']
-                            print(f"Mapped product_id {item['product_id']} to product field")
-                        elif 'product' in item:
-                            processed_item['product'] = item['product']
-                        else:
-                            # If neither product nor product_id is present, log an error
-                            print(f"Error: No product or product_id found in item: {item}")
-                            # Try to find any field that might contain the product ID
-                            for key, value in item.items():
-                                if 'product' in key.lower() and isinstance(value, (int, str)):
-                                    processed_item['product'] = value
-                                    print(f"Found potential product ID in field {key}: {value}")
-                                    break
-
-                        # Ensure product is an integer
-                        if 'product' in processed_item and not isinstance(processed_item['product'], int):
-                            try:
-                                processed_item['product'] = int(processed_item['product'])
-                                print(f"Converted product {processed_item['product']} to integer")
-                            except (ValueError, TypeError):
-                                processed_item['product'] = processed_item['product'].id if hasattr(processed_item['product'], 'id') else processed_item['product']
-                                print(f"Used object id for product: {processed_item['product']}")
-
-                        # Map quantity field if needed
-                        if 'quantity' in item:
-                            processed_item['quantity'] = item['quantity']
-                            print(f"Set quantity to {item['quantity']}")
-
-                        # Add product_name for reference
-                        if 'product_name' in item:
-                            processed_item['product_name'] = item['product_name']
-
-                        # Add the processed item to the list
-                        processed_items.append(processed_item)
-
-                    # Replace the original items with the processed ones
-                    order_data['items'] = processed_items
-
-                # Check if this broken order already exists by id or local_id
-                existing_order = None
-
-                # First check by id field (which might be used as local_id in the mobile app)
-                if 'id' in order_data and order_data['id']:
-                    existing_order = BrokenOrder.objects.filter(local_id=str(order_data['id'])).first()
-                    if existing_order:
-                        print(f"Found existing broken order by id as local_id: {existing_order.id}")
-
-                # Then check by local_id if not found
-                if not existing_order and 'local_id' in order_data and order_data['local_id']:
-                    existing_order = BrokenOrder.objects.filter(local_id=order_data['local_id']).first()
-                    if existing_order:
-                        print(f"Found existing broken order by local_id: {existing_order.id}")
-
-                if existing_order:
-                    # Update existing order
-                    broken_serializer = BrokenOrderSerializer(existing_order, data=order_data, partial=True)
-                    if broken_serializer.is_valid():
-                        # Set the local_id if it's not already set
-                        if 'id' in order_data and order_data['id'] and not existing_order.local_id:
-                            existing_order.local_id = str(order_data['id'])
-                            existing_order.save(update_fields=['local_id'])
-                            print(f"Updated local_id for existing broken order: {existing_order.id}")
-
-                        broken_serializer.save(sync_status='synced', updated_by=request.user)
-                        print(f"Successfully updated broken order: {existing_order.id}")
-                    else:
-                        print(f"Validation errors updating broken order: {broken_serializer.errors}")
-                        print(f"Data received: {order_data}")
-                        # Continue processing other orders instead of failing the whole request
-                        continue
-                else:
-                    # Create new order
-                    # Set the local_id from the id field if available
-                    if 'id' in order_data and order_data['id']:
-                        order_data['local_id'] = str(order_data['id'])
-                        print(f"Set local_id from id: {order_data['local_id']}")
-
-                    # Always generate a unique order_number for new BrokenOrder records, ignoring any value from the payload
-                    today = datetime.now().strftime('%Y%m%d')
-                    base_order_number = f"BO-{today}"
-                    random_suffix = random.randint(1000, 9999)
-                    generated_order_number = f"{base_order_number}-{random_suffix}"
-                    order_data['order_number'] = generated_order_number
-                    print(f"Trying order number: {order_data['order_number']}")
-                    broken_serializer = BrokenOrderSerializer(data=order_data)
-                    if broken_serializer.is_valid():
-                        try:
-                            new_broken_order = broken_serializer.save(sync_status='synced', updated_by=request.user, created_by=request.user)
-                            print(f"Successfully created broken order: {new_broken_order.id}, report_date: {new_broken_order.report_date}")
-                            print("BrokenOrder count after creation:", BrokenOrder.objects.filter(report_date=new_broken_order.report_date).count())
-                            break
-                        except IntegrityError as e:
-                            print(f"IntegrityError on attempt {attempt+1}: {e}")
-                            continue  # Try again with a new random number
-                    else:
-                        print(f"Validation errors creating broken order: {broken_serializer.errors}")
-                        print(f"Data received: {order_data}")
-                        # Continue processing other orders instead of failing the whole request
-                        continue
-        else:
-            print("Broken orders not provided in the request data.")
-
-        # Process public sales
-        if 'public_sales' in serializer.validated_data:
-            for sale_data in serializer.validated_data['public_sales']:
-                # Fix sale_time format
-                if 'sale_time' in sale_data and sale_data['sale_time']:
-                    try:
-                        # First, check if it's a datetime string with space
-                        if isinstance(sale_data['sale_time'], str) and ' ' in sale_data['sale_time']:
-                            # Extract just the time part
-                            time_part = sale_data['sale_time'].split(' ')[1]
-                            # Parse the time part
-                            time_obj = datetime.strptime(time_part, '%H:%M:%S').time()
-                            # Format as HH:MM:SS
-                            sale_data['sale_time'] = time_obj.strftime('%H:%M:%S')
-                        else:
-                            # Try to parse as datetime
-                            dt = datetime.strptime(str(sale_data['sale_time']), '%Y-%m-%d %H:%M:%S')
-                            sale_data['sale_time'] = dt.time().strftime('%H:%M:%S')
-                    except (ValueError, TypeError):
-                        try:
-                            # Try to parse as time
-                            dt = datetime.strptime(str(sale_data['sale_time']), '%H:%M:%S')
-                            sale_data['sale_time'] = dt.strftime('%H:%M:%S')
-                        except (ValueError, TypeError):
-                            # If all else fails, set to a default time
-                            sale_data['sale_time'] = '00:00:00'
-
-                # Ensure route and product are primary keys
-                if 'route' in sale_data and not isinstance(sale_data['route'], int):
-                    sale_data['route'] = sale_data['route'].id if hasattr(sale_data['route'], 'id') else sale_data['route']
-
-                # Process items to ensure product is a primary key
-                if 'items' in sale_data:
-                    for item in sale_data['items']:
-                        if 'product' in item and not isinstance(item['product'], int):
-                            item['product'] = item['product'].id if hasattr(item['product'], 'id') else item['product']
-
-                # Check if this public sale already exists by local_id
-                existing_sale = None
-                if 'local_id' in sale_data and sale_data['local_id']:
-                    existing_sale = PublicSale.objects.filter(local_id=sale_data['local_id']).first()
-                    if existing_sale:
-                        print(f"Found existing public sale by local_id: {existing_sale.id}")
-
-                if existing_sale:
-                    # Update existing sale
-                    sale_serializer = PublicSaleSerializer(existing_sale, data=sale_data, partial=True)
-                    if sale_serializer.is_valid():
-                        sale_serializer.save(sync_status='synced', updated_by=request.user)
-                        print(f"Successfully updated public sale: {existing_sale.id}")
-                    else:
-                        # Print detailed error information
-                        print(f"Validation errors updating public sale: {sale_serializer.errors}")
-                        print(f"Data received: {sale_data}")
-                        # Continue processing other sales instead of failing the whole request
-                        continue
-                else:
-                    # Create new sale
-                    sale_serializer = PublicSaleSerializer(data=sale_data)
-                    if sale_serializer.is_valid():
-                        sale_serializer.save(sync_status='synced', updated_by=request.user, created_by=request.user)
-                        print(f"Successfully created public sale")
-                    else:
-                        # Print detailed error information
-                        print(f"Validation errors creating public sale: {sale_serializer.errors}")
-                        print(f"Data received: {sale_data}")
-                        # Continue processing other sales instead of failing the whole request
-                        continue
-
-        else:
-            print("Public sales not provided in the request data.")
-
-        # Process expenses
-        if 'expenses' in serializer.validated_data:
-            print('Expenses: ', serializer.validated_data['expenses'])
-            for expense_data in serializer.validated_data['expenses']:
-                # Ensure route is a PK
-                if 'route' in expense_data and hasattr(expense_data['route'], 'pk'):
-                    expense_data['route'] = expense_data['route'].pk
-                elif 'route' in expense_data and expense_data['route'] is not None:
-                    expense_data['route'] = int(expense_data['route'])
-                else:
-                    try:
-                        expense_data['route'] = int(route_id) if route_id else None
-                    except Exception as e:
-                        print(f"Error setting route for expense: {e}")
-                        expense_data['route'] = data_to_process['route_id']
-                        print('added route_id')
-                        print('route id:' , data_to_process['route_id'])
-                    
-                # Ensure expense_date is a string
-                if 'expense_date' in expense_data and isinstance(expense_data['expense_date'], date):
-                    expense_data['expense_date'] = expense_data['expense_date'].isoformat()
-                elif 'expense_date' not in expense_data:
-                    expense_data['expense_date'] = delivery_date if isinstance(delivery_date, str) else delivery_date.isoformat()
-                # Find the delivery team for the route
-                route_id_exp = expense_data.get('route', None)
-                expense_date_val = expense_data.get('expense_date', None)
-                print('Expense date: ', expense_date_val)
-
-                # If we don't have a date, use the first delivery order's date
-                if not expense_date_val and 'delivery_orders' in serializer.validated_data and serializer.validated_data['delivery_orders']:
-                    try:
-                        expense_date_val = serializer.validated_data['delivery_orders'][0].get('delivery_date')
-                    except Exception as e:
-                        print(f"Error getting delivery date from delivery order: {e}")
-                        try:
-                            expense_date_val = serializer.validated_data['delivery_orders'][0].delivery_date    
-                        except Exception as e:
-                            print(f"Error getting delivery date from delivery order: {e}")
-                            expense_date_val = serializer.validated_data['expenses'][0].get('expense_date', None)
-                    
-
-                # Find the delivery team for this route
-                delivery_team = None
-                loading_order_number = data_to_process['loading_order']['order_number']
-                try:
-                    loading_order = LoadingOrder.objects.get(id=int(loading_order_number))
-                    delivery_team = loading_order.purchase_order.delivery_team.id
-                    print(f"Using delivery team {delivery_team} from loading order {loading_order_number}")
-                except Exception as e:
-                    print(f"Error getting delivery team from loading order: {e}")
-                if route_id_exp:
-                    # Try to find a loading order for this route and date
-                    loading_order = LoadingOrder.objects.filter(route_id=route_id_exp, loading_date=expense_date_val).first()
-                    if loading_order and loading_order.purchase_order and loading_order.purchase_order.delivery_team:
-                        delivery_team = loading_order.purchase_order.delivery_team.id
-                    else:
-                        # Fallback: find any delivery team assigned to this route
-                        delivery_team_obj = DeliveryTeam.objects.filter(routes__id=route_id_exp).first()
-                        if delivery_team_obj:
-                            delivery_team = delivery_team_obj.id
-                        else:
-                            # Last resort: use the first delivery team
-                            first_team = DeliveryTeam.objects.first()
-                            if first_team:
-                                delivery_team = first_team.id
-
-                # Map expense fields to match the model
-                mapped_expense_data = {
-                    'delivery_team': delivery_team,
-                    'expense_date': expense_date_val,
-                    'route': route_id_exp,
-                    'expense_type': 'other',  # Default to 'other' and map if possible
-                    'amount': expense_data.get('amount', None),
-                    'notes': expense_data.get('description', None),
-                    'local_id': expense_data.get('local_id', None),
-                    'sync_status': 'synced'
-                }
-                print(f"mapped_expense_data: {mapped_expense_data}")
-
-                print(f"Before expense type mapping: {expense_data.get('expense_type')}")
-                # Map expense type
-                expense_type = expense_data.get('expense_type', '').lower() if expense_data.get('expense_type') else ''
-                # Map expense types to valid choices in the model
-                if expense_type == 'fuel':
-                    mapped_expense_data['expense_type'] = 'fuel'
-                elif expense_type == 'food':
-                    mapped_expense_data['expense_type'] = 'food'
-                elif expense_type in ['vehicle', 'maintenance', 'repairs', 'repair']:
-                    # Map all vehicle-related expenses to 'vehicle'
-                    mapped_expense_data['expense_type'] = 'vehicle'
-                else:
-                    # Default to 'other' for any unrecognized expense types
-                    mapped_expense_data['expense_type'] = 'other'
-                    print(f"Mapped unknown expense type '{expense_type}' to 'other'")
-
-                print(f"Mapped expense type from '{expense_type}' to '{mapped_expense_data['expense_type']}'")
-
-                print(f"After expense type mapping: {mapped_expense_data['expense_type']}")
-
-                print(f"Mapped expense data: {mapped_expense_data}")
-
-                # Skip if we couldn't find a delivery team
-                if not mapped_expense_data['delivery_team']:
-                    print(f"Skipping expense due to missing delivery team: {expense_data}")
-                    continue
-
-                # Add created_by to the data directly
-                # This is needed because the serializer requires it
-                mapped_expense_data['created_by'] = request.user.id
-
-                print(f"Final expense data with created_by: {mapped_expense_data}")
-
-                # Check if this expense already exists by local_id
-                existing_expense = None
-                if 'local_id' in mapped_expense_data and mapped_expense_data['local_id']:
-                    existing_expense = DeliveryExpense.objects.filter(local_id=mapped_expense_data['local_id']).first()
-                    if existing_expense:
-                        print(f"Found existing expense by local_id: {existing_expense.id}")
-
-                if existing_expense:
-                    # Update existing expense
-                    expense_serializer = DeliveryExpenseSerializer(existing_expense, data=mapped_expense_data, partial=True)
-                    if expense_serializer.is_valid():
-                        expense_serializer.save(sync_status='synced')
-                        print(f"Successfully updated expense: {existing_expense.id}")
-                    else:
-                        print(f"Validation errors updating expense: {expense_serializer.errors}")
-                        print(f"Data received: {mapped_expense_data}")
-                        # Continue processing other expenses instead of failing the whole request
-                        continue
-                else:
-                    # Create new expense
-                    expense_serializer = DeliveryExpenseSerializer(data=mapped_expense_data)
-                    if expense_serializer.is_valid():
-                        expense_serializer.save(sync_status='synced')
-                        print(f"Successfully created expense: {expense_serializer.data}")
-                    else:
-                        print(f"Validation errors creating expense: {expense_serializer.errors}")
-                        print(f"Data received: {mapped_expense_data}")
-                        # Continue processing other expenses instead of failing the whole request
-                        continue
-
-        else:
-            print("Expenses not provided in the request data.")
-
-        # Process denominations
-        if 'denominations' in serializer.validated_data:
-            for denomination_data in serializer.validated_data['denominations']:
-                # Ensure route is a PK
-                if 'route' in denomination_data and hasattr(denomination_data['route'], 'pk'):
-                    denomination_data['route'] = denomination_data['route'].pk
-                elif 'route' in denomination_data and denomination_data['route'] is not None:
-                    denomination_data['route'] = int(denomination_data['route'])
-                else:
-                    denomination_data['route'] = int(route_id) if route_id else None
-                # Ensure delivery_date is a string
-                if 'delivery_date' in denomination_data and isinstance(denomination_data['delivery_date'], date):
-                    denomination_data['delivery_date'] = denomination_data['delivery_date'].isoformat()
-                elif 'delivery_date' not in denomination_data:
-                    denomination_data['delivery_date'] = delivery_date if isinstance(delivery_date, str) else delivery_date.isoformat()
-                # Ensure delivery_order is a PK if present
-                if 'delivery_order' in denomination_data and hasattr(denomination_data['delivery_order'], 'pk'):
-                    denomination_data['delivery_order'] = denomination_data['delivery_order'].pk
-
-                # Try to find existing denomination by local_id
-                existing_denomination = None
-                if 'local_id' in denomination_data and denomination_data['local_id']:
-                    existing_denomination = CashDenomination.objects.filter(local_id=denomination_data['local_id']).first()
-                    if existing_denomination:
-                        print(f"Found existing denomination by local_id: {existing_denomination.id}")
-
-                if existing_denomination:
-                    # Update existing denomination
-                    denomination_serializer = CashDenominationSerializer(existing_denomination, data=denomination_data, partial=True)
-                    if denomination_serializer.is_valid():
-                        denomination_serializer.save(sync_status='synced')
-                        print(f"Successfully updated denomination: {existing_denomination.id}")
-                    else:
-                        print(f"Validation errors updating denomination: {denomination_serializer.errors}")
-                        print(f"Data received: {denomination_data}")
-                        continue
-                else:
-                    # Create new denomination
-                    denomination_serializer = CashDenominationSerializer(data=denomination_data)
-                    if denomination_serializer.is_valid():
-                        denomination_serializer.save(sync_status='synced')
-                        print(f"Successfully created denomination")
-                    else:
-                        print(f"Validation errors creating denomination: {denomination_serializer.errors}")
-                        print(f"Data received: {denomination_data}")
-                        continue
-        else:
-            print("Denominations not provided in the request data.")
-
-        # Process payments
-        # Commented out until Payment model is implemented
-        # if 'payments' in serializer.validated_data:
-        #     for payment_data in serializer.validated_data['payments']:
-        #         payment_serializer = PaymentSerializer(data=payment_data)
-        #         if payment_serializer.is_valid():
-        #             payment_serializer.save(sync_status='synced')
-        #         else:
-        #             return Response(payment_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-            # Update last sync time for the user
-            request.user.profile.last_sync = timezone.now()
-            request.user.profile.save()
-
-        return Response({'status': 'success', 'message': 'Data synchronized successfully'}, status=status.HTTP_200_OK)
-
-        # Add logging at the end of the post method
-        try:
-            # Use delivery_date from earlier in the method if available
-            print("BrokenOrder count at end of POST:", BrokenOrder.objects.filter(report_date=delivery_date).count())
-        except Exception as e:
-            print(f"Error logging BrokenOrder count at end of POST: {e}")
+        # Only completed syncs are stored, so a failed upload can simply be retried
+        response_data = {'status': 'success', 'message': 'Data synchronized successfully'}
+        store_replay(request.user, sync_key, response_data, status.HTTP_200_OK)
+        return Response(response_data, status=status.HTTP_200_OK)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class SyncStatusView(APIView):
@@ -1927,6 +1240,81 @@ def get(self, request):
         serializer = SyncStatusSerializer(data)
         return Response(serializer.data)
 
+@method_decorator(csrf_exempt, name='dispatch')
+class SyncJobStatusView(APIView):
+    """Poll a sync upload accepted with ?async=1"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(DeliverySync, pk=pk, created_by=request.user)
+        return Response({
+            'job_id': job.pk,
+            'sync_type': job.sync_type,
+            'status': job.status,
+            'error_message': job.error_message,
+            'result': job.response,
+            'created_at': job.created_at,
+            'updated_at': job.updated_at,
+        })
+
+@method_decorator(csrf_exempt, name='dispatch')
+class SyncPullView(APIView):
+    """
+    Master data (routes, products, price plans, sellers) changed since
+    ?cursor=<value from the previous pull>; no cursor returns everything
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        cursor = parse_cursor(request.query_params.get('cursor'))
+        return Response(collect_changes(cursor, context={'request': request}))
+
+class RouteBundleView(APIView):
+    """
+    Everything a driver needs offline for ?route=<id> on ?date=YYYY-MM-DD
+    (default today) in one precomputed document (apps/api/route_bundle.py).
+    Sent gzip-compressed to clients that accept it; If-None-Match with the
+    bundle's ETag answers 304.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        route_id = str(request.query_params.get('route', '')).strip()
+        if not route_id.isdigit():
+            return Response({'detail': 'route must be a route id'}, status=status.HTTP_400_BAD_REQUEST)
+        route = get_object_or_404(Route, pk=route_id)
+        delivery_date = timezone.localdate()
+        if request.query_params.get('date'):
+            delivery_date = parse_date(request.query_params['date'])
+            if delivery_date is None:
+                return Response({'detail': 'date must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+
+        bundle = get_route_bundle(route, delivery_date)
+        if bundle.etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(bytes(bundle.payload), content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(bundle.payload), content_type='application/json')
+        response['ETag'] = bundle.etag
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
+def metrics(request):
+    """
+    This process's request metrics (apps/core/instrumentation.py) in the
+    Prometheus text format, for staff sessions or a scraper sending
+    Authorization: Bearer <METRICS_TOKEN>
+    """
+    token = settings.METRICS_TOKEN
+    if not (token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')):
+        if not request.user.is_staff:
+            return HttpResponse('Forbidden', status=status.HTTP_403_FORBIDDEN, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # @login_required
 # def check_purchase_order(request):
 #     route_id = request.GET.get('route')
@@ -2123,7 +1511,7 @@ def get(self, request):
 
 
 class DeliveryTeamViewSet(viewsets.ModelViewSet):
-    queryset = DeliveryTeam.objects.all()
+    queryset = DeliveryTeam.objects.select_related('route', 'distributor')
     serializer_class = DeliveryTeamSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -2149,7 +1537,7 @@ def perform_update(self, serializer):
         serializer.save(updated_by=self.request.user)
 
 class DeliveryTeamMemberViewSet(viewsets.ModelViewSet):
-    queryset = DeliveryTeamMember.objects.all()
+    queryset = DeliveryTeamMember.objects.select_related('user', 'delivery_team')
     serializer_class = DeliveryTeamMemberSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -2159,7 +1547,9 @@ class DeliveryTeamMemberViewSet(viewsets.ModelViewSet):
     pagination_class = None
 
 class DailyDeliveryTeamViewSet(viewsets.ModelViewSet):
-    queryset = DailyDeliveryTeam.objects.all()
+    queryset = DailyDeliveryTeam.objects.select_related(
+        'delivery_team', 'route', 'driver__user', 'supervisor__user', 'delivery_man__user'
+    )
     serializer_class = DailyDeliveryTeamSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -2184,51 +1574,53 @@ def get(self, request, *args, **kwargs):
         if not route_id or not delivery_date:
             return Response({'error': 'route and delivery_date are required'}, status=400)
 
-        # 1. LoadingOrder(s)
-        loading_orders = LoadingOrder.objects.filter(route_id=route_id, loading_date=delivery_date)
-        loading_orders_data = LoadingOrderSerializer(loading_orders, many=True).data
-
-        # 2. DeliveryOrder(s)
-        delivery_orders = DeliveryOrder.objects.filter(route_id=route_id, delivery_date=delivery_date)
-        delivery_orders_data = DeliveryOrderSerializer(delivery_orders, many=True).data
-
-        # 3. ReturnedOrder(s)
-        returned_orders = ReturnedOrder.objects.filter(route_id=route_id, return_date=delivery_date)
-        returned_orders_data = ReturnedOrderSerializer(returned_orders, many=True).data
-
-        # 4. CashDenomination(s)
+        # The same related-object plans as the viewsets serving these serializers,
+        # so the report costs a fixed number of queries however busy the day was
+        loading_orders = LoadingOrderViewSet.queryset.filter(route_id=route_id, loading_date=delivery_date)
+        delivery_orders = DeliveryOrderViewSet.queryset.filter(route_id=route_id, delivery_date=delivery_date)
+        returned_orders = ReturnedOrderViewSet.queryset.filter(route_id=route_id, return_date=delivery_date)
         cash_denominations = CashDenomination.objects.filter(route_id=route_id, delivery_date=delivery_date)
-        cash_denominations_data = CashDenominationSerializer(cash_denominations, many=True).data
-
-        # 5. DeliveryExpense(s)
-        delivery_expenses = DeliveryExpense.objects.filter(route_id=route_id, expense_date=delivery_date)
-        delivery_expenses_data = DeliveryExpenseSerializer(delivery_expenses, many=True).data
-
-        # 6. PublicSale(s)
-        public_sales = PublicSale.objects.filter(route_id=route_id, sale_date=delivery_date)
-        public_sales_data = PublicSaleSerializer(public_sales, many=True).data
+        delivery_expenses = DeliveryExpense.objects.select_related('delivery_team').filter(
+            route_id=route_id, expense_date=delivery_date
+        )
+        public_sales = PublicSaleViewSet.queryset.filter(route_id=route_id, sale_date=delivery_date)
+        broken_orders = BrokenOrderViewSet.queryset.filter(route_id=route_id, report_date=delivery_date)
 
-        # 7. BrokenOrder(s)
-        broken_orders = BrokenOrder.objects.filter(route_id=route_id, report_date=delivery_date)
-        broken_orders_data = BrokenOrderSerializer(broken_orders, many=True).data
+        try:
+            versions = [
+                *queryset_versions(loading_orders, ('items',)),
+                *queryset_versions(delivery_orders, ('items', 'seller')),
+                *queryset_versions(returned_orders, ('items',)),
+                *queryset_versions(cash_denominations),
+                *queryset_versions(delivery_expenses, ('delivery_team',)),
+                *queryset_versions(public_sales, ('items',)),
+                *queryset_versions(broken_orders, ('items',)),
+                *queryset_versions(Route.objects.filter(id=route_id)),
+                # Product names and the general prices of loading order items
+                *queryset_versions(Product.objects.all()),
+                *queryset_versions(PricePlan.objects.all()),
+            ]
+        except (ValueError, ValidationError):
+            return Response({'error': 'Invalid route or delivery_date'}, status=400)
+
+        def respond():
+            # Route details (optional, for context)
+            route_obj = Route.objects.filter(id=route_id).first()
+            route_data = RouteSerializer(route_obj).data if route_obj else None
 
-        # Route details (optional, for context)
-        from apps.seller.models import Route
-        route_obj = Route.objects.filter(id=route_id).first()
-        from .serializers import RouteSerializer
-        route_data = RouteSerializer(route_obj).data if route_obj else None
+            return Response({
+                'route': route_data,
+                'delivery_date': delivery_date,
+                'loading_orders': LoadingOrderSerializer(loading_orders, many=True).data,
+                'delivery_orders': DeliveryOrderSerializer(delivery_orders, many=True).data,
+                'returned_orders': ReturnedOrderSerializer(returned_orders, many=True).data,
+                'cash_denominations': CashDenominationSerializer(cash_denominations, many=True).data,
+                'delivery_expenses': DeliveryExpenseSerializer(delivery_expenses, many=True).data,
+                'public_sales': PublicSaleSerializer(public_sales, many=True).data,
+                'broken_orders': BrokenOrderSerializer(broken_orders, many=True).data,
+            })
 
-        return Response({
-            'route': route_data,
-            'delivery_date': delivery_date,
-            'loading_orders': loading_orders_data,
-            'delivery_orders': delivery_orders_data,
-            'returned_orders': returned_orders_data,
-            'cash_denominations': cash_denominations_data,
-            'delivery_expenses': delivery_expenses_data,
-            'public_sales': public_sales_data,
-            'broken_orders': broken_orders_data,
-        })
+        return conditional_response(request, versions, respond)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class AdminSnapshotAPIView(APIView):
@@ -2298,226 +1690,94 @@ def get(self, request):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class BalanceAgingReportAPIView(APIView):
+    """
+    Overdue balances per seller. Query parameters: period (week|month|buckets,
+    where buckets ages them 0-7, 8-30, 31-60 and 60+ days), seller_id,
+    route_id and page / page_size, which page over sellers.
+    """
     permission_classes = [IsAuthenticated]
+    PERIODS = ('week', 'month', 'buckets')
 
     def get(self, request):
         period = request.query_params.get('period', 'week')
-        today = timezone.now().date()
-
-        # Only consider orders with overdue balances (total_balance > 0 and delivery_date < today)
-        overdue_orders = DeliveryOrder.objects.filter(total_balance__gt=0, delivery_date__lt=today)
-
-        from collections import defaultdict
-        from django.db.models.functions import TruncWeek, TruncMonth
-        from django.db.models import Sum
-
-        sellers = {}
-        if period == 'month':
-            # Group by seller and month
-            orders = overdue_orders.annotate(period=TruncMonth('delivery_date'))
-        else:
-            # Default: group by seller and week
-            orders = overdue_orders.annotate(period=TruncWeek('delivery_date'))
-
-        # Aggregate balances by seller and period
-        seller_period_balances = defaultdict(lambda: defaultdict(lambda: 0))
-        seller_names = {}
-        for order in orders.select_related('seller'):
-            seller_id = order.seller_id
-            seller_name = order.seller.store_name if order.seller else str(seller_id)
-            seller_names[seller_id] = seller_name
-            period_label = order.period.strftime('%Y-%m') if period == 'month' else order.period.strftime('%Y-%W')
-            seller_period_balances[seller_id][period_label] += float(order.total_balance)
-
-        # Build sellers list
-        sellers_list = []
-        for seller_id, periods in seller_period_balances.items():
-            total_balance = sum(periods.values())
-            sellers_list.append({
-                'seller_id': seller_id,
-                'seller_name': seller_names[seller_id],
-                'total_balance': total_balance,
-                'overdue_breakdown': periods
-            })
+        if period not in self.PERIODS:
+            return Response({'error': f"Invalid period. Use one of: {', '.join(self.PERIODS)}."}, status=400)
+
+        as_of = timezone.now().date()
+        sellers, pagination = analytics.balance_aging(
+            period,
+            as_of,
+            seller_id=request.query_params.get('seller_id'),
+            route_id=request.query_params.get('route_id'),
+            page=request.query_params.get('page', 1),
+            page_size=request.query_params.get('page_size', analytics.ANALYTICS_PAGE_SIZE),
+        )
 
         data = {
             'period': period,
-            'sellers': sellers_list,
+            'as_of': as_of,
+            'pagination': pagination,
+            'sellers': sellers,
         }
         serializer = BalanceAgingReportSerializer(data)
         return Response(serializer.data)
 
-@method_decorator(csrf_exempt, name='dispatch')
-class ProductMovementChartAPIView(APIView):
+class AnalyticsAPIView(APIView):
+    """
+    Base for the grouped analytics endpoints. Query parameters: period
+    (week|month|year), start_date / end_date (YYYY-MM-DD) and page / page_size,
+    which page over the groups (products, sellers, routes).
+    """
     permission_classes = [IsAuthenticated]
+    analytics_function = None
+    results_key = None
+    serializer_class = None
 
     def get(self, request):
         period = request.query_params.get('period', 'week')
-
-        from collections import defaultdict
-        from django.db.models.functions import TruncWeek, TruncMonth
-        from django.db.models import Sum, F
-
-        # Join DeliveryOrderItem with DeliveryOrder for delivery_date
-        if period == 'month':
-            items = DeliveryOrderItem.objects.select_related('product', 'delivery_order').annotate(period=TruncMonth('delivery_order__delivery_date'))
-        else:
-            items = DeliveryOrderItem.objects.select_related('product', 'delivery_order').annotate(period=TruncWeek('delivery_order__delivery_date'))
-
-        # Aggregate by product and period
-        product_period_qty = defaultdict(lambda: defaultdict(lambda: 0))
-        product_period_value = defaultdict(lambda: defaultdict(lambda: 0))
-        product_names = {}
-        for item in items:
-            product_id = item.product_id
-            product_name = item.product.name if item.product else str(product_id)
-            product_names[product_id] = product_name
-            period_label = item.period.strftime('%Y-%m') if period == 'month' else item.period.strftime('%Y-%W')
-            product_period_qty[product_id][period_label] += float(item.delivered_quantity)
-            product_period_value[product_id][period_label] += float(item.total_price)
-
-        # Build products list
-        products_list = []
-        for product_id in product_period_qty:
-            total_quantity = sum(product_period_qty[product_id].values())
-            total_value = sum(product_period_value[product_id].values())
-            products_list.append({
-                'product_id': product_id,
-                'product_name': product_names[product_id],
-                'total_quantity': total_quantity,
-                'total_value': total_value,
-                'movement_breakdown': {
-                    'quantity': product_period_qty[product_id],
-                    'value': product_period_value[product_id],
-                }
-            })
+        try:
+            start_date, end_date = analytics.parse_date_bounds(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        results, pagination = self.analytics_function(
+            period,
+            start_date,
+            end_date,
+            page=request.query_params.get('page', 1),
+            page_size=request.query_params.get('page_size', analytics.ANALYTICS_PAGE_SIZE),
+        )
 
         data = {
             'period': period,
-            'products': products_list,
+            'start_date': start_date,
+            'end_date': end_date,
+            'pagination': pagination,
+            self.results_key: results,
         }
-        serializer = ProductMovementChartSerializer(data)
+        serializer = self.serializer_class(data)
         return Response(serializer.data)
 
 @method_decorator(csrf_exempt, name='dispatch')
-class TopSellersAPIView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
-        period = request.query_params.get('period', 'week')
-
-        from collections import defaultdict
-        from django.db.models.functions import TruncWeek, TruncMonth
-        from django.db.models import Sum, F
-
-        # Join DeliveryOrderItem with DeliveryOrder for delivery_date and seller
-        if period == 'month':
-            items = DeliveryOrderItem.objects.select_related('delivery_order', 'product').annotate(period=TruncMonth('delivery_order__delivery_date'))
-        else:
-            items = DeliveryOrderItem.objects.select_related('delivery_order', 'product').annotate(period=TruncWeek('delivery_order__delivery_date'))
-
-        # Aggregate by seller and period
-        seller_period_qty = defaultdict(lambda: defaultdict(lambda: 0))
-        seller_period_value = defaultdict(lambda: defaultdict(lambda: 0))
-        seller_names = {}
-        for item in items:
-            delivery_order = item.delivery_order
-            if not delivery_order or not delivery_order.seller:
-                continue
-            seller_id = delivery_order.seller_id
-            seller_name = delivery_order.seller.store_name
-            seller_names[seller_id] = seller_name
-            period_label = item.period.strftime('%Y-%m') if period == 'month' else item.period.strftime('%Y-%W')
-            seller_period_qty[seller_id][period_label] += float(item.delivered_quantity)
-            seller_period_value[seller_id][period_label] += float(item.total_price)
-
-        # Build sellers list
-        sellers_list = []
-        for seller_id in seller_period_qty:
-            total_quantity = sum(seller_period_qty[seller_id].values())
-            total_value = sum(seller_period_value[seller_id].values())
-            sellers_list.append({
-                'seller_id': seller_id,
-                'seller_name': seller_names[seller_id],
-                'total_quantity': total_quantity,
-                'total_value': total_value,
-                'delivery_breakdown': {
-                    'quantity': seller_period_qty[seller_id],
-                    'value': seller_period_value[seller_id],
-                }
-            })
-
-        # Sort by total_quantity descending
-        sellers_list.sort(key=lambda x: x['total_quantity'], reverse=True)
-
-        data = {
-            'period': period,
-            'sellers': sellers_list,
-        }
-        serializer = TopSellersSerializer(data)
-        return Response(serializer.data)
+class ProductMovementChartAPIView(AnalyticsAPIView):
+    analytics_function = staticmethod(analytics.product_movement)
+    results_key = 'products'
+    serializer_class = ProductMovementChartSerializer
 
 @method_decorator(csrf_exempt, name='dispatch')
-class RoutePerformanceAPIView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
-        period = request.query_params.get('period', 'week')
-
-        from collections import defaultdict
-        from django.db.models.functions import TruncWeek, TruncMonth
-        from django.db.models import Sum, Count, Q
-
-        # Annotate DeliveryOrder with period
-        if period == 'month':
-            orders = DeliveryOrder.objects.select_related('route').annotate(period=TruncMonth('delivery_date'))
-        else:
-            orders = DeliveryOrder.objects.select_related('route').annotate(period=TruncWeek('delivery_date'))
-
-        # Aggregate by route and period
-        route_period_stats = defaultdict(lambda: defaultdict(lambda: {'total_deliveries': 0, 'on_time_deliveries': 0, 'total_delivered_quantity': 0}))
-        route_names = {}
-        for order in orders:
-            route_id = order.route_id
-            route_name = order.route.name if order.route else str(route_id)
-            route_names[route_id] = route_name
-            period_label = order.period.strftime('%Y-%m') if period == 'month' else order.period.strftime('%Y-%W')
-            route_period_stats[route_id][period_label]['total_deliveries'] += 1
-            if order.actual_delivery_date and order.actual_delivery_date == order.delivery_date:
-                route_period_stats[route_id][period_label]['on_time_deliveries'] += 1
-            # Sum delivered_quantity from items
-            delivered_qty = order.items.aggregate(total=Sum('delivered_quantity'))['total'] or 0
-            route_period_stats[route_id][period_label]['total_delivered_quantity'] += float(delivered_qty)
-
-        # Build routes list
-        routes_list = []
-        for route_id in route_period_stats:
-            total_deliveries = sum(stats['total_deliveries'] for stats in route_period_stats[route_id].values())
-            on_time_deliveries = sum(stats['on_time_deliveries'] for stats in route_period_stats[route_id].values())
-            total_delivered_quantity = sum(stats['total_delivered_quantity'] for stats in route_period_stats[route_id].values())
-            on_time_percent = (on_time_deliveries / total_deliveries * 100) if total_deliveries else 0
-            routes_list.append({
-                'route_id': route_id,
-                'route_name': route_names[route_id],
-                'total_deliveries': total_deliveries,
-                'on_time_deliveries': on_time_deliveries,
-                'on_time_percent': round(on_time_percent, 2),
-                'total_delivered_quantity': total_delivered_quantity,
-                'performance_breakdown': route_period_stats[route_id],
-            })
-
-        # Sort by total_deliveries descending
-        routes_list.sort(key=lambda x: x['total_deliveries'], reverse=True)
+class TopSellersAPIView(AnalyticsAPIView):
+    analytics_function = staticmethod(analytics.top_sellers)
+    results_key = 'sellers'
+    serializer_class = TopSellersSerializer
 
-        data = {
-            'period': period,
-            'routes': routes_list,
-        }
-        serializer = RoutePerformanceSerializer(data)
-        return Response(serializer.data)
+@method_decorator(csrf_exempt, name='dispatch')
+class RoutePerformanceAPIView(AnalyticsAPIView):
+    analytics_function = staticmethod(analytics.route_performance)
+    results_key = 'routes'
+    serializer_class = RoutePerformanceSerializer
 
 class DeliveryLocationViewSet(viewsets.ModelViewSet):
-    queryset = DeliveryLocation.objects.all()
+    queryset = DeliveryLocation.objects.select_related('seller', 'route', 'delivery_order', 'created_by')
     serializer_class = DeliveryLocationSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
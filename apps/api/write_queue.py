@@ -0,0 +1,65 @@
+"""
+One sync upload writing at a time, for single-node SQLite deployments.
+
+SQLite has a single writer. Several gunicorn workers or sync worker
+processes running long sync transactions at once then mostly wait on
+each other inside SQLite, where they can still time out with "database
+is locked". With SYNC_WRITE_LOCK set (tuned SQLite, see
+config/databases.py) the sync views first take an exclusive lock on that
+file, outside any transaction, so uploads queue in the kernel instead
+and a transaction only begins once it is its turn. Reads do not take the
+lock, and in WAL mode they are not blocked by the writer either.
+
+Without SYNC_WRITE_LOCK, or where fcntl is unavailable, this does nothing.
+"""
+import functools
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .sync_jobs import wants_async
+
+try:
+    import fcntl
+except ImportError:  # Windows: SQLite's own busy timeout still applies
+    fcntl = None
+
+_held = threading.local()
+
+
+@contextmanager
+def sync_write_turn():
+    """Wait for and hold the sync write lock; re-entrant within a thread"""
+    path = getattr(settings, 'SYNC_WRITE_LOCK', None)
+    if not path or fcntl is None or getattr(_held, 'depth', 0):
+        _held.depth = getattr(_held, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            _held.depth -= 1
+        return
+
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        _held.depth = 1
+        try:
+            yield
+        finally:
+            _held.depth = 0
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def serialize_sync_writes(post):
+    """
+    Run a sync view's post() in its turn. Goes outside @transaction.atomic,
+    so the lock is held before the transaction begins. An async submit only
+    queues a job (apps/api/sync_jobs.py) and does not wait for the lock.
+    """
+    @functools.wraps(post)
+    def wrapper(view, request, *args, **kwargs):
+        if wants_async(request):
+            return post(view, request, *args, **kwargs)
+        with sync_write_turn():
+            return post(view, request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,75 @@
+"""
+Namespaced, versioned entries in the configured Django cache (CACHES in
+config/settings.py: locmem, file or Redis).
+
+Every entry belongs to one or more namespaces ('routes', 'products',
+'price_plans'). Each namespace has a version number kept in the cache
+itself and every key embeds the versions it was built from, so
+invalidating a namespace is a single increment: older entries are never
+read again and expire on their own. With a shared backend (file, Redis) an
+invalidation in one worker is seen by all of them.
+
+Invalidation is driven by model signals (apps/products/signals.py,
+apps/seller/signals.py) and by the bulk write paths that bypass them.
+"""
+import time
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+_MISSING = object()
+
+
+def _version_key(namespace):
+    return f'ns:{namespace}'
+
+
+def _new_version():
+    # Never repeats a number an evicted version key may have had
+    return time.time_ns()
+
+
+def namespace_versions(namespaces):
+    """Current version of each namespace, starting the missing ones"""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            cache.add(key, _new_version(), timeout=None)
+            version = cache.get(key)
+        versions.append(version)
+    return versions
+
+
+def _bump(namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            cache.set(_version_key(namespace), _new_version(), timeout=None)
+
+
+def invalidate(*namespaces):
+    """Make every entry under these namespaces stale"""
+    _bump(namespaces)
+    # Bump again after the commit so an entry built mid-transaction is not kept
+    transaction.on_commit(lambda: _bump(namespaces))
+
+
+def cached(namespaces, key, build, timeout=DEFAULT_TIMEOUT):
+    """
+    The entry for key under these namespaces, calling build() and storing
+    its result on a miss. None is a valid, cached result.
+    """
+    if isinstance(namespaces, str):
+        namespaces = (namespaces,)
+    versions = namespace_versions(namespaces)
+    full_key = ':'.join([*(f'{namespace}.{version}' for namespace, version in zip(namespaces, versions)), key])
+    value = cache.get(full_key, _MISSING)
+    if value is _MISSING:
+        value = build()
+        cache.set(full_key, value, timeout)
+    return value
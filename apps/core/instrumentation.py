@@ -0,0 +1,248 @@
+"""
+Per-request instrumentation. RequestMetricsMiddleware times every request
+and, while it runs, every SQL query (through connection.execute_wrapper)
+and every DRF serializer's .data / .is_valid(). The measurements go into
+per-view histograms, which /apiapp/metrics/ serves in the Prometheus text
+format:
+
+    request_seconds     wall time until the response is returned
+    db_queries          SQL statements run
+    db_seconds          time spent in them
+    python_seconds      the rest, request_seconds - db_seconds
+    serializer_seconds  time in serializers, including the queries they
+                        trigger (lazy relations show up here)
+
+Views are labelled by URL name, so ids in the path do not multiply the
+series. Requests slower than SLOW_REQUEST_MS are logged with the queries
+that cost the most; identical SQL is grouped, so an N+1 loop appears as
+one statement run many times.
+
+The histograms live in process memory: each worker reports its own.
+"""
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'dairy_http'
+
+# Upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+MEASURES = (
+    ('request_seconds', SECONDS_BUCKETS, 'Wall time of a request'),
+    ('db_queries', QUERY_BUCKETS, 'SQL statements run by a request'),
+    ('db_seconds', SECONDS_BUCKETS, 'Time a request spent in SQL'),
+    ('python_seconds', SECONDS_BUCKETS, 'Time a request spent outside SQL'),
+    ('serializer_seconds', SECONDS_BUCKETS, 'Time a request spent in DRF serializers'),
+)
+
+# Slowest statements listed in a slow request log entry
+SLOW_REQUEST_TOP_QUERIES = 5
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+_lock = threading.Lock()
+# (view, method) -> {measure: Histogram}
+_histograms = {}
+# (view, method, status) -> requests
+_responses = {}
+
+
+def record(view, method, status_code, values):
+    with _lock:
+        histograms = _histograms.get((view, method))
+        if histograms is None:
+            histograms = _histograms[(view, method)] = {
+                name: Histogram(buckets) for name, buckets, _ in MEASURES
+            }
+        for name, value in values.items():
+            histograms[name].observe(value)
+        key = (view, method, str(status_code))
+        _responses[key] = _responses.get(key, 0) + 1
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_label(value)}"' for name, value in labels.items())
+
+
+def render_metrics():
+    """Everything recorded by this process, in the Prometheus text exposition format"""
+    with _lock:
+        histograms = {key: {name: (list(h.cumulative()), h.sum, h.count) for name, h in measures.items()}
+                      for key, measures in _histograms.items()}
+        responses = dict(_responses)
+
+    lines = [
+        f'# HELP {PREFIX}_responses_total Responses by view, method and status',
+        f'# TYPE {PREFIX}_responses_total counter',
+    ]
+    for (view, method, status_code), count in sorted(responses.items()):
+        lines.append(f'{PREFIX}_responses_total{{{_labels(view=view, method=method, status=status_code)}}} {count}')
+
+    for name, _, description in MEASURES:
+        metric = f'{PREFIX}_{name}'
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} histogram']
+        for (view, method), measures in sorted(histograms.items()):
+            buckets, total, count = measures[name]
+            labels = _labels(view=view, method=method)
+            for bound, cumulative in buckets:
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{metric}_count{{{labels}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    """What one request did so far"""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+        # sql -> [runs, seconds]
+        self.statements = {}
+
+
+_current = threading.local()
+
+
+def current_stats():
+    """The RequestStats of the request this thread is serving, or None"""
+    return getattr(_current, 'stats', None)
+
+
+def _time_query(execute, sql, params, many, context):
+    stats = current_stats()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+        runs = stats.statements.setdefault(sql, [0, 0.0])
+        runs[0] += 1
+        runs[1] += elapsed
+
+
+@contextmanager
+def serializer_timer():
+    """Count the enclosed time as serializer time; nested serializers count once"""
+    stats = current_stats()
+    if stats is None:
+        yield
+        return
+    stats.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer_depth -= 1
+        if not stats.serializer_depth:
+            stats.serializer_seconds += time.perf_counter() - started
+
+
+_serializers_timed = False
+
+
+def _time_serializers():
+    """Wrap BaseSerializer.data and .is_valid(), which every DRF serializer goes through"""
+    global _serializers_timed
+    if _serializers_timed:
+        return
+    from rest_framework.serializers import BaseSerializer
+
+    data = BaseSerializer.data.fget
+    is_valid = BaseSerializer.is_valid
+
+    def timed_data(self):
+        with serializer_timer():
+            return data(self)
+
+    @functools.wraps(is_valid)
+    def timed_is_valid(self, *args, **kwargs):
+        with serializer_timer():
+            return is_valid(self, *args, **kwargs)
+
+    BaseSerializer.data = property(timed_data)
+    BaseSerializer.is_valid = timed_is_valid
+    _serializers_timed = True
+
+
+def _log_slow_request(request, view, elapsed, stats):
+    top = sorted(stats.statements.items(), key=lambda item: item[1][1], reverse=True)[:SLOW_REQUEST_TOP_QUERIES]
+    lines = [
+        f'Slow request {request.method} {request.path} ({view}): {elapsed * 1000:.0f} ms, '
+        f'{stats.db_queries} queries in {stats.db_seconds * 1000:.0f} ms, '
+        f'serializers {stats.serializer_seconds * 1000:.0f} ms'
+    ]
+    for sql, (runs, seconds) in top:
+        lines.append(f'  {seconds * 1000:.1f} ms over {runs} run(s): {sql[:500]}')
+    logger.warning('\n'.join(lines))
+
+
+class RequestMetricsMiddleware:
+    """Goes first in MIDDLEWARE so the other middleware is measured too"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _time_serializers()
+
+    def __call__(self, request):
+        stats = _current.stats = RequestStats()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_time_query))
+                response = self.get_response(request)
+        finally:
+            _current.stats = None
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        record(view, request.method, response.status_code, {
+            'request_seconds': elapsed,
+            'db_queries': stats.db_queries,
+            'db_seconds': stats.db_seconds,
+            'python_seconds': max(elapsed - stats.db_seconds, 0.0),
+            'serializer_seconds': stats.serializer_seconds,
+        })
+        if elapsed * 1000 >= settings.SLOW_REQUEST_MS:
+            _log_slow_request(request, view, elapsed, stats)
+        return response
@@ -0,0 +1,89 @@
+"""
+Logging for the apps. Every module logs through logging.getLogger(__name__),
+so under the "apps" or "web_project" logger, which settings.LOGGING sends to
+stderr. Records are one JSON object per line by default (LOG_FORMAT=text for
+development), and each carries the id of the request it belongs to.
+
+The per-record traces of the sync and order views log at DEBUG. LOG_LEVEL
+defaults to INFO, so they cost one level check each. When DEBUG is turned
+on, LOG_DEBUG_SAMPLE_RATE keeps only that fraction of debug records, which
+is still enough to follow a problem in a busy hour. Warnings and errors
+are never sampled.
+
+Pass structured fields with extra={...}; they become keys of the JSON
+object.
+"""
+import contextvars
+import json
+import logging
+import random
+import re
+import uuid
+
+# Id of the request being served, set by RequestIdMiddleware
+request_id = contextvars.ContextVar('request_id', default='-')
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# A client-supplied X-Request-ID is kept only if it looks like an id
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id"""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class DebugSampleFilter(logging.Filter):
+    """Keep a `rate` fraction of DEBUG records and everything above DEBUG"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestIdMiddleware:
+    """
+    Give each request an id for its log records: the client's X-Request-ID
+    (a proxy or the app retrying) or a new one, echoed in the response
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.headers.get('X-Request-ID', '')
+        current = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        token = request_id.set(current)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response['X-Request-ID'] = current
+        return response
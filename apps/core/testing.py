@@ -0,0 +1,103 @@
+"""
+Builders for the fixtures the apps' tests share: users, a route and its
+sellers, products, a general price plan and a delivery team. Codes,
+mobile numbers and e-mail addresses are numbered, so a test can build as
+many as it needs.
+
+Also the test runner (TEST_RUNNER in config/settings.py), which gives the
+test run a cache of its own.
+"""
+from datetime import date
+from decimal import Decimal
+from itertools import count
+
+from django.core.cache import cache
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from apps.authentication.models import CustomUser
+from apps.delivery.models import DeliveryTeam, Distributor
+from apps.products.models import Category, PricePlan, Product, ProductPrice
+from apps.products.pricing import recheck_prices_version
+from apps.seller.models import Route, Seller
+
+_serial = count(1)
+
+
+def create_user(username, role='ADMIN', **fields):
+    return CustomUser.objects.create_user(
+        username=username, password='secret', email=f'{username}@example.com',
+        mobile_number=f'90{next(_serial):08d}', first_name=username.title(), last_name='Tester', role=role,
+        **fields,
+    )
+
+
+def create_route(name):
+    return Route.objects.create(name=name, code=f'R{next(_serial)}')
+
+
+def create_sellers(route, number, name=None):
+    """number sellers on the route, stores named '<name> 0', '<name> 1', ..."""
+    name = name or route.name
+    return [
+        Seller.objects.create(
+            first_name=name, last_name=str(i), mobileno=f'96{next(_serial):08d}',
+            store_name=f'{name} {i}', store_address=f'{name} road', route=route,
+        )
+        for i in range(number)
+    ]
+
+
+def create_products(names, category='Milk'):
+    category, _ = Category.objects.get_or_create(code=category.upper(), defaults={'name': category})
+    return [
+        Product.objects.create(name=name, code=f'P{next(_serial)}', category=category, unit_size=1)
+        for name in names
+    ]
+
+
+def create_general_plan(products=(), price='10.00', valid_from=date(2026, 1, 1), valid_to=date(2026, 12, 31)):
+    """The general plan of 2026, pricing every product at price"""
+    plan = PricePlan.objects.create(name='General', valid_from=valid_from, valid_to=valid_to, is_general=True)
+    for product in products:
+        ProductPrice.objects.create(price_plan=plan, product=product, price=Decimal(price))
+    return plan
+
+
+def create_delivery_team(route, user):
+    distributor = Distributor.objects.create(
+        name=f'{route.name} fleet', code=f'D{next(_serial)}', contact_person='Ops', mobile='9000000000',
+        address='Depot', created_by=user, updated_by=user,
+    )
+    return DeliveryTeam.objects.create(name=f'Team {route.name}', distributor=distributor, route=route)
+
+
+def clear_caches():
+    """
+    Forget what earlier tests cached (rolling a test back sends no
+    signals): empty the test cache and re-read the prices version
+    """
+    cache.clear()
+    recheck_prices_version()
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests against a LocMemCache private to the test process, so the
+    cache.clear() of a test never empties the file cache a dev server on the
+    same checkout is using, and nothing cached by an earlier run is read back
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_cache = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'tests',
+            },
+        })
+        self._test_cache.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_cache.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,93 @@
+import json
+import logging
+from pathlib import Path
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from config.databases import database_settings
+from .log import DebugSampleFilter, JsonFormatter, RequestIdFilter, request_id
+from .testing import create_products, create_user
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    def test_tuned_sqlite_sets_pragmas_and_immediate_transactions(self):
+        plain = database_settings(Path('/srv'), {})['default']
+        self.assertNotIn('OPTIONS', plain)
+
+        tuned = database_settings(Path('/srv'), {'DATABASE_SQLITE_TUNED': 'true'})['default']
+        self.assertEqual(tuned['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(tuned['OPTIONS']['timeout'], 20)
+        self.assertIn('PRAGMA journal_mode=WAL', tuned['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA busy_timeout=20000', tuned['OPTIONS']['init_command'])
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('watcher')
+        cls.staff = create_user('operator', is_staff=True)
+        create_products(['Paneer'], category='Paneer')
+
+    def test_metrics_count_queries_and_serializer_time_per_view(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/apiapp/products/').status_code, 200)
+
+        # A plain Django view: sessions, not DRF authentication
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/apiapp/metrics/').status_code, 403)
+        self.client.force_login(self.staff)
+        body = self.client.get('/apiapp/metrics/').content.decode()
+        self.assertIn('dairy_http_responses_total{view="product-list",method="GET",status="200"}', body)
+        self.assertRegex(body, r'dairy_http_db_queries_count\{view="product-list",method="GET"\} [1-9]')
+        self.assertRegex(body, r'dairy_http_serializer_seconds_bucket\{view="product-list",method="GET",le="\+Inf"\} [1-9]')
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_scraper_token(self):
+        response = self.client.get('/apiapp/metrics/', headers={'Authorization': 'Bearer scrape-me'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        response = self.client.get('/apiapp/metrics/', headers={'Authorization': 'Bearer guess'})
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertLogs('apps.core.instrumentation', 'WARNING') as logs:
+            client.get('/apiapp/products/')
+        self.assertIn('Slow request GET /apiapp/products/ (product-list)', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class StructuredLoggingTests(TestCase):
+    def record(self, level, message, *args, **extra):
+        record = logging.getLogger('apps.core.tests').makeRecord(
+            'apps.core.tests', level, __file__, 1, message, args, None, extra=extra,
+        )
+        RequestIdFilter().filter(record)
+        return record
+
+    def test_records_are_json_with_the_request_id_and_extra_fields(self):
+        token = request_id.set('req-42')
+        try:
+            line = JsonFormatter().format(self.record(logging.INFO, 'Synced %s', 'expenses', section='expenses'))
+        finally:
+            request_id.reset(token)
+        entry = json.loads(line)
+        self.assertEqual(entry['message'], 'Synced expenses')
+        self.assertEqual(entry['request_id'], 'req-42')
+        self.assertEqual(entry['section'], 'expenses')
+        self.assertEqual(entry['level'], 'INFO')
+
+    def test_only_debug_records_are_sampled(self):
+        never = DebugSampleFilter(rate=0)
+        self.assertFalse(never.filter(self.record(logging.DEBUG, 'trace')))
+        self.assertTrue(never.filter(self.record(logging.WARNING, 'problem')))
+
+    def test_responses_carry_the_request_id(self):
+        response = self.client.get('/apiapp/metrics/', headers={'X-Request-ID': 'phone-7f3a'})
+        self.assertEqual(response['X-Request-ID'], 'phone-7f3a')
+        response = self.client.get('/apiapp/metrics/', headers={'X-Request-ID': 'not an id\n'})
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
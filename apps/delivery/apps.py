@@ -4,3 +4,6 @@
 class DeliveryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.delivery'
+
+    def ready(self):
+        import apps.delivery.signals  # Import signals when app is ready
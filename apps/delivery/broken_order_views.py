@@ -7,6 +7,7 @@
 from django.urls import reverse_lazy
 from django.contrib import messages
 import json
+import logging
 from decimal import Decimal
 
 from web_project import TemplateLayout
@@ -19,6 +20,10 @@
     Route,
     Product
 )
+from .reconciliation import loading_order_reconciliation
+from apps.products.pricing import get_price_resolver
+
+logger = logging.getLogger(__name__)
 
 
 class BrokenOrderListView(LoginRequiredMixin, DeliveryTeamRequiredMixin, ListView):
@@ -164,8 +169,8 @@ def post(self, request):
                         quantity=quantity,
                         reason=reason
                     )
-                except Exception as e:
-                    print(f"Error creating broken order item: {str(e)}")
+                except Exception:
+                    logger.warning('Could not create broken order item', exc_info=True)
                     # Continue with other items even if one fails
             
             return JsonResponse({
@@ -175,7 +180,7 @@ def post(self, request):
             })
             
         except Exception as e:
-            print(f"Error creating broken order: {str(e)}")
+            logger.exception('Could not create broken order')
             return JsonResponse({
                 'status': 'error',
                 'error': str(e)
@@ -270,8 +275,8 @@ def post(self, request, pk):
                         quantity=quantity,
                         reason=reason
                     )
-                except Exception as e:
-                    print(f"Error updating broken order item: {str(e)}")
+                except Exception:
+                    logger.warning('Could not update broken order item', exc_info=True)
                     # Continue with other items even if one fails
             
             return JsonResponse({
@@ -281,7 +286,7 @@ def post(self, request, pk):
             })
             
         except Exception as e:
-            print(f"Error updating broken order: {str(e)}")
+            logger.exception('Could not update broken order')
             return JsonResponse({
                 'status': 'error',
                 'error': str(e)
@@ -361,23 +366,23 @@ def get_available_products_for_broken_order(request):
         }, status=400)
     
     try:
-        # Get the loading order
-        loading_order = get_object_or_404(LoadingOrder, pk=loading_order_id)
-        
-        # Get the loading order items
-        loading_order_items = loading_order.items.select_related('product').all()
-        
-        # Format the response
+        loading_order = get_object_or_404(LoadingOrder.objects.only('route_id', 'loading_date'), pk=loading_order_id)
+        resolver = get_price_resolver()
+
+        # Only what is still on the truck can be reported broken
         products = []
-        for item in loading_order_items:
-            products.append({
-                'id': item.product.id,
-                'code': item.product.code,
-                'name': item.product.name,
-                'quantity': float(item.quantity),
-                'price': float(item.product.price)
-            })
-        
+        for row in loading_order_reconciliation(loading_order):
+            if row['remaining'] > 0:
+                price = resolver.get_general_price(row['product_id'], loading_order.loading_date)
+                products.append({
+                    'id': row['product_id'],
+                    'code': row['product_code'],
+                    'name': row['product_name'],
+                    'quantity': float(row['remaining']),
+                    'loaded_quantity': float(row['loaded']),
+                    'price': float(price or 0),
+                })
+
         return JsonResponse({
             'status': 'success',
             'products': products
@@ -0,0 +1,222 @@
+"""
+Seller balances from an append-only ledger.
+
+Every delivery order contributes a sale entry (its total_price) and a
+collection entry (minus its amount_collected). When an order changes, the
+difference between what it should contribute and what the ledger already
+holds for it is appended; a deleted order is reversed. A seller's first
+posted order also brings in its opening_balance as an opening entry, the
+balance carried over from before the system.
+
+SellerBalance caches the running total per seller, so the current balance
+is one row and an opening balance only sums the entries dated on or after
+the day asked for. entries_appended is sent with every batch of new
+entries, for whatever holds opening balances computed from earlier ones.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.dispatch import Signal
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import SellerBalance, SellerLedger
+
+ZERO = Decimal('0.00')
+
+# Sent with the SellerLedger entries of each append_entries() call
+entries_appended = Signal()
+
+# Fields whose change moves an order's ledger entries
+LEDGER_FIELDS = {'total_price', 'amount_collected', 'seller', 'seller_id', 'delivery_date'}
+
+
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        return parse_date(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _order_amounts(order):
+    """{(seller_id, entry_date, entry_type): amount} an order should contribute"""
+    return {
+        (order.seller_id, _as_date(order.delivery_date), 'sale'): Decimal(order.total_price or 0),
+        (order.seller_id, _as_date(order.delivery_date), 'collection'): -Decimal(order.amount_collected or 0),
+    }
+
+
+def _posted_amounts(order_ids):
+    """{order_id: {(seller_id, entry_date, entry_type): amount}} already in the ledger"""
+    posted = defaultdict(dict)
+    rows = SellerLedger.objects.filter(
+        delivery_order_id__in=order_ids
+    ).exclude(entry_type='opening').order_by().values(
+        'delivery_order_id', 'seller_id', 'entry_date', 'entry_type'
+    ).annotate(total=Sum('amount'))
+    for row in rows:
+        posted[row['delivery_order_id']][(row['seller_id'], row['entry_date'], row['entry_type'])] = row['total']
+    return posted
+
+
+def _lock_balances(seller_ids):
+    """
+    {seller_id: SellerBalance} for these sellers, created when missing and
+    locked for the rest of the transaction. A concurrent posting for the
+    same sellers waits here until this one commits, then reads what it
+    appended.
+    """
+    existing = set(SellerBalance.objects.filter(seller_id__in=seller_ids).values_list('seller_id', flat=True))
+    SellerBalance.objects.bulk_create(
+        [SellerBalance(seller_id=seller_id) for seller_id in set(seller_ids) - existing],
+        ignore_conflicts=True,
+    )
+    return {
+        balance.seller_id: balance
+        for balance in SellerBalance.objects.select_for_update().filter(seller_id__in=seller_ids)
+    }
+
+
+def _append(entries, balances):
+    """Write entries and move the locked balances with them"""
+    entries = [entry for entry in entries if entry.amount]
+    if not entries:
+        return []
+    now = timezone.now()
+    for entry in entries:
+        balance = balances[entry.seller_id]
+        balance.updated_at = now
+        balance.balance += entry.amount
+        entry.balance_after = balance.balance
+        if balance.last_entry_date is None or entry.entry_date > balance.last_entry_date:
+            balance.last_entry_date = entry.entry_date
+    SellerLedger.objects.bulk_create(entries)
+    SellerBalance.objects.bulk_update(list(balances.values()), ['balance', 'last_entry_date', 'updated_at'])
+    entries_appended.send(sender=SellerLedger, entries=entries)
+    return entries
+
+
+def append_entries(entries):
+    """
+    Append SellerLedger entries (unsaved instances) and move the cached
+    balances with them, with the balances of the sellers involved locked
+    """
+    entries = [entry for entry in entries if entry.amount]
+    if not entries:
+        return []
+    with transaction.atomic():
+        return _append(entries, _lock_balances({entry.seller_id for entry in entries}))
+
+
+def post_delivery_orders(orders):
+    """
+    Bring the ledger in line with these saved delivery orders: one read of
+    what is already posted for them, then the differences in one insert.
+    Used by the DeliveryOrder signal and by bulk writes that skip it.
+
+    The sellers' balances are locked before anything is read, so two
+    postings of the same order (a web edit and a sync, say) take turns and
+    the second one only appends what the first left to do.
+    """
+    orders = [order for order in orders if order.pk]
+    if not orders:
+        return []
+
+    with transaction.atomic():
+        balances = _lock_balances({order.seller_id for order in orders})
+        posted = _posted_amounts([order.pk for order in orders])
+        # Sellers with nothing posted yet bring their carried-over balance
+        known_sellers = {seller_id for seller_id, balance in balances.items() if balance.last_entry_date}
+
+        entries = []
+        for order in sorted(orders, key=lambda order: (_as_date(order.delivery_date), order.pk)):
+            if order.seller_id not in known_sellers:
+                known_sellers.add(order.seller_id)
+                entries.append(SellerLedger(
+                    seller_id=order.seller_id, delivery_order=order, reference=order.order_number,
+                    entry_type='opening', entry_date=_as_date(order.delivery_date),
+                    amount=Decimal(order.opening_balance or 0),
+                ))
+            wanted = _order_amounts(order)
+            already = posted.get(order.pk, {})
+            for key in list(wanted) + [key for key in already if key not in wanted]:
+                seller_id, entry_date, entry_type = key
+                entries.append(SellerLedger(
+                    seller_id=seller_id, delivery_order=order, reference=order.order_number,
+                    entry_type=entry_type, entry_date=entry_date,
+                    amount=wanted.get(key, ZERO) - already.get(key, ZERO),
+                ))
+        # An order moved to another seller takes amounts off the previous one too
+        moved_from = {entry.seller_id for entry in entries if entry.amount} - set(balances)
+        if moved_from:
+            balances.update(_lock_balances(moved_from))
+        return _append(entries, balances)
+
+
+def reverse_delivery_order(order):
+    """Append entries cancelling everything posted for an order that is being deleted"""
+    with transaction.atomic():
+        # Locked before the read, like post_delivery_orders()
+        balances = _lock_balances({order.seller_id})
+        posted = _posted_amounts([order.pk]).get(order.pk, {})
+        entries = [
+            SellerLedger(
+                seller_id=seller_id, reference=order.order_number,
+                entry_type=entry_type, entry_date=entry_date, amount=-amount,
+            )
+            for (seller_id, entry_date, entry_type), amount in posted.items()
+        ]
+        others = {entry.seller_id for entry in entries if entry.amount} - set(balances)
+        if others:
+            balances.update(_lock_balances(others))
+        return _append(entries, balances)
+
+
+def current_balance(seller):
+    balance = SellerBalance.objects.filter(seller_id=_pk(seller)).values_list('balance', flat=True).first()
+    return balance if balance is not None else ZERO
+
+
+def opening_balance(seller, delivery_date):
+    """
+    The seller's balance from every entry dated before delivery_date, i.e.
+    what a delivery order on that date opens with. One row read when nothing
+    is dated on or after that day, otherwise a sum over those later entries.
+    """
+    seller_id = _pk(seller)
+    delivery_date = _as_date(delivery_date)
+    row = SellerBalance.objects.filter(seller_id=seller_id).values_list('balance', 'last_entry_date').first()
+    if row is None:
+        return ZERO
+    balance, last_entry_date = row
+    if last_entry_date is None or last_entry_date < delivery_date:
+        return balance
+    later = SellerLedger.objects.filter(
+        seller_id=seller_id, entry_date__gte=delivery_date
+    ).aggregate(total=Sum('amount'))['total']
+    return balance - (later or ZERO)
+
+
+def opening_balances(seller_ids, delivery_date):
+    """
+    {seller_id: opening balance on delivery_date} for many sellers at once:
+    the cached balances minus one grouped sum of the entries dated on or
+    after that day
+    """
+    seller_ids = [_pk(seller) for seller in seller_ids]
+    delivery_date = _as_date(delivery_date)
+    balances = dict(SellerBalance.objects.filter(seller_id__in=seller_ids).values_list('seller_id', 'balance'))
+    later = SellerLedger.objects.filter(
+        seller_id__in=list(balances), entry_date__gte=delivery_date
+    ).order_by().values('seller_id').annotate(total=Sum('amount'))
+    for row in later:
+        balances[row['seller_id']] -= row['total']
+    return {seller_id: balances.get(seller_id, ZERO) for seller_id in seller_ids}
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.management.base import CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.delivery.rollups import raw_date_bounds
+
+
+def add_range_arguments(parser):
+    parser.add_argument('--start-date', help='First day to process (YYYY-MM-DD)')
+    parser.add_argument('--end-date', help='Last day to process (YYYY-MM-DD)')
+    parser.add_argument(
+        '--days', type=int,
+        help='Process the last N days up to today instead of a start/end date',
+    )
+    parser.add_argument(
+        '--chunk-days', type=int, default=31,
+        help='Days handled per transaction, to bound memory on long ranges',
+    )
+
+
+def _parse(value, name):
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise CommandError(f'Invalid {name}. Use YYYY-MM-DD.')
+    return parsed
+
+
+def date_chunks(options):
+    """
+    (start, end) ranges covering the requested days; without any bound,
+    everything from the first to the last day that has raw data
+    """
+    if options['days']:
+        end_date = timezone.localdate()
+        start_date = end_date - timedelta(days=options['days'] - 1)
+    else:
+        start_date = _parse(options['start_date'], 'start date')
+        end_date = _parse(options['end_date'], 'end date')
+        if not (start_date and end_date):
+            first, last = raw_date_bounds()
+            start_date = start_date or first
+            end_date = end_date or last
+    if not (start_date and end_date) or start_date > end_date:
+        return []
+
+    step = timedelta(days=max(1, options['chunk_days']))
+    chunks = []
+    while start_date <= end_date:
+        chunk_end = min(start_date + step - timedelta(days=1), end_date)
+        chunks.append((start_date, chunk_end))
+        start_date = chunk_end + timedelta(days=1)
+    return chunks
@@ -0,0 +1,122 @@
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+
+from apps.api.sync_pipeline import SyncPipeline
+from apps.authentication.models import CustomUser
+from apps.delivery.models import DeliveryOrder, DeliveryOrderItem
+from apps.products.models import Category, Product
+from apps.seller.models import Route, Seller
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare delivery order item table size and sync time with a zero-quantity '
+        'row per catalog product (the old fan-out) and with sparse items. '
+        'Everything is created inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sellers', type=int, default=200)
+        parser.add_argument('--products', type=int, default=150, help='Active catalog size')
+        parser.add_argument('--ordered', type=int, default=12, help='Products each seller actually takes')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['sellers'], options['products'], min(options['ordered'], options['products']))
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write('Benchmark data rolled back')
+
+    def table_bytes(self):
+        """On-disk size of the item table, None where the backend cannot tell"""
+        table = DeliveryOrderItem._meta.db_table
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+                elif connection.vendor == 'sqlite':
+                    cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [table])
+                else:
+                    return None
+                return cursor.fetchone()[0]
+        except DatabaseError:
+            return None
+
+    def report(self, label, sync_payload, user):
+        size = self.table_bytes()
+        self.stdout.write(
+            f'{label}: {DeliveryOrderItem.objects.count()} item rows'
+            + (f', {size / 1024:.0f} KiB' if size is not None else '')
+        )
+        started = time.perf_counter()
+        SyncPipeline(sync_payload, user).run()
+        self.stdout.write(f'  re-sync of the full catalog sheets: {(time.perf_counter() - started) * 1000:.0f} ms')
+
+    def run(self, seller_count, product_count, ordered):
+        today = date.today()
+        user = CustomUser.objects.create_user(
+            username='bench-fanout', password='bench', email='bench-fanout@example.com',
+            mobile_number='9999999990', first_name='Bench', last_name='Fanout', role='DELIVERY',
+        )
+        route = Route.objects.create(name='Bench route', code='BENCH-F')
+        category = Category.objects.create(name='Bench', code='BENCH-F')
+        products = Product.objects.bulk_create([
+            Product(name=f'Bench {i}', code=f'BF{i:05d}', category=category, unit_size=1)
+            for i in range(product_count)
+        ])
+        sellers = Seller.objects.bulk_create([
+            Seller(
+                first_name='Bench', last_name=str(i), mobileno=f'F{i:010d}',
+                store_name=f'Bench store {i}', store_address='Benchmark street', route=route,
+            )
+            for i in range(seller_count)
+        ])
+        orders = DeliveryOrder.objects.bulk_create([
+            DeliveryOrder(order_number=f'BENCH-F{i}', route=route, seller=seller, delivery_date=today)
+            for i, seller in enumerate(sellers)
+        ])
+
+        def quantity(index, position):
+            # Each seller takes a different run of `ordered` products
+            return Decimal('2.00') if (position - index) % product_count < ordered else Decimal('0.00')
+
+        # What the app sends back: the whole sheet, untouched products at 0
+        payload = {'delivery_orders': [
+            {
+                'id': order.pk, 'route': route.pk, 'seller': order.seller_id,
+                'delivery_date': today.isoformat(), 'amount_collected': '0.00',
+                'items': [
+                    {
+                        'product': product.pk, 'ordered_quantity': str(quantity(index, position)),
+                        'extra_quantity': '0.00', 'delivered_quantity': str(quantity(index, position)),
+                        'unit_price': '5.00',
+                    }
+                    for position, product in enumerate(products)
+                ],
+            }
+            for index, order in enumerate(orders)
+        ]}
+
+        self.stdout.write(f'{seller_count} delivery orders, {product_count} products, {ordered} ordered per seller')
+        DeliveryOrderItem.objects.bulk_create([
+            DeliveryOrderItem(
+                delivery_order=order, product=product,
+                ordered_quantity=quantity(index, position), delivered_quantity=quantity(index, position),
+                unit_price=Decimal('5.00'), total_price=quantity(index, position) * 5,
+            )
+            for index, order in enumerate(orders)
+            for position, product in enumerate(products)
+        ], batch_size=2000)
+        self.report('With a row per catalog product', payload, user)
+
+        DeliveryOrderItem.objects.filter(ordered_quantity=0, extra_quantity=0, delivered_quantity=0).delete()
+        self.report('Sparse', payload, user)
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.delivery.rollups import MEASURES, check_rollups, refresh_rollups
+
+from ._rollup_range import add_range_arguments, date_chunks
+
+
+def describe(stored, expected):
+    if stored is None:
+        return 'missing rollup row'
+    if expected is None:
+        return 'rollup row without raw data'
+    return ', '.join(
+        f'{measure} {stored[measure]} != {expected[measure]}'
+        for measure in MEASURES if stored[measure] != expected[measure]
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare DailySalesRollup rows with the raw order items and report cells that differ'
+
+    def add_arguments(self, parser):
+        add_range_arguments(parser)
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Rebuild the ranges that have differences',
+        )
+        parser.add_argument(
+            '--show', type=int, default=20,
+            help='Number of differing cells to print',
+        )
+
+    def handle(self, *args, **options):
+        mismatches = []
+        for start_date, end_date in date_chunks(options):
+            found = check_rollups(start_date, end_date)
+            if found and options['fix']:
+                refresh_rollups(start_date, end_date)
+            mismatches.extend(found)
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Rollups match the raw data'))
+            return
+
+        for (day, route_id, seller_id, product_id), stored, expected in mismatches[:options['show']]:
+            self.stdout.write(
+                f'{day} route={route_id} seller={seller_id} product={product_id}: {describe(stored, expected)}'
+            )
+        if options['fix']:
+            self.stdout.write(self.style.WARNING(f'Rebuilt ranges with {len(mismatches)} differing cells'))
+        else:
+            raise CommandError(f'{len(mismatches)} rollup cells differ from the raw data')
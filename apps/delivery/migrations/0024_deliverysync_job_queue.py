@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0023_deliverylocation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverysync',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='delivery_syncs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='deliverysync',
+            name='response',
+            field=models.JSONField(blank=True, help_text='Response body once the job has been processed', null=True),
+        ),
+        migrations.AlterField(
+            model_name='deliverysync',
+            name='sync_type',
+            field=models.CharField(choices=[('delivery_order', 'Delivery Order'), ('order_item', 'Order Item'), ('payment', 'Payment'), ('price_update', 'Price Update'), ('combined', 'Combined Sync'), ('delivery_orders', 'Delivery Orders Sync'), ('broken_orders', 'Broken Orders Sync'), ('return_orders', 'Return Orders Sync'), ('public_sales', 'Public Sales Sync'), ('expenses', 'Expenses Sync'), ('denominations', 'Denominations Sync')], max_length=20),
+        ),
+    ]
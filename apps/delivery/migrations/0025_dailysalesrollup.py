@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:39
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0024_deliverysync_job_queue'),
+        ('products', '0003_effectivesellerprice'),
+        ('seller', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('ordered_items', models.PositiveIntegerField(default=0)),
+                ('ordered_quantity', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14)),
+                ('ordered_value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('delivered_items', models.PositiveIntegerField(default=0)),
+                ('delivered_quantity', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14)),
+                ('delivered_value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('broken_quantity', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14)),
+                ('returned_quantity', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='products.product')),
+                ('route', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_rollups', to='seller.route')),
+                ('seller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='seller.seller')),
+            ],
+            options={
+                'verbose_name': 'Daily Sales Rollup',
+                'verbose_name_plural': 'Daily Sales Rollups',
+                'indexes': [models.Index(fields=['date', 'route'], name='delivery_da_date_d9f78d_idx'), models.Index(fields=['product', 'date'], name='delivery_da_product_7fdd95_idx'), models.Index(fields=['seller', 'date'], name='delivery_da_seller__0ba7aa_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'route', 'seller', 'product'), name='unique_daily_rollup_grain')],
+            },
+        ),
+    ]
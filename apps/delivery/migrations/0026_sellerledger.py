@@ -0,0 +1,83 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:42
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def build_seller_ledger(apps, schema_editor):
+    """Post the existing delivery orders once; signals keep the ledger up to date afterwards"""
+    DeliveryOrder = apps.get_model('delivery', 'DeliveryOrder')
+    SellerLedger = apps.get_model('delivery', 'SellerLedger')
+    SellerBalance = apps.get_model('delivery', 'SellerBalance')
+
+    balances = {}
+    entries = []
+    orders = DeliveryOrder.objects.order_by('seller_id', 'delivery_date', 'id').values_list(
+        'id', 'seller_id', 'order_number', 'delivery_date', 'opening_balance', 'total_price', 'amount_collected'
+    )
+    for order_id, seller_id, order_number, delivery_date, opening, total_price, collected in orders.iterator():
+        amounts = [('sale', total_price), ('collection', -collected)]
+        if seller_id not in balances:
+            balances[seller_id] = [Decimal('0.00'), None]
+            amounts.insert(0, ('opening', opening))
+        balance = balances[seller_id]
+        for entry_type, amount in amounts:
+            if not amount:
+                continue
+            balance[0] += amount
+            balance[1] = delivery_date
+            entries.append(SellerLedger(
+                seller_id=seller_id, delivery_order_id=order_id, reference=order_number,
+                entry_type=entry_type, entry_date=delivery_date, amount=amount, balance_after=balance[0],
+            ))
+        if len(entries) >= 2000:
+            SellerLedger.objects.bulk_create(entries)
+            entries = []
+    SellerLedger.objects.bulk_create(entries)
+    SellerBalance.objects.bulk_create([
+        SellerBalance(seller_id=seller_id, balance=balance, last_entry_date=last_entry_date)
+        for seller_id, (balance, last_entry_date) in balances.items()
+        if last_entry_date
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0025_dailysalesrollup'),
+        ('seller', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerBalance',
+            fields=[
+                ('seller', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger_balance', serialize=False, to='seller.seller')),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('last_entry_date', models.DateField(blank=True, help_text='Latest entry_date in the ledger; opening balances for later dates need no sum', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SellerLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(blank=True, help_text='Order number, kept after the order is deleted', max_length=20)),
+                ('entry_type', models.CharField(choices=[('opening', 'Opening Balance'), ('sale', 'Sale'), ('collection', 'Collection')], max_length=20)),
+                ('entry_date', models.DateField(help_text='Delivery date the entry belongs to')),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Change to the balance; collections are negative', max_digits=12)),
+                ('balance_after', models.DecimalField(decimal_places=2, help_text='Running balance once this entry was appended', max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('delivery_order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='delivery.deliveryorder')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='seller.seller')),
+            ],
+            options={
+                'verbose_name': 'Seller Ledger Entry',
+                'verbose_name_plural': 'Seller Ledger',
+                'ordering': ['seller', 'id'],
+                'indexes': [models.Index(fields=['seller', 'entry_date'], name='delivery_se_seller__2e14bb_idx')],
+            },
+        ),
+        migrations.RunPython(build_seller_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0026_sellerledger'),
+        ('sales', '0004_ordernumbersequence'),
+        ('seller', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deliveryorder',
+            index=models.Index(fields=['seller', 'delivery_date', 'total_balance'], name='delivery_order_aging_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, F
+
+MEASURES = (
+    'ordered_items', 'ordered_quantity', 'ordered_value',
+    'delivered_items', 'delivered_quantity', 'delivered_value',
+    'broken_quantity', 'returned_quantity',
+)
+
+
+def purge_blank_items(apps, schema_editor):
+    """
+    Delete the zero-quantity items that used to be created for every active
+    product. They only ever counted towards DailySalesRollup.delivered_items,
+    so those counts are lowered to match and cells left empty are dropped.
+    """
+    DeliveryOrderItem = apps.get_model('delivery', 'DeliveryOrderItem')
+    DailySalesRollup = apps.get_model('delivery', 'DailySalesRollup')
+
+    blank = DeliveryOrderItem.objects.filter(
+        ordered_quantity=0, extra_quantity=0, delivered_quantity=0, total_price=0,
+    )
+    removed_by_date = defaultdict(dict)
+    cells = blank.order_by().values(
+        'product_id',
+        day=F('delivery_order__delivery_date'),
+        route=F('delivery_order__route_id'),
+        seller=F('delivery_order__seller_id'),
+    ).annotate(removed=Count('id'))
+    for cell in cells.iterator():
+        removed_by_date[cell['day']][(cell['route'], cell['seller'], cell['product_id'])] = cell['removed']
+
+    blank.delete()
+
+    for day, removed in removed_by_date.items():
+        changed, emptied = [], []
+        for rollup in DailySalesRollup.objects.filter(date=day):
+            count = removed.get((rollup.route_id, rollup.seller_id, rollup.product_id))
+            if not count:
+                continue
+            rollup.delivered_items = max(rollup.delivered_items - count, 0)
+            if all(not getattr(rollup, measure) for measure in MEASURES):
+                emptied.append(rollup.pk)
+            else:
+                changed.append(rollup)
+        DailySalesRollup.objects.bulk_update(changed, ['delivered_items'], batch_size=2000)
+        DailySalesRollup.objects.filter(pk__in=emptied).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0027_deliveryorder_aging_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(purge_blank_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0029_cashdenomination_updated_at_deliveryexpense_updated_at'),
+        ('sales', '0004_ordernumbersequence'),
+        ('seller', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='brokenorder',
+            index=models.Index(fields=['route', 'report_date'], name='delivery_br_route_i_1c0e02_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='brokenorder',
+            index=models.Index(fields=['local_id'], name='delivery_br_local_i_8f622b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashdenomination',
+            index=models.Index(fields=['route', 'delivery_date'], name='delivery_ca_route_i_b6bcf3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashdenomination',
+            index=models.Index(fields=['local_id'], name='delivery_ca_local_i_8a7223_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryexpense',
+            index=models.Index(fields=['route', 'expense_date'], name='delivery_de_route_i_a47be0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryexpense',
+            index=models.Index(fields=['local_id'], name='delivery_de_local_i_01e9bf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliverylocation',
+            index=models.Index(fields=['local_id'], name='delivery_de_local_i_b6ea83_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryorder',
+            index=models.Index(fields=['local_id'], name='delivery_de_local_i_8af522_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='futureorderrequest',
+            index=models.Index(fields=['local_id'], name='delivery_fu_local_i_911b86_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loadingorder',
+            index=models.Index(fields=['route', 'loading_date'], name='delivery_lo_route_i_b89a60_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loadingorder',
+            index=models.Index(fields=['local_id'], name='delivery_lo_local_i_7e69a3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='publicsale',
+            index=models.Index(fields=['local_id'], name='delivery_pu_local_i_5ac014_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='returnedorder',
+            index=models.Index(fields=['route', 'return_date'], name='delivery_re_route_i_5a6a40_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='returnedorder',
+            index=models.Index(fields=['local_id'], name='delivery_re_local_i_4bdaa3_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0030_brokenorder_delivery_br_route_i_1c0e02_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='deliveryorder',
+            name='delivery_order_aging_idx',
+        ),
+    ]
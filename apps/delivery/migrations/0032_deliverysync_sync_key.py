@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0031_remove_deliveryorder_aging_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverysync',
+            name='sync_key',
+            field=models.CharField(blank=True, default='', help_text='Key of a queued upload (see apps/api/idempotency.py)', max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='deliverysync',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'processing']), models.Q(('sync_key', ''), _negated=True)), fields=('created_by', 'sync_type', 'sync_key'), name='unique_active_sync_job'),
+        ),
+    ]
@@ -1,13 +1,16 @@
-from django.db import models
-from django.utils import timezone
+from django.db import models, transaction
 from decimal import Decimal
+import logging
 import uuid
 from apps.authentication.models import CustomUser
 from apps.seller.models import Route, Seller
 from apps.products.models import Product
 from apps.sales.models import SalesOrder, OrderItem
+from apps.sales.sequences import next_order_number
 from apps.products.models import PricePlan, Product
 
+logger = logging.getLogger(__name__)
+
 class Distributor(models.Model):
     name = models.CharField(max_length=100)
     code = models.CharField(max_length=20, unique=True)
@@ -241,23 +244,12 @@ def __str__(self):
         return f"PO {self.order_number} - {self.delivery_team.name}"
 
     def save(self, *args, **kwargs):
-        if not self.order_number:
-            # Generate order number: PO-YYYYMMDD-XXXX
-            today = timezone.now().date()
-            prefix = f"PO-{today.strftime('%Y%m%d')}-"
-            last_order = PurchaseOrder.objects.filter(
-                order_number__startswith=prefix
-            ).order_by('-order_number').first()
-
-            if last_order:
-                last_number = int(last_order.order_number.split('-')[-1])
-                new_number = str(last_number + 1).zfill(4)
-            else:
-                new_number = '0001'
-
-            self.order_number = f"{prefix}{new_number}"
+        with transaction.atomic():
+            if not self.order_number:
+                # Generate order number: PO-YYYYMMDD-XXXX
+                self.order_number = next_order_number('PO', model=PurchaseOrder)
 
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
 
 class PurchaseOrderItem(models.Model):
     purchase_order = models.ForeignKey(
@@ -376,6 +368,10 @@ class Meta:
         ordering = ['-loading_date', '-loading_time']
         verbose_name = 'Loading Order'
         verbose_name_plural = 'Loading Orders'
+        indexes = [
+            models.Index(fields=['route', 'loading_date']),
+            models.Index(fields=['local_id']),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['purchase_order', 'route', 'loading_date'],
@@ -387,20 +383,12 @@ def __str__(self):
         return f"{self.order_number} - {self.route.name}"
 
     def save(self, *args, **kwargs):
-        if not self.order_number:
-            # Generate order number: LO-YYYYMMDD-XXXX
-            last_order = LoadingOrder.objects.order_by('-order_number').first()
-            if last_order:
-                last_number = int(last_order.order_number.split('-')[-1])
-                new_number = str(last_number + 1).zfill(4)
-            else:
-                new_number = '0001'
-
-            from datetime import date
-            today = date.today()
-            self.order_number = f'LO-{today.strftime("%Y%m%d")}-{new_number}'
+        with transaction.atomic():
+            if not self.order_number:
+                # Generate order number: LO-YYYYMMDD-XXXX
+                self.order_number = next_order_number('LO', model=LoadingOrder)
 
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
         delivery_orders = DeliveryOrder.objects.filter(route=self.route, delivery_date=self.loading_date)
         for delivery_order in delivery_orders:
             delivery_order.loading_order = self
@@ -423,8 +411,10 @@ class Meta:
         unique_together = ['loading_order', 'product']
 
     def save(self, *args, **kwargs):
-        # Calculate remaining quantity
-        self.remaining_quantity = self.loaded_quantity - self.delivered_quantity - self.return_quantity
+        from .reconciliation import remaining_quantity
+        self.remaining_quantity = remaining_quantity(
+            self.loaded_quantity, delivered=self.delivered_quantity, returned=self.return_quantity
+        )
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -551,6 +541,9 @@ class Meta:
         ordering = ['-delivery_date', '-delivery_time']
         verbose_name = 'Delivery Order'
         verbose_name_plural = 'Delivery Orders'
+        indexes = [
+            models.Index(fields=['local_id']),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['route', 'seller', 'delivery_date'],
@@ -565,22 +558,6 @@ def __str__(self):
             return f"DO {self.order_number} - {self.seller.store_name}"
 
     def save(self, *args, **kwargs):
-        if not self.order_number:
-            # Generate order number: DO-YYYYMMDD-XXXX
-            today = timezone.now().date()
-            prefix = f"DO-{today.strftime('%Y%m%d')}-"
-            last_order = DeliveryOrder.objects.filter(
-                order_number__startswith=prefix
-            ).order_by('-order_number').first()
-
-            if last_order:
-                last_number = int(last_order.order_number.split('-')[-1])
-                new_number = str(last_number + 1).zfill(4)
-            else:
-                new_number = '0001'
-
-            self.order_number = f"{prefix}{new_number}"
-
         # Skip the problematic calculations for now - we'll handle these in the view
         # if not self.pk and not self.opening_balance:  # Only for new orders
         #     # Get last order's total balance for this seller
@@ -603,16 +580,24 @@ def save(self, *args, **kwargs):
         # # Calculate total balance including opening balance
         # self.total_balance = self.opening_balance + self.balance_amount
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not self.order_number:
+                # Generate order number: DO-YYYYMMDD-XXXX
+                self.order_number = next_order_number('DO', model=DeliveryOrder)
+
+            super().save(*args, **kwargs)
 
     def recalculate_totals(self):
-        """Recalculate totals after items have been added"""
+        """
+        Recalculate totals after items have been added. Item saves schedule
+        apps.delivery.totals.schedule_order_totals() instead, which does this
+        once per transaction for every order they touched.
+        """
         if self.pk:  # Only if the order has been saved
             # Calculate total price from items
-            self.total_price = sum(
-                item.delivered_quantity * item.unit_price
-                for item in self.items.all()
-            )
+            self.total_price = self.items.aggregate(
+                total=models.Sum(models.F('delivered_quantity') * models.F('unit_price'))
+            )['total'] or Decimal('0.00')
 
             # Calculate balance amount for this delivery
             self.balance_amount = self.total_price - self.amount_collected
@@ -623,6 +608,35 @@ def recalculate_totals(self):
             # Save without triggering the full save method
             super().save(update_fields=['total_price', 'balance_amount', 'total_balance'])
 
+    def catalog_items(self):
+        """
+        The order as a full catalog sheet: its stored items plus an unsaved,
+        zero-quantity item for every other active product, in catalog order.
+        Zero rows are not stored; this builds them at read time from the
+        cached catalog and price index. Uses a prefetched items list when
+        there is one.
+        """
+        from apps.products.catalog import active_products
+        from apps.products.pricing import get_price_resolver
+
+        catalog = active_products()
+        position = {product.pk: index for index, product in enumerate(catalog)}
+        stored = {item.product_id: item for item in self.items.all()}
+        missing = [product for product in catalog if product.pk not in stored]
+        prices = get_price_resolver().get_prices(missing, self.seller_id, self.delivery_date)
+        for product in catalog:
+            item = stored.get(product.pk)
+            if item is not None:
+                item.product = product
+                continue
+            stored[product.pk] = DeliveryOrderItem(
+                delivery_order=self, product=product,
+                ordered_quantity=Decimal('0.00'), extra_quantity=Decimal('0.00'), delivered_quantity=Decimal('0.00'),
+                unit_price=prices.get(product.pk) or Decimal('0.00'), total_price=Decimal('0.00'),
+            )
+        # Items of products no longer active come last
+        return sorted(stored.values(), key=lambda item: (position.get(item.product_id, len(catalog)), item.product_id))
+
 class DeliveryOrderItem(models.Model):
     delivery_order = models.ForeignKey(
         DeliveryOrder,
@@ -697,7 +711,13 @@ class Meta:
     def __str__(self):
         return f"{self.product.name} - {self.delivered_quantity} units"
 
-    def save(self, *args, **kwargs):
+    @property
+    def is_blank(self):
+        """Nothing ordered, added or delivered; such rows are not stored (see DeliveryOrder.catalog_items)"""
+        return not (self.ordered_quantity or self.extra_quantity or self.delivered_quantity)
+
+    def apply_pricing(self):
+        """Fill in unit_price and total_price; shared by save() and bulk writes"""
         # Set unit price from cache if not set
         if not self.unit_price:
             self.unit_price = self.get_cached_price()
@@ -705,13 +725,13 @@ def save(self, *args, **kwargs):
         try:
             unit_price = Decimal(self.unit_price)
         except (ValueError, TypeError):
-            print(f"Invalid decimal value for unit_price: {self.unit_price}")
+            logger.warning('Invalid decimal value for unit_price: %r', self.unit_price)
             self.unit_price = Decimal('0.00')
         
         try:
             delivered_quantity = Decimal(self.delivered_quantity)
         except (ValueError, TypeError):
-            print(f"Invalid decimal value for delivered_quantity: {self.delivered_quantity}")
+            logger.warning('Invalid decimal value for delivered_quantity: %r', self.delivered_quantity)
             delivered_quantity = Decimal('0.00')
         
         
@@ -722,12 +742,23 @@ def save(self, *args, **kwargs):
         # else:
         #     self.total_price = Decimal('0.00')
         self.total_price = delivered_quantity * unit_price if delivered_quantity > 0 else Decimal('0.00')
+
+    def save(self, *args, **kwargs):
+        self.apply_pricing()
         super().save(*args, **kwargs)
 
     def get_cached_price(self):
-        """Get price from cached data for offline use"""
+        """Get price from the in-memory price index, falling back to the offline cache tables"""
+        from apps.products.pricing import get_price_resolver
+
         delivery_date = self.delivery_order.delivery_date
 
+        price = get_price_resolver().get_price(
+            self.product_id, self.delivery_order.seller_id, delivery_date
+        )
+        if price is not None:
+            return price
+
         # Try seller-specific cached price
         seller_price = SellerPriceCache.objects.filter(
             seller=self.delivery_order.seller,
@@ -818,6 +849,10 @@ class Meta:
         ordering = ['-report_date', '-report_time']
         verbose_name = 'Broken Order'
         verbose_name_plural = 'Broken Orders'
+        indexes = [
+            models.Index(fields=['route', 'report_date']),
+            models.Index(fields=['local_id']),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['loading_order', 'route', 'report_date'],
@@ -829,22 +864,11 @@ def __str__(self):
         return f"BO {self.order_number} - {self.route.name} - {self.report_date}"
 
     def save(self, *args, **kwargs):
-        if not self.order_number:
-            # Generate order number: BO-YYYYMMDD-XXXX
-            today = timezone.now().date()
-            prefix = f"BO-{today.strftime('%Y%m%d')}-"
-            last_order = BrokenOrder.objects.filter(
-                order_number__startswith=prefix
-            ).order_by('-order_number').first()
-
-            if last_order:
-                last_number = int(last_order.order_number.split('-')[-1])
-                new_number = str(last_number + 1).zfill(4)
-            else:
-                new_number = '0001'
-
-            self.order_number = f"{prefix}{new_number}"
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not self.order_number:
+                # Generate order number: BO-YYYYMMDD-XXXX
+                self.order_number = next_order_number('BO', model=BrokenOrder)
+            super().save(*args, **kwargs)
 
 class BrokenOrderItem(models.Model):
     broken_order = models.ForeignKey(
@@ -929,6 +953,10 @@ class Meta:
         ordering = ['-return_date', '-return_time']
         verbose_name = 'Returned Order'
         verbose_name_plural = 'Returned Orders'
+        indexes = [
+            models.Index(fields=['route', 'return_date']),
+            models.Index(fields=['local_id']),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['delivery_order', 'route', 'return_date'],
@@ -940,22 +968,11 @@ def __str__(self):
         return f"RO {self.order_number} - {self.route.name} - {self.return_date}"
 
     def save(self, *args, **kwargs):
-        if not self.order_number:
-            # Generate order number: RO-YYYYMMDD-XXXX
-            today = timezone.now().date()
-            prefix = f"RO-{today.strftime('%Y%m%d')}-"
-            last_order = ReturnedOrder.objects.filter(
-                order_number__startswith=prefix
-            ).order_by('-order_number').first()
-
-            if last_order:
-                last_number = int(last_order.order_number.split('-')[-1])
-                new_number = str(last_number + 1).zfill(4)
-            else:
-                new_number = '0001'
-
-            self.order_number = f"{prefix}{new_number}"
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not self.order_number:
+                # Generate order number: RO-YYYYMMDD-XXXX
+                self.order_number = next_order_number('RO', model=ReturnedOrder)
+            super().save(*args, **kwargs)
 
 class ReturnedOrderItem(models.Model):
     returned_order = models.ForeignKey(
@@ -988,6 +1005,14 @@ class DeliverySync(models.Model):
         ('order_item', 'Order Item'),
         ('payment', 'Payment'),
         ('price_update', 'Price Update'),
+        # Uploads queued by the /apiapp/sync/ endpoints (see apps/api/sync_jobs.py)
+        ('combined', 'Combined Sync'),
+        ('delivery_orders', 'Delivery Orders Sync'),
+        ('broken_orders', 'Broken Orders Sync'),
+        ('return_orders', 'Return Orders Sync'),
+        ('public_sales', 'Public Sales Sync'),
+        ('expenses', 'Expenses Sync'),
+        ('denominations', 'Denominations Sync'),
     )
 
     SYNC_STATUS = (
@@ -1015,6 +1040,12 @@ class DeliverySync(models.Model):
         blank=True,
         help_text='Actual ID from server after sync'
     )
+    sync_key = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        help_text='Key of a queued upload (see apps/api/idempotency.py)'
+    )
     data = models.JSONField(
         help_text='Data to be synced'
     )
@@ -1027,6 +1058,18 @@ class DeliverySync(models.Model):
         null=True,
         blank=True
     )
+    response = models.JSONField(
+        null=True,
+        blank=True,
+        help_text='Response body once the job has been processed'
+    )
+    created_by = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='delivery_syncs',
+        null=True,
+        blank=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_sync_attempt = models.DateTimeField(
@@ -1040,6 +1083,14 @@ class Meta:
             models.Index(fields=['local_id', 'server_id']),
             models.Index(fields=['status', 'last_sync_attempt']),
         ]
+        constraints = [
+            # One queued or running job per upload; a retry gets that job back
+            models.UniqueConstraint(
+                fields=['created_by', 'sync_type', 'sync_key'],
+                condition=models.Q(status__in=['pending', 'processing']) & ~models.Q(sync_key=''),
+                name='unique_active_sync_job'
+            )
+        ]
 
 class FutureOrderRequest(models.Model):
     """Store seller's future order requests"""
@@ -1079,6 +1130,7 @@ class Meta:
         indexes = [
             models.Index(fields=['seller', 'delivery_date']),
             models.Index(fields=['sync_status']),
+            models.Index(fields=['local_id']),
         ]
 
 class FutureOrderRequestItem(models.Model):
@@ -1137,6 +1189,7 @@ class DeliveryExpense(models.Model):
         on_delete=models.PROTECT
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     # Offline sync fields
     sync_status = models.CharField(
@@ -1157,7 +1210,9 @@ class DeliveryExpense(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['delivery_team', 'expense_date']),
+            models.Index(fields=['route', 'expense_date']),
             models.Index(fields=['sync_status']),
+            models.Index(fields=['local_id']),
         ]
 
 class CashDenomination(models.Model):
@@ -1204,6 +1259,7 @@ class CashDenomination(models.Model):
         null=True,
         blank=True
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         self.total_amount = self.denomination * self.count
@@ -1212,7 +1268,9 @@ def save(self, *args, **kwargs):
     class Meta:
         indexes = [
             models.Index(fields=['delivery_order', 'denomination']),
+            models.Index(fields=['route', 'delivery_date']),
             models.Index(fields=['sync_status']),
+            models.Index(fields=['local_id']),
         ]
 
 class SellerPriceCache(models.Model):
@@ -1354,6 +1412,7 @@ class Meta:
         indexes = [
             models.Index(fields=['route', 'sale_date']),
             models.Index(fields=['sync_status']),
+            models.Index(fields=['local_id']),
         ]
 
 
@@ -1373,9 +1432,9 @@ def save(self, *args, **kwargs):
         self.total_price = self.quantity * self.unit_price
         super().save(*args, **kwargs)
 
-        # Update the total price of the public sale
-        self.public_sale.total_price = self.public_sale.items.aggregate(total=models.Sum('total_price'))['total'] or 0
-        self.public_sale.save()
+        # Update the total price of the public sale once the changes commit
+        from .totals import schedule_public_sale_totals
+        schedule_public_sale_totals([self.public_sale_id])
 
     def __str__(self):
         return f"{self.product.name} - {self.quantity} - {self.total_price}"
@@ -1418,7 +1477,143 @@ class Meta:
         verbose_name_plural = 'Delivery Locations'
         indexes = [
             models.Index(fields=['seller', 'route', 'timestamp']),
+            models.Index(fields=['local_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.seller} @ {self.latitude},{self.longitude} on {self.timestamp}"
+
+class SellerLedger(models.Model):
+    """
+    Append-only record of what moves a seller's balance: delivery order
+    totals (sale), money collected (collection, negative) and the balance a
+    seller was carried into the system with (opening). A change to an order
+    is posted as the difference, never by editing earlier entries (see
+    apps/delivery/ledger.py).
+    """
+    ENTRY_TYPES = (
+        ('opening', 'Opening Balance'),
+        ('sale', 'Sale'),
+        ('collection', 'Collection'),
+    )
+
+    seller = models.ForeignKey(
+        Seller,
+        on_delete=models.PROTECT,
+        related_name='ledger_entries'
+    )
+    delivery_order = models.ForeignKey(
+        DeliveryOrder,
+        on_delete=models.SET_NULL,
+        related_name='ledger_entries',
+        null=True,
+        blank=True
+    )
+    reference = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text='Order number, kept after the order is deleted'
+    )
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    entry_date = models.DateField(help_text='Delivery date the entry belongs to')
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        help_text='Change to the balance; collections are negative'
+    )
+    balance_after = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        help_text='Running balance once this entry was appended'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seller', 'id']
+        verbose_name = 'Seller Ledger Entry'
+        verbose_name_plural = 'Seller Ledger'
+        indexes = [
+            models.Index(fields=['seller', 'entry_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.seller_id} {self.entry_type} {self.amount} on {self.entry_date}"
+
+
+class SellerBalance(models.Model):
+    """Running balance per seller: the sum of its SellerLedger entries"""
+    seller = models.OneToOneField(
+        Seller,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ledger_balance'
+    )
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    last_entry_date = models.DateField(
+        null=True,
+        blank=True,
+        help_text='Latest entry_date in the ledger; opening balances for later dates need no sum'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.seller_id}: {self.balance}"
+
+
+class DailySalesRollup(models.Model):
+    """
+    Ordered, delivered, broken and returned totals at the grain
+    route x seller x product x day, derived from the raw order items (see
+    apps/delivery/rollups.py). Broken orders, and returns without a delivery
+    order, have no seller.
+    """
+    date = models.DateField()
+    # Sales order items roll up under the seller's route, which may be unset
+    route = models.ForeignKey(
+        Route,
+        on_delete=models.SET_NULL,
+        related_name='daily_rollups',
+        null=True,
+        blank=True
+    )
+    seller = models.ForeignKey(
+        Seller,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups',
+        null=True,
+        blank=True
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups'
+    )
+    # Sales order items
+    ordered_items = models.PositiveIntegerField(default=0)
+    ordered_quantity = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal('0.000'))
+    ordered_value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    # Delivery order items
+    delivered_items = models.PositiveIntegerField(default=0)
+    delivered_quantity = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal('0.000'))
+    delivered_value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    broken_quantity = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal('0.000'))
+    returned_quantity = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal('0.000'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Daily Sales Rollup'
+        verbose_name_plural = 'Daily Sales Rollups'
+        indexes = [
+            models.Index(fields=['date', 'route']),
+            models.Index(fields=['product', 'date']),
+            models.Index(fields=['seller', 'date']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'route', 'seller', 'product'],
+                name='unique_daily_rollup_grain'
+            )
         ]
 
     def __str__(self):
-        return f"{self.seller} @ {self.latitude},{self.longitude} on {self.timestamp}"
\ No newline at end of file
+        return f"{self.date} - {self.route_id} - {self.seller_id} - {self.product_id}"
@@ -7,6 +7,7 @@
 from django.urls import reverse_lazy
 from django.contrib import messages
 import json
+import logging
 from decimal import Decimal
 
 from web_project import TemplateLayout
@@ -19,6 +20,11 @@
     Route
 )
 from apps.products.models import Product
+from apps.products.pricing import get_price_resolver
+from .reconciliation import loading_order_reconciliation
+from apps.seller.lookups import route_list
+
+logger = logging.getLogger(__name__)
 
 
 class PublicSaleListView(LoginRequiredMixin, DeliveryTeamRequiredMixin, ListView):
@@ -92,7 +98,7 @@ class PublicSaleCreateView(LoginRequiredMixin, DeliveryTeamRequiredMixin, View):
 
     def get(self, request):
         # Get data for the form
-        routes = Route.objects.all().order_by('name')
+        routes = route_list()
         delivery_teams = DeliveryTeam.objects.filter(is_active=True).order_by('name')
         loading_orders = LoadingOrder.objects.filter(status='completed').order_by('-loading_date')
 
@@ -169,9 +175,9 @@ def post(self, request):
                 try:
                     loading_order = LoadingOrder.objects.get(pk=loading_order_id)
                     delivery_team_id = loading_order.delivery_team_id
-                    print(f"Using delivery team {delivery_team_id} from loading order {loading_order_id}")
+                    logger.debug('Using delivery team %s from loading order %s', delivery_team_id, loading_order_id)
                 except LoadingOrder.DoesNotExist:
-                    print(f"Loading order {loading_order_id} not found")
+                    logger.info('Loading order %s not found', loading_order_id)
 
             # If still no delivery_team_id, try to get the first team for this route
             if not delivery_team_id:
@@ -179,9 +185,9 @@ def post(self, request):
                     delivery_team = DeliveryTeam.objects.filter(route_id=route_id, is_active=True).first()
                     if delivery_team:
                         delivery_team_id = delivery_team.id
-                        print(f"Using first delivery team {delivery_team_id} for route {route_id}")
-                except Exception as e:
-                    print(f"Error getting delivery team for route {route_id}: {str(e)}")
+                        logger.debug('Using first delivery team %s for route %s', delivery_team_id, route_id)
+                except Exception:
+                    logger.warning('Could not get a delivery team for route %s', route_id, exc_info=True)
 
             # Create the public sale
             public_sale = PublicSale.objects.create(
@@ -218,8 +224,8 @@ def post(self, request):
                         unit_price=unit_price,
                         total_price=total_price
                     )
-                except Exception as e:
-                    print(f"Error creating public sale item: {str(e)}")
+                except Exception:
+                    logger.warning('Could not create public sale item', exc_info=True)
                     # Continue with other items even if one fails
 
             return JsonResponse({
@@ -229,7 +235,7 @@ def post(self, request):
             })
 
         except Exception as e:
-            print(f"Error creating public sale: {str(e)}")
+            logger.exception('Could not create public sale')
             return JsonResponse({
                 'status': 'error',
                 'error': str(e)
@@ -247,7 +253,7 @@ def get(self, request, pk):
         )
 
         # Get data for the form
-        routes = Route.objects.all().order_by('name')
+        routes = route_list()
         delivery_teams = DeliveryTeam.objects.filter(is_active=True).order_by('name')
         loading_orders = LoadingOrder.objects.filter(status='completed').order_by('-loading_date')
 
@@ -359,8 +365,8 @@ def post(self, request, pk):
                         unit_price=unit_price,
                         total_price=total_price
                     )
-                except Exception as e:
-                    print(f"Error updating public sale item: {str(e)}")
+                except Exception:
+                    logger.warning('Could not update public sale item', exc_info=True)
                     # Continue with other items even if one fails
 
             return JsonResponse({
@@ -370,7 +376,7 @@ def post(self, request, pk):
             })
 
         except Exception as e:
-            print(f"Error updating public sale: {str(e)}")
+            logger.exception('Could not update public sale')
             return JsonResponse({
                 'status': 'error',
                 'error': str(e)
@@ -447,12 +453,13 @@ def get_available_products_for_public_sale(request):
     if not loading_order_id:
         try:
             products = Product.objects.all()
+            resolver = get_price_resolver()
             product_list = [{
                 'id': product.id,
                 'code': product.code,
                 'name': product.name,
                 'available_quantity': 999,  # No limit if no loading order
-                'price': float(product.price)
+                'price': float(resolver.get_general_price(product.id) or 0)
             } for product in products]
 
             return JsonResponse({
@@ -466,40 +473,20 @@ def get_available_products_for_public_sale(request):
             }, status=500)
 
     try:
-        # Get the loading order
-        loading_order = get_object_or_404(LoadingOrder, pk=loading_order_id)
-
-        # Get the loading order items
-        loading_order_items = loading_order.items.select_related('product').all()
+        loading_order = get_object_or_404(LoadingOrder.objects.only('route_id', 'loading_date'), pk=loading_order_id)
+        resolver = get_price_resolver()
 
-        # Format the response
+        # Whatever is still on the truck can be sold
         products = []
-        for item in loading_order_items:
-            # Calculate available quantity (considering already sold items)
-            available_quantity = item.quantity
-
-            # Subtract quantities from delivery orders
-            delivery_orders = loading_order.delivery_orders.all()
-            for order in delivery_orders:
-                order_items = order.items.filter(product=item.product)
-                for order_item in order_items:
-                    available_quantity -= order_item.delivered_quantity
-
-            # Subtract quantities from public sales
-            public_sales = loading_order.public_sales.all()
-            for sale in public_sales:
-                sale_items = sale.items.filter(product=item.product)
-                for sale_item in sale_items:
-                    available_quantity -= sale_item.quantity
-
-            # Only include products with available quantity
-            if available_quantity > 0:
+        for row in loading_order_reconciliation(loading_order):
+            if row['remaining'] > 0:
+                price = resolver.get_general_price(row['product_id'], loading_order.loading_date)
                 products.append({
-                    'id': item.product.id,
-                    'code': item.product.code,
-                    'name': item.product.name,
-                    'available_quantity': float(available_quantity),
-                    'price': float(item.product.price)
+                    'id': row['product_id'],
+                    'code': row['product_code'],
+                    'name': row['product_name'],
+                    'available_quantity': float(row['remaining']),
+                    'price': float(price or 0),
                 })
 
         return JsonResponse({
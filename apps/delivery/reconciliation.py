@@ -0,0 +1,141 @@
+"""
+Loading order reconciliation: for every product on a loading order, how
+much was loaded and where it went - delivered to sellers, reported broken,
+returned to the depot or sold to the public - and what is left on the truck.
+
+Each of those comes from one grouped SUM over its item table, so a loading
+order reconciles in a constant number of queries however many delivery
+orders and reports hang off it. The result is kept in the shared cache
+(apps/core/cache.py) under a namespace per loading order, which the item
+and order signals in signals.py invalidate; bulk writes that skip those
+signals call invalidate_reconciliations() themselves.
+"""
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+
+from apps.core.cache import cached, invalidate
+from apps.products.models import Product
+
+from .models import (
+    BrokenOrderItem, DeliveryOrder, DeliveryOrderItem, LoadingOrder, LoadingOrderItem, PublicSaleItem,
+    ReturnedOrder, ReturnedOrderItem,
+)
+
+ZERO = Decimal('0.000')
+
+# Measures of a reconciliation row, in the order stock leaves the truck
+MEASURES = ('loaded', 'delivered', 'broken', 'returned', 'public_sold')
+
+# Also bounds how long a change the signals cannot see (an order moved to
+# another loading order) stays hidden
+CACHE_TIMEOUT = 300
+
+
+def remaining_quantity(loaded, delivered=ZERO, broken=ZERO, returned=ZERO, public_sold=ZERO):
+    """What is still on the truck"""
+    return loaded - delivered - broken - returned - public_sold
+
+
+def _sums(queryset, quantity_field):
+    return dict(
+        queryset.order_by().values_list('product_id').annotate(total=Sum(quantity_field))
+    )
+
+
+def reconcile_loading_order(loading_order):
+    """
+    [{product_id, product_code, product_name, loaded, delivered, broken,
+    returned, public_sold, remaining}] by product name, every product
+    loaded or moved under this loading order
+    """
+    if not isinstance(loading_order, LoadingOrder):
+        loading_order = LoadingOrder.objects.get(pk=loading_order)
+
+    totals = {
+        'loaded': _sums(LoadingOrderItem.objects.filter(loading_order=loading_order), 'loaded_quantity'),
+        'delivered': _sums(
+            DeliveryOrderItem.objects.filter(delivery_order__loading_order=loading_order).exclude(
+                delivery_order__status='cancelled'
+            ),
+            'delivered_quantity',
+        ),
+        'broken': _sums(
+            BrokenOrderItem.objects.filter(broken_order__loading_order=loading_order).exclude(
+                broken_order__status='cancelled'
+            ),
+            'quantity',
+        ),
+        # Returns point at a delivery order, or only at the route and day
+        'returned': _sums(
+            ReturnedOrderItem.objects.filter(
+                Q(returned_order__delivery_order__loading_order=loading_order)
+                | Q(
+                    returned_order__delivery_order__isnull=True,
+                    returned_order__route_id=loading_order.route_id,
+                    returned_order__return_date=loading_order.loading_date,
+                )
+            ),
+            'quantity',
+        ),
+        'public_sold': _sums(
+            PublicSaleItem.objects.filter(public_sale__loading_order=loading_order).exclude(
+                public_sale__status='cancelled'
+            ),
+            'quantity',
+        ),
+    }
+
+    product_ids = set().union(*totals.values())
+    products = Product.objects.only('code', 'name').in_bulk(product_ids)
+    rows = []
+    for product_id in product_ids:
+        row = {measure: totals[measure].get(product_id) or ZERO for measure in MEASURES}
+        row['remaining'] = remaining_quantity(**row)
+        product = products[product_id]
+        rows.append({'product_id': product_id, 'product_code': product.code, 'product_name': product.name, **row})
+    rows.sort(key=lambda row: (row['product_name'], row['product_id']))
+    return rows
+
+
+def _namespace(loading_order_id):
+    return f'reconciliation.{loading_order_id}'
+
+
+def loading_order_reconciliation(loading_order):
+    """reconcile_loading_order(), from the cache while nothing has changed"""
+    loading_order_id = getattr(loading_order, 'pk', loading_order)
+    return cached(
+        _namespace(loading_order_id), 'rows',
+        lambda: reconcile_loading_order(loading_order), timeout=CACHE_TIMEOUT,
+    )
+
+
+def loading_orders_of(orders):
+    """Ids of the loading orders these delivery, broken, returned or public sale orders count towards"""
+    loading_order_ids, delivery_order_ids, unlinked_returns = set(), set(), Q()
+    for order in orders:
+        if isinstance(order, LoadingOrder):
+            loading_order_ids.add(order.pk)
+        elif isinstance(order, ReturnedOrder):
+            if order.delivery_order_id:
+                delivery_order_ids.add(order.delivery_order_id)
+            else:
+                unlinked_returns |= Q(route_id=order.route_id, loading_date=order.return_date)
+        else:
+            loading_order_ids.add(getattr(order, 'loading_order_id', None))
+    if delivery_order_ids:
+        loading_order_ids.update(
+            DeliveryOrder.objects.filter(pk__in=delivery_order_ids).values_list('loading_order_id', flat=True)
+        )
+    if unlinked_returns:
+        loading_order_ids.update(LoadingOrder.objects.filter(unlinked_returns).values_list('pk', flat=True))
+    loading_order_ids.discard(None)
+    return loading_order_ids
+
+
+def invalidate_reconciliations(loading_order_ids):
+    """Drop the cached reconciliation of these loading orders"""
+    namespaces = [_namespace(loading_order_id) for loading_order_id in set(loading_order_ids) if loading_order_id]
+    if namespaces:
+        invalidate(*namespaces)
@@ -7,6 +7,7 @@
 from django.urls import reverse_lazy
 from django.contrib import messages
 import json
+import logging
 from decimal import Decimal
 
 from web_project import TemplateLayout
@@ -15,16 +16,15 @@
     ReturnedOrder,
     ReturnedOrderItem,
     DeliveryOrder,
-    DeliveryOrderItem,
     LoadingOrder,
-    LoadingOrderItem,
-    BrokenOrder,
-    BrokenOrderItem,
-    Product,
-    Route
+    Product
 )
+from .reconciliation import loading_order_reconciliation
+from apps.seller.lookups import route_list
 from django.db.models import Sum, F
 
+logger = logging.getLogger(__name__)
+
 
 class ReturnOrderListView(LoginRequiredMixin, DeliveryTeamRequiredMixin, ListView):
     """View for listing all return orders"""
@@ -91,7 +91,7 @@ class ReturnOrderCreateView(LoginRequiredMixin, DeliveryTeamRequiredMixin, View)
 
     def get(self, request):
         # Get data for the form
-        routes = Route.objects.all().order_by('name')
+        routes = route_list()
 
         context = TemplateLayout.init(self, {
             'routes': routes,
@@ -106,8 +106,6 @@ def post(self, request):
             route_id = request.POST.get('route_id')
             return_date = request.POST.get('return_date')
             reason = request.POST.get('reason', '')
-            print('route id: ', route_id)
-
             # Get items data
             items_data_str = request.POST.get('items_data')
 
@@ -156,16 +154,16 @@ def post(self, request):
 
             # Log whether a delivery order was found
             if delivery_order:
-                print(f"Created return order {return_order.order_number} with delivery order {delivery_order.order_number}")
+                logger.info('Created return order %s with delivery order %s', return_order.order_number, delivery_order.order_number)
             else:
-                print(f"Created return order {return_order.order_number} without a delivery order for route {route_id}")
+                logger.info('Created return order %s without a delivery order for route %s', return_order.order_number, route_id)
 
             # Calculate the maximum returnable quantity for each product
             max_returnable = calculate_max_returnable_quantity(route_id, return_date)
 
             # Validate and create return order items
             invalid_items = []
-            print('items_data: ', items_data)
+            logger.debug('Return order items: %s', items_data)
             for item in items_data:
                 try:
                     product_id = int(item['product_id'])
@@ -191,8 +189,8 @@ def post(self, request):
                         quantity=quantity,
                         # reason=item_reason
                     )
-                except Exception as e:
-                    print(f"Error creating return order item: {str(e)}")
+                except Exception:
+                    logger.warning('Could not create return order item', exc_info=True)
                     # Continue with other items even if one fails
 
             # If there are invalid items, return an error
@@ -213,7 +211,7 @@ def post(self, request):
             })
 
         except Exception as e:
-            print(f"Error creating return order: {str(e)}")
+            logger.exception('Could not create return order')
             return JsonResponse({
                 'status': 'error',
                 'error': str(e)
@@ -231,7 +229,7 @@ def get(self, request, pk):
         )
 
         # Get data for the form
-        routes = Route.objects.all().order_by('name')
+        routes = route_list()
 
         # Get the route from the delivery order if it exists
         selected_route_id = None
@@ -303,9 +301,9 @@ def post(self, request, pk):
 
             # Log whether a delivery order was found
             if delivery_order:
-                print(f"Updated return order {return_order.order_number} with delivery order {delivery_order.order_number}")
+                logger.info('Updated return order %s with delivery order %s', return_order.order_number, delivery_order.order_number)
             else:
-                print(f"Updated return order {return_order.order_number} without a delivery order for route {route_id}")
+                logger.info('Updated return order %s without a delivery order for route %s', return_order.order_number, route_id)
 
             # Calculate the maximum returnable quantity for each product
             max_returnable = calculate_max_returnable_quantity(route_id, return_date)
@@ -342,8 +340,8 @@ def post(self, request, pk):
                         quantity=quantity,
                         reason=item_reason
                     )
-                except Exception as e:
-                    print(f"Error updating return order item: {str(e)}")
+                except Exception:
+                    logger.warning('Could not update return order item', exc_info=True)
                     # Continue with other items even if one fails
 
             # If there are invalid items, return an error
@@ -364,7 +362,7 @@ def post(self, request, pk):
             })
 
         except Exception as e:
-            print(f"Error updating return order: {str(e)}")
+            logger.exception('Could not update return order')
             return JsonResponse({
                 'status': 'error',
                 'error': str(e)
@@ -434,65 +432,23 @@ def post(self, request, pk):
 
 # Helper function to calculate maximum returnable quantity
 def calculate_max_returnable_quantity(route_id, return_date):
-    """Calculate the maximum returnable quantity for each product based on loading orders, delivery orders, and broken orders"""
-    # Find the most recent loading order for this route and date
+    """
+    Reconciliation rows of the route's latest loading order up to the
+    return date, each with max_returnable: what is still on the truck
+    """
     loading_order = LoadingOrder.objects.filter(
         route_id=route_id,
         loading_date__lte=return_date,
-        # status='completed'
-    ).order_by('-loading_date').first()
+    ).order_by('-loading_date').only('route_id', 'loading_date').first()
 
     if not loading_order:
-        print(f"No loading order found for route {route_id} and date {return_date}")
-        return {}
-
-    # Get all products and quantities from the loading order
-    loading_items = LoadingOrderItem.objects.filter(loading_order=loading_order).select_related('product')
-    print('loading items: ', loading_items)
-
-    # Initialize a dictionary to store the maximum returnable quantity for each product
-    max_returnable = {}
-
-    for item in loading_items:
-        max_returnable[item.product_id] = {
-            'product': item.product,
-            'loaded_quantity': item.loaded_quantity,
-            'delivered_quantity': 0,
-            'broken_quantity': 0,
-            'max_returnable': item.loaded_quantity
-        }
-
-    # Get all delivery orders for this loading order
-    delivery_orders = DeliveryOrder.objects.filter(loading_order=loading_order)
-
-    # Calculate the total delivered quantity for each product
-    for order in delivery_orders:
-        delivery_items = DeliveryOrderItem.objects.filter(delivery_order=order)
-        for item in delivery_items:
-            if item.product_id in max_returnable:
-                max_returnable[item.product_id]['delivered_quantity'] += item.delivered_quantity
-
-    # Get all broken orders for this loading order
-    broken_orders = BrokenOrder.objects.filter(loading_order=loading_order)
-
-    # Calculate the total broken quantity for each product
-    for order in broken_orders:
-        broken_items = BrokenOrderItem.objects.filter(broken_order=order)
-        for item in broken_items:
-            if item.product_id in max_returnable:
-                max_returnable[item.product_id]['broken_quantity'] += item.quantity
-
-    # Calculate the maximum returnable quantity for each product
-    for product_id, data in max_returnable.items():
-        # Max returnable = Loaded - Delivered - Broken
-        data['max_returnable'] = max(
-            0,
-            data['loaded_quantity'] - data['delivered_quantity'] - data['broken_quantity']
-        )
-
-        print(f"Product {data['product'].name}: Loaded={data['loaded_quantity']}, Delivered={data['delivered_quantity']}, Broken={data['broken_quantity']}, Max Returnable={data['max_returnable']}")
+        logger.info('No loading order for route %s on %s', route_id, return_date)
+        return []
 
-    return max_returnable
+    return [
+        {**row, 'max_returnable': max(row['remaining'], 0)}
+        for row in loading_order_reconciliation(loading_order)
+    ]
 
 
 # API Views for Return Orders
@@ -500,8 +456,6 @@ def get_available_products_for_return(request):
     """API endpoint to get available products for return from a route"""
     route_id = request.GET.get('route_id')
     return_date = request.GET.get('return_date')
-    print('route: ', route_id)
-    print('return date: ', return_date)
     if not route_id:
         # If no route is specified, return all products
         try:
@@ -551,23 +505,23 @@ def get_available_products_for_return(request):
 
         # Format the response
         products = []
-        for product_id, data in max_returnable.items():
-            if data['max_returnable'] > 0:
-                product = data['product']
+        for row in max_returnable:
+            if row['max_returnable'] > 0:
                 products.append({
-                    'id': product.id,
-                    'code': product.code,
-                    'name': product.name,
-                    'max_returnable': float(data['max_returnable']),
-                    'loaded_quantity': float(data['loaded_quantity']),
-                    'delivered_quantity': float(data['delivered_quantity']),
-                    'broken_quantity': float(data['broken_quantity']),
-                    # 'price': float(product.price)
+                    'id': row['product_id'],
+                    'code': row['product_code'],
+                    'name': row['product_name'],
+                    'max_returnable': float(row['max_returnable']),
+                    'loaded_quantity': float(row['loaded']),
+                    'delivered_quantity': float(row['delivered']),
+                    'broken_quantity': float(row['broken']),
+                    'returned_quantity': float(row['returned']),
+                    'public_sold_quantity': float(row['public_sold']),
                 })
 
         # If no products with returnable quantity, return all products
         if not products:
-            print("No products with returnable quantity found, returning all products")
+            logger.debug('No products with returnable quantity, returning all products')
             products = Product.objects.all()
             product_list = [{
                 'id': product.id,
@@ -0,0 +1,225 @@
+"""
+Daily rollups: DailySalesRollup rows hold, per route x seller x product x
+day, what was ordered (sales order items), delivered (delivery order
+items), reported broken and returned, with item counts for the first two.
+Dashboards aggregate these rows instead of rescanning the raw item tables.
+
+Rows are rebuilt per slice, a (date, route_id) pair: deleted and computed
+again from the raw items with one grouped query per source. Model signals
+(see signals.py) schedule the slices a save or delete touches; bulk writes
+that skip signals call schedule_rollup_refresh themselves. The
+rebuild_daily_rollups command backfills or compacts a date range and
+check_daily_rollups compares the rows against the raw data.
+"""
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum
+
+from apps.sales.models import OrderItem, SalesOrder
+from apps.seller.models import Seller
+
+from .models import (
+    BrokenOrder, BrokenOrderItem, DailySalesRollup, DeliveryOrderItem, ReturnedOrder, ReturnedOrderItem,
+)
+
+MEASURES = (
+    'ordered_items', 'ordered_quantity', 'ordered_value',
+    'delivered_items', 'delivered_quantity', 'delivered_value',
+    'broken_quantity', 'returned_quantity',
+)
+
+# Slices whose rows need rebuilding once the current transaction commits
+_pending_slices = threading.local()
+
+
+class RollupSource:
+    """One raw item table and the lookups that place its rows in the grain"""
+
+    def __init__(self, model, date, route, seller, measures):
+        self.model = model
+        self.date = date
+        self.route = route
+        self.seller = seller
+        self.measures = measures
+
+    def filter(self, start_date=None, end_date=None, slices=None):
+        queryset = self.model.objects.all()
+        if start_date:
+            queryset = queryset.filter(**{f'{self.date}__gte': start_date})
+        if end_date:
+            queryset = queryset.filter(**{f'{self.date}__lte': end_date})
+        if slices is not None:
+            queryset = queryset.filter(_slices_q(slices, self.date, self.route))
+        return queryset
+
+    def grouped(self, **filters):
+        """(date, route_id, seller_id, product_id, {measure: value}) per grain cell"""
+        group = {'rollup_date': F(self.date), 'rollup_route': F(self.route), 'rollup_product': F('product_id')}
+        if self.seller:
+            group['rollup_seller'] = F(self.seller)
+        rows = self.filter(**filters).order_by().values(**group).annotate(**self.measures())
+        for row in rows:
+            key = (row['rollup_date'], row['rollup_route'], row.get('rollup_seller'), row['rollup_product'])
+            yield key, {measure: row[measure] for measure in self.measures()}
+
+
+def _sum(expression, decimal_places):
+    return Sum(expression, output_field=DecimalField(max_digits=14, decimal_places=decimal_places))
+
+
+SOURCES = (
+    RollupSource(
+        OrderItem, 'order__delivery_date', 'order__seller__route_id', 'order__seller_id',
+        lambda: {
+            'ordered_items': Count('id'),
+            'ordered_quantity': _sum('quantity', 3),
+            'ordered_value': _sum(F('quantity') * F('unit_price'), 2),
+        },
+    ),
+    RollupSource(
+        DeliveryOrderItem, 'delivery_order__delivery_date', 'delivery_order__route_id', 'delivery_order__seller_id',
+        lambda: {
+            'delivered_items': Count('id'),
+            'delivered_quantity': _sum('delivered_quantity', 3),
+            'delivered_value': _sum('total_price', 2),
+        },
+    ),
+    RollupSource(
+        BrokenOrderItem, 'broken_order__report_date', 'broken_order__route_id', None,
+        lambda: {'broken_quantity': _sum('quantity', 3)},
+    ),
+    RollupSource(
+        ReturnedOrderItem, 'returned_order__return_date', 'returned_order__route_id',
+        'returned_order__delivery_order__seller_id',
+        lambda: {'returned_quantity': _sum('quantity', 3)},
+    ),
+)
+
+
+def order_slice(order):
+    """
+    The (date, route_id) slice a DeliveryOrder, BrokenOrder, ReturnedOrder or
+    SalesOrder rolls up into; sales orders use the seller's route
+    """
+    if isinstance(order, SalesOrder):
+        route_id = Seller.objects.filter(pk=order.seller_id).values_list('route_id', flat=True).first()
+        return (order.delivery_date, route_id)
+    if isinstance(order, BrokenOrder):
+        return (order.report_date, order.route_id)
+    if isinstance(order, ReturnedOrder):
+        return (order.return_date, order.route_id)
+    return (order.delivery_date, order.route_id)
+
+
+def _slices_q(slices, date_field, route_field):
+    """OR of (date, route) pairs, one IN per date"""
+    routes_by_date = defaultdict(set)
+    for day, route_id in slices:
+        routes_by_date[day].add(route_id)
+    condition = Q(pk__in=[])
+    for day, route_ids in routes_by_date.items():
+        day_condition = Q(**{f'{route_field}__in': [route_id for route_id in route_ids if route_id is not None]})
+        if None in route_ids:
+            day_condition |= Q(**{f'{route_field}__isnull': True})
+        condition |= Q(**{date_field: day}) & day_condition
+    return condition
+
+
+def compute_rollups(start_date=None, end_date=None, slices=None):
+    """
+    {(date, route_id, seller_id, product_id): {measure: value}} straight
+    from the raw items, for a date range and/or a set of (date, route_id)
+    slices. Measures a cell has no rows for are 0.
+    """
+    cells = {}
+    for source in SOURCES:
+        for key, measures in source.grouped(start_date=start_date, end_date=end_date, slices=slices):
+            cell = cells.setdefault(key, dict.fromkeys(MEASURES, 0))
+            for measure, value in measures.items():
+                cell[measure] += value or 0
+    return cells
+
+
+def raw_date_bounds():
+    """(first, last) date any raw item rolls up into, or (None, None) without data"""
+    days = []
+    for source in SOURCES:
+        bounds = source.model.objects.aggregate(first=Min(source.date), last=Max(source.date))
+        days.extend(day for day in bounds.values() if day)
+    return (min(days), max(days)) if days else (None, None)
+
+
+def _stored(start_date=None, end_date=None, slices=None):
+    queryset = DailySalesRollup.objects.all()
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+    if slices is not None:
+        queryset = queryset.filter(_slices_q(slices, 'date', 'route_id'))
+    return queryset
+
+
+def refresh_rollups(start_date=None, end_date=None, slices=None):
+    """
+    Rebuild the DailySalesRollup rows of a date range (all history when
+    both bounds are None) or of a set of (date, route_id) slices. Returns
+    the number of rows written.
+    """
+    slices = set(slices) if slices is not None else None
+    if slices is not None and not slices:
+        return 0
+    cells = compute_rollups(start_date, end_date, slices)
+    rows = [
+        DailySalesRollup(date=day, route_id=route_id, seller_id=seller_id, product_id=product_id, **measures)
+        for (day, route_id, seller_id, product_id), measures in cells.items()
+    ]
+    with transaction.atomic():
+        _stored(start_date, end_date, slices).delete()
+        DailySalesRollup.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def check_rollups(start_date=None, end_date=None):
+    """
+    Compare the stored rollups of a date range with the raw items. Returns a
+    list of (key, stored, expected) for every cell that differs, where key is
+    (date, route_id, seller_id, product_id) and stored/expected are measure
+    dicts (None for a missing cell).
+    """
+    expected = compute_rollups(start_date, end_date)
+    stored = {}
+    for row in _stored(start_date, end_date).values('date', 'route_id', 'seller_id', 'product_id', *MEASURES):
+        key = (row['date'], row['route_id'], row['seller_id'], row['product_id'])
+        stored[key] = {measure: row[measure] for measure in MEASURES}
+
+    mismatches = []
+    for key in sorted(set(expected) | set(stored), key=lambda key: tuple(str(part) for part in key)):
+        if expected.get(key) != stored.get(key):
+            mismatches.append((key, stored.get(key), expected.get(key)))
+    return mismatches
+
+
+def _run_scheduled_refresh():
+    slices = getattr(_pending_slices, 'slices', set())
+    _pending_slices.slices = set()
+    if slices:
+        refresh_rollups(slices=slices)
+
+
+def schedule_rollup_refresh(slices):
+    """
+    Rebuild these (date, route_id) slices after the current transaction
+    commits. Requests are merged, so saving an order and all of its items
+    rebuilds the slice once.
+    """
+    slices = {(day, route_id) for day, route_id in slices if day}
+    if not slices:
+        return
+    if not hasattr(_pending_slices, 'slices'):
+        _pending_slices.slices = set()
+    _pending_slices.slices.update(slices)
+    # Later callbacks find the pending set already drained and do nothing
+    transaction.on_commit(_run_scheduled_refresh)
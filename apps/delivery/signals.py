@@ -0,0 +1,145 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from apps.sales.models import OrderItem, SalesOrder
+
+from .models import (
+    BrokenOrder, BrokenOrderItem, DeliveryOrder, DeliveryOrderItem, LoadingOrder, LoadingOrderItem, PublicSale,
+    PublicSaleItem, ReturnedOrder, ReturnedOrderItem,
+)
+from .ledger import LEDGER_FIELDS, post_delivery_orders, reverse_delivery_order
+from .reconciliation import invalidate_reconciliations, loading_orders_of
+from .rollups import order_slice, schedule_rollup_refresh
+
+
+# Fields whose change moves an order to another slice
+ORDER_SLICE_FIELDS = {
+    DeliveryOrder: {'delivery_date', 'route', 'route_id'},
+    BrokenOrder: {'report_date', 'route', 'route_id'},
+    ReturnedOrder: {'return_date', 'route', 'route_id'},
+    SalesOrder: {'delivery_date', 'seller', 'seller_id'},
+}
+
+# Item model -> foreign key to its order
+ITEM_ORDERS = {
+    DeliveryOrderItem: 'delivery_order',
+    BrokenOrderItem: 'broken_order',
+    ReturnedOrderItem: 'returned_order',
+    OrderItem: 'order',
+}
+
+# Item model -> foreign key to the order it is reconciled under
+RECONCILED_ITEMS = {
+    LoadingOrderItem: 'loading_order',
+    DeliveryOrderItem: 'delivery_order',
+    BrokenOrderItem: 'broken_order',
+    ReturnedOrderItem: 'returned_order',
+    PublicSaleItem: 'public_sale',
+}
+
+
+def _moves_slice(sender, update_fields):
+    # recalculate_totals() and other update_fields saves leave the rollups alone
+    return not update_fields or bool(ORDER_SLICE_FIELDS[sender] & set(update_fields))
+
+
+@receiver(pre_save, sender=DeliveryOrder)
+@receiver(pre_save, sender=BrokenOrder)
+@receiver(pre_save, sender=ReturnedOrder)
+@receiver(pre_save, sender=SalesOrder)
+def remember_order_slice(sender, instance, **kwargs):
+    """
+    Keep the slice the order was in before this save, so moving it to
+    another date or route rebuilds both
+    """
+    instance._previous_rollup_slice = None
+    if instance.pk and _moves_slice(sender, kwargs.get('update_fields')):
+        previous = sender.objects.filter(pk=instance.pk).first()
+        if previous:
+            instance._previous_rollup_slice = order_slice(previous)
+
+
+@receiver(post_save, sender=DeliveryOrder)
+@receiver(post_save, sender=BrokenOrder)
+@receiver(post_save, sender=ReturnedOrder)
+@receiver(post_save, sender=SalesOrder)
+def refresh_rollups_for_moved_order(sender, instance, **kwargs):
+    # Only the slice matters at order level; item signals cover the contents
+    previous = getattr(instance, '_previous_rollup_slice', None)
+    if previous:
+        current = order_slice(instance)
+        if current != previous:
+            schedule_rollup_refresh([previous, current])
+
+
+@receiver(post_delete, sender=DeliveryOrder)
+@receiver(post_delete, sender=BrokenOrder)
+@receiver(post_delete, sender=ReturnedOrder)
+@receiver(post_delete, sender=SalesOrder)
+def refresh_rollups_for_deleted_order(sender, instance, **kwargs):
+    schedule_rollup_refresh([order_slice(instance)])
+
+
+@receiver(post_save, sender=DeliveryOrderItem)
+@receiver(post_save, sender=BrokenOrderItem)
+@receiver(post_save, sender=ReturnedOrderItem)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=DeliveryOrderItem)
+@receiver(post_delete, sender=BrokenOrderItem)
+@receiver(post_delete, sender=ReturnedOrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_rollups_for_item(sender, instance, **kwargs):
+    order = item_order(instance, ITEM_ORDERS[sender])
+    if order:
+        schedule_rollup_refresh([order_slice(order)])
+
+
+def item_order(instance, field_name):
+    """The order an item belongs to, None when the order is gone"""
+    field = instance._meta.get_field(field_name)
+    if field.is_cached(instance):
+        return field.get_cached_value(instance)
+    # When the whole order is being deleted its own signal covers it
+    return field.related_model.objects.filter(pk=getattr(instance, field.attname)).first()
+
+
+@receiver(post_save, sender=LoadingOrder)
+@receiver(post_save, sender=DeliveryOrder)
+@receiver(post_save, sender=BrokenOrder)
+@receiver(post_save, sender=ReturnedOrder)
+@receiver(post_save, sender=PublicSale)
+@receiver(post_delete, sender=DeliveryOrder)
+@receiver(post_delete, sender=BrokenOrder)
+@receiver(post_delete, sender=ReturnedOrder)
+@receiver(post_delete, sender=PublicSale)
+def invalidate_reconciliation_for_order(sender, instance, **kwargs):
+    invalidate_reconciliations(loading_orders_of([instance]))
+
+
+@receiver(post_save, sender=LoadingOrderItem)
+@receiver(post_save, sender=DeliveryOrderItem)
+@receiver(post_save, sender=BrokenOrderItem)
+@receiver(post_save, sender=ReturnedOrderItem)
+@receiver(post_save, sender=PublicSaleItem)
+@receiver(post_delete, sender=LoadingOrderItem)
+@receiver(post_delete, sender=DeliveryOrderItem)
+@receiver(post_delete, sender=BrokenOrderItem)
+@receiver(post_delete, sender=ReturnedOrderItem)
+@receiver(post_delete, sender=PublicSaleItem)
+def invalidate_reconciliation_for_item(sender, instance, **kwargs):
+    order = item_order(instance, RECONCILED_ITEMS[sender])
+    if order:
+        invalidate_reconciliations(loading_orders_of([order]))
+
+
+@receiver(post_save, sender=DeliveryOrder)
+def post_delivery_order_to_ledger(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not LEDGER_FIELDS & set(update_fields):
+        return
+    post_delivery_orders([instance])
+
+
+@receiver(pre_delete, sender=DeliveryOrder)
+def reverse_deleted_delivery_order(sender, instance, **kwargs):
+    reverse_delivery_order(instance)
@@ -1,3 +1,321 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.admin_dashboard.utils import get_seller_balance_report
+from apps.api import analytics
+from apps.core.testing import (
+    clear_caches, create_delivery_team, create_general_plan, create_products, create_route, create_sellers,
+    create_user,
+)
+from apps.sales.models import OrderItem, SalesOrder
+from .ledger import current_balance, opening_balance
+from .models import (
+    BrokenOrder, BrokenOrderItem, DailySalesRollup, DeliveryOrder, DeliveryOrderItem, LoadingOrder,
+    LoadingOrderItem, PublicSale, PublicSaleItem, PurchaseOrder, ReturnedOrder, ReturnedOrderItem, SellerLedger,
+)
+from .reconciliation import reconcile_loading_order
+from .rollups import check_rollups
+
+
+class DailyRollupTests(TestCase):
+    """DailySalesRollup rows follow item saves and deletes and match the raw data"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.route = create_route('South')
+        cls.product, = create_products(['Curd 500g'], category='Curd')
+        cls.seller, = create_sellers(cls.route, 1)
+
+    def create_order(self, delivery_date, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = DeliveryOrder.objects.create(
+                route=self.route, seller=self.seller, delivery_date=delivery_date
+            )
+            item = DeliveryOrderItem.objects.create(
+                delivery_order=order, product=self.product, ordered_quantity=quantity,
+                delivered_quantity=quantity, unit_price=Decimal('4.00'), total_price=Decimal('0'),
+            )
+        return order, item
+
+    def test_item_changes_update_the_rollup(self):
+        order, item = self.create_order(date(2026, 10, 1), Decimal('3'))
+        rollup = DailySalesRollup.objects.get()
+        self.assertEqual(rollup.delivered_quantity, Decimal('3.000'))
+        self.assertEqual(rollup.delivered_value, Decimal('12.00'))
+        self.assertEqual(rollup.delivered_items, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delivery_date = date(2026, 10, 2)
+            order.save()
+        self.assertEqual(list(DailySalesRollup.objects.values_list('date', flat=True)), [date(2026, 10, 2)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.assertFalse(DailySalesRollup.objects.exists())
+        self.assertEqual(check_rollups(), [])
+
+    def test_checker_and_rebuild_command(self):
+        self.create_order(date(2026, 10, 1), Decimal('3'))
+        self.create_order(date(2026, 11, 5), Decimal('2'))
+        DailySalesRollup.objects.all().delete()
+
+        self.assertEqual(len(check_rollups()), 2)
+        with self.assertRaises(CommandError):
+            call_command('check_daily_rollups', stdout=StringIO())
+
+        call_command('rebuild_daily_rollups', stdout=StringIO())
+        self.assertEqual(DailySalesRollup.objects.count(), 2)
+        self.assertEqual(check_rollups(), [])
+
+        totals = {
+            row['period']: row['total_value']
+            for row in DailySalesRollup.objects.annotate(
+                period=analytics.period_trunc('year', 'date')
+            ).values('period').annotate(total_value=Sum('delivered_value'))
+        }
+        self.assertEqual(totals, {date(2026, 1, 1): Decimal('20.00')})
+
+
+class SellerLedgerTests(TestCase):
+    """Delivery order totals and collections are posted to the seller ledger"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.route = create_route('East')
+        cls.seller, = create_sellers(cls.route, 1)
+
+    def create_order(self, delivery_date, total_price, amount_collected, opening_balance='0.00'):
+        return DeliveryOrder.objects.create(
+            route=self.route, seller=self.seller, delivery_date=delivery_date,
+            total_price=Decimal(total_price), amount_collected=Decimal(amount_collected),
+            opening_balance=Decimal(opening_balance),
+        )
+
+    def test_balances_follow_order_changes(self):
+        first = self.create_order(date(2026, 10, 1), '100.00', '30.00', opening_balance='50.00')
+        second = self.create_order(date(2026, 10, 3), '40.00', '0.00')
+
+        self.assertEqual(current_balance(self.seller), Decimal('160.00'))
+        self.assertEqual(opening_balance(self.seller, date(2026, 10, 1)), Decimal('0.00'))
+        self.assertEqual(opening_balance(self.seller, '2026-10-02'), Decimal('120.00'))
+        self.assertEqual(opening_balance(self.seller, date(2026, 10, 4)), Decimal('160.00'))
+
+        first.amount_collected = Decimal('100.00')
+        first.save()
+        self.assertEqual(opening_balance(self.seller, date(2026, 10, 3)), Decimal('50.00'))
+
+        second.delete()
+        self.assertEqual(current_balance(self.seller), Decimal('50.00'))
+        # Nothing is rewritten: the changes are appended
+        self.assertEqual(SellerLedger.objects.filter(entry_type='collection').count(), 2)
+        self.assertEqual(SellerLedger.objects.last().balance_after, Decimal('50.00'))
+
+    def test_balance_report_reads_the_ledger(self):
+        self.create_order(date(2026, 9, 20), '80.00', '80.00', opening_balance='25.00')
+        self.create_order(date(2026, 10, 5), '60.00', '10.00')
+        self.create_order(date(2026, 11, 2), '15.00', '0.00')
+
+        seller = get_seller_balance_report(
+            self.seller.pk, start_date='2026-10-01', end_date='2026-10-31'
+        ).get()
+        self.assertEqual(seller.opening_balance, Decimal('25.00'))
+        self.assertEqual(seller.total_sales, Decimal('60.00'))
+        self.assertEqual(seller.total_payments, Decimal('10.00'))
+        self.assertEqual(seller.current_balance, Decimal('75.00'))
+        self.assertEqual(seller.last_order_date, date(2026, 11, 2))
+
+    def test_posting_locks_the_balance_before_reading_the_ledger(self):
+        order = self.create_order(date(2026, 10, 1), '100.00', '30.00')
+        order.amount_collected = Decimal('60.00')
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+
+        reads = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        first_balance = next(i for i, sql in enumerate(reads) if 'FROM "delivery_sellerbalance"' in sql)
+        first_ledger = next(i for i, sql in enumerate(reads) if 'FROM "delivery_sellerledger"' in sql)
+        self.assertLess(first_balance, first_ledger)
+        self.assertEqual(current_balance(self.seller), Decimal('40.00'))
+
+
+class DeferredTotalsTests(TestCase):
+    """Item saves recalculate their order's totals once per transaction"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('sales')
+        cls.route = create_route('South')
+        cls.seller, = create_sellers(cls.route, 1)
+        cls.products = create_products([f'Butter {i}' for i in range(5)], category='Butter')
+
+    def updates_of(self, queries, table):
+        return [query for query in queries if query['sql'].startswith(f'UPDATE "{table}" SET "total_price"')]
+
+    def test_order_items_recalculate_the_delivery_order_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_general_plan(self.products, '4.00')
+        order = SalesOrder.objects.create(
+            seller=self.seller, delivery_date=date(2026, 10, 18), created_by=self.user, updated_by=self.user,
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                for product in self.products:
+                    OrderItem.objects.create(order=order, product=product, quantity=Decimal('3.000'), unit_price=Decimal('4.00'))
+        self.assertEqual(DeliveryOrder.objects.get(sales_order=order).total_price, Decimal('60.00'))
+        # One recalculation at commit, not one per item
+        self.assertEqual(len(self.updates_of(queries, 'delivery_deliveryorder')), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].order_items.get().delete()
+        self.assertEqual(DeliveryOrder.objects.get(sales_order=order).total_price, Decimal('48.00'))
+
+    def test_public_sale_items_recalculate_the_sale_once(self):
+        sale = PublicSale.objects.create(
+            route=self.route, sale_date=date(2026, 10, 18), sale_time='08:00', amount_collected=Decimal('5.00'),
+            created_by=self.user, updated_by=self.user,
+        )
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for product in self.products:
+                PublicSaleItem.objects.create(
+                    public_sale=sale, product=product, quantity=Decimal('2.000'), unit_price=Decimal('2.50'),
+                )
+            sale.refresh_from_db()
+            self.assertEqual(sale.total_price, Decimal('0.00'))
+        self.assertEqual(len(callbacks), len(self.products))
+
+        sale.refresh_from_db()
+        self.assertEqual(sale.total_price, Decimal('25.00'))
+        self.assertEqual(sale.balance_amount, Decimal('20.00'))
+
+
+class SparseDeliveryItemsTests(TestCase):
+    """Only products a seller takes are stored; the full sheet is built when read"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('sheet')
+        cls.route = create_route('Central')
+        cls.seller, = create_sellers(cls.route, 1)
+        cls.products = create_products([f'Ghee {i}' for i in range(6)], category='Ghee')
+        with cls.captureOnCommitCallbacks(execute=True):
+            create_general_plan(cls.products, '7.00')
+
+    def test_only_ordered_products_are_stored(self):
+        order = SalesOrder.objects.create(
+            seller=self.seller, delivery_date=date(2026, 10, 18), created_by=self.user, updated_by=self.user,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            for product in self.products[:2]:
+                OrderItem.objects.create(order=order, product=product, quantity=Decimal('1.000'), unit_price=Decimal('7.00'))
+            order.update_delivery_order_items()
+        delivery_order = DeliveryOrder.objects.get(sales_order=order)
+        self.assertEqual(delivery_order.items.count(), 2)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        sheet = client.get(f'/apiapp/orders/delivery/{delivery_order.pk}/').data['items']
+        self.assertEqual([item['product'] for item in sheet], [product.pk for product in self.products])
+        self.assertEqual(sum(item['id'] is None for item in sheet), 4)
+        self.assertEqual({Decimal(item['unit_price']) for item in sheet}, {Decimal('7.00')})
+
+        sparse = client.get(f'/apiapp/orders/delivery/{delivery_order.pk}/', {'catalog': 'sparse'}).data['items']
+        self.assertEqual(len(sparse), 2)
+        items = client.get('/apiapp/orders/delivery-items/', {'delivery_order': delivery_order.pk, 'catalog': 'full'}).data
+        self.assertEqual(len(items), len(self.products))
+
+
+class LoadingOrderReconciliationTests(TestCase):
+    """Where a loading order's stock went, in a constant number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reconciler')
+        cls.route = create_route('Ridge')
+        cls.day = date(2026, 10, 18)
+        cls.butter, cls.ghee = create_products(['Butter', 'Ghee'], category='Butter')
+        team = create_delivery_team(cls.route, cls.user)
+        purchase_order = PurchaseOrder.objects.create(
+            order_number='PO-R9', delivery_team=team, route=cls.route, delivery_date=cls.day,
+            created_by=cls.user, updated_by=cls.user,
+        )
+        cls.loading_order = LoadingOrder.objects.create(
+            order_number='LO-R9', purchase_order=purchase_order, route=cls.route, loading_date=cls.day,
+            loading_time='05:00', created_by=cls.user, updated_by=cls.user,
+        )
+        LoadingOrderItem.objects.create(loading_order=cls.loading_order, product=cls.butter, loaded_quantity=10)
+        LoadingOrderItem.objects.create(loading_order=cls.loading_order, product=cls.ghee, loaded_quantity=5)
+
+        cls.orders = []
+        for seller, (butter, ghee) in zip(create_sellers(cls.route, 2), ((3, 1), (2, 0))):
+            order = DeliveryOrder.objects.create(
+                route=cls.route, seller=seller, delivery_date=cls.day, loading_order=cls.loading_order,
+            )
+            cls.orders.append(order)
+            for product, quantity in ((cls.butter, butter), (cls.ghee, ghee)):
+                if quantity:
+                    DeliveryOrderItem.objects.create(
+                        delivery_order=order, product=product, ordered_quantity=quantity,
+                        delivered_quantity=quantity, unit_price=Decimal('10.00'),
+                    )
+
+        broken = BrokenOrder.objects.create(loading_order=cls.loading_order, route=cls.route, report_date=cls.day)
+        BrokenOrderItem.objects.create(broken_order=broken, product=cls.butter, quantity=1)
+        returned = ReturnedOrder.objects.create(
+            route=cls.route, return_date=cls.day, reason='Unsold', created_by=cls.user, updated_by=cls.user,
+        )
+        ReturnedOrderItem.objects.create(returned_order=returned, product=cls.ghee, quantity=1)
+        sale = PublicSale.objects.create(
+            route=cls.route, loading_order=cls.loading_order, sale_date=cls.day, sale_time='09:00',
+            created_by=cls.user, updated_by=cls.user,
+        )
+        PublicSaleItem.objects.create(public_sale=sale, product=cls.butter, quantity=2, unit_price=Decimal('12.00'))
+
+    def setUp(self):
+        # Rolling a test back sends no signals, so drop what it cached
+        clear_caches()
+
+    def test_reconciles_every_movement_per_product(self):
+        with self.assertNumQueries(6):
+            rows = reconcile_loading_order(self.loading_order)
+        self.assertEqual(
+            [(row['product_name'], row['loaded'], row['delivered'], row['broken'], row['returned'],
+              row['public_sold'], row['remaining']) for row in rows],
+            [('Butter', 10, 5, 1, 0, 2, 2), ('Ghee', 5, 1, 0, 1, 0, 3)],
+        )
+
+    def test_api_serves_the_cached_reconciliation_until_an_item_changes(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f'/apiapp/orders/loading/{self.loading_order.pk}/reconciliation/'
+        client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # The loading order itself; the rows come from the cache
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['products'][0]['remaining'], '2.000')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DeliveryOrderItem.objects.filter(delivery_order=self.orders[1], product=self.butter).delete()
+        self.assertEqual(client.get(url).data['products'][0]['remaining'], '4.000')
 
-# Create your tests here.
+    def test_pickers_offer_what_is_left_on_the_truck(self):
+        response = self.client.get(
+            '/api/delivery/public-sales/available-products/', {'loading_order_id': self.loading_order.pk}
+        )
+        self.assertEqual(
+            [(product['name'], product['available_quantity']) for product in response.json()['products']],
+            [('Butter', 2.0), ('Ghee', 3.0)],
+        )
+        response = self.client.get(
+            '/api/delivery/return-orders/available-products/', {'route_id': self.route.pk, 'return_date': '2026-10-18'}
+        )
+        self.assertEqual([product['max_returnable'] for product in response.json()['products']], [2.0, 3.0])
@@ -0,0 +1,110 @@
+"""
+Delivery order and public sale totals straight from their items.
+
+DeliveryOrder.recalculate_totals() reads every item of one order and saves
+it. recalculate_order_totals() does the same for any number of orders with
+one UPDATE whose values come from a correlated SUM over the items, then
+posts the new totals to the seller ledger, which that UPDATE bypasses.
+recalculate_public_sale_totals() is the same for public sales.
+
+Item saves do not recalculate anything themselves: they call
+schedule_order_totals() / schedule_public_sale_totals(), and every order
+marked during a transaction is recalculated once when it commits. Code
+that reads the totals before the commit calls flush_scheduled_totals().
+"""
+import threading
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .ledger import post_delivery_orders
+from .models import DeliveryOrder, DeliveryOrderItem, PublicSale, PublicSaleItem
+
+# Orders and public sales whose totals need recalculating once the current transaction commits
+_pending_totals = threading.local()
+
+
+def _items_total(model, parent, expression):
+    """Sum of expression over the items of the outer row, 0 without items"""
+    total = model.objects.filter(
+        **{f'{parent}_id': OuterRef('pk')}
+    ).order_by().values(f'{parent}_id').annotate(total=Sum(expression)).values('total')
+    return Coalesce(
+        Subquery(total, output_field=DecimalField(max_digits=12, decimal_places=2)),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def recalculate_order_totals(order_ids):
+    """
+    Recompute total_price, balance_amount and total_balance of these
+    delivery orders in one UPDATE. Returns the number of orders updated.
+    """
+    order_ids = {order_id for order_id in order_ids if order_id}
+    if not order_ids:
+        return 0
+
+    # Each column is computed from the items again: within one UPDATE,
+    # F('total_price') would still read the old value
+    items_total = _items_total(DeliveryOrderItem, 'delivery_order', F('delivered_quantity') * F('unit_price'))
+    updated = DeliveryOrder.objects.filter(pk__in=order_ids).update(
+        total_price=items_total,
+        balance_amount=items_total - F('amount_collected'),
+        total_balance=F('opening_balance') + items_total - F('amount_collected'),
+        # update() skips auto_now; conditional GETs compare updated_at
+        updated_at=timezone.now(),
+    )
+    post_delivery_orders(DeliveryOrder.objects.filter(pk__in=order_ids).only(
+        'seller_id', 'delivery_date', 'order_number', 'opening_balance', 'total_price', 'amount_collected',
+    ))
+    return updated
+
+
+def recalculate_public_sale_totals(sale_ids):
+    """Recompute total_price and balance_amount of these public sales in one UPDATE"""
+    sale_ids = {sale_id for sale_id in sale_ids if sale_id}
+    if not sale_ids:
+        return 0
+    items_total = _items_total(PublicSaleItem, 'public_sale', F('total_price'))
+    return PublicSale.objects.filter(pk__in=sale_ids).update(
+        total_price=items_total,
+        balance_amount=items_total - F('amount_collected'),
+        updated_at=timezone.now(),
+    )
+
+
+def _pending(name):
+    if not hasattr(_pending_totals, name):
+        setattr(_pending_totals, name, set())
+    return getattr(_pending_totals, name)
+
+
+def flush_scheduled_totals():
+    """Recalculate everything scheduled so far on this thread, now"""
+    order_ids, sale_ids = _pending('orders'), _pending('public_sales')
+    _pending_totals.orders, _pending_totals.public_sales = set(), set()
+    if order_ids or sale_ids:
+        with transaction.atomic():
+            recalculate_order_totals(order_ids)
+            recalculate_public_sale_totals(sale_ids)
+
+
+def schedule_order_totals(order_ids):
+    """
+    Recalculate these delivery orders' totals after the current transaction
+    commits (right away outside one). Requests are merged, so saving an
+    order's 40 items recalculates it once.
+    """
+    _pending('orders').update(order_ids)
+    # Later callbacks find the pending sets already drained and do nothing
+    transaction.on_commit(flush_scheduled_totals)
+
+
+def schedule_public_sale_totals(sale_ids):
+    """Like schedule_order_totals(), for public sales"""
+    _pending('public_sales').update(sale_ids)
+    transaction.on_commit(flush_scheduled_totals)
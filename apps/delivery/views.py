@@ -28,9 +28,13 @@
     PublicSaleItem
  )
 from apps.sales.models import SalesOrder, OrderItem
-from apps.seller.models import Route, Seller
+from apps.seller.models import Seller
+from apps.products import lookups
+from apps.seller.lookups import route_list
+from .ledger import opening_balance as ledger_opening_balance
 from decimal import Decimal
 import json
+import logging
 from django.db import transaction, OperationalError
 from django.db.utils import IntegrityError
 import time
@@ -47,6 +51,9 @@
 from django.shortcuts import redirect
 from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 
+logger = logging.getLogger(__name__)
+
+
 class DeliveryDashboardView(LoginRequiredMixin, DeliveryTeamRequiredMixin, TemplateView):
     template_name = "delivery/dashboard.html"
 
@@ -128,7 +135,7 @@ def get_queryset(self):
     def get_context_data(self, **kwargs):
         context = TemplateLayout.init(self, super().get_context_data(**kwargs))
         context.update({
-            'routes': Route.objects.all().order_by('name'),
+            'routes': route_list(),
             'delivery_teams': DeliveryTeam.objects.filter(is_active=True).order_by('name'),
             'title': 'Purchase Orders'
         })
@@ -170,7 +177,7 @@ def get_route_sales_summary(request):
 def create_purchase_order(request):
     if request.method == 'GET':
         context = {
-            'routes': Route.objects.all().order_by('name'),
+            'routes': route_list(),
             'delivery_teams': DeliveryTeam.objects.filter(is_active=True).order_by('name')
         }
         return render(request, 'delivery/purchase_order_form.html', context)
@@ -214,7 +221,7 @@ def create_purchase_order(request):
 
             # Create purchase order items
             items_data_str = request.POST.get('items_data')
-            print(f"Items data received: {items_data_str}")
+            logger.debug('Items data received: %s', items_data_str)
 
             if not items_data_str:
                 return JsonResponse({
@@ -225,7 +232,7 @@ def create_purchase_order(request):
             try:
                 items_data = json.loads(items_data_str)
             except json.JSONDecodeError as e:
-                print(f"JSON decode error: {e}")
+                logger.warning('Invalid items_data JSON: %s', e)
                 return JsonResponse({
                     'success': False,
                     'error': f'Invalid items data format: {str(e)}'
@@ -237,19 +244,13 @@ def create_purchase_order(request):
                     'error': 'No items to process'
                 }, status=400)
 
-            # Keep track of products in purchase order for later use
-            purchase_order_products = []
-
-            print(f"Processing {len(items_data)} items")
+            logger.debug('Processing %s items', len(items_data))
             for item in items_data:
                 sales_qty = Decimal(item['sales_quantity'])
                 extra_qty = Decimal(item['extra_quantity'])
                 remaining_qty = Decimal(item['remaining_quantity'])
                 product_id = int(item['product_id'])
 
-                # Add to our list of products
-                purchase_order_products.append(product_id)
-
                 # Validate quantities
                 if (sales_qty + extra_qty - remaining_qty) < sales_qty:
                     raise ValueError(f"Total quantity must be greater than or equal to sales quantity for {item['product_name']}")
@@ -262,46 +263,8 @@ def create_purchase_order(request):
                     remaining_quantity=remaining_qty
                 )
 
-            # Now update all delivery orders for this route and date
-            from apps.products.models import Product
-            from apps.sales.utils import get_product_price
-
-            # Get all delivery orders for this route and date
-            delivery_orders = DeliveryOrder.objects.filter(
-                route_id=route_id,
-                delivery_date=delivery_date
-            )
-
-            print(f"Found {delivery_orders.count()} delivery orders to update")
-
-            # For each delivery order, check if it has all the products from the purchase order
-            for delivery_order in delivery_orders:
-                # Get existing products in this delivery order
-                existing_products = set(DeliveryOrderItem.objects.filter(
-                    delivery_order=delivery_order
-                ).values_list('product_id', flat=True))
-
-                # For each product in the purchase order that's not in the delivery order,
-                # add it with ordered_quantity=0
-                for product_id in purchase_order_products:
-                    if product_id not in existing_products:
-                        # Get the product
-                        product = Product.objects.get(id=product_id)
-
-                        # Get the appropriate unit price for this seller and date
-                        unit_price = get_product_price(product, delivery_order.seller, delivery_date)
-
-                        # Create the delivery order item
-                        DeliveryOrderItem.objects.create(
-                            delivery_order=delivery_order,
-                            product=product,
-                            ordered_quantity=Decimal('0.00'),
-                            delivered_quantity=Decimal('0.00'),
-                            extra_quantity=Decimal('0.00'),
-                            unit_price=unit_price,
-                            total_price=Decimal('0.00')
-                        )
-                        print(f"Added product {product.name} to delivery order {delivery_order.order_number}")
+            # Delivery orders keep only the products their seller takes;
+            # DeliveryOrder.catalog_items() fills in the rest when read
 
             return JsonResponse({'success': True})
 
@@ -321,7 +284,7 @@ def get(self, request, pk):
 
             context = {
                 'purchase_order': purchase_order,
-                'routes': Route.objects.all().order_by('name'),
+                'routes': route_list(),
                 'delivery_teams': DeliveryTeam.objects.filter(is_active=True).order_by('name'),
             }
 
@@ -362,49 +325,8 @@ def put(self, request, pk):
                             item.remaining_quantity = Decimal(str(data[remaining_qty_key]))
                         item.save()
 
-                    # Now update all delivery orders for this route and date
-                    from apps.products.models import Product
-                    from apps.sales.utils import get_product_price
-
-                    # Get all products in the purchase order
-                    purchase_order_products = list(purchase_order.items.values_list('product_id', flat=True))
-
-                    # Get all delivery orders for this route and date
-                    delivery_orders = DeliveryOrder.objects.filter(
-                        route_id=purchase_order.route_id,
-                        delivery_date=purchase_order.delivery_date
-                    )
-
-                    print(f"Found {delivery_orders.count()} delivery orders to update")
-
-                    # For each delivery order, check if it has all the products from the purchase order
-                    for delivery_order in delivery_orders:
-                        # Get existing products in this delivery order
-                        existing_products = set(DeliveryOrderItem.objects.filter(
-                            delivery_order=delivery_order
-                        ).values_list('product_id', flat=True))
-
-                        # For each product in the purchase order that's not in the delivery order,
-                        # add it with ordered_quantity=0
-                        for product_id in purchase_order_products:
-                            if product_id not in existing_products:
-                                # Get the product
-                                product = Product.objects.get(id=product_id)
-
-                                # Get the appropriate unit price for this seller and date
-                                unit_price = get_product_price(product, delivery_order.seller, purchase_order.delivery_date)
-
-                                # Create the delivery order item
-                                DeliveryOrderItem.objects.create(
-                                    delivery_order=delivery_order,
-                                    product=product,
-                                    ordered_quantity=Decimal('0.00'),
-                                    delivered_quantity=Decimal('0.00'),
-                                    extra_quantity=Decimal('0.00'),
-                                    unit_price=unit_price,
-                                    total_price=Decimal('0.00')
-                                )
-                                print(f"Added product {product.name} to delivery order {delivery_order.order_number}")
+                    # Delivery orders keep only the products their seller takes;
+                    # DeliveryOrder.catalog_items() fills in the rest when read
 
                     # Fetch updated data
                     purchase_orders = PurchaseOrder.objects.select_related(
@@ -471,7 +393,7 @@ def get_queryset(self):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['routes'] = Route.objects.all().order_by('name')
+        context['routes'] = route_list()
         if self.request.user.role == 'DISTRIBUTOR':
             context['distributor'] = Distributor.objects.get(user=self.request.user)
         else:
@@ -481,7 +403,7 @@ def get_context_data(self, **kwargs):
 class DeliveryTeamCreateView(LoginRequiredMixin,DeliveryTeamRequiredMixin, View):
     def get(self, request):
         context = {
-            'routes': Route.objects.all().order_by('name')
+            'routes': route_list()
         }
         if request.user.role == 'DISTRIBUTOR':
             distributor = Distributor.objects.get(user=request.user)
@@ -658,7 +580,7 @@ def get_queryset(self):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context.update({
-            'routes': Route.objects.all().order_by('name'),
+            'routes': route_list(),
             'purchase_orders': PurchaseOrder.objects.filter(
                 status='confirmed'
             ).select_related('route').order_by('-created_at'),
@@ -802,7 +724,7 @@ def get(self, request, pk):
             context = {
                 'loading_order': loading_order,
                 'items': loading_order.purchase_order.items.all(),
-                'routes': Route.objects.all().order_by('name')
+                'routes': route_list()
             }
             return render(request, 'delivery/loading_order_edit_form.html', context)
 
@@ -854,10 +776,7 @@ def get_context_data(self, **kwargs):
         orders = DeliveryOrder.objects.select_related(
             'route', 'seller', 'sales_order', 'loading_order'
         )
-        print('delivery orders: ', orders)
-        print('status filter: ', status_filter)
-        print('date filter: ', date_filter)
-        print('route filter: ', route_filter)
+        logger.debug('Delivery order list filters: status=%s date=%s route=%s', status_filter, date_filter, route_filter)
 
         # Apply filters
         # if status_filter != 'all':
@@ -871,7 +790,6 @@ def get_context_data(self, **kwargs):
 
         # Process orders to add display properties
         delivery_orders = orders.order_by('-delivery_date', '-delivery_time')
-        print('delivery orders after filters: ', delivery_orders)
         for order in delivery_orders:
             # Add status color
             if order.status == 'pending':
@@ -886,13 +804,11 @@ def get_context_data(self, **kwargs):
             # Format display values
             order.total_amount = order.total_price if order.total_price is not None else 0
             order.paid_amount = order.amount_collected if order.amount_collected is not None else 0
-
-            # Debug
-            print(f"Order {order.pk}: total_price={order.total_price}, total_amount={order.total_amount}")
+            logger.debug('Order %s: total_price=%s, total_amount=%s', order.pk, order.total_price, order.total_amount)
 
         context.update({
             'delivery_orders': delivery_orders,
-            'routes': Route.objects.all().order_by('name'),
+            'routes': route_list(),
             'sellers': Seller.objects.all().order_by('store_name'),
             'sales_orders': SalesOrder.objects.filter(status='confirmed').order_by('-created_at'),
             'current_status': status_filter,
@@ -905,7 +821,7 @@ class DeliveryOrderCreateView(LoginRequiredMixin,DeliveryTeamRequiredMixin, View
     login_url = reverse_lazy('auth-login-basic')
 
     def get(self, request, pk=None):
-        routes = Route.objects.all().order_by('name')
+        routes = route_list()
         sellers = Seller.objects.all().order_by('store_name')
         sales_orders = SalesOrder.objects.filter(status='confirmed').order_by('-created_at')
 
@@ -916,9 +832,9 @@ def get(self, request, pk=None):
                 delivery_order = DeliveryOrder.objects.select_related(
                     'route', 'seller', 'sales_order', 'loading_order'
                 ).prefetch_related('items__product').get(pk=pk)
-                print(f"Editing delivery order: {delivery_order.pk}")
+                logger.debug('Editing delivery order %s', delivery_order.pk)
             except DeliveryOrder.DoesNotExist:
-                print(f"Delivery order with pk={pk} not found")
+                logger.info('Delivery order %s not found', pk)
                 return redirect('delivery:delivery-order-list')
 
         return render(request, 'delivery/delivery_order_form.html', {
@@ -934,9 +850,9 @@ def get(self, request, pk=None):
     def post(self, request, pk=None):
         try:
             if pk:
-                print(f"Received delivery order update request for order {pk}")
+                logger.debug('Received delivery order update request for order %s', pk)
             else:
-                print("Received delivery order creation request")
+                logger.debug('Received delivery order creation request')
 
             # Get form data
             route_id = request.POST.get('route_id')
@@ -949,7 +865,7 @@ def post(self, request, pk=None):
 
             # Get items data
             items_data_str = request.POST.get('items_data')
-            print(f"Items data received: {items_data_str}")
+            logger.debug('Items data received: %s', items_data_str)
 
             if not items_data_str:
                 return JsonResponse({
@@ -960,7 +876,7 @@ def post(self, request, pk=None):
             try:
                 items_data = json.loads(items_data_str)
             except json.JSONDecodeError as e:
-                print(f"JSON decode error: {e}")
+                logger.warning('Invalid items_data JSON: %s', e)
                 return JsonResponse({
                     'status': 'error',
                     'error': f'Invalid items data format: {str(e)}'
@@ -978,7 +894,10 @@ def post(self, request, pk=None):
                     delivery_date = delivery_date or existing_order.delivery_date
                     delivery_time = delivery_time or existing_order.delivery_time.strftime('%H:%M')
 
-                    print(f"Using existing values for edit: route={route_id}, seller={seller_id}, date={delivery_date}, time={delivery_time}")
+                    logger.debug(
+                        'Using existing values for edit: route=%s, seller=%s, date=%s, time=%s',
+                        route_id, seller_id, delivery_date, delivery_time,
+                    )
                 except DeliveryOrder.DoesNotExist:
                     return JsonResponse({
                         'status': 'error',
@@ -1019,7 +938,7 @@ def post(self, request, pk=None):
 
             # Even if there's no loading order, we'll continue
             if not loading_order:
-                print(f"No loading order found for route {route_id} and date {delivery_date}, but continuing anyway")
+                logger.info('No loading order for route %s on %s, continuing without one', route_id, delivery_date)
 
             # First, calculate the total price and prepare items
             total_price = Decimal('0.00')
@@ -1042,7 +961,11 @@ def post(self, request, pk=None):
                     # calculate extra_quantity as the difference
                     if extra_qty == 0 and delivered_qty > ordered_qty:
                         extra_qty = delivered_qty - ordered_qty
-                        print(f"Calculated extra_quantity: {extra_qty} (delivered={delivered_qty}, ordered={ordered_qty})")
+                        logger.debug('Calculated extra_quantity %s (delivered=%s, ordered=%s)', extra_qty, delivered_qty, ordered_qty)
+
+                    # The form lists the whole catalog; untouched products are not stored
+                    if not (ordered_qty or extra_qty or delivered_qty):
+                        continue
 
                     items_to_create.append({
                         'product_id': product_id,
@@ -1053,21 +976,10 @@ def post(self, request, pk=None):
                         'total_price': item_total
                     })
                 except (ValueError, TypeError) as e:
-                    print(f"Error processing product ID {item['product_id']}: {e}")
-
-            # Get last order's total balance for this seller
-            last_order = DeliveryOrder.objects.filter(
-                seller_id=seller_id,
-                delivery_date__lt=delivery_date
-            ).order_by('-delivery_date', '-delivery_time').first()
-
-            # Handle the case where there's no previous order
-            if last_order:
-                opening_balance = last_order.total_balance
-                print(f"Found previous order with balance: {opening_balance}")
-            else:
-                opening_balance = Decimal('0.00')
-                print("No previous order found, setting opening balance to 0")
+                    logger.warning('Skipping product %s: %s', item['product_id'], e)
+
+            # Seller's balance before this delivery date, from the ledger
+            opening_balance = ledger_opening_balance(seller_id, delivery_date)
             amount_collected_decimal = Decimal(amount_collected)
             balance_amount = total_price - amount_collected_decimal
             total_balance = opening_balance + balance_amount
@@ -1096,7 +1008,7 @@ def post(self, request, pk=None):
 
                 # Delete existing items
                 delivery_order.items.all().delete()
-                print(f"Deleted existing items for delivery order {pk}")
+                logger.debug('Deleted existing items of delivery order %s', pk)
             else:
                 # Create new delivery order
                 delivery_order = DeliveryOrder.objects.create(
@@ -1118,20 +1030,20 @@ def post(self, request, pk=None):
                     updated_by=request.user
                 )
 
-            print(f"Created delivery order: {delivery_order.id}")
+            logger.info('Created delivery order %s', delivery_order.id)
 
             # Now create the items
-            print(f"Creating {len(items_to_create)} delivery order items")
+            logger.debug('Creating %s delivery order items', len(items_to_create))
             for item_data in items_to_create:
                 try:
-                    print(f"Creating delivery order item with data: {item_data}")
+                    logger.debug('Creating delivery order item %s', item_data)
                     DeliveryOrderItem.objects.create(
                         delivery_order=delivery_order,
                         **item_data
                     )
-                    print(f"Successfully created delivery order item for product {item_data['product_id']}")
-                except Exception as e:
-                    print(f"Error creating delivery order item: {str(e)}")
+                    logger.debug('Created delivery order item for product %s', item_data['product_id'])
+                except Exception:
+                    logger.exception('Could not create delivery order item')
 
             # Recalculate totals after all items have been added
             delivery_order.recalculate_totals()
@@ -1143,7 +1055,7 @@ def post(self, request, pk=None):
 
         except Exception as e:
             action = 'updating' if pk else 'creating'
-            print(f"Error {action} delivery order: {str(e)}")
+            logger.exception('Error %s delivery order', action)
             return JsonResponse({
                 'status': 'error',
                 'error': str(e)
@@ -1161,11 +1073,8 @@ def get(self, request, pk):
                 pk=pk
             )
 
-            # Get items and debug
             items = delivery_order.items.all()
-            print(f"Delivery order {pk} has {items.count()} items")
-            for item in items:
-                print(f"Item: product={item.product.name if item.product else 'None'}, ordered={item.ordered_quantity}, delivered={item.delivered_quantity}")
+            logger.debug('Delivery order %s has %s items', pk, len(items))
 
             context = TemplateLayout.init(self, {
                 'delivery_order': delivery_order,
@@ -1199,7 +1108,7 @@ def get_context_data(self, **kwargs):
 
         context.update({
             'orders': orders.order_by('-report_date', '-report_time'),
-            'routes': Route.objects.all().order_by('name'),
+            'routes': route_list(),
             'current_date': date_filter,
             'current_route': route_filter,
         })
@@ -1209,7 +1118,7 @@ class BrokenOrderCreateView(LoginRequiredMixin,DeliveryTeamRequiredMixin, View):
     login_url = reverse_lazy('auth-login-basic')
 
     def get(self, request):
-        routes = Route.objects.all().order_by('name')
+        routes = route_list()
         return render(request, 'delivery/broken_order_form.html', {
             'routes': routes,
         })
@@ -1266,7 +1175,7 @@ def get_context_data(self, **kwargs):
 
         context.update({
             'orders': orders.order_by('-return_date', '-return_time'),
-            'routes': Route.objects.all().order_by('name'),
+            'routes': route_list(),
             'current_date': date_filter,
             'current_route': route_filter,
         })
@@ -1276,7 +1185,7 @@ class ReturnedOrderCreateView(LoginRequiredMixin,DeliveryTeamRequiredMixin, View
     login_url = reverse_lazy('auth-login-basic')
 
     def get(self, request):
-        routes = Route.objects.all().order_by('name')
+        routes = route_list()
         delivery_orders = DeliveryOrder.objects.filter(
             status='completed'
         ).order_by('-delivery_date')
@@ -1341,41 +1250,26 @@ def get_route_sellers(request, route_id):
 
 @require_http_methods(["GET"])
 def get_seller_opening_balance(request, seller_id):
-    """API endpoint to get the opening balance for a seller based on the last delivery order"""
+    """API endpoint to get the opening balance for a seller from the seller ledger"""
     delivery_date = request.GET.get('date')
 
-    print(f"\n\nGET_SELLER_OPENING_BALANCE CALLED: seller_id={seller_id}, date={delivery_date}\n\n")
-
     if not delivery_date:
-        print("ERROR: Date parameter is missing")
         return JsonResponse({
             'status': 'error',
             'error': 'Date parameter is required'
         }, status=400)
 
     try:
-        # Get last order's total balance for this seller
-        last_order = DeliveryOrder.objects.filter(
-            seller_id=seller_id,
-            delivery_date__lt=delivery_date
-        ).order_by('-delivery_date', '-delivery_time').first()
-
-        # Handle the case where there's no previous order
-        if last_order:
-            opening_balance = last_order.total_balance
-            print(f"SUCCESS: Found previous order #{last_order.pk} with balance: {opening_balance}")
-        else:
-            opening_balance = Decimal('0.00')
-            print(f"INFO: No previous order found for seller {seller_id} before {delivery_date}, setting opening balance to 0")
+        # Seller's balance before this delivery date, from the ledger
+        opening_balance = ledger_opening_balance(seller_id, delivery_date)
 
         response_data = {
             'status': 'success',
             'opening_balance': float(opening_balance)
         }
-        print(f"RESPONSE: {response_data}")
         return JsonResponse(response_data)
     except Exception as e:
-        print(f"ERROR getting opening balance: {str(e)}")
+        logger.exception('Could not get the opening balance of seller %s', seller_id)
         return JsonResponse({
             'status': 'error',
             'error': str(e)
@@ -1485,7 +1379,7 @@ def get_delivery_order(request, order_id):
             'error': f'Delivery order with ID {order_id} not found'
         }, status=404)
     except Exception as e:
-        print(f"Error getting delivery order: {str(e)}")
+        logger.exception('Could not get delivery order')
         return JsonResponse({
             'error': str(e)
         }, status=500)
@@ -1493,7 +1387,6 @@ def get_delivery_order(request, order_id):
 
 @require_http_methods(["GET"])
 def get_seller_sales_items(request):
-    print('seller: ', request.GET.get('seller'))
     seller = request.GET.get('seller')
     route = request.GET.get('route')
     delivery_date = request.GET.get('date')
@@ -1543,7 +1436,6 @@ def get_seller_sales_items(request):
 
 @require_http_methods(["GET"])
 def get_available_products(request, route_id):
-    print('route: ', route_id)
     delivery_date = request.GET.get('date')
 
     loading_order = LoadingOrder.objects.filter(
@@ -1553,7 +1445,7 @@ def get_available_products(request, route_id):
 
     # Even if there's no loading order, return an empty list without an error
     if not loading_order:
-        print(f"No loading order found for route {route_id} and date {delivery_date}, returning empty list")
+        logger.info('No loading order for route %s on %s, returning no products', route_id, delivery_date)
         return JsonResponse({
             'products': []
         })
@@ -1581,7 +1473,7 @@ def get_available_products(request, route_id):
             } for item in products]
         })
     except Exception as e:
-        print(f"Error getting available products: {str(e)}")
+        logger.exception('Could not get available products')
         return JsonResponse({
             'products': [],
             'error': str(e)
@@ -1598,7 +1490,7 @@ def get_all_products(request):
         products = Product.objects.filter(is_active=True)
 
         # Get the general price plan
-        general_price_plan = PricePlan.objects.filter(is_general=True, is_active=True).first()
+        general_price_plan = lookups.general_price_plan()
 
         if general_price_plan:
             # Create a subquery to get the price for each product
@@ -1622,7 +1514,7 @@ def get_all_products(request):
             'id', 'name', 'code', 'category__name', 'price'
         ).order_by('category__name', 'name')
 
-        print(f"Found {len(product_values)} active products")
+        logger.debug('Found %s active products', len(product_values))
         return JsonResponse({
             'products': [{
                 'id': str(product['id']),
@@ -1633,7 +1525,7 @@ def get_all_products(request):
             } for product in product_values]
         })
     except Exception as e:
-        print(f"Error fetching products: {str(e)}")
+        logger.exception('Could not fetch products')
         return JsonResponse({
             'products': [],
             'error': str(e)
@@ -1649,7 +1541,7 @@ def get_product_price(request, product_id):
 
     try:
         # Get the general price plan
-        general_price_plan = PricePlan.objects.filter(is_general=True, is_active=True).first()
+        general_price_plan = lookups.general_price_plan()
 
         if general_price_plan:
             # Get the price from the general price plan
@@ -1671,7 +1563,7 @@ def get_product_price(request, product_id):
         })
 
     except Exception as e:
-        print(f"Error getting product price: {str(e)}")
+        logger.exception('Could not get product price')
         return JsonResponse({
             'success': False,
             'error': str(e)
@@ -0,0 +1,45 @@
+"""
+The active product catalog, held in memory.
+
+Delivery orders only store the products a seller actually takes; screens
+that need a row for every product (the mobile app's delivery sheet) fill
+in the rest from this catalog at read time. Like the price index it is
+reloaded lazily: Product and Category signals bump the 'products' version
+in the shared cache (apps/core/cache.py) and the next reader, in whichever
+process, rebuilds the list.
+"""
+import threading
+
+from apps.core.cache import invalidate, namespace_versions
+
+from .models import Product
+
+# ('products' version it was loaded at, [Product, ...])
+_catalog = (None, [])
+_catalog_lock = threading.Lock()
+
+
+def invalidate_catalog():
+    """
+    Mark the catalog of every process stale, with the cached product
+    lookups of lookups.py; called from the Product and Category signals
+    """
+    # Bumped now and again after the commit, so a reload mid-transaction is not kept
+    invalidate('products')
+
+
+def active_products():
+    """Active products in catalog order (category, name), categories loaded"""
+    global _catalog
+    version = namespace_versions(('products',))[0]
+    generation, products = _catalog
+    if generation == version:
+        return products
+    with _catalog_lock:
+        if _catalog[0] != version:
+            generation = version
+            products = list(Product.objects.filter(is_active=True).select_related('category').order_by(
+                'category__name', 'name'
+            ))
+            _catalog = (generation, products)
+        return _catalog[1]
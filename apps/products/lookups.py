@@ -0,0 +1,30 @@
+"""
+Price plan and product lists that many views and serializers read, kept in
+the shared cache (apps/core/cache.py). PricePlan / ProductPrice changes
+invalidate 'price_plans' (through invalidate_price_cache), Product and
+Category changes 'products' (through invalidate_catalog).
+"""
+from apps.core.cache import cached
+
+from .models import PricePlan, Product
+
+
+def general_price_plan():
+    """The active general price plan, None without one"""
+    return cached(
+        'price_plans', 'general',
+        lambda: PricePlan.objects.filter(is_general=True, is_active=True).first(),
+    )
+
+
+def price_plan_list():
+    """Every price plan, newest first, sellers loaded"""
+    return cached(
+        'price_plans', 'list',
+        lambda: list(PricePlan.objects.select_related('seller').order_by('-created_at')),
+    )
+
+
+def product_list():
+    """Active products by name"""
+    return cached('products', 'active', lambda: list(Product.objects.filter(is_active=True).order_by('name')))
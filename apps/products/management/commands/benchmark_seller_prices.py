@@ -0,0 +1,102 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.api.serializers import SellerSerializer
+from apps.api.views import SellerViewSet
+from apps.products.models import Category, PricePlan, Product, ProductPrice
+from apps.products.pricing import refresh_effective_prices
+from apps.seller.models import Seller
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the seller list (SellerSerializer with effective prices) on synthetic data. '
+        'Everything is created inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sellers', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument(
+            '--special-every', type=int, default=10,
+            help='Give every Nth seller its own price plan',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['sellers'], options['products'], options['special_every'])
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write('Benchmark data rolled back')
+
+    def timed(self, label, func):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f'{label}: {elapsed * 1000:.0f} ms, {len(queries)} queries')
+        return result
+
+    def run(self, seller_count, product_count, special_every):
+        self.stdout.write(f'Building {seller_count} sellers x {product_count} products')
+        today = date.today()
+        category = Category.objects.create(name='Benchmark', code='BENCH-CAT')
+        products = Product.objects.bulk_create([
+            Product(name=f'Bench product {i}', code=f'BENCH-{i}', category=category, unit_size=Decimal('1'))
+            for i in range(product_count)
+        ])
+        sellers = Seller.objects.bulk_create([
+            Seller(
+                first_name='Bench', last_name=str(i), mobileno=f'B{i:010d}',
+                store_name=f'Bench store {i}', store_address='Benchmark street',
+            )
+            for i in range(seller_count)
+        ])
+
+        # bulk_create skips the Excel import signal, which needs a real file
+        plans = [PricePlan(
+            name='Bench general', valid_from=today - timedelta(days=30),
+            valid_to=today + timedelta(days=30), is_general=True, excel_file='bench.xlsx',
+        )]
+        plans += [
+            PricePlan(
+                name=f'Bench seller {seller.pk}', valid_from=today - timedelta(days=7),
+                valid_to=today + timedelta(days=7), is_general=False, seller=seller, excel_file='bench.xlsx',
+            )
+            for seller in sellers[::special_every]
+        ]
+        plans = PricePlan.objects.bulk_create(plans)
+
+        prices = [
+            ProductPrice(price_plan=plans[0], product=product, price=Decimal('10.00'))
+            for product in products
+        ]
+        for plan in plans[1:]:
+            # Seller plans override a quarter of the catalog
+            prices += [
+                ProductPrice(price_plan=plan, product=product, price=Decimal('9.00'))
+                for product in products[::4]
+            ]
+        ProductPrice.objects.bulk_create(prices, batch_size=2000)
+
+        rows = self.timed('Full EffectiveSellerPrice rebuild', refresh_effective_prices)
+        self.stdout.write(f'  {rows} effective price rows')
+        self.timed('Rebuild for one seller plan', lambda: refresh_effective_prices([sellers[0].pk]))
+
+        queryset = SellerViewSet.queryset.filter(pk__in=[seller.pk for seller in sellers]).order_by('store_name')
+        data = self.timed(
+            f'Serialize {seller_count} sellers',
+            lambda: SellerSerializer(queryset, many=True).data,
+        )
+        priced = sum(len(seller['effective_prices']) for seller in data)
+        self.stdout.write(f'  {priced} effective prices returned')
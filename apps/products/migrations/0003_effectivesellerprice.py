@@ -0,0 +1,65 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_effective_prices(apps, schema_editor):
+    """Fill the table once; signals keep it up to date afterwards"""
+    Seller = apps.get_model('seller', 'Seller')
+    PricePlan = apps.get_model('products', 'PricePlan')
+    ProductPrice = apps.get_model('products', 'ProductPrice')
+    EffectiveSellerPrice = apps.get_model('products', 'EffectiveSellerPrice')
+
+    latest_plans = {}
+    for plan_id, seller_id in PricePlan.objects.filter(
+        seller__isnull=False, is_active=True
+    ).order_by('-valid_from', 'name').values_list('id', 'seller_id'):
+        latest_plans.setdefault(seller_id, plan_id)
+    general_plan_id = PricePlan.objects.filter(
+        is_general=True, is_active=True
+    ).order_by('-valid_from', 'name').values_list('id', flat=True).first()
+
+    plan_prices = {}
+    for plan_id, product_id, price in ProductPrice.objects.values_list('price_plan_id', 'product_id', 'price'):
+        plan_prices.setdefault(plan_id, []).append((product_id, price))
+
+    rows = []
+    for seller_id in Seller.objects.values_list('id', flat=True):
+        priced = set()
+        for product_id, price in plan_prices.get(latest_plans.get(seller_id), []):
+            priced.add(product_id)
+            rows.append(EffectiveSellerPrice(seller_id=seller_id, product_id=product_id, price=price, source='seller_specific'))
+        for product_id, price in plan_prices.get(general_plan_id, []):
+            if product_id not in priced:
+                rows.append(EffectiveSellerPrice(seller_id=seller_id, product_id=product_id, price=price, source='general'))
+    EffectiveSellerPrice.objects.bulk_create(rows, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_is_active'),
+        ('seller', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectiveSellerPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('source', models.CharField(choices=[('seller_specific', 'Seller Specific'), ('general', 'General')], max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_seller_prices', to='products.product')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_prices', to='seller.seller')),
+            ],
+            options={
+                'verbose_name': 'Effective Seller Price',
+                'verbose_name_plural': 'Effective Seller Prices',
+                'ordering': ['seller', '-source', 'product'],
+                'constraints': [models.UniqueConstraint(fields=('seller', 'product'), name='unique_effective_seller_price')],
+            },
+        ),
+        migrations.RunPython(build_effective_prices, migrations.RunPython.noop),
+    ]
@@ -138,3 +138,43 @@ class Meta:
 
     def __str__(self):
         return f"{self.product} - {self.price} ({self.price_plan})"
+
+class EffectiveSellerPrice(models.Model):
+    """
+    Materialized price list per seller: the prices of the seller's latest
+    active plan, topped up with general-plan prices for the other products.
+    Maintained by apps.products.pricing.refresh_effective_prices.
+    """
+    SOURCE_CHOICES = (
+        ('seller_specific', 'Seller Specific'),
+        ('general', 'General'),
+    )
+
+    seller = models.ForeignKey(
+        Seller,
+        on_delete=models.CASCADE,
+        related_name='effective_prices'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='effective_seller_prices'
+    )
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Seller-specific prices first, like the serializer always listed them
+        ordering = ['seller', '-source', 'product']
+        verbose_name = 'Effective Seller Price'
+        verbose_name_plural = 'Effective Seller Prices'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['seller', 'product'],
+                name='unique_effective_seller_price'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.seller} - {self.product}: {self.price} ({self.source})"
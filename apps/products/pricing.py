@@ -0,0 +1,340 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.dispatch import Signal
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.core.cache import invalidate, namespace_versions
+from apps.seller.models import Seller
+
+from .models import EffectiveSellerPrice, PricePlan, ProductPrice
+
+_shared_resolver = None
+_shared_resolver_lock = threading.Lock()
+
+# get_price_resolver() reads the shared prices version at most this often
+# (seconds); invalidations made in this process are seen at once
+PRICES_VERSION_INTERVAL = 1.0
+_prices_checked_at = None
+
+# Sellers whose EffectiveSellerPrice rows need rebuilding once the current
+# transaction commits; 'all' wins over any set of ids
+_pending_refresh = threading.local()
+
+# Set while a whole plan's prices are rewritten at once (see bulk_price_write)
+_bulk_price_write = threading.local()
+
+# Sent with the price plan once a bulk price write has replaced its prices,
+# for the work the skipped ProductPrice signals would have triggered elsewhere
+prices_replaced = Signal()
+
+
+def _prices_version():
+    """
+    Version of the 'price_plans' cache namespace. It lives in the shared
+    cache, so a price edit made by the web process reaches the resolvers of
+    every other process (run_sync_worker included).
+    """
+    return namespace_versions(('price_plans',))[0]
+
+
+def recheck_prices_version():
+    """Make the next get_price_resolver() read the shared prices version"""
+    global _prices_checked_at
+    _prices_checked_at = None
+
+
+def invalidate_price_cache():
+    """
+    Mark every PriceResolver, in every process, as stale, together with the
+    cached plan lookups of lookups.py. Called from the PricePlan/ProductPrice
+    signals and from code paths that bypass them (bulk_create, queryset.update).
+    """
+    # Bumped now and again on commit, so a resolver that reloaded
+    # mid-transaction does not keep the pre-commit prices
+    invalidate('price_plans')
+    recheck_prices_version()
+    transaction.on_commit(recheck_prices_version)
+
+
+@contextmanager
+def bulk_price_write():
+    """
+    Rewrite ProductPrice rows in bulk without the per-row signal work
+    (cache invalidation, effective price refresh, plan bumps). The caller
+    is responsible for doing that work once for the plan afterwards.
+    """
+    _bulk_price_write.active = True
+    try:
+        yield
+    finally:
+        _bulk_price_write.active = False
+
+
+def in_bulk_price_write():
+    return getattr(_bulk_price_write, 'active', False)
+
+
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+def _as_date(value):
+    # Call sites pass dates straight from request data as well as model fields
+    if value is None:
+        return timezone.now().date()
+    if isinstance(value, str):
+        return parse_date(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+class PriceResolver:
+    """
+    In-memory interval index over active price plans.
+
+    All active PricePlan/ProductPrice rows overlapping [start_date, end_date]
+    are loaded with a single query; (seller, product, date) lookups are then
+    answered from memory. Seller-specific plans win over general plans, and
+    between overlapping plans of the same kind the latest valid_from wins
+    (the same order PricePlan.Meta.ordering gives the old queries).
+    Passing no dates loads every active plan.
+    """
+
+    def __init__(self, start_date=None, end_date=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        # Version of the prices it was loaded from, and the latest one seen
+        self._generation = None
+        self._current = _prices_version()
+        self._lock = threading.Lock()
+        self._special = {}
+        self._general = {}
+
+    def _load(self):
+        queryset = ProductPrice.objects.filter(
+            price_plan__is_active=True
+        ).values_list(
+            'product_id',
+            'price',
+            'price_plan__seller_id',
+            'price_plan__is_general',
+            'price_plan__valid_from',
+            'price_plan__valid_to',
+            'price_plan__name',
+        ).order_by()
+
+        if self.start_date:
+            queryset = queryset.filter(price_plan__valid_to__gte=self.start_date)
+        if self.end_date:
+            queryset = queryset.filter(price_plan__valid_from__lte=self.end_date)
+
+        generation = self._current
+        special = defaultdict(list)
+        general = defaultdict(list)
+
+        for product_id, price, seller_id, is_general, valid_from, valid_to, name in queryset:
+            if is_general:
+                general[product_id].append((valid_from, name, valid_to, price))
+            elif seller_id is not None:
+                special[(seller_id, product_id)].append((valid_from, name, valid_to, price))
+
+        self._special = {key: self._build_index(rows) for key, rows in special.items()}
+        self._general = {key: self._build_index(rows) for key, rows in general.items()}
+        self._generation = generation
+
+    @staticmethod
+    def _build_index(rows):
+        # Sort so that, for equal valid_from, the plan PricePlan.Meta.ordering
+        # would return first ends up last (it is scanned first on lookup)
+        rows.sort(key=lambda row: row[1], reverse=True)
+        rows.sort(key=lambda row: row[0])
+        starts = [row[0] for row in rows]
+        intervals = [(row[2], row[3]) for row in rows]
+        return starts, intervals
+
+    def _ensure_loaded(self, date):
+        with self._lock:
+            if self.start_date and date < self.start_date:
+                self.start_date = date
+                self._generation = None
+            if self.end_date and date > self.end_date:
+                self.end_date = date
+                self._generation = None
+            if self._generation != self._current:
+                self._load()
+
+    def check_version(self, version):
+        """Reload on the next lookup unless loaded from this version of the prices"""
+        with self._lock:
+            self._current = version
+
+    @staticmethod
+    def _lookup(index, date):
+        if not index:
+            return None
+        starts, intervals = index
+        position = bisect_right(starts, date)
+        # Walk back over every plan that started on or before the date and
+        # return the most recent one that is still valid on it
+        while position > 0:
+            position -= 1
+            valid_to, price = intervals[position]
+            if valid_to >= date:
+                return price
+        return None
+
+    def get_price(self, product, seller, date=None):
+        """Get the price for a product for a specific seller on a specific date"""
+        date = _as_date(date)
+        self._ensure_loaded(date)
+
+        if seller is not None:
+            price = self._lookup(self._special.get((_pk(seller), _pk(product))), date)
+            if price is not None:
+                return price
+
+        return self._lookup(self._general.get(_pk(product)), date)
+
+    def get_general_price(self, product, date=None):
+        """Get the price for a product from the general price plan on a date"""
+        return self.get_price(product, None, date)
+
+    def get_prices(self, products, seller, date=None):
+        """Resolve several products at once, returning {product_id: price}"""
+        return {
+            _pk(product): self.get_price(product, seller, date)
+            for product in products
+        }
+
+
+def get_price_resolver():
+    """
+    Process-wide resolver shared by every pricing call site. It is checked
+    against the shared prices version at most every PRICES_VERSION_INTERVAL,
+    so pricing each item of a sync does not read the cache each time.
+    """
+    global _shared_resolver, _prices_checked_at
+    if _shared_resolver is None:
+        with _shared_resolver_lock:
+            if _shared_resolver is None:
+                _shared_resolver = PriceResolver()
+    now = time.monotonic()
+    checked_at = _prices_checked_at
+    if checked_at is None or now - checked_at >= PRICES_VERSION_INTERVAL:
+        # Stamped before the read, so an invalidation during it is not lost
+        _prices_checked_at = now
+        _shared_resolver.check_version(_prices_version())
+    return _shared_resolver
+
+
+def refresh_effective_prices(seller_ids=None):
+    """
+    Rebuild EffectiveSellerPrice rows for the given sellers (every seller
+    when None): the latest active plan of the seller, then the general plan
+    for products the seller plan does not price. Same rules as the old
+    per-request SellerSerializer.get_effective_prices.
+    """
+    full = seller_ids is None
+    if full:
+        seller_ids = list(Seller.objects.values_list('id', flat=True))
+    else:
+        seller_ids = list(Seller.objects.filter(id__in=list(seller_ids)).values_list('id', flat=True))
+
+    latest_plans = {}
+    seller_plans = PricePlan.objects.filter(seller__isnull=False, is_active=True)
+    if not full:
+        seller_plans = seller_plans.filter(seller_id__in=seller_ids)
+    for plan_id, seller_id in seller_plans.order_by('-valid_from', 'name').values_list('id', 'seller_id'):
+        latest_plans.setdefault(seller_id, plan_id)
+
+    general_plan_id = PricePlan.objects.filter(
+        is_general=True, is_active=True
+    ).values_list('id', flat=True).first()
+
+    plan_prices = defaultdict(list)
+    plan_ids = set(latest_plans.values())
+    if general_plan_id:
+        plan_ids.add(general_plan_id)
+    if plan_ids:
+        for plan_id, product_id, price in ProductPrice.objects.filter(
+            price_plan_id__in=plan_ids
+        ).order_by().values_list('price_plan_id', 'product_id', 'price'):
+            plan_prices[plan_id].append((product_id, price))
+
+    general_prices = plan_prices.get(general_plan_id, [])
+    rows = []
+    for seller_id in seller_ids:
+        priced = set()
+        for product_id, price in plan_prices.get(latest_plans.get(seller_id), []):
+            priced.add(product_id)
+            rows.append(EffectiveSellerPrice(
+                seller_id=seller_id, product_id=product_id, price=price, source='seller_specific'
+            ))
+        for product_id, price in general_prices:
+            if product_id not in priced:
+                rows.append(EffectiveSellerPrice(
+                    seller_id=seller_id, product_id=product_id, price=price, source='general'
+                ))
+
+    with transaction.atomic():
+        stale = EffectiveSellerPrice.objects.all()
+        if not full:
+            stale = stale.filter(seller_id__in=seller_ids)
+        stale.delete()
+        EffectiveSellerPrice.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def effective_prices_prefetch():
+    """Prefetch for Seller querysets rendered with SellerSerializer.effective_prices"""
+    return Prefetch(
+        'effective_prices',
+        queryset=EffectiveSellerPrice.objects.select_related('product').only(
+            'seller_id', 'product_id', 'price', 'source', 'product__name'
+        ),
+    )
+
+
+def _run_scheduled_refresh():
+    refresh_all = getattr(_pending_refresh, 'all', False)
+    seller_ids = getattr(_pending_refresh, 'sellers', set())
+    _pending_refresh.all = False
+    _pending_refresh.sellers = set()
+    if refresh_all:
+        refresh_effective_prices()
+    elif seller_ids:
+        refresh_effective_prices(seller_ids)
+
+
+def schedule_effective_price_refresh(seller_ids=None):
+    """
+    Rebuild EffectiveSellerPrice for these sellers (all when None) after the
+    current transaction commits. Requests are merged, so saving a plan and
+    its prices in one transaction rebuilds each seller once.
+    """
+    if seller_ids is None:
+        _pending_refresh.all = True
+    else:
+        if not hasattr(_pending_refresh, 'sellers'):
+            _pending_refresh.sellers = set()
+        _pending_refresh.sellers.update(seller_ids)
+    # Later callbacks find the pending set already drained and do nothing
+    transaction.on_commit(_run_scheduled_refresh)
+
+
+def schedule_plan_refresh(seller_id, is_general):
+    """Schedule the EffectiveSellerPrice rebuild a change to one plan calls for"""
+    if is_general:
+        # The general plan fills in prices for every seller
+        schedule_effective_price_refresh()
+    elif seller_id:
+        schedule_effective_price_refresh([seller_id])
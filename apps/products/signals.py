@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
-from .models import PricePlan
+from apps.seller.models import Seller
+from .models import Category, PricePlan, Product, ProductPrice
 from .utils import process_price_plan_excel
+from .catalog import invalidate_catalog
+from .pricing import invalidate_price_cache, schedule_effective_price_refresh, schedule_plan_refresh, in_bulk_price_write
 
 @receiver(post_save, sender=PricePlan)
 def handle_price_plan_upload(sender, instance, created, **kwargs):
@@ -9,4 +12,62 @@ def handle_price_plan_upload(sender, instance, created, **kwargs):
     When a new PricePlan is created, process the Excel file
     """
     if created:
-        process_price_plan_excel(instance)
\ No newline at end of file
+        process_price_plan_excel(instance)
+
+@receiver(post_save, sender=PricePlan)
+@receiver(post_delete, sender=PricePlan)
+@receiver(post_save, sender=ProductPrice)
+@receiver(post_delete, sender=ProductPrice)
+def invalidate_price_resolver(sender, **kwargs):
+    """
+    Any change to a price plan or one of its prices makes the in-memory
+    price index stale
+    """
+    if sender is ProductPrice and in_bulk_price_write():
+        return
+    invalidate_price_cache()
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_product_catalog(sender, **kwargs):
+    """Product or category changes make the in-memory catalog stale"""
+    invalidate_catalog()
+
+@receiver(pre_save, sender=PricePlan)
+def remember_price_plan_seller(sender, instance, **kwargs):
+    """
+    Keep the seller the plan belonged to before this save, so moving a plan
+    to another seller refreshes both
+    """
+    instance._previous_assignment = None
+    if instance.pk:
+        instance._previous_assignment = PricePlan.objects.filter(
+            pk=instance.pk
+        ).values_list('seller_id', 'is_general').first()
+
+@receiver(post_save, sender=PricePlan)
+@receiver(post_delete, sender=PricePlan)
+def refresh_effective_prices_for_plan(sender, instance, **kwargs):
+    schedule_plan_refresh(instance.seller_id, instance.is_general)
+    previous = getattr(instance, '_previous_assignment', None)
+    if previous:
+        schedule_plan_refresh(*previous)
+
+@receiver(post_save, sender=ProductPrice)
+@receiver(post_delete, sender=ProductPrice)
+def refresh_effective_prices_for_price(sender, instance, **kwargs):
+    if in_bulk_price_write():
+        return
+    plan = PricePlan.objects.filter(
+        pk=instance.price_plan_id
+    ).values_list('seller_id', 'is_general').first()
+    # When the whole plan is being deleted its own signal covers it
+    if plan:
+        schedule_plan_refresh(*plan)
+
+@receiver(post_save, sender=Seller)
+def build_effective_prices_for_new_seller(sender, instance, created, **kwargs):
+    if created:
+        schedule_effective_price_refresh([instance.pk])
@@ -1,3 +1,230 @@
-from django.test import TestCase
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.core.testing import (
+    clear_caches, create_general_plan, create_products, create_route, create_sellers, create_user,
+)
+from apps.core.cache import invalidate
+from .catalog import active_products
+from .lookups import general_price_plan
+from .models import EffectiveSellerPrice, PricePlan, Product, ProductPrice
+from .pricing import PRICES_VERSION_INTERVAL, get_price_resolver, refresh_effective_prices
+from .utils import process_price_plan_excel
+
+
+class GeneralPlanLookupTests(TestCase):
+    """The general plan is served from the cache until a price plan or price changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product, = create_products(['Curd'], category='Curd')
+        cls.plan = create_general_plan()
+
+    def test_general_plan_follows_price_plan_changes(self):
+        self.assertEqual(general_price_plan(), self.plan)
+        with self.assertNumQueries(0):
+            general_price_plan()
+
+        self.plan.is_active = False
+        self.plan.save()
+        self.assertIsNone(general_price_plan())
+        # None is cached like any other result
+        with self.assertNumQueries(0):
+            self.assertIsNone(general_price_plan())
+
+    def test_seller_endpoint_general_plan_follows_price_changes(self):
+        ProductPrice.objects.create(price_plan=self.plan, product=self.product, price=Decimal('40.00'))
+        create_sellers(create_route('Bay'), 1)
+        user = create_user('cacher')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        first = client.get('/apiapp/sellers/').data['results'][0]['general_price_plan']
+        self.assertEqual(first['product_prices'][0]['price'], '40.00')
+
+        ProductPrice.objects.filter(price_plan=self.plan).get().delete()
+        ProductPrice.objects.create(price_plan=self.plan, product=self.product, price=Decimal('42.00'))
+        second = client.get('/apiapp/sellers/').data['results'][0]['general_price_plan']
+        self.assertEqual(second['product_prices'][0]['price'], '42.00')
+
+
+class PriceResolverTests(TestCase):
+    """Prices come from the seller's plan, then the general plan, within their validity"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.milk, cls.curd = create_products(['Milk', 'Curd'])
+        create_general_plan([cls.milk], price='10.00')
+        cls.seller, cls.other = create_sellers(create_route('North'), 2)
+        plan = PricePlan.objects.create(
+            name='March', is_general=False, seller=cls.seller, valid_from=date(2026, 3, 1), valid_to=date(2026, 3, 31),
+        )
+        ProductPrice.objects.create(price_plan=plan, product=cls.milk, price=Decimal('8.00'))
+
+    def setUp(self):
+        clear_caches()
+
+    def test_seller_plan_overrides_general_plan(self):
+        resolver = get_price_resolver()
+        self.assertEqual(resolver.get_price(self.milk, self.seller, date(2026, 3, 15)), Decimal('8.00'))
+        self.assertEqual(resolver.get_price(self.milk, self.other, date(2026, 3, 15)), Decimal('10.00'))
+        self.assertEqual(resolver.get_general_price(self.milk, date(2026, 3, 15)), Decimal('10.00'))
+
+    def test_validity_boundaries_are_inclusive(self):
+        resolver = get_price_resolver()
+        prices = {
+            day: resolver.get_price(self.milk, self.seller, day)
+            for day in [date(2026, 2, 28), date(2026, 3, 1), date(2026, 3, 31), date(2026, 4, 1)]
+        }
+        self.assertEqual(list(prices.values()), [Decimal('10.00'), Decimal('8.00'), Decimal('8.00'), Decimal('10.00')])
+        self.assertEqual(resolver.get_price(self.milk, self.seller, '2026-12-31'), Decimal('10.00'))
+        self.assertIsNone(resolver.get_price(self.milk, self.seller, date(2027, 1, 1)))
+
+    def test_missing_price_is_none(self):
+        self.assertIsNone(get_price_resolver().get_price(self.curd, self.seller, date(2026, 3, 15)))
+        self.assertEqual(
+            get_price_resolver().get_prices([self.milk, self.curd], self.other, date(2026, 6, 1)),
+            {self.milk.pk: Decimal('10.00'), self.curd.pk: None},
+        )
+
+    def test_invalidation_from_another_process_is_seen(self):
+        self.assertEqual(get_price_resolver().get_general_price(self.milk, date(2026, 6, 1)), Decimal('10.00'))
+        self.assertEqual(len(active_products()), 2)
+
+        # What another process's signals leave behind: new rows and new
+        # namespace versions in the shared cache, nothing in this process
+        ProductPrice.objects.filter(product=self.milk, price_plan__is_general=True).update(price=Decimal('11.00'))
+        Product.objects.filter(pk=self.curd.pk).update(is_active=False)
+        invalidate('price_plans', 'products')
+
+        self.assertEqual(active_products(), [self.milk])
+        # The resolver trusts the version it read for PRICES_VERSION_INTERVAL
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as reads:
+            self.assertEqual(get_price_resolver().get_general_price(self.milk, date(2026, 6, 1)), Decimal('10.00'))
+        self.assertEqual(reads.call_count, 0)
+
+        later = time.monotonic() + PRICES_VERSION_INTERVAL
+        with mock.patch('apps.products.pricing.time.monotonic', return_value=later):
+            self.assertEqual(get_price_resolver().get_general_price(self.milk, date(2026, 6, 1)), Decimal('11.00'))
+
+    def test_local_price_changes_are_seen_at_once(self):
+        self.assertEqual(get_price_resolver().get_general_price(self.milk, date(2026, 6, 1)), Decimal('10.00'))
+        ProductPrice.objects.filter(product=self.milk, price_plan__is_general=True).get().delete()
+        self.assertIsNone(get_price_resolver().get_general_price(self.milk, date(2026, 6, 1)))
+
+
+class PricePlanImportTests(TestCase):
+    """Excel imports validate the sheet column-wise and replace a plan's prices in one go"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.milk, cls.curd, cls.ghee = create_products(['Milk', 'Curd', 'Ghee'])
+        cls.plan = create_general_plan([cls.ghee], price='99.00')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media = Path(media.name)
+
+    def import_sheet(self, rows):
+        pd.DataFrame(rows, columns=['product_code', 'price']).to_excel(self.media / 'prices.xlsx', index=False)
+        self.plan.excel_file.name = 'prices.xlsx'
+        return process_price_plan_excel(self.plan)
+
+    def plan_prices(self):
+        return dict(ProductPrice.objects.filter(price_plan=self.plan).values_list('product__name', 'price'))
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        report = self.import_sheet([
+            (self.milk.code, 12.5),
+            (None, 5),
+            ('NOPE', 5),
+            (self.curd.code, 'abc'),
+            (self.curd.code, -1),
+            (self.milk.code, 13),
+            (f' {self.curd.code} ', 7.456),
+        ])
+
+        self.assertTrue(report)
+        self.assertIsNone(report.error)
+        self.assertEqual(report.imported, 2)
+        self.assertEqual([(rejected['row'], rejected['reason']) for rejected in report.rejected], [
+            (3, 'missing product code'),
+            (4, 'unknown product code'),
+            (5, 'invalid price'),
+            (6, 'negative price'),
+            (7, 'duplicate product code'),
+        ])
+        self.assertEqual(report.as_dict()['rejected_count'], 5)
+        # Curd's rejected rows do not count as its first price; prices are rounded to cents
+        self.assertEqual(self.plan_prices(), {'Milk': Decimal('12.50'), 'Curd': Decimal('7.46')})
+
+    def test_prices_are_replaced_atomically(self):
+        with mock.patch.object(ProductPrice.objects, 'bulk_create', side_effect=DatabaseError('disk full')):
+            report = self.import_sheet([(self.milk.code, 11)])
+        self.assertFalse(report)
+        self.assertEqual(report.error, 'disk full')
+        # The delete before the failed insert was rolled back with it
+        self.assertEqual(self.plan_prices(), {'Ghee': Decimal('99.00')})
+
+        self.assertTrue(self.import_sheet([(self.milk.code, 11)]))
+        self.assertEqual(self.plan_prices(), {'Milk': Decimal('11.00')})
+
+    def test_missing_columns_are_an_error(self):
+        pd.DataFrame({'code': ['X'], 'price': [1]}).to_excel(self.media / 'prices.xlsx', index=False)
+        self.plan.excel_file.name = 'prices.xlsx'
+        report = process_price_plan_excel(self.plan)
+        self.assertFalse(report)
+        self.assertIn('Missing required columns', report.error)
+        self.assertEqual(self.plan_prices(), {'Ghee': Decimal('99.00')})
+
+
+class EffectivePriceRefreshTests(TestCase):
+    """EffectiveSellerPrice holds each seller's latest plan, topped up from the general plan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.milk, cls.curd = create_products(['Milk', 'Curd'])
+        create_general_plan([cls.milk, cls.curd], price='10.00')
+        cls.seller, cls.other = create_sellers(create_route('West'), 2)
+        cls.plan = PricePlan.objects.create(
+            name='Seller', is_general=False, seller=cls.seller,
+            valid_from=date(2026, 1, 1), valid_to=date(2026, 12, 31),
+        )
+        ProductPrice.objects.create(price_plan=cls.plan, product=cls.milk, price=Decimal('8.00'))
+
+    def effective_prices(self, seller):
+        return {
+            name: (price, source)
+            for name, price, source in EffectiveSellerPrice.objects.filter(seller=seller).values_list(
+                'product__name', 'price', 'source'
+            )
+        }
+
+    def test_refresh_rebuilds_the_given_sellers(self):
+        self.assertEqual(refresh_effective_prices([self.seller.pk]), 2)
+        self.assertEqual(self.effective_prices(self.seller), {
+            'Milk': (Decimal('8.00'), 'seller_specific'),
+            'Curd': (Decimal('10.00'), 'general'),
+        })
+        self.assertEqual(self.effective_prices(self.other), {})
+
+        self.plan.is_active = False
+        self.plan.save()
+        self.assertEqual(refresh_effective_prices(), 4)
+        general = {'Milk': (Decimal('10.00'), 'general'), 'Curd': (Decimal('10.00'), 'general')}
+        self.assertEqual(self.effective_prices(self.seller), general)
+        self.assertEqual(self.effective_prices(self.other), general)
@@ -1,104 +1,151 @@
 import pandas as pd
 from datetime import date
+from decimal import Decimal
 import logging
 from django.db import transaction
-from .models import Product, ProductPrice
+from django.utils import timezone
+from .models import PricePlan, Product, ProductPrice
+from .pricing import bulk_price_write, invalidate_price_cache, prices_replaced, schedule_plan_refresh
 
 logger = logging.getLogger(__name__)
 
+# Product codes are resolved in chunks so the IN list stays under the
+# bound-parameter limit of every backend
+PRODUCT_LOOKUP_CHUNK = 900
+
+
+class PriceImportReport:
+    """
+    Outcome of a price plan Excel import. Truthy when at least one price was
+    imported, so callers that only check success keep working.
+    """
+
+    def __init__(self):
+        self.imported = 0
+        self.rejected = []
+        self.error = None
+
+    def reject(self, row, product_code, price, reason):
+        self.rejected.append({
+            'row': row,
+            'product_code': product_code,
+            'price': price,
+            'reason': reason,
+        })
+
+    def __bool__(self):
+        return self.imported > 0
+
+    def as_dict(self):
+        return {
+            'imported': self.imported,
+            'rejected_count': len(self.rejected),
+            'rejected': self.rejected,
+            'error': self.error,
+        }
+
+
+def _resolve_product_codes(codes):
+    product_ids = {}
+    codes = list(codes)
+    for start in range(0, len(codes), PRODUCT_LOOKUP_CHUNK):
+        product_ids.update(
+            Product.objects.filter(code__in=codes[start:start + PRODUCT_LOOKUP_CHUNK]).values_list('code', 'id')
+        )
+    return product_ids
+
+
 def process_price_plan_excel(price_plan):
     """
-    Process the uploaded Excel file and create ProductPrice entries
+    Process the uploaded Excel file and replace the plan's ProductPrice
+    entries. The sheet is read once, validated column-wise, product codes
+    are resolved in bulk and prices written with bulk_create. Returns a
+    PriceImportReport listing every rejected row and why.
     """
+    report = PriceImportReport()
     try:
         logger.info(f"Starting to process Excel file for price plan {price_plan.id}")
-        
+
         # Ensure the file exists and is readable
         if not price_plan.excel_file:
             logger.error("No excel file found")
-            return False
+            report.error = 'No excel file found'
+            return report
 
-        # Read the Excel file using pandas
+        # Read the Excel file using pandas; codes stay text so '0012' is not read as 12
         try:
-            df = pd.read_excel(price_plan.excel_file.path)
+            df = pd.read_excel(price_plan.excel_file.path, dtype={'product_code': str})
         except Exception as e:
             logger.error(f"Error reading Excel file: {str(e)}")
-            return False
-        
+            report.error = f'Error reading Excel file: {e}'
+            return report
+
         # Validate columns
         required_columns = ['product_code', 'price']
         if not all(col in df.columns for col in required_columns):
             logger.error(f"Missing required columns. Found columns: {df.columns.tolist()}")
-            return False
+            report.error = f'Missing required columns. Found columns: {df.columns.tolist()}'
+            return report
+
+        # Column-wise validation; 'row' is the spreadsheet row number (header is row 1)
+        sheet = pd.DataFrame({
+            'row': df.index + 2,
+            'product_code': df['product_code'].fillna('').astype(str).str.strip(),
+            'raw_price': df['price'],
+            'price': pd.to_numeric(df['price'], errors='coerce').round(2),
+        })
+        sheet['reason'] = None
+        sheet.loc[sheet['product_code'] == '', 'reason'] = 'missing product code'
+        sheet.loc[sheet['reason'].isna() & sheet['price'].isna(), 'reason'] = 'invalid price'
+        sheet.loc[sheet['reason'].isna() & (sheet['price'] < 0), 'reason'] = 'negative price'
+
+        product_ids = _resolve_product_codes(sheet.loc[sheet['reason'].isna(), 'product_code'].unique())
+        sheet['product_id'] = sheet['product_code'].map(product_ids)
+        sheet.loc[sheet['reason'].isna() & sheet['product_id'].isna(), 'reason'] = 'unknown product code'
+        # The first valid price for a product wins, as it did when rows were inserted one by one
+        valid = sheet['reason'].isna()
+        duplicated = valid & sheet['product_id'].where(valid).duplicated(keep='first')
+        sheet.loc[duplicated, 'reason'] = 'duplicate product code'
 
-        with transaction.atomic():
+        for row, product_code, raw_price, reason in sheet.loc[
+            sheet['reason'].notna(), ['row', 'product_code', 'raw_price', 'reason']
+        ].itertuples(index=False):
+            report.reject(int(row), product_code, None if pd.isna(raw_price) else str(raw_price), reason)
+
+        valid = sheet.loc[sheet['reason'].isna(), ['product_id', 'price']]
+        prices = [
+            ProductPrice(price_plan=price_plan, product_id=int(product_id), price=Decimal(f'{price:.2f}'))
+            for product_id, price in valid.itertuples(index=False)
+        ]
+
+        with transaction.atomic(), bulk_price_write():
             # Delete existing prices
             ProductPrice.objects.filter(price_plan=price_plan).delete()
-            
-            # Process each row
-            success_count = 0
-            error_count = 0
-            
-            for index, row in df.iterrows():
-                try:
-                    product_code = str(row['product_code']).strip()
-                    price = float(row['price'])
-                    
-                    product = Product.objects.get(code=product_code)
-                    
-                    ProductPrice.objects.create(
-                        price_plan=price_plan,
-                        product=product,
-                        price=price
-                    )
-                    success_count += 1
-                    
-                except Product.DoesNotExist:
-                    logger.error(f"Product with code {product_code} not found")
-                    error_count += 1
-                except Exception as e:
-                    logger.error(f"Error processing row {index}: {str(e)}")
-                    error_count += 1
-
-            logger.info(f"Processed {success_count} prices successfully, {error_count} errors")
-            
-            return success_count > 0
+            ProductPrice.objects.bulk_create(prices, batch_size=2000)
+            # bulk_create skips the ProductPrice signals, so do their work once for the plan
+            PricePlan.objects.filter(pk=price_plan.pk).update(updated_at=timezone.now())
+            invalidate_price_cache()
+            schedule_plan_refresh(price_plan.seller_id, price_plan.is_general)
+            prices_replaced.send(sender=PricePlan, price_plan=price_plan)
+
+        report.imported = len(prices)
+        logger.info(f"Processed {report.imported} prices successfully, {len(report.rejected)} rejected")
+        for rejected in report.rejected:
+            logger.error(f"Rejected row {rejected['row']} ({rejected['product_code']}): {rejected['reason']}")
+
+        return report
 
     except Exception as e:
         logger.error(f"Error processing Excel file: {str(e)}", exc_info=True)
-        return False
+        report.error = str(e)
+        report.imported = 0
+        return report
 
 def get_product_price(product, seller, date=None):
     """
     Get the price for a product for a specific seller on a specific date
     If no date is provided, use current date
     """
-    if date is None:
-        date = date.today()
-
-    # First, try to find a special price plan for the seller
-    special_price = ProductPrice.objects.filter(
-        price_plan__seller=seller,
-        price_plan__is_general=False,
-        price_plan__valid_from__lte=date,
-        price_plan__valid_to__gte=date,
-        price_plan__is_active=True,
-        product=product
-    ).first()
-
-    if special_price:
-        return special_price.price
-
-    # If no special price found, get the general price
-    general_price = ProductPrice.objects.filter(
-        price_plan__is_general=True,
-        price_plan__valid_from__lte=date,
-        price_plan__valid_to__gte=date,
-        price_plan__is_active=True,
-        product=product
-    ).first()
-
-    if general_price:
-        return general_price.price
-
-    return None
+    from .pricing import get_price_resolver
+
+    return get_price_resolver().get_price(product, seller, date)
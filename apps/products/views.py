@@ -9,6 +9,7 @@
 from django.http import HttpResponse, HttpResponseBadRequest
 from web_project import TemplateLayout
 from .models import Category, Product, PricePlan, Seller, ProductPrice
+from .lookups import price_plan_list
 import json
 from urllib.parse import parse_qs
 import xlsxwriter
@@ -223,7 +224,7 @@ class PricePlanListView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = TemplateLayout.init(self, super().get_context_data(**kwargs))
-        context['price_plans'] = PricePlan.objects.all().order_by('-created_at')
+        context['price_plans'] = price_plan_list()
         context['sellers'] = Seller.objects.all().order_by('first_name')
         return context
 
@@ -232,10 +233,8 @@ def post(self, request):
         try:
             # Debug logging
             logger.info("Received POST request for price plan creation")
-            logger.info(f"POST data: {request.POST}")
-            logger.info(f"Files: {request.FILES}")
-            print(request.POST)
-            print(request.FILES)
+            logger.debug('POST data: %s', request.POST)
+            logger.debug('Files: %s', request.FILES)
 
             # Validate required fields
             required_fields = ['name', 'valid_from', 'valid_to']
@@ -271,7 +270,7 @@ def post(self, request):
             response = render(
                 request,
                 'products/partials/price_plan_table.html',
-                {'price_plans': PricePlan.objects.all().order_by('-created_at')}
+                {'price_plans': price_plan_list()}
             )
             
             # Add both HX-Trigger headers
@@ -360,7 +359,7 @@ def put(self, request, price_plan_id):
             response = render(
                 request,
                 'products/partials/price_plan_table.html',
-                {'price_plans': PricePlan.objects.all().order_by('-created_at')}
+                {'price_plans': price_plan_list()}
             )
             
             # Add HX-Trigger headers with proper JSON formatting
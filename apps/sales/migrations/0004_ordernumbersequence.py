@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_salesorder_unique_seller_delivery_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=10)),
+                ('sequence_date', models.DateField()),
+                ('last_value', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Order Number Sequence',
+                'verbose_name_plural': 'Order Number Sequences',
+                'ordering': ['-sequence_date', 'prefix'],
+                'constraints': [models.UniqueConstraint(fields=('prefix', 'sequence_date'), name='unique_order_number_sequence')],
+            },
+        ),
+    ]
@@ -1,9 +1,8 @@
-from django.db import models
-from django.utils import timezone
+from django.db import models, transaction
 from decimal import Decimal
 from apps.authentication.models import CustomUser
 from apps.seller.models import Seller, Route
-from apps.products.models import Product, PricePlan
+from apps.products.models import Product
 from django.conf import settings
 from .utils import get_opening_balance
 
@@ -83,24 +82,15 @@ def __str__(self):
         return f"Order {self.order_number} - {self.seller.store_name}"
 
     def save(self, *args, **kwargs):
+        from .sequences import next_order_number
+
         is_new = self.pk is None
-        if not self.order_number:
-            # Generate order number: SO-YYYYMMDD-XXXX
-            today = timezone.now().date()
-            prefix = f"SO-{today.strftime('%Y%m%d')}-"
-            last_order = SalesOrder.objects.filter(
-                order_number__startswith=prefix
-            ).order_by('-order_number').first()
-
-            if last_order:
-                last_number = int(last_order.order_number.split('-')[-1])
-                new_number = str(last_number + 1).zfill(4)
-            else:
-                new_number = '0001'
-
-            self.order_number = f"{prefix}{new_number}"
+        with transaction.atomic():
+            if not self.order_number:
+                # Generate order number: SO-YYYYMMDD-XXXX
+                self.order_number = next_order_number('SO', model=SalesOrder)
 
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
 
         from apps.delivery.models import DeliveryOrder
 
@@ -141,7 +131,10 @@ def update_delivery_order_items(self):
         """Update delivery order items based on sales order items.
         This method should be called after all sales order items have been created/updated."""
         from apps.delivery.models import DeliveryOrder, DeliveryOrderItem
-        from .utils import get_product_price
+        from apps.delivery.totals import schedule_order_totals
+        from apps.products.pricing import get_price_resolver
+
+        resolver = get_price_resolver()
 
         try:
             delivery_order = DeliveryOrder.objects.get(sales_order=self)
@@ -152,15 +145,16 @@ def update_delivery_order_items(self):
             ).values_list('product_id', flat=True))
 
             # Update quantities for existing items
-            for item in self.items.all():
+            for item in self.items.select_related('product'):
+                unit_price = resolver.get_price(item.product, self.seller, self.delivery_date)
                 delivery_item, created = DeliveryOrderItem.objects.get_or_create(
                     delivery_order=delivery_order,
                     product=item.product,
                     defaults={
                         'ordered_quantity': item.quantity,
                         'delivered_quantity': item.quantity,
-                        'unit_price': get_product_price(item.product, self.seller, self.delivery_date),
-                        'total_price': item.quantity * get_product_price(item.product, self.seller, self.delivery_date)
+                        'unit_price': unit_price,
+                        'total_price': item.quantity * unit_price
                     }
                 )
 
@@ -186,22 +180,11 @@ def update_delivery_order_items(self):
                     product_id__in=existing_products
                 ).delete()
 
-            # Recalculate delivery order totals
-            delivery_order.recalculate_totals()
-
-            # Ensure every active product has a DeliveryOrderItem (with 0 quantity if not in the order)
-            all_products = Product.objects.filter(is_active=True)
-            delivery_order_product_ids = set(DeliveryOrderItem.objects.filter(delivery_order=delivery_order).values_list('product_id', flat=True))
-            for product in all_products:
-                if product.id not in delivery_order_product_ids:
-                    DeliveryOrderItem.objects.create(
-                        delivery_order=delivery_order,
-                        product=product,
-                        ordered_quantity=Decimal('0.000'),
-                        delivered_quantity=Decimal('0.000'),
-                        unit_price=get_product_price(product, self.seller, self.delivery_date) or Decimal('0.00'),
-                        total_price=Decimal('0.00')
-                    )
+            # Recalculate delivery order totals once the changes commit
+            schedule_order_totals([delivery_order.pk])
+
+            # Products the seller did not order are not stored as zero rows;
+            # DeliveryOrder.catalog_items() shows them when a full sheet is needed
 
             return delivery_order
         except DeliveryOrder.DoesNotExist:
@@ -260,6 +243,7 @@ def total_amount(self):
     def delete(self, *args, **kwargs):
         # Before deleting the order item, delete the corresponding delivery order item
         from apps.delivery.models import DeliveryOrder, DeliveryOrderItem
+        from apps.delivery.totals import schedule_order_totals
 
         try:
             # Find the delivery order associated with this sales order
@@ -272,8 +256,8 @@ def delete(self, *args, **kwargs):
                     product=self.product
                 ).delete()
 
-                # Recalculate delivery order totals
-                delivery_order.recalculate_totals()
+                # Recalculate delivery order totals once the changes commit
+                schedule_order_totals([delivery_order.pk])
         except DeliveryOrder.DoesNotExist:
             pass
 
@@ -281,46 +265,37 @@ def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
 
     def save(self, *args, **kwargs):
+        from apps.products.pricing import get_price_resolver
+
+        resolver = get_price_resolver()
+
         if not self.unit_price:
             # Get price from active general price plan
-            price_plan = PricePlan.objects.filter(
-                is_general=True,
-                is_active=True,
-                valid_from__lte=self.order.delivery_date,
-                valid_to__gte=self.order.delivery_date
-            ).order_by('-created_at').first()
-
-            if price_plan:
-                product_price = price_plan.product_prices.filter(
-                    product=self.product
-                ).first()
-                if product_price:
-                    self.unit_price = product_price.price
-                else:
-                    self.unit_price = Decimal('0.00')
-            else:
-                self.unit_price = Decimal('0.00')
+            self.unit_price = resolver.get_general_price(
+                self.product, self.order.delivery_date
+            ) or Decimal('0.00')
 
         # Save the order item first
         super().save(*args, **kwargs)
 
         # Now update the corresponding delivery order item
         from apps.delivery.models import DeliveryOrder, DeliveryOrderItem
-        from .utils import get_product_price
+        from apps.delivery.totals import schedule_order_totals
 
         try:
             # Find the delivery order associated with this sales order
             delivery_order = DeliveryOrder.objects.get(sales_order=self.order)
 
             # Create or update the delivery order item
+            unit_price = resolver.get_price(self.product, self.order.seller_id, self.order.delivery_date)
             delivery_item, created = DeliveryOrderItem.objects.get_or_create(
                 delivery_order=delivery_order,
                 product=self.product,
                 defaults={
                     'ordered_quantity': self.quantity,
                     'delivered_quantity': self.quantity,
-                    'unit_price': get_product_price(self.product, self.order.seller, self.order.delivery_date),
-                    'total_price': self.quantity * get_product_price(self.product, self.order.seller, self.order.delivery_date)
+                    'unit_price': unit_price,
+                    'total_price': self.quantity * unit_price
                 }
             )
 
@@ -334,8 +309,9 @@ def save(self, *args, **kwargs):
                 delivery_item.total_price = delivery_item.delivered_quantity * delivery_item.unit_price
                 delivery_item.save()
 
-            # Recalculate delivery order totals
-            delivery_order.recalculate_totals()
+            # Recalculate delivery order totals once the changes commit; saving
+            # every item of an order in one transaction recalculates it once
+            schedule_order_totals([delivery_order.pk])
 
         except DeliveryOrder.DoesNotExist:
             # This shouldn't happen, but if it does, we'll just skip creating the delivery order item
@@ -369,3 +345,24 @@ class Meta:
 
     def __str__(self):
         return f"Call to {self.seller.store_name} on {self.call_date}"
+
+class OrderNumberSequence(models.Model):
+    """Per-prefix, per-day counter behind the XX-YYYYMMDD-NNNN order numbers"""
+    prefix = models.CharField(max_length=10)
+    sequence_date = models.DateField()
+    last_value = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-sequence_date', 'prefix']
+        verbose_name = 'Order Number Sequence'
+        verbose_name_plural = 'Order Number Sequences'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['prefix', 'sequence_date'],
+                name='unique_order_number_sequence'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.prefix}-{self.sequence_date.strftime('%Y%m%d')}: {self.last_value}"
@@ -0,0 +1,90 @@
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OrderNumberSequence
+
+
+def _legacy_last_value(model, stem):
+    """
+    Highest number already issued under this stem before the counter row
+    existed, so numbers created by the old scan-based save() are not reused
+    """
+    if model is None:
+        return 0
+    last_order = model.objects.filter(
+        order_number__startswith=stem
+    ).order_by('-order_number').values_list('order_number', flat=True).first()
+    if not last_order:
+        return 0
+    try:
+        return int(last_order.split('-')[-1])
+    except ValueError:
+        return 0
+
+
+def _bump_returning(prefix, date, count):
+    """
+    Add count to an existing counter row and read the new value back in the
+    same UPDATE ... RETURNING statement. None when the row does not exist
+    yet, or when the backend cannot return rows from an UPDATE.
+    """
+    if connection.vendor not in ('postgresql', 'sqlite') or not connection.features.can_return_columns_from_insert:
+        return None
+    table = connection.ops.quote_name(OrderNumberSequence._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET last_value = last_value + %s, updated_at = %s '
+            f'WHERE prefix = %s AND sequence_date = %s RETURNING last_value',
+            [
+                count, connection.ops.adapt_datetimefield_value(timezone.now()),
+                prefix, connection.ops.adapt_datefield_value(date),
+            ],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def allocate_order_numbers(prefix, count=1, model=None, date=None):
+    """
+    Reserve a block of `count` consecutive order numbers for `prefix` on
+    `date` (today by default) and return them as a list, e.g.
+    ['DO-20250101-0007', 'DO-20250101-0008'].
+
+    Once the day's counter row exists, a block costs one round trip: a
+    single UPDATE ... SET last_value = last_value + count RETURNING
+    last_value on PostgreSQL and SQLite. Other backends, and the first
+    block of a day, create the row if needed and then bump it and read it
+    back with separate queries. The row lock taken by the UPDATE means
+    concurrent callers never see the same value. Call it inside the
+    transaction that inserts the orders: if that transaction rolls back,
+    the increment rolls back with it and no gap is left.
+    """
+    if count < 1:
+        return []
+    if date is None:
+        date = timezone.now().date()
+    stem = f"{prefix}-{date.strftime('%Y%m%d')}-"
+
+    last_value = _bump_returning(prefix, date, count)
+    if last_value is None:
+        with transaction.atomic():
+            sequence, created = OrderNumberSequence.objects.get_or_create(
+                prefix=prefix,
+                sequence_date=date,
+                defaults={'last_value': _legacy_last_value(model, stem)}
+            )
+            OrderNumberSequence.objects.filter(pk=sequence.pk).update(
+                last_value=F('last_value') + count
+            )
+            last_value = OrderNumberSequence.objects.filter(
+                pk=sequence.pk
+            ).values_list('last_value', flat=True).get()
+
+    first_value = last_value - count + 1
+    return [f"{stem}{str(number).zfill(4)}" for number in range(first_value, last_value + 1)]
+
+
+def next_order_number(prefix, model=None, date=None):
+    """Allocate a single order number, see allocate_order_numbers()"""
+    return allocate_order_numbers(prefix, 1, model=model, date=date)[0]
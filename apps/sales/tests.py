@@ -1,3 +1,56 @@
+from datetime import date
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.core.testing import create_route, create_sellers
+from apps.delivery.models import DeliveryOrder
+from .models import OrderNumberSequence
+from .sequences import allocate_order_numbers, next_order_number
+
+
+class OrderNumberAllocationTests(TestCase):
+    """Order numbers come from a counter row per prefix and day, in blocks"""
+
+    day = date(2026, 10, 18)
+
+    def test_first_allocation_starts_a_counter(self):
+        self.assertEqual(
+            allocate_order_numbers('DO', 3, date=self.day),
+            ['DO-20261018-0001', 'DO-20261018-0002', 'DO-20261018-0003'],
+        )
+        self.assertEqual(OrderNumberSequence.objects.get(prefix='DO', sequence_date=self.day).last_value, 3)
+        # Prefixes and days count separately
+        self.assertEqual(next_order_number('LO', date=self.day), 'LO-20261018-0001')
+        self.assertEqual(next_order_number('DO', date=date(2026, 10, 19)), 'DO-20261019-0001')
+        self.assertEqual(allocate_order_numbers('DO', 0, date=self.day), [])
+
+    def test_consecutive_blocks_do_not_overlap(self):
+        first = allocate_order_numbers('BO', 5, date=self.day)
+        second = allocate_order_numbers('BO', 2, date=self.day)
+        third = [next_order_number('BO', date=self.day)]
+
+        numbers = first + second + third
+        self.assertEqual(len(set(numbers)), 8)
+        self.assertEqual(numbers, [f'BO-20261018-{value:04d}' for value in range(1, 9)])
+
+    def test_later_blocks_take_one_statement(self):
+        allocate_order_numbers('PO', 2, date=self.day)
+        with CaptureQueriesContext(connection) as queries:
+            numbers = allocate_order_numbers('PO', 3, date=self.day)
+
+        self.assertEqual(numbers, ['PO-20261018-0003', 'PO-20261018-0004', 'PO-20261018-0005'])
+        self.assertEqual(len(queries), 1)
+        self.assertIn('RETURNING', queries[0]['sql'])
+
+    def test_numbers_continue_after_existing_orders(self):
+        # Orders numbered by the old scan-based save(), before the counter row existed
+        route = create_route('East')
+        for seller, number in zip(create_sellers(route, 2), ('DO-20261018-0007', 'DO-20261018-0041')):
+            DeliveryOrder.objects.create(route=route, seller=seller, delivery_date=self.day, order_number=number)
 
-# Create your tests here.
+        numbers = allocate_order_numbers('DO', 2, model=DeliveryOrder, date=self.day)
+        self.assertEqual(numbers, ['DO-20261018-0042', 'DO-20261018-0043'])
+        self.assertFalse(DeliveryOrder.objects.filter(order_number__in=numbers).exists())
+        self.assertEqual(next_order_number('DO', model=DeliveryOrder, date=self.day), 'DO-20261018-0044')
@@ -9,6 +9,8 @@
 from .models import SalesOrder, OrderItem, SellerCallLog, Product
 from apps.seller.models import Route, Seller
 from apps.products.models import ProductPrice
+from apps.products.lookups import product_list
+from apps.seller.lookups import route_list
 import json
 from decimal import Decimal
 import logging
@@ -67,7 +69,7 @@ def get_context_data(self, **kwargs):
             'seller', 
             'seller__route'
         ).order_by('-call_date', '-created_at')
-        context['routes'] = Route.objects.all().order_by('name')
+        context['routes'] = route_list()
         return context
 
 class CallLogCreateView(LoginRequiredMixin, SalesTeamRequiredMixin, View):
@@ -75,7 +77,7 @@ class CallLogCreateView(LoginRequiredMixin, SalesTeamRequiredMixin, View):
 
     def get(self, request):
         try:
-            routes = Route.objects.all().order_by('name')
+            routes = route_list()
             context = {
                 'routes': routes,
                 'call_statuses': SellerCallLog.CALL_STATUS,
@@ -204,7 +206,7 @@ def get_context_data(self, **kwargs):
 
         context.update({
             'orders': page_obj,
-            'routes': Route.objects.all().order_by('name'),
+            'routes': route_list(),
             'status_choices': SalesOrder.ORDER_STATUS,
             # Add filter values to context for maintaining state
             'selected_route': route_id,
@@ -286,8 +288,8 @@ class SalesOrderCreateView(LoginRequiredMixin, SalesTeamRequiredMixin, View):
 
     def get(self, request):
         try:
-            routes = Route.objects.all().order_by('name')
-            products = Product.objects.filter(is_active=True).order_by('name')
+            routes = route_list()
+            products = product_list()
             
             context = {
                 'routes': routes,
@@ -395,8 +397,8 @@ def get(self, request, order_id):
             if order.status != 'draft':
                 return HttpResponseBadRequest('Only draft orders can be edited')
             
-            routes = Route.objects.all().order_by('name')
-            products = Product.objects.filter(is_active=True).order_by('name')
+            routes = route_list()
+            products = product_list()
             
             context = {
                 'order': order,
@@ -523,7 +525,6 @@ def get(self, request):
                 price_plan__valid_from__lte=today,
                 price_plan__valid_to__gte=today
             ).order_by('-price_plan__created_at').first()
-            print('price: ', price)
             return JsonResponse({
                 'price': float(price.price) if price else 10.00
             })
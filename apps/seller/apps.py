@@ -4,3 +4,6 @@
 class SellerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.seller'
+
+    def ready(self):
+        import apps.seller.signals  # Import signals when app is ready
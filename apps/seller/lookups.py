@@ -0,0 +1,12 @@
+"""
+The route list behind most forms and filters, kept in the shared cache
+(apps/core/cache.py) and invalidated by the Route signals in signals.py.
+"""
+from apps.core.cache import cached
+
+from .models import Route
+
+
+def route_list():
+    """Every route by name"""
+    return cached('routes', 'all', lambda: list(Route.objects.order_by('name')))
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.core.cache import invalidate
+from .models import Route
+
+
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+def invalidate_route_list(sender, **kwargs):
+    """Route changes make the cached route list stale"""
+    invalidate('routes')
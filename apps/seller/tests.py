@@ -1,3 +1,22 @@
 from django.test import TestCase
 
-# Create your tests here.
+from apps.core.testing import create_route
+from .lookups import route_list
+from .models import Route
+
+
+class RouteListTests(TestCase):
+    """The route list is served from the cache until a route changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.route = create_route('Bay')
+
+    def test_route_list_is_cached_until_a_route_changes(self):
+        route_list()
+        with self.assertNumQueries(0):
+            self.assertIn(self.route, route_list())
+
+        Route.objects.create(name='Aqueduct', code='A1')
+        with self.assertNumQueries(1):
+            self.assertEqual([route.name for route in route_list()], ['Aqueduct', 'Bay'])
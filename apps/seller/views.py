@@ -6,6 +6,7 @@
 from django.http import HttpResponse, HttpResponseBadRequest
 from web_project import TemplateLayout
 from .models import Route, Seller
+from .lookups import route_list
 import json
 from urllib.parse import parse_qs
 
@@ -53,14 +54,14 @@ class SellerListView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = TemplateLayout.init(self, super().get_context_data(**kwargs))
         context['sellers'] = Seller.objects.all().order_by('-created_at')
-        context['routes'] = Route.objects.all().order_by('name')  # Added for the form
+        context['routes'] = route_list()  # Added for the form
         return context
 
 class SellerCreateView(LoginRequiredMixin, View):
     login_url = reverse_lazy('auth-login-basic')
 
     def get(self, request):
-        routes = Route.objects.all().order_by('name')
+        routes = route_list()
         return render(request, 'seller/seller_form.html', {'routes': routes})
     
     def post(self, request):
@@ -142,7 +143,7 @@ class SellerEditFormView(LoginRequiredMixin, View):
 
     def get(self, request, seller_id):
         seller = Seller.objects.get(id=seller_id)
-        routes = Route.objects.all().order_by('name')
+        routes = route_list()
         return render(request, 'seller/seller_edit_form.html', {
             'seller': seller,
             'routes': routes
@@ -0,0 +1,110 @@
+"""
+Database profiles, picked with DATABASE_PROFILE.
+
+sqlite    (default) the file next to manage.py; the tests run on it.
+          DATABASE_SQLITE_TUNED=true is for single-box depots: WAL so
+          readers never wait for a writer, a busy timeout instead of an
+          immediate "database is locked", and writers that take the lock
+          when their transaction starts rather than failing to upgrade
+          halfway through. Sync uploads then also queue on a file lock
+          (apps/api/write_queue.py) so only one writes at a time.
+postgres  PostgreSQL through psycopg, for production. Connections persist
+          for DATABASE_CONN_MAX_AGE seconds (health-checked before reuse)
+          so the morning sync burst does not reconnect per request.
+          DATABASE_POOL=min:max swaps that for psycopg's own pool (needs
+          psycopg[pool]). DATABASE_PGBOUNCER=true is for a pgbouncer in
+          transaction pooling mode: no server-side cursors or prepared
+          statements, which do not survive a change of server connection.
+          There DATABASE_DIRECT_HOST / DATABASE_DIRECT_PORT add an "exports"
+          alias straight to PostgreSQL, so exports still stream through
+          server-side cursors.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = ('sqlite', 'postgres')
+
+# Run on every new SQLite connection in tuned mode. journal_mode=WAL sticks
+# to the file; the rest is per connection. cache_size is in KiB when negative.
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout={busy_timeout}',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+def _flag(environ, name):
+    return environ.get(name, 'False').lower() in ['true', 'yes', '1']
+
+
+def _postgres(environ):
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': environ.get('DATABASE_NAME', 'dairy'),
+        'USER': environ.get('DATABASE_USER', 'dairy'),
+        'PASSWORD': environ.get('DATABASE_PASSWORD', ''),
+        'HOST': environ.get('DATABASE_HOST', '127.0.0.1'),
+        'PORT': environ.get('DATABASE_PORT', '5432'),
+        'CONN_MAX_AGE': int(environ.get('DATABASE_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': int(environ.get('DATABASE_CONNECT_TIMEOUT', 5)),
+            'application_name': environ.get('DATABASE_APPLICATION_NAME', 'dairy'),
+        },
+    }
+
+
+def _sqlite(base_dir, environ):
+    default = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': base_dir / 'db.sqlite3',
+    }
+    if sqlite_tuned(environ):
+        busy_timeout = int(environ.get('DATABASE_BUSY_TIMEOUT', 20000))
+        default['OPTIONS'] = {
+            'init_command': ';'.join(SQLITE_PRAGMAS).format(busy_timeout=busy_timeout),
+            'timeout': busy_timeout / 1000,
+            'transaction_mode': 'IMMEDIATE',
+        }
+    return default
+
+
+def _profile(environ):
+    profile = environ.get('DATABASE_PROFILE', 'sqlite')
+    if profile not in PROFILES:
+        raise ImproperlyConfigured(f"DATABASE_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}")
+    return profile
+
+
+def sqlite_tuned(environ):
+    """True when environ selects SQLite in its tuned, single-node mode"""
+    return _profile(environ) == 'sqlite' and _flag(environ, 'DATABASE_SQLITE_TUNED')
+
+
+def database_settings(base_dir, environ):
+    """DATABASES for the profile environ selects"""
+    if _profile(environ) == 'sqlite':
+        return {'default': _sqlite(base_dir, environ)}
+
+    default = _postgres(environ)
+    databases = {'default': default}
+    if _flag(environ, 'DATABASE_PGBOUNCER'):
+        default['DISABLE_SERVER_SIDE_CURSORS'] = True
+        default['OPTIONS']['prepare_threshold'] = None
+        if environ.get('DATABASE_DIRECT_HOST'):
+            databases['exports'] = {
+                **_postgres(environ),
+                'HOST': environ['DATABASE_DIRECT_HOST'],
+                'PORT': environ.get('DATABASE_DIRECT_PORT', '5432'),
+                # Exports are rare and long; do not hold a server connection between them
+                'CONN_MAX_AGE': 0,
+                'TEST': {'MIRROR': 'default'},
+            }
+    elif environ.get('DATABASE_POOL'):
+        min_size, _, max_size = environ['DATABASE_POOL'].partition(':')
+        # Django's pool replaces persistent connections
+        default['CONN_MAX_AGE'] = 0
+        default['OPTIONS']['pool'] = {'min_size': int(min_size), 'max_size': int(max_size or min_size)}
+    return databases
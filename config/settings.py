@@ -13,10 +13,12 @@
 import random
 import string
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from django.urls import reverse_lazy
 
 from dotenv import load_dotenv
 
+from .databases import database_settings, sqlite_tuned
 from .template import  THEME_LAYOUT_DIR, THEME_VARIABLES
 
 load_dotenv()  # take environment variables from .env.
@@ -84,7 +86,59 @@
 # LOGIN_REDIRECT_URL = 'index' 
 # LOGOUT_REDIRECT_URL = '/auth/login/'
 
+
+# Request metrics (apps/core/instrumentation.py)
+
+# Requests slower than this are logged with their most expensive queries
+SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS", 1000))
+
+# Bearer token a Prometheus scraper sends to /apiapp/metrics/ (staff sessions need none)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.0/topics/logging/
+# The apps log through per-module loggers under "apps" and "web_project"
+# (see apps/core/log.py).
+# LOG_FORMAT is "json" (one object per line, for the log shipper) or "text".
+# Per-record traces are DEBUG: off at the default LOG_LEVEL, and sampled at
+# LOG_DEBUG_SAMPLE_RATE when switched on.
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", 0.05))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "request_id": {"()": "apps.core.log.RequestIdFilter"},
+        "debug_sample": {"()": "apps.core.log.DebugSampleFilter", "rate": LOG_DEBUG_SAMPLE_RATE},
+    },
+    "formatters": {
+        "json": {"()": "apps.core.log.JsonFormatter"},
+        "text": {"format": "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"},
+    },
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+            "formatter": LOG_FORMAT,
+            "filters": ["request_id", "debug_sample"],
+        },
+    },
+    "loggers": {
+        "apps": {"handlers": ["console"], "level": LOG_LEVEL, "propagate": False},
+        "web_project": {"handlers": ["console"], "level": LOG_LEVEL, "propagate": False},
+        # Unhandled exceptions (500s) with their traceback; 4xx stay out of the log
+        "django.request": {"handlers": ["console"], "level": "ERROR", "propagate": False},
+    },
+}
+
 MIDDLEWARE = [
+    # Tags every log record of the request, the slow request log included (apps/core/log.py)
+    "apps.core.log.RequestIdMiddleware",
+    # Early, so it measures everything below it (apps/core/instrumentation.py)
+    "apps.core.instrumentation.RequestMetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -142,13 +196,50 @@
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
+# DATABASE_PROFILE picks SQLite (default) or PostgreSQL; see config/databases.py
+
+DATABASES = database_settings(BASE_DIR, os.environ)
+
+# Tuned SQLite lets sync uploads take turns on this file lock (apps/api/write_queue.py)
+SYNC_WRITE_LOCK = BASE_DIR / 'db.sqlite3.sync-lock' if sqlite_tuned(os.environ) else None
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Holds the hot lookups of apps/core/cache.py (routes, products, price plans).
+# CACHE_BACKEND picks the store: "file" (default) shares entries between the
+# workers of one host, "redis" (needs the redis package) between hosts.
+# "locmem" is per process, so run_sync_worker would never see an
+# invalidation made by the web workers: it is refused unless DEBUG is on.
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", default="file")
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "lookups"),
+    "file": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        os.environ.get("CACHE_LOCATION", default=str(BASE_DIR / ".cache")),
+    ),
+    "redis": (
+        "django.core.cache.backends.redis.RedisCache",
+        os.environ.get("REDIS_URL", default="redis://127.0.0.1:6379/1"),
+    ),
+}
+if CACHE_BACKEND == "locmem" and not DEBUG:
+    raise ImproperlyConfigured("CACHE_BACKEND=locmem is per process and only allowed with DEBUG on")
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND][0],
+        "LOCATION": CACHE_BACKENDS[CACHE_BACKEND][1],
+        "KEY_PREFIX": os.environ.get("CACHE_KEY_PREFIX", default=ENVIRONMENT),
+        # Entries are invalidated by version bumps; the timeout only bounds leftovers
+        "TIMEOUT": int(os.environ.get("CACHE_TIMEOUT", default=3600)),
     }
 }
 
+# Tests get a LocMemCache of their own instead of the cache above
+TEST_RUNNER = "apps.core.testing.TestRunner"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -3,6 +3,7 @@
 bind = '0.0.0.0:5005'
 workers = 1
 accesslog = '-'
-loglevel = 'debug'
-capture_output = True
+loglevel = 'info'
+# The app logs to stderr itself (LOGGING in config/settings.py)
+capture_output = False
 enable_stdio_inheritance = True
@@ -1,6 +1,11 @@
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
+import logging
+
+logger = logging.getLogger(__name__)
+
+
 class AdminRequiredMixin(UserPassesTestMixin):
     def test_func(self):
         return (
@@ -25,7 +30,6 @@ def handle_no_permission(self):
 
 class DeliveryTeamRequiredMixin(UserPassesTestMixin):
     def test_func(self):
-        print('role:', self.request.user.role)
         if not self.request.user.is_authenticated:
             return redirect('auth-login-basic')
             
@@ -37,5 +41,5 @@ def test_func(self):
         return self.request.user.role in ['DELIVERY', 'SUPERVISOR', 'DISTRIBUTOR']
 
     def handle_no_permission(self):
-        print('role  :', self.request.user.role)
+        logger.info('Denied %s to role %s', self.request.path, getattr(self.request.user, 'role', None))
         raise PermissionDenied("You do not have permission to access this page.")